@@ -3,19 +3,32 @@
 智能火锅点餐顾问 - LangGraph 状态图（Gemini）。
 流程：Profiler（收集画像） -> Inventory（筛选菜品） -> Reviewer（展示方案）。
 """
+import functools
 import json
+import os
 import re
+from pathlib import Path
 from typing import Literal
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
 
+from .memory import DEFAULT_MESSAGE_WINDOW, ConversationMemory, prompt_lines
 from .menu_loader import get_all_broths_with_prices, get_all_items_with_prices, load_menu
 from .state import OrderState
 
 # llm.py 位于项目根目录，由入口脚本保证 sys.path 包含项目根
+from core import scheduler, tracing
+from core.context import estimate_tokens
 from core.llm import get_llm
 
+# 会话只保留最近 N 条消息，更早的折叠进摘要（CONCIERGE_MESSAGE_WINDOW 可配置）
+_memory = ConversationMemory(
+    window=int(os.environ.get("CONCIERGE_MESSAGE_WINDOW", DEFAULT_MESSAGE_WINDOW))
+)
+_graph = None
+
 
 def _ensure_profile(state: OrderState) -> dict:
     return state.get("customer_profile") or {
@@ -43,7 +56,6 @@ def _extract_json(text: str) -> dict | None:
 
 
 def profiler_node(state: OrderState) -> dict:
-    messages = state.get("messages") or []
     profile = _ensure_profile(state)
     llm = get_llm(temperature=0.2, max_output_tokens=400)
 
@@ -60,20 +72,28 @@ def profiler_node(state: OrderState) -> dict:
         "只输出一个 JSON 对象，包含 key：profile、need_more、next_question。"
     )
 
-    conv_lines = ["对话历史："]
-    for m in messages[-10:]:
-        role = "user" if isinstance(m, HumanMessage) else "assistant"
-        content = m.content if hasattr(m, "content") else str(m)
-        conv_lines.append(f"{role}: {content}")
-    conv_lines.append(f"\n当前画像：{json.dumps(profile, ensure_ascii=False)}")
+    conv_lines = prompt_lines(state, profile)
     conv_lines.append("\n请输出 JSON（profile, need_more, next_question）：")
 
+    prompt = "\n".join(conv_lines)
     try:
-        resp = llm.invoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content="\n".join(conv_lines)),
-        ])
-        text = resp.content if hasattr(resp, "content") else str(resp)
+        with scheduler.slot(), tracing.span(
+            "llm", prompt_tokens=estimate_tokens(system_prompt) + estimate_tokens(prompt)
+        ) as sp:
+            resp = llm.invoke([
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=prompt),
+            ])
+            text = resp.content if hasattr(resp, "content") else str(resp)
+            # 模型返回用量时记录真实 token 数，否则按字符估算
+            usage = getattr(resp, "usage_metadata", None) or {}
+            if usage:
+                sp.set(prompt_tokens=usage.get("input_tokens"), response_tokens=usage.get("output_tokens"))
+            else:
+                sp.set(response_tokens=estimate_tokens(text))
+    except scheduler.LLMBusy:
+        # 繁忙时不要用默认画像继续出方案，交给 Web 层快速回复「繁忙」，本轮状态不变
+        raise
     except Exception as e:
         return {
             "customer_profile": profile,
@@ -100,13 +120,19 @@ def profiler_node(state: OrderState) -> dict:
     return updates
 
 
+def _menu(state: OrderState, config: RunnableConfig | None) -> dict:
+    """本轮使用的菜单：优先用调用方传入的门店快照（config["configurable"]["menu"]），否则按 menu_path 读文件。"""
+    menu = ((config or {}).get("configurable") or {}).get("menu")
+    return menu if menu is not None else load_menu(state.get("menu_path"))
+
+
 def _route_after_profiler(state: OrderState) -> Literal["need_more", "done"]:
     step = state.get("current_step", "")
     return "done" if step == "menu_generation" else "need_more"
 
 
-def inventory_node(state: OrderState) -> dict:
-    menu = load_menu()
+def inventory_node(state: OrderState, config: RunnableConfig | None = None) -> dict:
+    menu = _menu(state, config)
     profile = _ensure_profile(state)
     items = get_all_items_with_prices(menu)
     allergies = set((profile.get("allergies") or []) + (profile.get("dislikes") or []))
@@ -146,8 +172,8 @@ def inventory_node(state: OrderState) -> dict:
     }
 
 
-def reviewer_node(state: OrderState) -> dict:
-    menu = load_menu()
+def reviewer_node(state: OrderState, config: RunnableConfig | None = None) -> dict:
+    menu = _menu(state, config)
     profile = _ensure_profile(state)
     cart = state.get("cart") or []
     broths = get_all_broths_with_prices(menu)
@@ -184,11 +210,20 @@ def reviewer_node(state: OrderState) -> dict:
     }
 
 
+def _traced(name: str, node):
+    """节点执行记为 graph.<name> span；functools.wraps 保留原签名，LangGraph 据此决定是否传入 config。"""
+    @functools.wraps(node)
+    def wrapper(*args, **kwargs):
+        with tracing.span(f"graph.{name}"):
+            return node(*args, **kwargs)
+    return wrapper
+
+
 def build_order_graph():
     workflow = StateGraph(OrderState)
-    workflow.add_node("profiler", profiler_node)
-    workflow.add_node("inventory", inventory_node)
-    workflow.add_node("reviewer", reviewer_node)
+    workflow.add_node("profiler", _traced("profiler", profiler_node))
+    workflow.add_node("inventory", _traced("inventory", inventory_node))
+    workflow.add_node("reviewer", _traced("reviewer", reviewer_node))
 
     workflow.add_edge(START, "profiler")
     workflow.add_conditional_edges(
@@ -201,11 +236,35 @@ def build_order_graph():
     return workflow.compile()
 
 
-def run_concierge_once(user_message: str, initial_state: OrderState | None = None) -> dict:
-    graph = build_order_graph()
+def _get_graph():
+    """编译好的状态图（无状态，可跨请求复用）。"""
+    global _graph
+    if _graph is None:
+        _graph = build_order_graph()
+    return _graph
+
+
+def run_concierge_once(
+    user_message: str,
+    initial_state: OrderState | None = None,
+    memory: ConversationMemory | None = None,
+    menu_path: Path | str | None = None,
+    menu: dict | None = None,
+) -> dict:
+    """
+    跑一轮对话；返回的新状态中消息已按 memory 窗口裁剪，旧消息中的要点并入 conversation_facts、原话折叠进 conversation_digest。
+    menu_path 指定门店菜单（缺省用默认菜单）；menu 为已加载的门店菜单快照，
+    经 config 传给各节点（不写入状态），热更新时本轮对话始终使用同一份菜单。
+    """
+    memory = memory or _memory
     state: OrderState = initial_state.copy() if initial_state else {}
+    if menu_path is not None:
+        state["menu_path"] = str(menu_path)
     msgs = list(state.get("messages") or [])
     msgs.append(HumanMessage(content=user_message))
     state["messages"] = msgs
-    result = graph.invoke(state)
+    state.update(memory.compact(state))
+    config = {"configurable": {"menu": menu}} if menu is not None else None
+    result = dict(_get_graph().invoke(state, config=config))
+    result.update(memory.compact(result))
     return result
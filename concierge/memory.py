@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+智能火锅点餐顾问 - 有界对话记忆。
+
+会话中只保留最近 window 条消息；消息移出窗口时：
+  - 要点（conversation_facts）：把当时画像中的人数、辣度、锅底与过敏、忌口、偏好（均取最新）结构化地带下去，
+    早期说过的过敏、人数不会因为窗口滑动或模型漏写字段而丢失；客人撤回的过敏、忌口随画像一起更新，不会被要点带回；
+  - 原话（conversation_digest）：移出窗口的最后几句原话（每句截断），是长度受限的截断窗口而非摘要，只给 profiler 补语境。
+两者与客户画像（customer_profile）一起写入 prompt。这样无论对话多长，profiler 的 prompt 大小与 session 占用都保持常量。
+"""
+import json
+
+from langchain_core.messages import HumanMessage
+
+DEFAULT_MESSAGE_WINDOW = 10
+DEFAULT_DIGEST_MAX_CHARS = 400
+# 原话窗口中每条旧消息保留的最大字符数
+DIGEST_LINE_MAX_CHARS = 60
+# 画像中列表字段（过敏、偏好等）写入 prompt 时的最大条数
+PROFILE_LIST_MAX_ITEMS = 10
+# 要点：标量字段取最新的非空值，列表字段取画像中最新的整份列表（最多保留最近 FACT_LIST_MAX_ITEMS 条）
+FACT_SCALAR_KEYS = ("num_guests", "spice_tolerance", "broth_id")
+FACT_LIST_KEYS = ("allergies", "dislikes", "preferences")
+FACT_LIST_MAX_ITEMS = 20
+_FACT_LABELS = {
+    "num_guests": "人数", "spice_tolerance": "辣度", "broth_id": "锅底",
+    "allergies": "过敏", "dislikes": "不喜欢", "preferences": "偏好",
+}
+
+
+def _message_line(m) -> str:
+    role = "user" if isinstance(m, HumanMessage) else "assistant"
+    content = m.content if hasattr(m, "content") else str(m)
+    content = " ".join(str(content).split())
+    if len(content) > DIGEST_LINE_MAX_CHARS:
+        content = content[:DIGEST_LINE_MAX_CHARS] + "…"
+    return f"{role}: {content}"
+
+
+def bound_profile(profile: dict) -> dict:
+    """画像中的列表字段只保留最近 PROFILE_LIST_MAX_ITEMS 条。"""
+    return {
+        k: (v[-PROFILE_LIST_MAX_ITEMS:] if isinstance(v, list) else v)
+        for k, v in (profile or {}).items()
+    }
+
+
+def merge_facts(facts: dict, profile: dict) -> dict:
+    """
+    把画像并入要点，各字段都以最新画像为准：标量取画像中的非空值；列表字段出现在画像中时整份替换
+    （空列表表示客人已撤回，清除该项），画像中没有该字段（模型漏写）时沿用已记下的要点。
+    """
+    out = dict(facts or {})
+    profile = profile or {}
+    for key in FACT_SCALAR_KEYS:
+        value = profile.get(key)
+        if value not in (None, ""):
+            out[key] = value
+    for key in FACT_LIST_KEYS:
+        if key not in profile:
+            continue
+        items = [v for v in profile.get(key) or [] if v][-FACT_LIST_MAX_ITEMS:]
+        if items:
+            out[key] = items
+        else:
+            out.pop(key, None)
+    return out
+
+
+def render_facts(facts: dict) -> str:
+    """要点的一行文本，如「人数 2；辣度 mild；过敏 海鲜、花生」。"""
+    parts = []
+    for key in FACT_SCALAR_KEYS + FACT_LIST_KEYS:
+        value = (facts or {}).get(key)
+        if value in (None, "", []):
+            continue
+        parts.append(f"{_FACT_LABELS[key]} {'、'.join(map(str, value)) if isinstance(value, list) else value}")
+    return "；".join(parts)
+
+
+def prompt_lines(state: dict, profile: dict) -> list[str]:
+    """profiler 用的对话上下文：要点 + 移出窗口的最后几句 + 已裁剪的窗口内消息 + 当前画像（列表字段截断）。"""
+    lines = []
+    facts = render_facts(state.get("conversation_facts") or {})
+    if facts:
+        lines.append(f"更早的对话中已确认：{facts}")
+    digest = state.get("conversation_digest") or ""
+    if digest:
+        lines.append("更早对话的最后几句（截断）：")
+        lines.append(digest)
+    lines.append("对话历史：")
+    for m in state.get("messages") or []:
+        role = "user" if isinstance(m, HumanMessage) else "assistant"
+        content = m.content if hasattr(m, "content") else str(m)
+        lines.append(f"{role}: {content}")
+    lines.append(f"\n当前画像：{json.dumps(bound_profile(profile), ensure_ascii=False)}")
+    return lines
+
+
+class ConversationMemory:
+    """滚动窗口；移出窗口的消息折叠为结构化要点与截断的原话窗口。"""
+
+    def __init__(
+        self,
+        window: int = DEFAULT_MESSAGE_WINDOW,
+        digest_max_chars: int = DEFAULT_DIGEST_MAX_CHARS,
+    ):
+        self.window = max(1, window)
+        self.digest_max_chars = digest_max_chars
+
+    def fold(self, digest: str, messages: list) -> str:
+        """把移出窗口的消息追加进原话窗口；超长时从最旧的一行开始丢弃（其中的事实已由要点保留）。"""
+        lines = [ln for ln in (digest or "").split("\n") if ln]
+        lines += [_message_line(m) for m in messages]
+        while lines and len("\n".join(lines)) > self.digest_max_chars:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def compact(self, state: dict) -> dict:
+        """
+        返回裁剪后的 {messages, conversation_facts, conversation_digest, customer_profile}：
+        有消息移出窗口时，当前画像（已看过这些消息）并入要点，消息本身折叠进原话窗口。
+        """
+        messages = list(state.get("messages") or [])
+        digest = state.get("conversation_digest") or ""
+        facts = state.get("conversation_facts") or {}
+        out: dict = {"messages": messages, "conversation_facts": facts, "conversation_digest": digest}
+        if len(messages) > self.window:
+            overflow = messages[: len(messages) - self.window]
+            out["messages"] = messages[-self.window:]
+            out["conversation_facts"] = merge_facts(facts, state.get("customer_profile") or {})
+            out["conversation_digest"] = self.fold(digest, overflow)
+        if state.get("customer_profile"):
+            out["customer_profile"] = bound_profile(state["customer_profile"])
+        return out
@@ -26,16 +26,21 @@ def _menu_context(menu: dict) -> str:
 
 def generate_order_struct(
     customer_profile: dict,
-    cart: list[str],
+    cart: list[str] | dict[str, int],
     menu_path: Path | str | None = None,
     use_pydantic_ai: bool = True,
+    rules_path: Path | str | None = None,
+    menu: dict | None = None,
+    rules: dict | None = None,
 ) -> HotpotOrder:
     """
-    根据画像与购物车生成结构化订单。
+    根据画像与购物车生成结构化订单。cart 可为 id 列表或 id -> 份数倍数 的映射。
+    menu_path / rules_path 指定门店菜单与蘸料规则（缺省用默认数据）；
+    menu / rules 为已加载的门店快照，提供时优先使用、不再读文件。
     若 use_pydantic_ai=True 且已安装 pydantic-ai，则用 Agent(output_type=HotpotOrder) 生成并校验；
     否则用 LLM + 手工解析/校验为 HotpotOrder。
     """
-    menu = load_menu(menu_path)
+    menu = menu if menu is not None else load_menu(menu_path)
     brooths = get_all_broths_with_prices(menu)
     items = get_all_items_with_prices(menu)
     by_id = {it["id"]: it for it in items}
@@ -70,14 +75,15 @@ def generate_order_struct(
 
     context = _menu_context(menu)
 
-    # 仅允许 cart 中存在的 id，并计算份数（按每人推荐份数）
+    # 仅允许 cart 中存在的 id，并计算份数（按每人推荐份数 × 倍数）
     order_items: list[MenuItem] = []
-    for iid in cart:
+    cart_counts = cart.items() if isinstance(cart, dict) else ((iid, 1) for iid in cart)
+    for iid, count in cart_counts:
         it = by_id.get(iid)
         if not it:
             continue
         portion_per = it.get("portion_per_person", 1.0)
-        qty = max(0.5, round(portion_per * num_guests, 1))
+        qty = max(0.5, round(portion_per * num_guests * count, 1))
         order_items.append(
             MenuItem(
                 menu_item_id=iid,
@@ -91,7 +97,7 @@ def generate_order_struct(
         )
 
     # 蘸料：风味图谱（用第一个锅底）
-    sauce_result = calc_sauce_pairing(broth_id, cart, menu_path)
+    sauce_result = calc_sauce_pairing(broth_id, list(cart), menu_path, rules_path, menu=menu, rules=rules)
     recipe = sauce_result.get("sauce_recipe") or ["蒜泥+香油+蚝油+香菜"]
 
     return HotpotOrder(
@@ -107,7 +113,7 @@ def generate_order_struct(
 
 def generate_order_with_llm(
     customer_profile: dict,
-    cart: list[str],
+    cart: list[str] | dict[str, int],
     menu_path: Path | str | None = None,
 ) -> HotpotOrder:
     """
@@ -2,7 +2,9 @@
 """
 加载火锅菜单与价格，为菜品推荐与结构化订单提供数据。
 """
+import hashlib
 import json
+import threading
 from pathlib import Path
 
 DEFAULT_MENU_PATH = Path(__file__).parent.parent / "data" / "hotpot_menu.json"
@@ -72,3 +74,55 @@ def get_all_broths_with_prices(menu: dict) -> list[dict]:
             "price": b.get("price") or SOUP_BASE_PRICE.get(bid, 28.0),
         })
     return result
+
+
+class MenuIndex:
+    """菜单只读快照：加载一次并预建常用查表结构（合法 id、id→食材、中文名→锅底）。"""
+
+    def __init__(self, menu: dict, version: str = ""):
+        self.menu = menu
+        self.version = version
+        self.ingredients: list[dict] = menu.get("ingredients", [])
+        self.soup_bases: list[dict] = menu.get("soup_bases", [])
+        self.items_with_prices = get_all_items_with_prices(menu)
+        self.item_by_id: dict[str, dict] = {it["id"]: it for it in self.items_with_prices if it.get("id")}
+        self.ingredient_ids: frozenset[str] = frozenset(self.item_by_id)
+        self.broth_by_name: dict[str, dict] = {b["name_cn"]: b for b in self.soup_bases if b.get("name_cn")}
+
+    @classmethod
+    def from_file(cls, path: Path | str | None = None) -> "MenuIndex":
+        path = Path(path or DEFAULT_MENU_PATH)
+        if not path.exists():
+            raise FileNotFoundError(f"菜单文件不存在: {path}")
+        raw = path.read_bytes()
+        return cls(json.loads(raw.decode("utf-8")), version=hashlib.sha256(raw).hexdigest()[:12])
+
+    def item_name(self, item_id: str) -> str:
+        it = self.item_by_id.get(item_id, {})
+        return it.get("name_cn") or it.get("name_en") or item_id
+
+
+_index_lock = threading.Lock()
+_index_cache: dict[Path, tuple[float, MenuIndex]] = {}
+
+
+def get_menu_index(path: Path | str | None = None) -> MenuIndex:
+    """返回菜单快照（按文件修改时间缓存，菜单文件更新后自动重建）。"""
+    path = Path(path or DEFAULT_MENU_PATH).resolve()
+    mtime = path.stat().st_mtime if path.exists() else -1.0
+    cached = _index_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with _index_lock:
+        cached = _index_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        index = MenuIndex.from_file(path)
+        _index_cache[path] = (mtime, index)
+        return index
+
+
+def cached_indexes() -> list[MenuIndex]:
+    """get_menu_index 当前缓存的菜单快照（供内存核算）。"""
+    with _index_lock:
+        return [index for _, index in _index_cache.values()]
@@ -8,10 +8,11 @@ from pathlib import Path
 RULES_PATH = Path(__file__).parent.parent / "data" / "sauce_pairing_rules.json"
 
 
-def _load_rules() -> dict:
-    if not RULES_PATH.exists():
+def load_rules(path: Path | str | None = None) -> dict:
+    path = Path(path or RULES_PATH)
+    if not path.exists():
         return {"rules": [], "default_sauce": {"sauce_recipe": ["蒜泥+香油+蚝油+香菜"], "reason_cn": "万能蘸料", "reason_en": "All-purpose"}}
-    with open(RULES_PATH, "r", encoding="utf-8") as f:
+    with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
@@ -19,14 +20,18 @@ def calc_sauce_pairing(
     broth_id: str,
     ingredient_ids: list[str],
     menu_path: Path | str | None = None,
+    rules_path: Path | str | None = None,
+    menu: dict | None = None,
+    rules: dict | None = None,
 ) -> dict:
     """
-    根据锅底与已选食材推荐蘸料配方。
+    根据锅底与已选食材推荐蘸料配方。rules_path 指定门店自己的蘸料规则（缺省用默认规则）。
+    menu / rules 为已加载的门店快照（热更新时保证一次请求内数据一致），提供时不再读文件。
     可供 ADK 工具定义：Tool(sauce_pairing, "Recommend dipping sauce for broth and ingredients")
     """
     from .menu_loader import load_menu, get_all_broths_with_prices, get_all_items_with_prices
 
-    menu = load_menu(menu_path)
+    menu = menu if menu is not None else load_menu(menu_path)
     broths = {b["id"]: b for b in get_all_broths_with_prices(menu)}
     items = {it["id"]: it for it in get_all_items_with_prices(menu)}
 
@@ -68,7 +73,7 @@ def calc_sauce_pairing(
             ingredient_tags.append("vegetable")
     ingredient_tags = list(set(ingredient_tags))
 
-    data = _load_rules()
+    data = rules if rules is not None else load_rules(rules_path)
     for rule in data.get("rules", []):
         bt = set(rule.get("broth_tags", []))
         it = set(rule.get("ingredient_tags", []))
@@ -17,6 +17,9 @@ class OrderState(TypedDict, total=False):
     messages: Annotated[list[Any], add_messages]
     customer_profile: dict          # spice_tolerance, allergies, preferences, num_guests, broth_id
     current_step: str               # preference_gathering | menu_generation | sauce_recommendation
-    cart: list[str]                 # 暂存的菜品 ID（menu_item_id）
+    cart: list[str] | dict[str, int]  # 暂存的菜品：ID 列表（图内生成）或 ID -> 份数倍数（Web session）
     confirmed: bool                 # 用户是否已确认方案
     last_order_json: Optional[dict] # 最近一次生成的结构化订单（HotpotOrder），供展示与重试
+    conversation_facts: dict        # 移出消息窗口的对话中已确认的要点：人数、辣度、过敏等（concierge.memory）
+    conversation_digest: str        # 移出消息窗口的最后几句原话（截断窗口，concierge.memory）
+    menu_path: str                  # 当前门店的菜单文件（多门店时由 Web 层注入；缺省为默认菜单）
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 """核心：LLM 工厂 + RAG 知识库。"""
 from .llm import get_llm
-from .rag import RAG
+from .rag import RAG, knowledge_hash, shared_embeddings
 
-__all__ = ["get_llm", "RAG"]
+__all__ = ["get_llm", "RAG", "knowledge_hash", "shared_embeddings"]
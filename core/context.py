@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+检索结果 → Prompt 上下文组装：去重（完全重复 + 向量近重复）、MMR 多样化、按 token 预算装箱（句级裁剪）。
+位于检索与 create_stuff_documents_chain 之间，减少冗余上下文的输入 token 与生成延迟。
+"""
+import re
+from dataclasses import dataclass
+
+import numpy as np
+from langchain_core.documents import Document
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1200
+DEFAULT_MMR_LAMBDA = 0.7
+DEFAULT_NEAR_DUP_THRESHOLD = 0.95
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+_SENTENCE_RE = re.compile(r"[^。！？!?；;\n]+[。！？!?；;\n]?")
+_WS_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符按 1 字 1 token，其余按约 4 字符 1 token。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    rest = len(_WS_RE.sub("", text)) - cjk
+    return cjk + (rest + 3) // 4
+
+
+@dataclass
+class ContextStats:
+    """一次上下文组装的前后对比，用于日志。"""
+    chunks_in: int
+    tokens_in: int
+    chunks_out: int = 0
+    tokens_out: int = 0
+    duplicates: int = 0
+    trimmed: int = 0
+
+
+def _normalize(vecs) -> np.ndarray:
+    m = np.asarray(vecs, dtype=np.float32)
+    if m.ndim == 1:
+        m = m.reshape(1, -1)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def _trim_to_budget(text: str, budget: int) -> str:
+    """按句裁剪：保留能放进预算的前若干整句。"""
+    out = []
+    used = 0
+    for m in _SENTENCE_RE.finditer(text):
+        sent = m.group(0)
+        t = estimate_tokens(sent)
+        if used + t > budget:
+            break
+        out.append(sent)
+        used += t
+    return "".join(out).strip()
+
+
+def build_context(
+    query_vec,
+    docs: list[Document],
+    doc_vecs,
+    max_docs: int,
+    token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+    mmr_lambda: float = DEFAULT_MMR_LAMBDA,
+    near_dup_threshold: float = DEFAULT_NEAR_DUP_THRESHOLD,
+    priority: str | None = None,
+) -> tuple[list[Document], ContextStats]:
+    """
+    组装上下文：
+      1. 去掉文本完全相同的块，以及与已保留块余弦相似度 ≥ near_dup_threshold 的近重复块；
+      2. 用已算好的向量做 MMR（relevance 为与问题的余弦相似度，含 priority 字符串的块额外 +2 保持优先）；
+      3. 依 MMR 顺序装入 token_budget，放不下的块按句裁剪。
+    返回 (上下文文档列表, 统计)。
+    """
+    stats = ContextStats(
+        chunks_in=min(len(docs), max_docs),
+        tokens_in=sum(estimate_tokens(d.page_content) for d in docs[:max_docs]),
+    )
+    if not docs:
+        return [], stats
+
+    q = _normalize(query_vec)[0]
+    dv = _normalize(doc_vecs)
+
+    # 1. 去重（保持检索顺序，先出现者保留）
+    kept: list[int] = []
+    seen_text: set[str] = set()
+    for i, d in enumerate(docs):
+        key = _WS_RE.sub("", d.page_content)
+        if not key or key in seen_text:
+            stats.duplicates += 1
+            continue
+        if kept and float(np.max(dv[kept] @ dv[i])) >= near_dup_threshold:
+            stats.duplicates += 1
+            continue
+        seen_text.add(key)
+        kept.append(i)
+
+    # 2. MMR
+    relevance = dv[kept] @ q
+    if priority:
+        relevance = relevance + np.array([2.0 if priority in docs[i].page_content else 0.0 for i in kept])
+    sim = dv[kept] @ dv[kept].T
+    selected: list[int] = []
+    remaining = list(range(len(kept)))
+    while remaining and len(selected) < max_docs:
+        if selected:
+            redundancy = sim[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+
+    # 3. token 预算装箱
+    out: list[Document] = []
+    budget = token_budget
+    for j in selected:
+        d = docs[kept[j]]
+        t = estimate_tokens(d.page_content)
+        if t <= budget:
+            out.append(d)
+            budget -= t
+            continue
+        trimmed = _trim_to_budget(d.page_content, budget)
+        if trimmed:
+            out.append(Document(page_content=trimmed, metadata=d.metadata))
+            budget -= estimate_tokens(trimmed)
+            stats.trimmed += 1
+        if budget <= 0:
+            break
+
+    stats.chunks_out = len(out)
+    stats.tokens_out = sum(estimate_tokens(d.page_content) for d in out)
+    return out, stats
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+请求级延迟预算（Deadline）与对冲调用（hedged request）。
+
+Deadline 由 Web 路由在请求开始时创建，一路传给检索与生成；
+hedged_call 在主调用超过 hedge_delay 仍未返回时再发一份相同请求，取先返回者，
+预算耗尽则抛出 DeadlineExceeded，由调用方降级。
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, TypeVar
+
+from . import metrics, profiling, tracing
+
+T = TypeVar("T")
+
+# LLM 调用在线程池中执行，便于超时等待与对冲；被放弃的调用在后台自然结束
+_LLM_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm")
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求延迟预算已耗尽。"""
+
+
+class Deadline:
+    """单个请求的截止时间（基于 monotonic 时钟）。"""
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    @classmethod
+    def from_ms(cls, budget_ms: float) -> "Deadline":
+        return cls(budget_ms / 1000.0)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+def hedged_call(
+    fn: Callable[[], T],
+    deadline: Deadline,
+    hedge_delay: float | None = None,
+    hedge_if: Callable[[], bool] | None = None,
+) -> T:
+    """
+    在预算内执行 fn；若 hedge_delay 秒后主调用未返回，则再发一次对冲调用，取先成功者。
+    hedge_if 返回 False 时不发对冲（如 LLM 调度器已排队，对冲只会加重拥塞）。
+    两次都失败时抛出最后一个异常；预算耗尽时抛出 DeadlineExceeded。
+    指标：llm.hedge_fired / llm.hedge_won / llm.hedge_skipped。
+    """
+    # 每次提交单独绑定调用方的 trace 上下文，LLM span 挂在发起请求的 span 下；被剖析的请求同时计入 LLM 线程的样本
+    primary = _LLM_POOL.submit(tracing.bind(profiling.attach(fn)))
+    pending = {primary}
+    hedge = None
+    last_exc: BaseException | None = None
+
+    if hedge_delay is not None and hedge_delay < deadline.remaining():
+        done, _ = wait(pending, timeout=hedge_delay)
+        if primary in done and primary.exception() is None:
+            return primary.result()
+        if primary in done:
+            last_exc = primary.exception()
+            pending.discard(primary)
+        if hedge_if is None or hedge_if() or not pending:
+            hedge = _LLM_POOL.submit(tracing.bind(profiling.attach(fn)))
+            pending.add(hedge)
+            metrics.incr("llm.hedge_fired")
+            tracing.annotate(hedge="fired")
+        else:
+            metrics.incr("llm.hedge_skipped")
+            tracing.annotate(hedge="skipped")
+
+    while pending:
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for fut in done:
+            exc = fut.exception()
+            if exc is None:
+                if fut is hedge:
+                    metrics.incr("llm.hedge_won")
+                    tracing.annotate(hedge="won")
+                return fut.result()
+            last_exc = exc
+    if pending or last_exc is None:
+        raise DeadlineExceeded(f"延迟预算 {deadline.budget_s:.1f}s 已耗尽")
+    raise last_exc
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+本机 embedding 服务（sidecar）：单独进程加载一份 embedding 模型，经 Unix socket 为多个 Web worker 提供向量。
+
+多 worker 部署时每个 worker 只持有轻量的 EmbeddingClient，不再各自加载模型。
+服务端把短时间内到达的请求合并成一批调用 embed_documents，提高吞吐。
+
+协议（每帧 = 4 字节大端长度 + 内容）：
+  请求：一帧 JSON {"op": "embed", "texts": [...]} 或 {"op": "ping"}
+  响应：一帧 JSON {"shape": [n, dim]}，随后一帧 float32 原始字节；出错时只有一帧 {"error": "..."}
+
+用法：python -m core.embed_server --socket /tmp/hotpot-embed.sock
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_SOCKET = "/tmp/hotpot-embed.sock"
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+CLIENT_TIMEOUT_S = 30.0
+
+_LEN = struct.Struct(">I")
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("embedding 服务连接已关闭")
+        buf += chunk
+    return bytes(buf)
+
+
+def send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_LEN.pack(len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> bytes:
+    (n,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    return _recv_exact(sock, n)
+
+
+class EmbeddingServer:
+    """Unix socket 上的 embedding 服务：每连接一个读线程，一个批处理线程合并请求后统一编码。"""
+
+    def __init__(
+        self,
+        socket_path: str,
+        embeddings: Embeddings,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+    ):
+        self.socket_path = socket_path
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_ms / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._sock: socket.socket | None = None
+        self.requests = 0
+        self.batches = 0
+
+    def start(self) -> "EmbeddingServer":
+        """绑定 socket 并在后台线程中开始服务。"""
+        path = Path(self.socket_path)
+        if path.exists():
+            path.unlink()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.socket_path)
+        self._sock.listen(128)
+        threading.Thread(target=self._accept_loop, name="embed-accept", daemon=True).start()
+        threading.Thread(target=self._batch_loop, name="embed-batch", daemon=True).start()
+        return self
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    def _accept_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), name="embed-conn", daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        with conn:
+            while not self._stop.is_set():
+                try:
+                    req = json.loads(recv_frame(conn))
+                except (ConnectionError, OSError):
+                    return
+                if req.get("op") == "ping":
+                    send_frame(conn, b'{"ok": true}')
+                    continue
+                fut: Future = Future()
+                self._queue.put((list(req.get("texts") or []), fut))
+                try:
+                    vecs = fut.result()
+                    header = {"shape": list(vecs.shape)}
+                    send_frame(conn, json.dumps(header).encode("utf-8"))
+                    send_frame(conn, vecs.tobytes())
+                except (ConnectionError, OSError):
+                    return
+                except Exception as e:
+                    send_frame(conn, json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8"))
+
+    def _batch_loop(self) -> None:
+        """取出一个请求后最多再等 max_wait_s，凑满 max_batch 条文本即一起编码。"""
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            n_texts = len(first[0])
+            wait_until = time.monotonic() + self.max_wait_s
+            while n_texts < self.max_batch:
+                timeout = wait_until - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                n_texts += len(item[0])
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list) -> None:
+        texts = [t for item, _ in batch for t in item]
+        self.requests += len(batch)
+        self.batches += 1
+        try:
+            vecs = np.asarray(self.embeddings.embed_documents(texts) if texts else [], dtype=np.float32)
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        start = 0
+        for item, fut in batch:
+            fut.set_result(vecs[start:start + len(item)])
+            start += len(item)
+
+
+class EmbeddingClient(Embeddings):
+    """EmbeddingServer 的客户端（每线程一条长连接，断开后重连一次）。"""
+
+    def __init__(self, socket_path: str = DEFAULT_EMBEDDING_SOCKET, timeout: float = CLIENT_TIMEOUT_S):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _reset(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _call(self, payload: dict) -> socket.socket:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        for attempt in range(2):
+            try:
+                conn = self._conn()
+                send_frame(conn, data)
+                return conn
+            except (ConnectionError, OSError):
+                self._reset()
+                if attempt:
+                    raise
+        raise ConnectionError("embedding 服务不可用")
+
+    def ping(self) -> bool:
+        try:
+            conn = self._call({"op": "ping"})
+            return json.loads(recv_frame(conn)).get("ok") is True
+        except (ConnectionError, OSError):
+            self._reset()
+            return False
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        try:
+            conn = self._call({"op": "embed", "texts": list(texts)})
+            header = json.loads(recv_frame(conn))
+            if "error" in header:
+                raise RuntimeError(f"embedding 服务出错：{header['error']}")
+            body = recv_frame(conn)
+        except (ConnectionError, OSError):
+            self._reset()
+            raise
+        return np.frombuffer(body, dtype=np.float32).reshape(header["shape"]).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        # 句向量模型的 query / document 编码相同，走同一批处理通道
+        return self.embed_documents([text])[0]
+
+
+def wait_for_server(socket_path: str, timeout: float = 120.0) -> bool:
+    """等待 embedding 服务就绪（模型加载完成、socket 可连通）。"""
+    client = EmbeddingClient(socket_path, timeout=5.0)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if Path(socket_path).exists() and client.ping():
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本机 embedding 服务（Unix socket）")
+    parser.add_argument("--socket", type=str, default=os.environ.get("EMBEDDING_SOCKET", DEFAULT_EMBEDDING_SOCKET))
+    parser.add_argument("--model", type=str, default=None, help="embedding 模型名（默认与 RAG 相同）")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    from .rag import DEFAULT_EMBED_MODEL, _get_embeddings
+
+    embeddings = _get_embeddings(args.model or DEFAULT_EMBED_MODEL)
+    embeddings.embed_query("预热")
+    server = EmbeddingServer(args.socket, embeddings, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    print(f"[Embed] embedding 服务已就绪：{args.socket}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+预构建的只读索引包：离线（python main.py build-index）把知识文档分块、编码后写成一个自描述目录，
+服务启动时直接打开，不再加载文档、分块与编码。
+
+目录结构：
+  manifest.json   格式版本、知识库指纹（source_hash）、embedding 模型、分块参数、块数与向量维度
+  vectors.npy     float32 [count, dim]，打开时内存映射（mmap），多 worker 共享同一份页缓存
+  chunks.jsonl    每行一个文本块 {"text": ..., "metadata": {...}}，与 vectors.npy 按行对应
+
+指纹、模型或分块参数与当前配置不一致时视为过期，调用方回退到 Chroma 录入。
+"""
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+VECTORS_FILENAME = "vectors.npy"
+CHUNKS_FILENAME = "chunks.jsonl"
+
+
+class ReadOnlyIndexError(RuntimeError):
+    """预构建索引包只读：不能向其中录入文档（更新知识库请重新运行 build-index）。"""
+
+
+def write_index_bundle(
+    output_dir: Path | str,
+    docs: list[Document],
+    vectors,
+    manifest: dict,
+) -> dict:
+    """写出索引包：先写到同级临时目录，完成后整体替换，读者不会看到写了一半的包。"""
+    output_dir = Path(output_dir)
+    vecs = np.asarray(vectors, dtype=np.float32)
+    if len(docs) != len(vecs):
+        raise ValueError(f"文本块数 {len(docs)} 与向量数 {len(vecs)} 不一致")
+    manifest = {
+        **manifest,
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "count": len(docs),
+        "dim": int(vecs.shape[1]) if vecs.ndim == 2 and len(vecs) else 0,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    tmp = output_dir.with_name(output_dir.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.save(tmp / VECTORS_FILENAME, vecs)
+    with open(tmp / CHUNKS_FILENAME, "w", encoding="utf-8") as f:
+        for d in docs:
+            f.write(json.dumps({"text": d.page_content, "metadata": d.metadata or {}}, ensure_ascii=False) + "\n")
+    (tmp / MANIFEST_FILENAME).write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    old = output_dir.with_name(output_dir.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if output_dir.exists():
+        os.replace(output_dir, old)
+    os.replace(tmp, output_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+def read_manifest(path: Path | str) -> dict | None:
+    """读取索引包清单；不存在或无法解析时返回 None。"""
+    try:
+        return json.loads((Path(path) / MANIFEST_FILENAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+class IndexBundle(VectorStore):
+    """
+    只读向量库：文本块常驻内存，向量内存映射；检索为暴力 L2 距离（与 Chroma 默认度量一致）。
+    知识库规模为数百个块，单次检索是一次 [count, dim] 矩阵乘，不需要 HNSW。
+    """
+
+    def __init__(self, path: Path | str, embedding: Embeddings | None = None):
+        self.path = Path(path)
+        manifest = read_manifest(self.path)
+        if manifest is None:
+            raise FileNotFoundError(f"索引包不存在或清单损坏: {self.path}")
+        if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"索引包格式版本不符: {manifest.get('format_version')}")
+        self.manifest = manifest
+        self._embedding = embedding
+        self._vectors = np.load(self.path / VECTORS_FILENAME, mmap_mode="r")
+        self._texts: list[str] = []
+        self._metadatas: list[dict] = []
+        with open(self.path / CHUNKS_FILENAME, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    self._texts.append(row["text"])
+                    self._metadatas.append(row.get("metadata") or {})
+        if len(self._texts) != len(self._vectors):
+            raise ValueError(f"索引包损坏：{len(self._texts)} 个文本块对应 {len(self._vectors)} 个向量")
+        # 各行向量的平方范数只算一次，检索时 ||q - v||² = ||v||² - 2 q·v + ||q||²
+        self._sq_norms = np.einsum("ij,ij->i", self._vectors, self._vectors) if len(self._texts) else np.zeros(0)
+
+    @property
+    def embeddings(self) -> Embeddings | None:
+        return self._embedding
+
+    def mismatch(self, source_hash: str, embed_model: str, splitter: dict) -> str | None:
+        """与当前知识库 / 模型 / 分块参数不一致的原因；一致时返回 None。"""
+        m = self.manifest
+        if m.get("source_hash") != source_hash:
+            return "知识库内容已变化"
+        if m.get("embed_model") != embed_model:
+            return f"embedding 模型不同（{m.get('embed_model')}）"
+        if m.get("splitter") != splitter:
+            return "分块参数不同"
+        return None
+
+    def count(self) -> int:
+        return len(self._texts)
+
+    def search_with_vectors(self, query_vec, k: int) -> tuple[list[Document], list]:
+        """按向量检索 top-k，同时返回各块的向量（与 RAG._search_by_vector 的 Chroma 分支同构）。"""
+        return self.search_many_with_vectors([query_vec], k)[0]
+
+    def search_many_with_vectors(self, query_vecs, k: int) -> list[tuple[list[Document], list]]:
+        """多个 query 一次检索：一次 [queries, dim] × [dim, count] 矩阵乘，再逐行取 top-k。"""
+        n = len(self._texts)
+        if n == 0 or k <= 0:
+            return [([], []) for _ in query_vecs]
+        q = np.asarray(query_vecs, dtype=np.float32).reshape(len(query_vecs), -1)
+        dist = self._sq_norms[None, :] - 2.0 * (q @ self._vectors.T)
+        k = min(k, n)
+        out = []
+        for row in dist:
+            top = np.argpartition(row, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(row[top], kind="stable")]
+            docs = [Document(page_content=self._texts[i], metadata=dict(self._metadatas[i])) for i in top]
+            out.append((docs, [np.array(self._vectors[i]) for i in top]))
+        return out
+
+    # ---------- VectorStore 接口 ----------
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs: Any) -> list[Document]:
+        return self.search_with_vectors(embedding, k)[0]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        if self._embedding is None:
+            raise ValueError("索引包未绑定 embedding，无法按文本检索")
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k)
+
+    def add_texts(self, texts: Iterable[str], metadatas: list[dict] | None = None, **kwargs: Any) -> list[str]:
+        raise ReadOnlyIndexError(f"索引包只读: {self.path}")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs: Any) -> "IndexBundle":
+        raise ReadOnlyIndexError("请使用 python main.py build-index 构建索引包")
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+内存核算：对象的深度大小估算、session 占用分布、进程 RSS，以及按需的 tracemalloc 快照对比。
+
+  - deep_sizeof：沿容器、__dict__ / __slots__ 与 numpy 数组的 base 递归累加 sys.getsizeof，
+    同一对象只计一次；类型、模块、函数不计入。结果是估算值（不含分配器碎片与 C 扩展内部缓冲）；
+  - session_footprint：逐个 session 计算深度大小，给出总量、大小分布与最大的若干个 session；
+  - HeapSnapshots：第一次调用时启动 tracemalloc 并记下基线，之后每次与上一次（或基线）比较，
+    按代码位置列出增长最多的分配。tracemalloc 开启期间每次分配都有额外开销，排查完应停止。
+
+由 /api/admin/memory 与 python main.py memory 使用。
+"""
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+import types
+from collections import deque
+from typing import Iterable, Mapping
+
+import numpy as np
+
+# session 大小分布的桶上界（字节）
+SIZE_BUCKETS = (1024, 4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024)
+DEFAULT_TOP = 10
+_SKIP_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_sizeof(obj, exclude: Iterable = ()) -> int:
+    """对象及其可达子对象的估算字节数；exclude 中的对象（如共享的模型）不计入也不展开。"""
+    seen = {id(o) for o in exclude}
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _SKIP_TYPES):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, (str, bytes, bytearray, int, float, bool)) or o is None:
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        elif isinstance(o, np.ndarray):
+            # 视图不持有数据，计入其 base（同一 base 只计一次）；内存映射的数据不在堆上
+            if isinstance(o.base, np.ndarray) and not isinstance(o.base, np.memmap):
+                stack.append(o.base)
+        else:
+            d = getattr(o, "__dict__", None)
+            if d is not None:
+                stack.append(d)
+            for cls in type(o).__mro__:
+                for name in cls.__dict__.get("__slots__", ()):
+                    if name not in ("__dict__", "__weakref__") and hasattr(o, name):
+                        stack.append(getattr(o, name))
+    return total
+
+
+def sized(obj, exclude: Iterable = ()) -> dict:
+    """缓存的条目数与估算字节数（对象无 len 时条目数为 None）。"""
+    try:
+        entries = len(obj)
+    except TypeError:
+        entries = None
+    return {"entries": entries, "bytes": deep_sizeof(obj, exclude)}
+
+
+def model_bytes(embeddings) -> int | None:
+    """embedding 模型权重的字节数（sentence-transformers / torch 模型）；无法得知时返回 None。"""
+    client = getattr(embeddings, "_client", None) or getattr(embeddings, "client", None)
+    parameters = getattr(client, "parameters", None)
+    if not callable(parameters):
+        return None
+    try:
+        return int(sum(p.numel() * p.element_size() for p in parameters()))
+    except Exception:
+        return None
+
+
+# ---------- 进程 ----------
+def process_rss_bytes() -> int | None:
+    """当前常驻内存（Linux 读 /proc/self/statm）；不可用时返回 None。"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss_bytes() -> int | None:
+    """进程启动以来的峰值常驻内存。"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 计，macOS 以字节计
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def process_report() -> dict:
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": process_rss_bytes(),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "gc_counts": list(gc.get_count()),
+        "threads": threading.active_count(),
+    }
+
+
+# ---------- session ----------
+def histogram(sizes: Iterable[int], buckets: tuple[int, ...] = SIZE_BUCKETS) -> list[dict]:
+    """按桶上界统计个数；最后一个桶 le 为 None（超过最大上界）。"""
+    counts = [0] * (len(buckets) + 1)
+    for s in sizes:
+        i = 0
+        while i < len(buckets) and s > buckets[i]:
+            i += 1
+        counts[i] += 1
+    return [{"le": b, "count": c} for b, c in zip(list(buckets) + [None], counts)]
+
+
+def session_footprint(sessions: Iterable[tuple[str, Mapping]], top: int = DEFAULT_TOP) -> dict:
+    """
+    逐个 session 估算深度大小。各 session 独立计算（共享的对象在每个 session 中都计入），总量是上界。
+    最大的 session 只显示 id 前 8 位（session id 即购物车凭证）。
+    """
+    rows = []
+    for sid, state in sessions:
+        rows.append((deep_sizeof(state), len(state.get("messages") or []), sid))
+    rows.sort(key=lambda r: -r[0])
+    sizes = [r[0] for r in rows]
+    return {
+        "count": len(rows),
+        "total_bytes": sum(sizes),
+        "mean_bytes": round(sum(sizes) / len(sizes)) if sizes else 0,
+        "histogram": histogram(sizes),
+        "largest": [
+            {"session": sid[:8] + "…" if len(sid) > 8 else sid, "bytes": size, "messages": n}
+            for size, n, sid in rows[:top]
+        ],
+    }
+
+
+# ---------- tracemalloc ----------
+class HeapSnapshots:
+    """按需的 tracemalloc 快照对比；线程安全。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._baseline: tracemalloc.Snapshot | None = None
+        self._previous: tracemalloc.Snapshot | None = None
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+
+    def snapshot(self, top: int = 20, frames: int = 1, since_baseline: bool = False) -> dict:
+        """
+        未开启 tracemalloc 时开启（保留 frames 层调用栈）并记下基线；
+        已开启时取新快照，与上一次快照（since_baseline 为真时与基线）比较，列出增长最多的 top 个位置。
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, frames))
+                self._baseline = self._previous = self._take()
+                return {"started": True, **self.status()}
+            snap = self._take()
+            base = self._baseline if since_baseline else self._previous
+            self._previous = snap
+            key = "traceback" if tracemalloc.get_traceback_limit() > 1 else "lineno"
+            diff = snap.compare_to(base, key)[:top]
+        return {
+            "started": False,
+            "compared_to": "baseline" if since_baseline else "previous",
+            **self.status(),
+            "top": [
+                {
+                    "where": [f"{fr.filename}:{fr.lineno}" for fr in stat.traceback],
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size": stat.size,
+                    "count": stat.count,
+                }
+                for stat in diff
+            ],
+        }
+
+    @staticmethod
+    def status() -> dict:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": True, "traced_bytes": current, "traced_peak_bytes": peak}
+
+    def stop(self) -> dict:
+        with self._lock:
+            tracemalloc.stop()
+            self._baseline = self._previous = None
+        return self.status()
+
+
+# ---------- 文本输出（python main.py memory） ----------
+def _fmt_bytes(n) -> str:
+    if n is None:
+        return "-"
+    for unit in ("B", "KB", "MB"):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def format_report(report: dict) -> str:
+    """把 /api/admin/memory 的结果排成文本。"""
+    lines = []
+    proc = report.get("process")
+    if proc:
+        lines.append(
+            f"进程 {proc.get('pid')}：RSS {_fmt_bytes(proc.get('rss_bytes'))}，峰值 {_fmt_bytes(proc.get('peak_rss_bytes'))}，"
+            f"线程 {proc.get('threads')}"
+        )
+    sess = report.get("sessions")
+    if sess:
+        lines.append(
+            f"\nsession：{sess.get('count', 0)} 个（上限 {sess.get('max_sessions')}，空闲 {sess.get('ttl_s')} 秒过期），"
+            f"估算共 {_fmt_bytes(sess.get('total_bytes'))}，平均 {_fmt_bytes(sess.get('mean_bytes'))}；"
+            f"累计逐出 {sess.get('evicted', 0)}、过期 {sess.get('expired', 0)}"
+        )
+        for b in sess.get("histogram") or []:
+            label = f"≤ {_fmt_bytes(b['le'])}" if b["le"] is not None else "更大"
+            lines.append(f"  {label:>12}  {b['count']}")
+        if sess.get("largest"):
+            lines.append("  最大的 session：")
+            for s in sess["largest"]:
+                lines.append(f"    {s['session']:<10} {_fmt_bytes(s['bytes']):>10}  消息 {s['messages']} 条")
+    caches = report.get("caches") or {}
+    if caches:
+        lines.append(f"\n  {'缓存':<40} {'条目':>8} {'估算大小':>12}")
+        for name, c in caches.items():
+            entries = "-" if c.get("entries") is None else c["entries"]
+            lines.append(f"  {name:<42} {entries:>8} {_fmt_bytes(c.get('bytes')):>12}")
+    heap = report.get("tracemalloc") or {}
+    if heap.get("tracing"):
+        lines.append(
+            f"\ntracemalloc：已追踪 {_fmt_bytes(heap.get('traced_bytes'))}，峰值 {_fmt_bytes(heap.get('traced_peak_bytes'))}"
+        )
+    if heap.get("top"):
+        lines.append(f"  与{'基线' if heap.get('compared_to') == 'baseline' else '上一次快照'}相比增长最多的位置：")
+        for s in heap["top"]:
+            lines.append(f"    {_fmt_bytes(s['size_diff']):>10}  {s['count_diff']:+d} 个  {' <- '.join(s['where'])}")
+    elif heap.get("started"):
+        lines.append("\ntracemalloc 已开启并记下基线，稍后再取一次快照查看增长。")
+    return "\n".join(lines).strip("\n")
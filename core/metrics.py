@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+进程内轻量指标：线程安全的计数器，供 /api/metrics 暴露。
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters: dict[str, float] = defaultdict(float)
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def get(name: str) -> float:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> dict[str, float]:
+    with _lock:
+        return dict(sorted(_counters.items()))
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
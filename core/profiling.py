@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+按需采样的 CPU 剖析：被选中的请求在处理期间由后台线程定时抓取调用栈（sys._current_frames），
+按路由聚合成 collapsed stack（「帧;帧;帧 次数」，flamegraph.pl / speedscope / inferno 可直接读取）。
+
+  - 事件循环线程：ProfilingMiddleware 是纯 ASGI 中间件，与路由处理函数在同一个 task 中执行，
+    抓到的栈里出现该请求的中间件帧即归属该请求（截掉中间件以上的帧）；
+  - 线程池：用 attach(fn) 包装交给线程池的函数，执行期间登记「线程 → 请求」（截掉包装以上的帧）。
+    run_in_threadpool 会带上调用方的 contextvars，attach 在线程内读取当前请求。
+
+开销：没有被剖析的请求只多一次判断，采样线程只在有被剖析的请求时运行；
+同时剖析的请求数（max_active）、采样间隔、栈深度与每个路由的不同栈数都有上限。
+结果由采样线程写入 <profile_dir>/<路由>.<pid>.folded（多 worker 各写各的，读取时合并）。
+"""
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = "data/profiles"
+DEFAULT_INTERVAL_S = 0.005
+DEFAULT_MAX_ACTIVE = 4
+MAX_STACK_DEPTH = 64
+# 每个路由最多记录的不同调用栈数，超出的样本记为 [truncated]
+MAX_STACKS_PER_ROUTE = 5000
+_FLUSH_INTERVAL_S = 1.0
+_TRUNCATED = "[truncated]"
+
+
+class ProfileSession:
+    """一次被剖析的请求：采样线程把归属它的栈计入 samples。"""
+
+    __slots__ = ("sampler", "frame", "samples", "started")
+
+    def __init__(self, sampler: "StackSampler", frame):
+        self.sampler = sampler
+        self.frame = frame
+        self.samples: Counter[str] = Counter()
+        self.started = time.perf_counter()
+
+
+def route_slug(route: str) -> str:
+    """路由名转文件名：POST /api/chat → POST_api_chat。"""
+    return re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+
+
+def _label(frame) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_qualname}".replace(";", ",").replace(" ", "_")
+
+
+class StackSampler:
+    """采样线程 + 按路由聚合的调用栈计数；线程安全。"""
+
+    def __init__(
+        self,
+        profile_dir: Path | str | None = DEFAULT_PROFILE_DIR,
+        interval: float = DEFAULT_INTERVAL_S,
+        max_active: int = DEFAULT_MAX_ACTIVE,
+    ):
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.interval = max(0.001, interval)
+        self.max_active = max(1, max_active)
+        self._lock = threading.Lock()
+        self._sessions: dict[int, ProfileSession] = {}  # id(中间件帧) -> 会话
+        self._threads: dict[int, ProfileSession] = {}   # 线程 id -> 会话
+        self._routes: dict[str, Counter[str]] = {}
+        self._requests: Counter[str] = Counter()
+        self._dirty: set[str] = set()
+        self._thread: threading.Thread | None = None
+
+    # ---------- 会话 ----------
+    def begin(self, frame) -> ProfileSession | None:
+        """开始剖析一个请求（frame 为中间件自身的帧）；同时剖析的请求已达上限时返回 None。"""
+        with self._lock:
+            if len(self._sessions) >= self.max_active:
+                metrics.incr("profile.skipped_busy")
+                return None
+            session = ProfileSession(self, frame)
+            self._sessions[id(frame)] = session
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        return session
+
+    def end(self, session: ProfileSession, route: str) -> None:
+        """请求结束：把样本并入路由聚合。"""
+        with self._lock:
+            self._sessions.pop(id(session.frame), None)
+            session.frame = None
+            stacks = self._routes.setdefault(route, Counter())
+            for stack, n in session.samples.items():
+                if stack not in stacks and len(stacks) >= MAX_STACKS_PER_ROUTE:
+                    stack = _TRUNCATED
+                stacks[stack] += n
+            self._requests[route] += 1
+            self._dirty.add(route)
+        metrics.incr("profile.requests")
+        metrics.incr("profile.samples", sum(session.samples.values()))
+
+    def _register_thread(self, session: ProfileSession) -> None:
+        with self._lock:
+            self._threads[threading.get_ident()] = session
+
+    def _unregister_thread(self) -> None:
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    # ---------- 采样 ----------
+    def _run(self) -> None:
+        last_flush = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    break
+                self._sample_locked()
+            if time.monotonic() - last_flush >= _FLUSH_INTERVAL_S:
+                self.flush()
+                last_flush = time.monotonic()
+        self.flush()
+
+    def _sample_locked(self) -> None:
+        me = threading.get_ident()
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            # 线程池线程按登记归属；其它线程（事件循环）沿栈向外找被剖析请求的中间件帧
+            owner = self._threads.get(tid)
+            root = None
+            labels = []
+            f = frame
+            while f is not None:
+                if owner is not None and f.f_code is _ATTACHED_CODE:
+                    root = "worker_thread"
+                    break
+                if owner is None and id(f) in self._sessions:
+                    owner = self._sessions[id(f)]
+                    root = "event_loop"
+                    break
+                labels.append(_label(f))
+                f = f.f_back
+            if owner is None or root is None:
+                continue
+            if len(labels) > MAX_STACK_DEPTH:
+                labels = labels[:MAX_STACK_DEPTH] + [_TRUNCATED]
+            labels.append(root)
+            owner.samples[";".join(reversed(labels))] += 1
+
+    # ---------- 结果 ----------
+    def flush(self) -> None:
+        """把有新样本的路由写入 collapsed stack 文件（本进程一个文件，整体替换）。"""
+        if self.profile_dir is None:
+            return
+        with self._lock:
+            dirty = {r: dict(self._routes[r]) for r in self._dirty}
+            self._dirty.clear()
+        if not dirty:
+            return
+        try:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            for route, stacks in dirty.items():
+                path = self.profile_dir / f"{route_slug(route)}.{os.getpid()}.folded"
+                tmp = path.with_name(path.name + ".tmp")
+                tmp.write_text("".join(f"{s} {n}\n" for s, n in sorted(stacks.items())), encoding="utf-8")
+                os.replace(tmp, path)
+        except OSError:
+            logger.exception("[Profile] 写入剖析结果失败")
+
+    def routes(self) -> dict[str, dict]:
+        """本进程各路由的剖析请求数与样本数。"""
+        with self._lock:
+            return {
+                r: {"requests": self._requests[r], "samples": sum(c.values()), "stacks": len(c)}
+                for r, c in sorted(self._routes.items())
+            }
+
+    def active(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def clear(self) -> None:
+        """清空内存中的聚合结果并删除本目录下的剖析文件。"""
+        with self._lock:
+            self._routes.clear()
+            self._requests.clear()
+            self._dirty.clear()
+        if self.profile_dir is not None and self.profile_dir.exists():
+            for p in self.profile_dir.glob("*.folded"):
+                p.unlink(missing_ok=True)
+
+
+_current: contextvars.ContextVar[ProfileSession | None] = contextvars.ContextVar("profile_session", default=None)
+
+
+def attach(fn: Callable) -> Callable:
+    """
+    包装交给线程池的函数：在线程内读取当前被剖析的请求，执行期间把本线程的样本记给它。
+    不在被剖析的请求中时直接调用 fn；提交到自建线程池时与 tracing.bind 连用：bind(attach(fn))。
+    """
+    def attached(*args, **kwargs):
+        session = _current.get()
+        if session is None:
+            return fn(*args, **kwargs)
+        session.sampler._register_thread(session)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            session.sampler._unregister_thread()
+    return attached
+
+
+# attach 包装函数的代码对象：线程池线程的栈从这里往外截掉
+_ATTACHED_CODE = attach(lambda: None).__code__
+
+
+def load_collapsed(profile_dir: Path | str, route: str) -> str:
+    """合并各 worker 写出的同一路由的 collapsed stack 文件；route 可为路由名或其文件名形式。"""
+    merged: Counter[str] = Counter()
+    for p in Path(profile_dir).glob(f"{route_slug(route)}.*.folded"):
+        for line in p.read_text(encoding="utf-8").splitlines():
+            stack, _, n = line.rpartition(" ")
+            if stack and n.isdigit():
+                merged[stack] += int(n)
+    return "".join(f"{s} {n}\n" for s, n in sorted(merged.items()))
+
+
+def list_profiles(profile_dir: Path | str) -> dict[str, int]:
+    """剖析目录中的路由（文件名形式）及其合并后的样本数。"""
+    totals: Counter[str] = Counter()
+    d = Path(profile_dir)
+    if not d.exists():
+        return {}
+    for p in d.glob("*.folded"):
+        slug = p.name.rsplit(".", 2)[0]
+        for line in p.read_text(encoding="utf-8").splitlines():
+            n = line.rpartition(" ")[2]
+            if n.isdigit():
+                totals[slug] += int(n)
+    return dict(sorted(totals.items()))
+
+
+class ProfilingMiddleware:
+    """
+    纯 ASGI 中间件：should_profile(scope) 为真的请求在处理期间被采样，结束后按路由（方法 + 路径模板）聚合。
+    should_profile 为空或返回假时直接透传。
+    """
+
+    def __init__(self, app, sampler: StackSampler, should_profile: Callable[[dict], bool]):
+        self.app = app
+        self.sampler = sampler
+        self.should_profile = should_profile
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        session = self.sampler.begin(sys._getframe())
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+        token = _current.set(session)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or scope.get("path", "")
+            self.sampler.end(session, f"{scope.get('method', '')} {path}")
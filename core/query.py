@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+请求级查询上下文：一次请求内用户问题只编码一次，
+意图路由、FAQ 语义查表与向量检索共用同一个 query 向量。
+"""
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from . import metrics, tracing
+
+
+def normalize(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n > 0 else v
+
+
+class QueryContext:
+    """用户问题 + 懒计算的 embedding；embed_count 记录本请求实际编码次数（正常为 0 或 1）。"""
+
+    def __init__(self, text: str, embeddings: Embeddings):
+        self.text = text
+        self._embeddings = embeddings
+        self._vector: np.ndarray | None = None
+        self.embed_count = 0
+
+    @classmethod
+    def batch(cls, texts: list[str], embeddings: Embeddings) -> list["QueryContext"]:
+        """一批问题一次 embed_documents 编码（离线批量问答），各上下文的向量已就绪。"""
+        out = [cls(t, embeddings) for t in texts]
+        if not out:
+            return out
+        with tracing.span("embed_batch", queries=len(out)):
+            vecs = embeddings.embed_documents(list(texts))
+        for ctx, v in zip(out, vecs):
+            ctx._vector = normalize(v)
+            ctx.embed_count = 1
+        metrics.incr("embed.batch")
+        metrics.incr("embed.batch_queries", len(out))
+        return out
+
+    @property
+    def vector(self) -> np.ndarray:
+        """单位化的 query 向量（首次访问时编码）。"""
+        if self._vector is None:
+            with tracing.span("embed_query"):
+                self._vector = normalize(self._embeddings.embed_query(self.text))
+            self.embed_count += 1
+            metrics.incr("embed.query")
+        return self._vector
+
+    def blended(self, other, weight: float = 1.0) -> np.ndarray:
+        """query 向量与预计算向量（如菜单实体的扩展向量）相加后单位化，近似「问题 + 扩展词」整体编码。"""
+        return normalize(self.vector + weight * normalize(other))
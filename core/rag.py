@@ -2,21 +2,104 @@
 """
 RAG 系统核心（基于 LangChain + Gemini）：文本摄取、向量存储、检索与问答。
 """
+import hashlib
+import logging
+import os
 import re
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
+import chromadb
+import numpy as np
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from langchain_classic.chains.combine_documents import create_stuff_documents_chain
-from langchain_classic.chains import create_retrieval_chain
 
+from . import metrics, scheduler, tracing
+from .context import (
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    DEFAULT_MMR_LAMBDA,
+    DEFAULT_NEAR_DUP_THRESHOLD,
+    build_context,
+    estimate_tokens,
+)
+from .deadline import Deadline, DeadlineExceeded, hedged_call
+from .index_bundle import IndexBundle, read_manifest, write_index_bundle
 from .llm import get_llm
 
+logger = logging.getLogger(__name__)
+
 _EMPTY_ANSWER = "当前知识库中没有相关内容，无法回答。"
+_DEGRADED_PREFIX = "（知识库快速摘要）"
+_SENTENCE_RE = re.compile(r"[^。！？!?；;\n]+[。！？!?；;]?")
+_PUNCT_RE = re.compile(r"[\s，,。！？!?；;：:、（）()【】\[\]\"'“”‘’]+")
+
+
+@dataclass
+class Candidates:
+    """一次检索的候选块：docs / vecs / scores 按位置一一对应，scores 为与问题向量的余弦相似度。"""
+    query_vec: list[float]
+    docs: list[Document]
+    vecs: list
+    scores: list[float]
+    scanned: int = 0  # 本次检索从向量库取回的候选块总数（含扩大窗口与备用检索）
+
+    @property
+    def best_score(self) -> float:
+        return max(self.scores, default=0.0)
+
+
+@dataclass
+class RAGAnswer:
+    """一次问答的结果：answer 为回复文本，degraded 表示未走 LLM 生成（超时抽取或异常回退）。"""
+    answer: str
+    degraded: bool = False
+
+    @property
+    def empty(self) -> bool:
+        """知识库中没有相关内容（相关度低于下限或检索为空）时的固定回复。"""
+        return self.answer == _EMPTY_ANSWER
+
+
+def _bigrams(text: str) -> set[str]:
+    t = _PUNCT_RE.sub("", text.lower())
+    return {t[i:i + 2] for i in range(len(t) - 1)} or ({t} if t else set())
+
+
+def _extractive_answer(question: str, chunks: list[str], max_sentences: int = 3) -> str:
+    """本地抽取式答案：从靠前的文档块中选出与问题字符二元组重合度最高的句子，按原文顺序拼接。"""
+    q = _bigrams(question)
+    candidates: list[tuple[float, int, str]] = []
+    for chunk in chunks[:3]:
+        for m in _SENTENCE_RE.finditer(chunk):
+            sent = m.group(0).strip()
+            if len(sent) < 4:
+                continue
+            grams = _bigrams(sent)
+            score = len(q & grams) / (len(grams) ** 0.5) if grams else 0.0
+            candidates.append((score, len(candidates), sent))
+    if not candidates:
+        return _DEGRADED_PREFIX + chunks[0].strip()[:200]
+    best = sorted(candidates, key=lambda c: (-c[0], c[1]))[:max_sentences]
+    best.sort(key=lambda c: c[1])
+    return _DEGRADED_PREFIX + "".join(c[2] for c in best)
+
+
+def _cosine_scores(query_vec, vecs) -> list[float]:
+    """问题向量与各候选块向量的余弦相似度。"""
+    if len(vecs) == 0:
+        return []
+    m = np.asarray(vecs, dtype=np.float32)
+    q = np.asarray(query_vec, dtype=np.float32)
+    denom = np.linalg.norm(m, axis=1) * (np.linalg.norm(q) or 1.0)
+    denom[denom == 0] = 1.0
+    return [float(x) for x in (m @ q) / denom]
 
 
 def _extract_answer(result) -> str:
@@ -42,16 +125,120 @@ DEFAULT_CHUNK_OVERLAP = 50
 DEFAULT_COLLECTION_NAME = "rag_docs"
 DEFAULT_EMBED_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
 DEFAULT_PERSIST_DIR = "data/chroma_data"
+SPLITTER_SEPARATORS = ["\n\n", "\n", "。", "！", "？", "；", " ", ""]
+# 67 种食材章节的标记：含该章节的文档按「一种食材一块」打散
+_INGREDIENT_SECTION_MARKER = "【67 种食材详细介绍】"
+_INGREDIENT_SECTION_FALLBACK = "■ 蔬菜类"
+# 候选池为 top_k 的倍数：多取一些候选，去重 + MMR 后再按 token 预算挑选
+CONTEXT_CANDIDATE_FACTOR = 2
+# 自适应候选扫描：从候选池大小起检索，第一名与当前窗口末位的余弦相似度差距达到 margin 即停止；
+# 分数平坦（差距不足）时窗口翻倍，普通问题最多到候选池的 ADAPTIVE_MAX_FACTOR 倍，带食材名的问题最多到 BOOST_FETCH_K
+DEFAULT_SCORE_MARGIN = 0.08
+ADAPTIVE_MAX_FACTOR = 2
+BOOST_FETCH_K = 120
+# 相关度下限：最高余弦相似度低于该值视为知识库中没有相关内容，直接返回 _EMPTY_ANSWER，不调用 LLM
+DEFAULT_MIN_SCORE = 0.2
+
+
+def knowledge_hash(paths) -> str:
+    """知识库内容指纹：按文件名排序后对全部文件内容做 sha256，用于判断离线产物（FAQ 答案表等）是否过期。"""
+    h = hashlib.sha256()
+    for p in sorted(Path(p) for p in paths):
+        h.update(p.name.encode("utf-8"))
+        h.update(b"\0")
+        h.update(p.read_bytes())
+        h.update(b"\0")
+    return h.hexdigest()
 
 
 def _get_embeddings(model_name: str = DEFAULT_EMBED_MODEL) -> HuggingFaceEmbeddings:
     return HuggingFaceEmbeddings(model_name=model_name)
 
 
+def splitter_config(
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    ingredient_splitting: bool = True,
+) -> dict:
+    """分块参数（写入索引包清单，参数变化时旧包失效）。"""
+    return {
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "separators": list(SPLITTER_SEPARATORS),
+        "ingredient_splitting": ingredient_splitting,
+    }
+
+
+def split_knowledge_text(
+    text: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    metadata: dict | None = None,
+    ingredient_splitting: bool = True,
+) -> list[Document]:
+    """
+    把一篇知识文档切成文本块。若包含 67 种食材章节，前半部分按常规分块，
+    食材章节按「一条食材一个 chunk」打散，避免鱼丸/虾丸/墨鱼丸等易混食材挤在同一块里。
+    ingredient_splitting=False 时整篇按常规分块（供检索评测对比）。
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=SPLITTER_SEPARATORS,
+    )
+    idx = text.find(_INGREDIENT_SECTION_MARKER) if ingredient_splitting else -1
+    if idx == -1 and ingredient_splitting:
+        idx = text.find(_INGREDIENT_SECTION_FALLBACK)
+    main_part, ingredients_section = (text, "") if idx == -1 else (text[:idx].strip(), text[idx:].strip())
+    docs = splitter.split_documents([Document(page_content=main_part, metadata=dict(metadata or {}))]) if main_part else []
+    # 按行首「数字. 」拆成一条条食材，每种食材单独成块
+    for c in re.split(r"\n(?=\d+\. )", ingredients_section):
+        c = c.strip()
+        if c and re.match(r"^\d+\. ", c):
+            docs.append(Document(page_content=c, metadata=dict(metadata or {})))
+    return docs
+
+
+def split_knowledge_file(
+    file_path: str | Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    encoding: str = "utf-8",
+    ingredient_splitting: bool = True,
+) -> list[Document]:
+    path = Path(file_path)
+    if not path.exists():
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+    return split_knowledge_text(
+        path.read_text(encoding=encoding),
+        chunk_size,
+        chunk_overlap,
+        metadata={"source": path.name},
+        ingredient_splitting=ingredient_splitting,
+    )
+
+
+@lru_cache(maxsize=None)
+def shared_embeddings(model_name: str = DEFAULT_EMBED_MODEL) -> Embeddings:
+    """
+    进程内共享的 embedding 模型：多个 RAG 实例（如多门店）只加载一份权重。
+    设置了 EMBEDDING_SOCKET 时改用本机 embedding 服务的客户端（多 worker 部署共用一份模型）。
+    """
+    socket_path = os.environ.get("EMBEDDING_SOCKET")
+    if socket_path:
+        from .embed_server import EmbeddingClient
+        return EmbeddingClient(socket_path)
+    return _get_embeddings(model_name)
+
+
 def _get_vectorstore(
     collection_name: str,
     persist_directory: str,
-    embedding_function: HuggingFaceEmbeddings,
+    embedding_function: Embeddings,
 ):
     Path(persist_directory).mkdir(parents=True, exist_ok=True)
     return Chroma(
@@ -61,6 +248,18 @@ def _get_vectorstore(
     )
 
 
+def list_collections(persist_directory: str) -> list[str]:
+    """持久化目录中的全部向量集合名（目录不存在时为空）。"""
+    if not Path(persist_directory).is_dir():
+        return []
+    return [c.name for c in chromadb.PersistentClient(path=persist_directory).list_collections()]
+
+
+def delete_collection(persist_directory: str, collection_name: str) -> None:
+    """按名删除持久化目录中的向量集合（清理不再使用的旧集合）。"""
+    chromadb.PersistentClient(path=persist_directory).delete_collection(collection_name)
+
+
 class RAG:
     """RAG：基于 LangChain 的文本录入、向量存储与检索问答（Gemini）。"""
 
@@ -71,31 +270,87 @@ class RAG:
         embed_model_name: str = DEFAULT_EMBED_MODEL,
         chunk_size: int = DEFAULT_CHUNK_SIZE,
         chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+        mmr_lambda: float = DEFAULT_MMR_LAMBDA,
+        near_dup_threshold: float = DEFAULT_NEAR_DUP_THRESHOLD,
+        embeddings: Embeddings | None = None,
+        index_bundle: IndexBundle | None = None,
+        min_score: float = DEFAULT_MIN_SCORE,
+        score_margin: float = DEFAULT_SCORE_MARGIN,
+        adaptive: bool = True,
+        boost_fetch_k: int = BOOST_FETCH_K,
+        ingredient_splitting: bool = True,
     ):
+        """
+        提供 index_bundle 时直接在只读索引包上检索，不打开 Chroma 集合（见 RAG.open_prebuilt）。
+        adaptive=False 时按固定窗口检索且不做相关度下限判断（即自适应检索之前的行为，供基准对比）。
+        boost_fetch_k / ingredient_splitting 为带食材名问题的最大候选窗口与录入时是否按食材打散，默认即线上配置。
+        """
         self.collection_name = collection_name
+        self.embed_model_name = embed_model_name
         self.persist_directory = persist_directory
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self._embeddings = _get_embeddings(embed_model_name)
-        self._vectorstore = _get_vectorstore(
-            collection_name, persist_directory, self._embeddings
-        )
+        self.context_token_budget = context_token_budget
+        self.mmr_lambda = mmr_lambda
+        self.near_dup_threshold = near_dup_threshold
+        self.min_score = min_score
+        self.score_margin = score_margin
+        self.adaptive = adaptive
+        self.boost_fetch_k = boost_fetch_k
+        self.ingredient_splitting = ingredient_splitting
+        self._embeddings = embeddings or shared_embeddings(embed_model_name)
+        if index_bundle is not None:
+            self._vectorstore = index_bundle
+        else:
+            self._vectorstore = _get_vectorstore(
+                collection_name, persist_directory, self._embeddings
+            )
         self._text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             length_function=len,
-            separators=["\n\n", "\n", "。", "！", "？", "；", " ", ""],
+            separators=SPLITTER_SEPARATORS,
         )
 
-    def _get_rag_chain(self, top_k: int = 5):
-        retriever = self._vectorstore.as_retriever(search_kwargs={"k": top_k})
-        llm = get_llm(temperature=0, max_output_tokens=500)
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "你是一个助手。请仅根据下面提供的【参考内容】回答问题。若参考内容中没有相关信息，请明确说「参考内容中未提及」。不要编造内容。"),
-            ("human", "【参考内容】\n{context}\n\n【问题】\n{input}"),
-        ])
-        combine_docs_chain = create_stuff_documents_chain(llm, prompt)
-        return create_retrieval_chain(retriever, combine_docs_chain)
+    @classmethod
+    def open_prebuilt(
+        cls,
+        index_dir: str | Path,
+        source_hash: str,
+        embeddings: Embeddings | None = None,
+        embed_model_name: str = DEFAULT_EMBED_MODEL,
+        **kwargs,
+    ) -> "RAG | None":
+        """
+        打开与当前知识库一致的预构建索引包（只读，向量内存映射）。
+        索引包不存在、损坏或已过期（指纹 / 模型 / 分块参数不同）时返回 None，由调用方回退到 Chroma 录入。
+        """
+        if read_manifest(index_dir) is None:
+            return None
+        embeddings = embeddings or shared_embeddings(embed_model_name)
+        try:
+            bundle = IndexBundle(index_dir, embedding=embeddings)
+        except (OSError, ValueError) as e:
+            logger.warning("[RAG] 索引包无法打开，已忽略：%s", e)
+            return None
+        reason = bundle.mismatch(
+            source_hash,
+            embed_model_name,
+            splitter_config(
+                kwargs.get("chunk_size", DEFAULT_CHUNK_SIZE),
+                kwargs.get("chunk_overlap", DEFAULT_CHUNK_OVERLAP),
+            ),
+        )
+        if reason is not None:
+            logger.warning("[RAG] 索引包 %s 已过期（%s），已忽略", index_dir, reason)
+            return None
+        return cls(embed_model_name=embed_model_name, embeddings=embeddings, index_bundle=bundle, **kwargs)
+
+    @property
+    def read_only(self) -> bool:
+        """是否在预构建索引包上运行（不可录入）。"""
+        return isinstance(self._vectorstore, IndexBundle)
 
     def _get_combine_chain(self):
         """返回仅组合文档的 chain（不包含 retriever），用于传入已重排的 docs。"""
@@ -117,82 +372,346 @@ class RAG:
         return len(splits)
 
     def ingest_file(self, file_path: str, encoding: str = "utf-8") -> int:
-        path = Path(file_path)
-        if not path.exists():
-            raise FileNotFoundError(f"文件不存在: {file_path}")
-        text = path.read_text(encoding=encoding)
-        # 若包含 67 种食材章节，则将该章节按「一种食材一块」打散，避免鱼丸/虾丸/墨鱼丸等易混食材挤在同一块里
-        if "【67 种食材详细介绍】" in text or "■ 蔬菜类" in text:
-            return self._ingest_file_with_ingredient_splitting(text)
-        return self.ingest_text(text)
-
-    def _ingest_file_with_ingredient_splitting(self, text: str) -> int:
-        """前半部分按原分块录入；67 种食材段按「一条食材一个 chunk」打散录入，便于单种食材检索。"""
-        marker = "【67 种食材详细介绍】"
-        idx = text.find(marker)
-        if idx == -1:
-            idx = text.find("■ 蔬菜类")
-        if idx == -1:
-            return self.ingest_text(text)
-        main_part = text[:idx].strip()
-        ingredients_section = text[idx:].strip()
-        n_main = 0
-        if main_part:
-            n_main = self.ingest_text(main_part)
-        # 按行首「数字. 」拆成一条条食材，每种食材单独成块
-        chunks = re.split(r"\n(?=\d+\. )", ingredients_section)
-        n_ing = 0
-        for c in chunks:
-            c = c.strip()
-            if not c or not re.match(r"^\d+\. ", c):
-                continue
-            self._vectorstore.add_documents([Document(page_content=c)])
-            n_ing += 1
-        return n_main + n_ing
+        """录入一个知识文件（67 种食材章节按「一条食材一个 chunk」打散，见 split_knowledge_text）。"""
+        docs = split_knowledge_file(
+            file_path,
+            self.chunk_size,
+            self.chunk_overlap,
+            encoding=encoding,
+            ingredient_splitting=self.ingredient_splitting,
+        )
+        if not docs:
+            return 0
+        self._vectorstore.add_documents(docs)
+        return len(docs)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def drop(self) -> None:
+        """删除底层向量集合（热更新后释放旧快照）；只读索引包不删除。"""
+        if not self.read_only:
+            self._vectorstore.delete_collection()
+
+    def count(self) -> int:
+        """集合中的文本块数量。"""
+        if self.read_only:
+            return self._vectorstore.count()
+        return self._vectorstore._collection.count()
 
     def retrieve(self, query: str, top_k: int = 5) -> list[str]:
         docs = self._vectorstore.similarity_search(query, k=top_k)
         return [d.page_content for d in docs]
 
+    def _search_by_vector(self, query_vec, k: int) -> tuple[list[Document], list]:
+        """按向量检索，同时取回各块已存储的 embedding（供去重/MMR 复用，不再重复计算）。"""
+        return self._search_by_vectors([query_vec], k)[0]
+
+    def _search_by_vectors(self, query_vecs: list, k: int) -> list[tuple[list[Document], list]]:
+        """多个 query 向量一次检索（Chroma 一次 query 调用 / 索引包一次矩阵乘），按输入顺序返回各自的 (块, 向量)。"""
+        with tracing.span("vector_search", k=k, queries=len(query_vecs)) as sp:
+            if self.read_only:
+                out = self._vectorstore.search_many_with_vectors(query_vecs, k)
+            else:
+                res = self._vectorstore._collection.query(
+                    query_embeddings=list(query_vecs),
+                    n_results=k,
+                    include=["documents", "metadatas", "embeddings"],
+                )
+                all_texts = res.get("documents") or [[] for _ in query_vecs]
+                all_metas = res.get("metadatas") or [None for _ in query_vecs]
+                all_vecs = res.get("embeddings") if res.get("embeddings") is not None else [[] for _ in query_vecs]
+                out = []
+                for texts, metas, vecs in zip(all_texts, all_metas, all_vecs):
+                    metas = metas or [None] * len(texts)
+                    docs = [Document(page_content=t, metadata=m or {}) for t, m in zip(texts, metas)]
+                    out.append((docs, list(vecs)))
+            sp.set(candidates=sum(len(docs) for docs, _ in out))
+            return out
+
+    def _scan(
+        self,
+        query_vec,
+        start_k: int,
+        max_k: int,
+        key: str | None = None,
+        min_score: float | None = None,
+        prefetched: tuple[list[Document], list] | None = None,
+    ) -> Candidates:
+        """
+        自适应扩大检索窗口：从 start_k 起取候选，满足以下任一条件即停止，否则窗口翻倍（不超过 max_k）：
+          - 给定 key 时，候选中已出现含 key 的块；
+          - 未给 key 时，第一名与窗口末位的相似度差距 >= score_margin（相关块已集中在窗口内），
+            或第一名已低于相关度下限（扩大窗口也不会出现更相关的块）；
+          - 向量库已取尽。
+        prefetched 为批量检索预先取回的至少 max_k 个候选（按相似度排序），各窗口直接取其前缀，不再查询向量库。
+        """
+        min_score = self.min_score if min_score is None else min_score
+        k, scanned = max(1, start_k), 0
+        while True:
+            if prefetched is not None:
+                docs, vecs = prefetched[0][:k], prefetched[1][:k]
+            else:
+                docs, vecs = self._search_by_vector(query_vec, k)
+            scanned += len(docs)
+            scores = _cosine_scores(query_vec, vecs)
+            if not self.adaptive or len(docs) < k or k >= max_k:
+                break
+            if key is not None:
+                if any(key in d.page_content for d in docs):
+                    break
+            elif max(scores) < min_score or max(scores) - min(scores) >= self.score_margin:
+                break
+            k = min(max_k, k * 2)
+        return Candidates(query_vec, docs, list(vecs), scores, scanned)
+
+    def search(
+        self,
+        question: str,
+        top_k: int = 5,
+        boost_contains: str | None = None,
+        query_vec=None,
+        boost_vec=None,
+        min_score: float | None = None,
+    ) -> Candidates:
+        """
+        检索候选块（top_k 的 CONTEXT_CANDIDATE_FACTOR 倍，供上下文组装挑选），连同相似度一起返回。
+        提供 boost_contains 时扩大窗口直到命中含该名的块，并按「是否含该名」重排。
+        query_vec / boost_vec 为调用方已算好的问题向量与名称向量，提供时不再重复编码；
+        min_score 为相关度下限（默认取构造参数），只用于决定是否继续扩大窗口。
+        """
+        with tracing.span("retrieve", top_k=top_k, entity=boost_contains) as sp:
+            found = self._search(question, top_k, boost_contains, query_vec, boost_vec, min_score)
+            sp.set(scanned=found.scanned, candidates=len(found.docs), best_score=round(found.best_score, 4))
+            return found
+
+    def search_batch(
+        self,
+        questions: list[str],
+        query_vecs: list,
+        top_k: int = 5,
+        boosts: list[str | None] | None = None,
+        boost_vecs: list | None = None,
+        min_score: float | None = None,
+    ) -> list[Candidates]:
+        """
+        批量检索：先用一次多 query 检索为每个问题取回它可能用到的最大窗口，
+        再逐个问题在取回的候选上做与 search 相同的自适应窗口与重排（窗口取前缀，结果与逐条 search 一致）。
+        boosts / boost_vecs 与 questions 一一对应（对应 search 的 boost_contains / boost_vec）。
+        """
+        n = len(questions)
+        boosts = boosts or [None] * n
+        boost_vecs = boost_vecs or [None] * n
+        if n == 0:
+            return []
+        vecs = [[float(x) for x in v] for v in query_vecs]
+        window = max(self._max_window(top_k, b) for b in boosts)
+        with tracing.span("retrieve_batch", top_k=top_k, queries=n) as sp:
+            prefetched = self._search_by_vectors(vecs, window)
+            out = [
+                self._search(q, top_k, b, v, bv, min_score, prefetched=p)
+                for q, v, b, bv, p in zip(questions, vecs, boosts, boost_vecs, prefetched)
+            ]
+            sp.set(window=window, scanned=sum(f.scanned for f in out))
+        return out
+
+    def _max_window(self, top_k: int, boost_contains: str | None) -> int:
+        pool = top_k * CONTEXT_CANDIDATE_FACTOR
+        return max(pool, self.boost_fetch_k) if boost_contains else pool * ADAPTIVE_MAX_FACTOR
+
+    def _search(
+        self, question, top_k, boost_contains, query_vec, boost_vec, min_score, prefetched=None
+    ) -> Candidates:
+        pool = top_k * CONTEXT_CANDIDATE_FACTOR
+        if query_vec is None:
+            query_vec = self._embeddings.embed_query(question)
+        query_vec = [float(x) for x in query_vec]
+        if not boost_contains:
+            found = self._scan(query_vec, pool, pool * ADAPTIVE_MAX_FACTOR, min_score=min_score, prefetched=prefetched)
+            metrics.incr("rag.candidates_scanned", found.scanned)
+            return found
+        key = boost_contains.strip()
+        # 主检索：窗口逐步扩大，最多覆盖全部 67 种食材独立 chunk
+        fetch_k = max(pool, self.boost_fetch_k)
+        found = self._scan(query_vec, pool if self.adaptive else fetch_k, fetch_k, key=key, prefetched=prefetched)
+        docs, vecs, scores = found.docs, found.vecs, found.scores
+        # 若主检索结果中不含该名，用纯食材名做备用检索（应对鱿鱼花、火锅云吞等向量相似度偏低的）
+        if not any(key in d.page_content for d in docs):
+            if boost_vec is None:
+                boost_vec = self._embeddings.embed_query(key)
+            fb_docs, fb_vecs = self._search_by_vector([float(x) for x in boost_vec], 10)
+            found.scanned += len(fb_docs)
+            seen = {d.page_content for d in docs}
+            for d, v, sc in zip(fb_docs, fb_vecs, _cosine_scores(query_vec, fb_vecs)):
+                if d.page_content not in seen:
+                    docs.append(d)
+                    vecs.append(v)
+                    scores.append(sc)
+                    seen.add(d.page_content)
+        order = sorted(range(len(docs)), key=lambda i: (0 if key in docs[i].page_content else 1))[:pool]
+        metrics.incr("rag.candidates_scanned", found.scanned)
+        return Candidates(
+            query_vec, [docs[i] for i in order], [vecs[i] for i in order], [scores[i] for i in order], found.scanned
+        )
+
+    def is_relevant(self, found: Candidates, boost_contains: str | None = None, min_score: float | None = None) -> bool:
+        """候选是否值得交给 LLM：含 boost 名称的块一律算相关，否则看最高相似度是否达到相关度下限。"""
+        if not self.adaptive:
+            return bool(found.docs)
+        key = boost_contains.strip() if boost_contains else ""
+        if key and any(key in d.page_content for d in found.docs):
+            return True
+        return found.best_score >= (self.min_score if min_score is None else min_score)
+
+    def assemble_context(
+        self,
+        question: str,
+        found: Candidates,
+        top_k: int,
+        priority: str | None = None,
+    ) -> list[Document]:
+        """从候选中去重 + MMR + token 预算装箱，得到交给 LLM 的文本块，并记录组装前后的 prompt 大小。"""
+        with tracing.span("assemble_context") as sp:
+            context, stats = build_context(
+                found.query_vec,
+                found.docs,
+                found.vecs,
+                max_docs=top_k,
+                token_budget=self.context_token_budget,
+                mmr_lambda=self.mmr_lambda,
+                near_dup_threshold=self.near_dup_threshold,
+                priority=priority,
+            )
+            sp.set(chunks=stats.chunks_out, tokens=stats.tokens_out)
+        q_tokens = estimate_tokens(question)
+        logger.info(
+            "[RAG] prompt context: %d chunks / ~%d tokens -> %d chunks / ~%d tokens (dup=%d, trimmed=%d)",
+            stats.chunks_in, stats.tokens_in + q_tokens,
+            stats.chunks_out, stats.tokens_out + q_tokens,
+            stats.duplicates, stats.trimmed,
+        )
+        return context
+
+    def answer(
+        self,
+        question: str,
+        top_k: int = 5,
+        use_llm: bool = True,
+        boost_contains: str | None = None,
+        strict: bool = False,
+        deadline: Deadline | None = None,
+        hedge_delay: float | None = None,
+        query_vec=None,
+        boost_vec=None,
+        min_score: float | None = None,
+        found: Candidates | None = None,
+    ) -> RAGAnswer:
+        """
+        检索 + 生成，返回 RAGAnswer（含是否降级）。
+        候选的最高相似度低于相关度下限（min_score，默认取构造参数）时直接返回 _EMPTY_ANSWER，不调用 LLM。
+        提供 deadline 时：LLM 调用超过 hedge_delay 未返回则发对冲请求（调度器有空闲槽位时）；
+        预算耗尽或 LLM 繁忙被调度器拒绝时返回本地抽取式答案（degraded=True）。
+        query_vec / boost_vec：请求中已算好的问题向量与 boost_contains 名称向量（见 core.query.QueryContext）；
+        found：已由 search_batch 检索好的候选，提供时跳过检索。
+        """
+        if not use_llm:
+            chunks = self.retrieve(question, top_k=top_k)
+            if not chunks:
+                return RAGAnswer(_EMPTY_ANSWER)
+            return RAGAnswer("根据检索到的内容：\n\n" + "\n\n".join(chunks))
+        docs: list[Document] = []
+        try:
+            if found is None:
+                found = self.search(
+                    question, top_k, boost_contains, query_vec=query_vec, boost_vec=boost_vec, min_score=min_score
+                )
+            if not self.is_relevant(found, boost_contains, min_score):
+                metrics.incr("rag.below_floor")
+                tracing.annotate(below_floor=True)
+                logger.info("[RAG] 最高相似度 %.3f 低于相关度下限，跳过生成", found.best_score)
+                return RAGAnswer(_EMPTY_ANSWER)
+            docs = self.assemble_context(
+                question, found, top_k,
+                priority=boost_contains.strip() if boost_contains else None,
+            )
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceeded("检索后预算已耗尽")
+            combine_chain = self._get_combine_chain()
+
+            prompt_tokens = estimate_tokens(question) + sum(estimate_tokens(d.page_content) for d in docs)
+
+            def _generate():
+                # 经全局调度器排队取槽位；排队时间计入延迟预算
+                with scheduler.slot(timeout=deadline.remaining() if deadline is not None else None):
+                    with tracing.span("llm", prompt_tokens=prompt_tokens) as sp:
+                        result = combine_chain.invoke({"context": docs, "input": question})
+                        sp.set(response_tokens=estimate_tokens(_extract_answer(result)))
+                        return result
+
+            if deadline is None:
+                result = _generate()
+            else:
+                result = hedged_call(
+                    _generate, deadline, hedge_delay, hedge_if=scheduler.get_scheduler().has_capacity
+                )
+            return RAGAnswer(_extract_answer(result) or _EMPTY_ANSWER)
+        except (DeadlineExceeded, scheduler.LLMBusy):
+            # 预算耗尽或 LLM 繁忙被甩负载：返回本地抽取式答案
+            if strict:
+                raise
+            metrics.incr("rag.degraded")
+            if not docs:
+                return RAGAnswer(_EMPTY_ANSWER, degraded=True)
+            return RAGAnswer(_extractive_answer(question, [d.page_content for d in docs]), degraded=True)
+        except Exception as e:
+            if strict:
+                raise
+            metrics.incr("rag.degraded")
+            chunks = [d.page_content for d in docs] or self.retrieve(question, top_k=top_k)
+            context = "\n\n".join(chunks) if chunks else ""
+            return RAGAnswer(f"调用 Gemini 失败: {e}\n\n检索到的内容：\n{context}", degraded=True)
+
     def query(
         self,
         question: str,
         top_k: int = 5,
         use_llm: bool = True,
         boost_contains: str | None = None,
+        strict: bool = False,
     ) -> str:
-        """若提供 boost_contains（如食材名「竹轮」「海带」），先多取 2 倍候选再按「是否含该名」重排，优先命中对应块。"""
-        if use_llm:
-            try:
-                if boost_contains:
-                    # 主检索：扩大候选池以覆盖全部 67 种食材独立 chunk
-                    fetch_k = 120
-                    docs = self._vectorstore.similarity_search(question, k=fetch_k)
-                    key = boost_contains.strip()
-                    # 若主检索结果中不含该名，用纯食材名做备用检索（应对鱿鱼花、火锅云吞等向量相似度偏低的）
-                    if not any(key in d.page_content for d in docs):
-                        fallback = self._vectorstore.similarity_search(key, k=10)
-                        seen = {d.page_content for d in docs}
-                        for d in fallback:
-                            if d.page_content not in seen:
-                                docs.append(d)
-                                seen.add(d.page_content)
-                    docs_sorted = sorted(
-                        docs,
-                        key=lambda d: (0 if key in d.page_content else 1),
-                    )
-                    docs_top = docs_sorted[:top_k]
-                    combine_chain = self._get_combine_chain()
-                    result = combine_chain.invoke({"context": docs_top, "input": question})
-                    return _extract_answer(result) or _EMPTY_ANSWER
-                chain = self._get_rag_chain(top_k)
-                result = chain.invoke({"input": question})
-                return _extract_answer(result) or _EMPTY_ANSWER
-            except Exception as e:
-                chunks = self.retrieve(question, top_k=top_k)
-                context = "\n\n".join(chunks) if chunks else ""
-                return f"调用 Gemini 失败: {e}\n\n检索到的内容：\n{context}"
-        chunks = self.retrieve(question, top_k=top_k)
-        if not chunks:
-            return "当前知识库中没有相关内容，无法回答。"
-        return "根据检索到的内容：\n\n" + "\n\n".join(chunks)
+        """若提供 boost_contains（如食材名「竹轮」「海带」），先多取 2 倍候选再按「是否含该名」重排，优先命中对应块。
+        strict=True 时 Gemini 调用异常直接抛出（供离线批处理判断失败），不回退为检索内容。"""
+        return self.answer(
+            question, top_k=top_k, use_llm=use_llm, boost_contains=boost_contains, strict=strict
+        ).answer
+
+
+def build_index_bundle(
+    files,
+    output_dir: str | Path,
+    source_hash: str,
+    embeddings: Embeddings | None = None,
+    embed_model_name: str = DEFAULT_EMBED_MODEL,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    batch_size: int = 64,
+) -> dict:
+    """离线构建只读索引包：分块方式与 RAG.ingest_file 相同，按批编码后写出，返回清单。"""
+    embeddings = embeddings or shared_embeddings(embed_model_name)
+    files = sorted(Path(f) for f in files)
+    docs = [d for f in files for d in split_knowledge_file(f, chunk_size, chunk_overlap)]
+    vectors: list = []
+    for i in range(0, len(docs), batch_size):
+        vectors.extend(embeddings.embed_documents([d.page_content for d in docs[i:i + batch_size]]))
+    return write_index_bundle(
+        output_dir,
+        docs,
+        np.asarray(vectors, dtype=np.float32) if docs else np.zeros((0, 0), dtype=np.float32),
+        {
+            "source_hash": source_hash,
+            "source_files": [f.name for f in files],
+            "embed_model": embed_model_name,
+            "splitter": splitter_config(chunk_size, chunk_overlap),
+        },
+    )
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 调用准入控制：进程内全局调度器，所有 Gemini 调用先取得一个「槽位」再发请求。
+
+  with scheduler.request(scheduler.PRIORITY_CONCIERGE, session_id):   # Web 路由：标记本次请求的优先级与会话
+      ...
+      with scheduler.slot():                                          # 调用 LLM 处：排队、取令牌、占用并发槽
+          llm.invoke(...)
+
+  - 并发上限：同时在途的 LLM 调用不超过 max_concurrency；
+  - 优先级：下单确认 > 点餐画像 > 知识问答，槽位空出时总是先给优先级最高的等待者；
+  - 会话公平：同一优先级内按「该会话已排队 + 在途的调用数」排序，一桌连发多条不会挤占其它桌；
+  - 令牌桶：按供应商配额（每分钟请求数 rpm）匀速放行，避免突发打满配额被 429；
+  - 甩负载：排队超过 queue_timeout 或队列已满时抛出 LLMBusy，由调用方快速返回「繁忙」而不是继续堆积。
+
+请求的优先级与会话保存在 contextvars 中，随 run_in_threadpool / tracing.bind 传到实际调用 LLM 的线程。
+指标：llm.admitted / llm.queue_wait_ms（累计）/ llm.shed.timeout / llm.shed.queue_full，
+以及 gauges() 给出的当前队列深度、在途数与近期排队耗时分位数。
+"""
+import contextvars
+import heapq
+import itertools
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Iterator
+
+from . import metrics, tracing
+
+PRIORITY_ORDER = 0
+PRIORITY_CONCIERGE = 1
+PRIORITY_KNOWLEDGE = 2
+PRIORITY_NAMES = {PRIORITY_ORDER: "order", PRIORITY_CONCIERGE: "concierge", PRIORITY_KNOWLEDGE: "knowledge"}
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_QUEUE_TIMEOUT_S = 5.0
+DEFAULT_MAX_QUEUE = 200
+# 计算排队耗时分位数时保留的最近样本数
+_WAIT_SAMPLES = 1000
+
+
+class LLMBusy(RuntimeError):
+    """排队超时或队列已满：LLM 调用被拒绝，调用方应快速返回「繁忙」。"""
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个；rate <= 0 表示不限速。"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """取一个令牌；成功返回 0，否则返回还需等待的秒数。"""
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class _Entry:
+    __slots__ = ("key", "session", "cancelled")
+
+    def __init__(self, key: tuple, session: str):
+        self.key = key
+        self.session = session
+        self.cancelled = False
+
+    def __lt__(self, other: "_Entry") -> bool:
+        return self.key < other.key
+
+
+class LLMScheduler:
+    """带优先级、会话公平与令牌桶限速的并发槽位；线程安全。"""
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        rpm: float = 0.0,
+        burst: float | None = None,
+        queue_timeout: float = DEFAULT_QUEUE_TIMEOUT_S,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self._bucket = TokenBucket(rpm / 60.0, burst if burst is not None else self.max_concurrency)
+        self._cond = threading.Condition()
+        self._heap: list[_Entry] = []
+        self._queued = 0
+        self._queued_by_priority: dict[int, int] = defaultdict(int)
+        self._inflight = 0
+        self._session_load: dict[str, int] = defaultdict(int)
+        self._seq = itertools.count()
+        self._waits: deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+    def acquire(self, priority: int, session: str, timeout: float | None = None) -> float:
+        """排队直到取得槽位，返回排队秒数；超时或队列已满抛出 LLMBusy。"""
+        timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        start = time.monotonic()
+        expires = start + timeout
+        with self._cond:
+            if self._queued >= self.max_queue:
+                metrics.incr("llm.shed.queue_full")
+                raise LLMBusy(f"LLM 排队已满（{self._queued}）")
+            entry = _Entry((priority, self._session_load[session], next(self._seq)), session)
+            heapq.heappush(self._heap, entry)
+            self._queued += 1
+            self._queued_by_priority[priority] += 1
+            self._session_load[session] += 1
+            try:
+                while True:
+                    while self._heap and self._heap[0].cancelled:
+                        heapq.heappop(self._heap)
+                    now = time.monotonic()
+                    wait_s = None
+                    if self._heap[0] is entry and self._inflight < self.max_concurrency:
+                        wait_s = self._bucket.take(now)
+                        if wait_s == 0:
+                            heapq.heappop(self._heap)
+                            self._inflight += 1
+                            # 新的队首可能也能立即放行
+                            self._cond.notify_all()
+                            break
+                    remaining = expires - now
+                    if remaining <= 0:
+                        metrics.incr("llm.shed.timeout")
+                        raise LLMBusy(f"LLM 排队超过 {timeout:.1f}s")
+                    self._cond.wait(min(remaining, wait_s) if wait_s else remaining)
+            except BaseException:
+                entry.cancelled = True
+                self._release_session(session)
+                # 队首被取消时，唤醒后面的等待者
+                self._cond.notify_all()
+                raise
+            finally:
+                self._queued -= 1
+                self._queued_by_priority[priority] -= 1
+        waited = time.monotonic() - start
+        self._waits.append(waited * 1000)
+        metrics.incr("llm.admitted")
+        metrics.incr("llm.queue_wait_ms", waited * 1000)
+        return waited
+
+    def release(self, session: str) -> None:
+        with self._cond:
+            self._inflight -= 1
+            self._release_session(session)
+            self._cond.notify_all()
+
+    def _release_session(self, session: str) -> None:
+        self._session_load[session] -= 1
+        if self._session_load[session] <= 0:
+            del self._session_load[session]
+
+    def gauges(self) -> dict[str, float]:
+        """当前队列深度（含按优先级）、在途调用数与近期排队耗时分位数（毫秒）。"""
+        with self._cond:
+            out = {
+                "llm.queue_depth": float(self._queued),
+                "llm.inflight": float(self._inflight),
+            }
+            for p, name in PRIORITY_NAMES.items():
+                out[f"llm.queue_depth.{name}"] = float(self._queued_by_priority.get(p, 0))
+            waits = sorted(self._waits)
+        if waits:
+            out["llm.queue_wait_p50_ms"] = round(statistics.median(waits), 3)
+            out["llm.queue_wait_p95_ms"] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3)
+        return out
+
+    def has_capacity(self) -> bool:
+        """当前没有排队且有空闲槽位（对冲请求只在此时发出）。"""
+        with self._cond:
+            return self._queued == 0 and self._inflight < self.max_concurrency
+
+
+# ---------- 全局调度器与请求上下文 ----------
+_scheduler = LLMScheduler()
+_request: contextvars.ContextVar[tuple[int, str] | None] = contextvars.ContextVar("llm_request", default=None)
+
+
+def configure(
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    rpm: float = 0.0,
+    burst: float | None = None,
+    queue_timeout: float = DEFAULT_QUEUE_TIMEOUT_S,
+    max_queue: int = DEFAULT_MAX_QUEUE,
+) -> LLMScheduler:
+    """替换全局调度器（服务启动时按环境变量调用一次）。"""
+    global _scheduler
+    _scheduler = LLMScheduler(max_concurrency, rpm, burst, queue_timeout, max_queue)
+    return _scheduler
+
+
+def get_scheduler() -> LLMScheduler:
+    return _scheduler
+
+
+@contextmanager
+def request(priority: int, session_id: str | None = None) -> Iterator[None]:
+    """标记当前请求的优先级与会话；其中（含线程池内）的 slot() 据此排队。"""
+    token = _request.set((priority, session_id or ""))
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+@contextmanager
+def slot(timeout: float | None = None) -> Iterator[None]:
+    """
+    取得一个 LLM 槽位后执行 with 块。优先级与会话取自 request()，未标记时按知识问答优先级处理；
+    timeout 为调用方剩余预算（秒），实际排队上限取它与 queue_timeout 的较小者。
+    """
+    priority, session = _request.get() or (PRIORITY_KNOWLEDGE, "")
+    scheduler = _scheduler
+    with tracing.span("llm_queue", priority=PRIORITY_NAMES.get(priority, priority)) as sp:
+        waited = scheduler.acquire(priority, session, timeout)
+        sp.set(wait_ms=round(waited * 1000, 3))
+    try:
+        yield
+    finally:
+        scheduler.release(session)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+trace 汇总（python main.py traces）：读取导出的 JSONL（含轮转文件），列出最慢的 trace 并拆解关键路径。
+
+关键路径：从根 span 的结束时刻往回，逐段找出决定它何时结束的子 span（并行的子 span 只取最晚结束的一支），
+再对每个子 span 递归；路径上各 span 的「自身耗时」之和等于 trace 总耗时，占比最大的即为优化重点。
+"""
+import json
+import statistics
+from collections import defaultdict
+from pathlib import Path
+
+from .tracing import DEFAULT_TRACE_FILE
+
+# 汇总时展示的 span 属性
+_SHOWN_ATTRS = (
+    "intent", "source", "k", "candidates", "scanned", "best_score", "top_k", "hit", "entity",
+    "prompt_tokens", "response_tokens", "chunks", "tokens", "hedge", "below_floor", "error",
+)
+
+
+def trace_files(path: Path | str = DEFAULT_TRACE_FILE) -> list[Path]:
+    """当前文件与轮转文件，按从旧到新排列。"""
+    path = Path(path)
+    backups = sorted(
+        (p for p in path.parent.glob(path.name + ".*") if p.suffix[1:].isdigit()),
+        key=lambda p: -int(p.suffix[1:]),
+    )
+    return backups + ([path] if path.exists() else [])
+
+
+def load_traces(path: Path | str = DEFAULT_TRACE_FILE) -> list[dict]:
+    """读取全部 trace；无法解析的行（如写入中途被截断）跳过。"""
+    traces = []
+    for f in trace_files(path):
+        with open(f, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    traces.append(json.loads(line))
+                except ValueError:
+                    continue
+    return traces
+
+
+_EPS_MS = 0.001
+
+
+def critical_path(trace: dict) -> list[dict]:
+    """
+    关键路径上的 span（先序：父在前、子按时间先后），每项附 depth 与 self_ms（该 span 在关键路径上独占的时间）。
+    每个 span 从结束时刻往回走：取在游标之前结束、最晚结束的子 span，游标移到它的开始，重复直到没有子 span；
+    被选中的子 span 互不重叠，未被覆盖的时间算作父 span 自身耗时。未结束的 span（被放弃的对冲调用等）不参与。
+    """
+    spans = [s for s in trace.get("spans") or [] if s.get("duration_ms") is not None]
+    if not spans:
+        return []
+    children: dict[str | None, list[dict]] = defaultdict(list)
+    for s in spans:
+        children[s.get("parent_id")].append(s)
+
+    def visit(node: dict, depth: int) -> list[dict]:
+        cursor = node["start_ms"] + node["duration_ms"]
+        chosen = []
+        kids = list(children.get(node["span_id"], []))
+        while True:
+            fits = [
+                c for c in kids
+                if c["start_ms"] + c["duration_ms"] <= cursor + _EPS_MS and c["start_ms"] >= node["start_ms"] - _EPS_MS
+            ]
+            if not fits:
+                break
+            c = max(fits, key=lambda c: c["start_ms"] + c["duration_ms"])
+            chosen.append(c)
+            kids.remove(c)
+            cursor = c["start_ms"]
+        chosen.reverse()
+        self_ms = node["duration_ms"] - sum(c["duration_ms"] for c in chosen)
+        out = [{**node, "depth": depth, "self_ms": max(0.0, self_ms)}]
+        for c in chosen:
+            out += visit(c, depth + 1)
+        return out
+
+    root = next((s for s in spans if s.get("parent_id") is None), spans[0])
+    return visit(root, 0)
+
+
+def _percentile(values: list[float], p: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, int(round(p / 100 * len(s))) - 1))] if s else 0.0
+
+
+def _attrs(attrs: dict) -> str:
+    shown = [f"{k}={attrs[k]}" for k in _SHOWN_ATTRS if k in attrs]
+    return f"  [{', '.join(shown)}]" if shown else ""
+
+
+def summarize(traces: list[dict], top: int = 10) -> str:
+    """总体耗时分布、各类 span 在关键路径上的自身耗时占比，以及最慢 top 条 trace 的关键路径。"""
+    if not traces:
+        return "没有 trace（确认已设置 TRACE_SAMPLE_RATE 或 TRACE_SLOW_MS，且服务处理过请求）"
+    durations = [t.get("duration_ms") or 0.0 for t in traces]
+    lines = [
+        f"共 {len(traces)} 条 trace（{traces[0].get('started_at', '?')} ~ {traces[-1].get('started_at', '?')}）",
+        f"耗时 ms：p50 {_percentile(durations, 50):.1f}  p95 {_percentile(durations, 95):.1f}"
+        f"  p99 {_percentile(durations, 99):.1f}  max {max(durations):.1f}",
+        "",
+        "关键路径自身耗时（全部 trace 合计）：",
+    ]
+    by_name: dict[str, list[float]] = defaultdict(list)
+    for t in traces:
+        for s in critical_path(t):
+            by_name[s["name"]].append(s["self_ms"])
+    total = sum(sum(v) for v in by_name.values()) or 1.0
+    lines.append(f"  {'span':<24} {'次数':>6} {'合计ms':>10} {'平均ms':>8} {'占比':>7}")
+    for name, values in sorted(by_name.items(), key=lambda kv: -sum(kv[1])):
+        lines.append(
+            f"  {name:<24} {len(values):>7} {sum(values):>11.1f} {statistics.mean(values):>9.1f}"
+            f" {sum(values) / total:>8.1%}"
+        )
+    lines += ["", f"最慢的 {min(top, len(traces))} 条："]
+    for t in sorted(traces, key=lambda t: -(t.get("duration_ms") or 0.0))[:top]:
+        lines.append(
+            f"  {t.get('trace_id')}  {t.get('duration_ms', 0):.1f} ms  {t.get('started_at', '')}{_attrs(t.get('attrs') or {})}"
+        )
+        for s in critical_path(t):
+            depth = s["depth"]
+            lines.append(
+                f"    {'  ' * depth}{s['name']:<{max(1, 24 - 2 * depth)}} {s['duration_ms']:>9.1f} ms"
+                f"  自身 {s['self_ms']:>8.1f} ms{_attrs(s.get('attrs') or {})}"
+            )
+    return "\n".join(lines)
+
+
+def format_trace(trace: dict) -> str:
+    """单条 trace 的完整 span 树（按开始时间排序）。"""
+    spans = trace.get("spans") or []
+    children: dict[str | None, list[dict]] = defaultdict(list)
+    for s in spans:
+        children[s.get("parent_id")].append(s)
+    on_path = {s["span_id"] for s in critical_path(trace)}
+    lines = [f"trace {trace.get('trace_id')}  {trace.get('duration_ms', 0):.1f} ms  {trace.get('started_at', '')}"]
+
+    def walk(parent_id: str | None, depth: int) -> None:
+        for s in sorted(children.get(parent_id, []), key=lambda s: s["start_ms"]):
+            dur = "未结束" if s["duration_ms"] is None else f"{s['duration_ms']:.1f} ms"
+            mark = "*" if s["span_id"] in on_path else " "
+            lines.append(
+                f" {mark}{'  ' * depth}{s['name']}  +{s['start_ms']:.1f} ms  {dur}  ({s.get('thread', '')}){_attrs(s.get('attrs') or {})}"
+            )
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+    lines.append("（* 为关键路径）")
+    return "\n".join(lines)
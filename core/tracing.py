@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+轻量请求追踪：每次 /api/chat 一个 trace（trace_id），内含嵌套 span
+（意图路由、query 编码、实体扩展、向量检索、上下文组装、LLM 调用、状态图节点……）。
+
+  with tracing.start_trace("chat", store_id="default") as trace:
+      with tracing.span("vector_search", k=16) as sp:
+          docs = ...
+          sp.set(candidates=len(docs))
+
+当前 trace / span 保存在 contextvars 中：asyncio 任务与 run_in_threadpool 自动继承；
+自建线程池提交任务时用 tracing.bind(fn) 带上调用方的上下文（见 core.deadline.hedged_call）。
+
+采样在 trace 结束时决定（尾部采样）：按 sample_rate 随机保留，耗时超过 slow_ms 的一律保留，
+慢请求因此不会被随机采样漏掉。保留的 trace 交给后台线程序列化并追加写入 JSONL 文件
+（超过 max_bytes 轮转为 .1 .2 …），请求线程不做文件 IO；队列满时丢弃并计数 trace.dropped。
+未启用（sample_rate 与 slow_ms 均为 0）时 start_trace / span 都是空操作。
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows：多进程同时写同一文件时不加锁
+    fcntl = None
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACE_FILE = "data/traces/traces.jsonl"
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+# 单个 trace 最多记录的 span 数（防止异常循环撑爆内存），超出的 span 不记录
+MAX_SPANS_PER_TRACE = 500
+_QUEUE_SIZE = 1000
+
+
+class Span:
+    """一段计时区间；attrs 为附加属性（k、候选数、token 数等）。"""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attrs", "thread")
+
+    def __init__(self, name: str, parent_id: str | None, attrs: dict):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.attrs = attrs
+        self.thread = threading.current_thread().name
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self, t0: float) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.start - t0) * 1000, 3),
+            # 未结束的 span（如被放弃的对冲调用）记为 None
+            "duration_ms": None if self.end is None else round((self.end - self.start) * 1000, 3),
+            "thread": self.thread,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    """未启用追踪或不在 trace 中时返回的空 span。"""
+
+    trace_id = None
+    exported = False
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Trace:
+    """一次请求的全部 span；根 span 即 trace 本身。"""
+
+    def __init__(self, name: str, attrs: dict):
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.root = Span(name, None, attrs)
+        self.spans: list[Span] = [self.root]
+        self.dropped_spans = 0
+        # 结束时是否被采样并交给导出线程
+        self.exported = False
+
+    def set(self, **attrs) -> None:
+        self.root.set(**attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.root.end if self.root.end is not None else time.perf_counter()
+        return (end - self.root.start) * 1000
+
+    def to_dict(self) -> dict:
+        t0 = self.root.start
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.root.attrs,
+            "dropped_spans": self.dropped_spans,
+            "spans": [s.to_dict(t0) for s in list(self.spans)],
+        }
+
+
+class JsonlExporter:
+    """后台线程把 trace 追加写入 JSONL，文件超过 max_bytes 时轮转；多进程共写同一文件时用文件锁串行化。"""
+
+    def __init__(self, path: Path | str, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue: queue.Queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, trace: Trace) -> bool:
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(trace)
+            return True
+        except queue.Full:
+            metrics.incr("trace.dropped")
+            return False
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """等待队列中的 trace 写完（关闭服务、测试时用）。"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            try:
+                self._write(json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n")
+            except Exception:
+                logger.exception("[Trace] 写入 trace 失败")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, line: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = line.encode("utf-8")
+        with open(self.path.with_name(self.path.name + ".lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                size = self.path.stat().st_size if self.path.exists() else 0
+                if size and size + len(data) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, "ab") as f:
+                    f.write(data)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _rotate(self) -> None:
+        if self.backups <= 0:
+            self.path.unlink(missing_ok=True)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+
+# ---------- 配置 ----------
+_sample_rate = 0.0
+_slow_ms = 0.0
+_exporter: JsonlExporter | None = None
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("span", default=None)
+
+
+def configure(
+    path: Path | str | None = DEFAULT_TRACE_FILE,
+    sample_rate: float = 0.0,
+    slow_ms: float = 0.0,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    backups: int = DEFAULT_BACKUPS,
+) -> None:
+    """设置采样率、慢请求阈值与导出文件；sample_rate 与 slow_ms 均为 0 或 path 为空时关闭追踪。"""
+    global _sample_rate, _slow_ms, _exporter
+    _sample_rate = max(0.0, min(1.0, sample_rate))
+    _slow_ms = max(0.0, slow_ms)
+    _exporter = JsonlExporter(path, max_bytes, backups) if path and enabled() else None
+
+
+def enabled() -> bool:
+    return _sample_rate > 0 or _slow_ms > 0
+
+
+def flush(timeout: float = 5.0) -> None:
+    if _exporter is not None:
+        _exporter.flush(timeout)
+
+
+def current_trace_id() -> str | None:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def _should_keep(trace: Trace) -> bool:
+    if _slow_ms > 0 and trace.duration_ms >= _slow_ms:
+        return True
+    return _sample_rate > 0 and random.random() < _sample_rate
+
+
+@contextmanager
+def start_trace(name: str, **attrs) -> Iterator[Trace | _NoopSpan]:
+    """开始一个 trace（请求入口调用）；结束时按采样规则决定是否导出。"""
+    if _exporter is None:
+        yield _NOOP
+        return
+    trace = Trace(name, attrs)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.set(error=f"{type(e).__name__}: {e}"[:200])
+        raise
+    finally:
+        trace.root.end = time.perf_counter()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        metrics.incr("trace.finished")
+        if _exporter is not None and _should_keep(trace) and _exporter.submit(trace):
+            trace.exported = True
+            metrics.incr("trace.exported")
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span | _NoopSpan]:
+    """在当前 trace 中记录一个子 span；不在 trace 中时为空操作。"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NOOP
+        return
+    if len(trace.spans) >= MAX_SPANS_PER_TRACE:
+        trace.dropped_spans += 1
+        yield _NOOP
+        return
+    parent = _current_span.get() or trace.root
+    sp = Span(name, parent.span_id, attrs)
+    trace.spans.append(sp)
+    token = _current_span.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.set(error=f"{type(e).__name__}: {e}"[:200])
+        raise
+    finally:
+        sp.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def annotate(**attrs) -> None:
+    """给当前 span 补充属性（不在 trace 中时忽略）。"""
+    sp = _current_span.get()
+    if sp is not None and _current_trace.get() is not None:
+        sp.set(**attrs)
+
+
+def bind(fn: Callable) -> Callable:
+    """把调用方当前的 trace 上下文绑定到 fn 上，供提交到自建线程池（每次提交单独 bind 一次）。"""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
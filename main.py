@@ -5,14 +5,84 @@
 用法：
   python main.py ingest <文件路径>      将文本文件录入知识库
   python main.py serve                  启动 Web 服务（等同 python api.py）
+  python main.py serve --workers 4      多 worker 启动，共用一个本机 embedding 服务进程
+  python main.py precompute-faq         离线为全部食材/锅底 × 常见意图生成 FAQ 答案表
+  python main.py ask --input q.txt --output a.jsonl --concurrency 8   离线批量问答（可 --resume 续跑）
+  python main.py build-index --all      离线构建只读索引包（启动时直接打开，跳过分块与编码）
+  python main.py eval-retrieval         在黄金问题集上并排评测检索配置（recall@k / MRR / 延迟，不调用 LLM）
+  python main.py traces                 汇总采样的请求 trace：最慢请求及其关键路径
+  python main.py memory                 查看运行中服务的内存核算（session、各缓存、RSS），可取 tracemalloc 快照对比
 """
 import argparse
 import os
+import subprocess
 import sys
+import time
 
 from core import RAG
 
 
+def _serve(args) -> None:
+    """
+    启动 Web 服务。多 worker 时：
+      1. 先起 embedding 服务子进程（模型只加载一份），worker 通过 EMBEDDING_SOCKET 环境变量继承地址；
+      2. 在启动进程里清理旧向量集合、打开索引包或录入一次知识库，worker 启动时集合已非空，不会并发重复录入；
+      3. 再由 uvicorn 派生 worker（SERVE_WORKERS 告知各 worker 集合是共用的，热更新时不删除旧集合）。
+    """
+    import uvicorn
+
+    port = args.port or int(os.environ.get("PORT", 8080))
+    if args.workers <= 1:
+        uvicorn.run("api:app", host=args.host, port=port, reload=not args.no_reload)
+        return
+
+    from core.embed_server import wait_for_server
+
+    sidecar = None
+    if not args.no_sidecar:
+        socket_path = os.environ.setdefault("EMBEDDING_SOCKET", f"/tmp/hotpot-embed-{port}.sock")
+        sidecar = subprocess.Popen([sys.executable, "-m", "core.embed_server", "--socket", socket_path])
+        if not wait_for_server(socket_path):
+            sidecar.terminate()
+            print(f"embedding 服务启动失败: {socket_path}", file=sys.stderr)
+            sys.exit(1)
+    os.environ["SERVE_WORKERS"] = str(args.workers)
+    try:
+        from web.app import _get_stores
+
+        _get_stores().prune_collections()
+        _get_stores().get().load_knowledge()
+        uvicorn.run("api:app", host=args.host, port=port, workers=args.workers)
+    finally:
+        if sidecar is not None:
+            sidecar.terminate()
+            sidecar.wait(timeout=10)
+
+
+def _admin_request(base_url: str, path: str, token: str, method: str = "GET", body: dict | None = None) -> dict:
+    """调用运行中服务的管理接口（X-Admin-Token 鉴权），返回 JSON。"""
+    import json
+    import urllib.error
+    import urllib.request
+
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(
+        base_url.rstrip("/") + path,
+        data=data,
+        method=method,
+        headers={"X-Admin-Token": token, "Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        print(f"{method} {path} 失败：HTTP {e.code} {e.read().decode('utf-8', 'replace')}", file=sys.stderr)
+        sys.exit(1)
+    except urllib.error.URLError as e:
+        print(f"无法连接 {base_url}：{e.reason}", file=sys.stderr)
+        sys.exit(1)
+
+
 def main():
     parser = argparse.ArgumentParser(description="火锅顾问 + RAG 系统")
     sub = parser.add_subparsers(dest="command", required=True)
@@ -20,15 +90,71 @@ def main():
     ingest_p = sub.add_parser("ingest", help="将文本文件录入 RAG 知识库")
     ingest_p.add_argument("file", type=str, help="文本文件路径（UTF-8）")
     ingest_p.add_argument("--encoding", type=str, default="utf-8")
-    ingest_p.add_argument("--collection", type=str, default="rag_docs")
+    ingest_p.add_argument("--store", type=str, default="default", help="录入到该门店当前使用的向量集合")
+    ingest_p.add_argument("--collection", type=str, default=None, help="指定集合名（覆盖 --store）")
     ingest_p.add_argument("--persist", type=str, default="data/chroma_data")
 
-    sub.add_parser("serve", help="启动 Web 服务（FastAPI + Uvicorn）")
+    serve_p = sub.add_parser("serve", help="启动 Web 服务（FastAPI + Uvicorn）")
+    serve_p.add_argument("--host", type=str, default="0.0.0.0")
+    serve_p.add_argument("--port", type=int, default=None, help="默认读取 PORT 环境变量（8080）")
+    serve_p.add_argument("--workers", type=int, default=1, help="uvicorn worker 进程数；>1 时启动 embedding 服务供各 worker 共用")
+    serve_p.add_argument("--no-reload", action="store_true", help="单 worker 时关闭代码热重载（生产环境）")
+    serve_p.add_argument("--no-sidecar", action="store_true", help="多 worker 时不启动 embedding 服务，每个 worker 各自加载模型")
+
+    faq_p = sub.add_parser("precompute-faq", help="离线生成 FAQ 答案表（食材/锅底 × 常见意图）")
+    faq_p.add_argument("--store", type=str, default="default", help="门店 id（默认门店用 data/ 下的数据）")
+    faq_p.add_argument("--output", type=str, default=None, help="答案表路径（默认为门店目录下的 faq_answers.json）")
+    faq_p.add_argument("--concurrency", type=int, default=4, help="并发调用 RAG 的线程数")
+
+    ask_p = sub.add_parser("ask", help="离线批量知识问答：每行一个问题，答完一条写一行 JSONL")
+    ask_p.add_argument("--input", type=str, required=True, help="问题文件（UTF-8，每行一个问题，# 开头为注释）")
+    ask_p.add_argument("--output", type=str, required=True, help="结果文件（JSONL，追加写入）")
+    ask_p.add_argument("--store", type=str, default="default", help="门店 id（默认门店用 data/ 下的数据）")
+    ask_p.add_argument("--concurrency", type=int, default=4, help="同时在途的 Gemini 调用数")
+    ask_p.add_argument("--rpm", type=float, default=None, help="每分钟 Gemini 请求数上限（默认读取 LLM_RPM，0 为不限）")
+    ask_p.add_argument("--resume", action="store_true", help="跳过结果文件中已成功作答的问题（失败的重答）")
+
+    index_p = sub.add_parser("build-index", help="离线构建只读索引包（向量 + 文本块 + 清单）")
+    index_p.add_argument("--store", type=str, default="default", help="门店 id（默认门店用 data/ 下的数据）")
+    index_p.add_argument("--all", action="store_true", help="为全部已配置门店构建")
+    index_p.add_argument("--output", type=str, default=None, help="索引包目录（默认为门店目录下的 index/；仅单门店时可用）")
+
+    eval_p = sub.add_parser("eval-retrieval", help="在黄金问题集上并排评测检索配置（不调用 LLM）")
+    eval_p.add_argument("--store", type=str, default="default", help="门店 id（默认门店用 data/ 下的数据）")
+    eval_p.add_argument("--golden", type=str, default=None, help="手写问题集（默认为门店知识目录下的 retrieval_golden.json）")
+    eval_p.add_argument("--no-menu-questions", action="store_true", help="不自动生成食材 / 锅底问题")
+    eval_p.add_argument(
+        "--config", action="append", default=None, metavar="NAME:KEY=VALUE,...",
+        help="评测配置，可重复；如 small:chunk_size=300,chunk_overlap=30 或 nosplit:ingredient_splitting=0（默认一组对照配置）",
+    )
+    eval_p.add_argument("--repeat", type=int, default=3, help="每题重复检索次数（延迟取分位数）")
+    eval_p.add_argument("--output", type=str, default=None, help="另存完整结果（JSON）")
+    eval_p.add_argument("--show-misses", action="store_true", help="列出各配置未命中的问题")
+
+    traces_p = sub.add_parser("traces", help="汇总请求 trace（需启用 TRACE_SAMPLE_RATE 或 TRACE_SLOW_MS）")
+    traces_p.add_argument("--file", type=str, default=None, help="trace 文件（默认读取 TRACE_FILE 环境变量或 data/traces/traces.jsonl，含轮转文件）")
+    traces_p.add_argument("--top", type=int, default=10, help="列出最慢的前 N 条")
+    traces_p.add_argument("--trace-id", type=str, default=None, help="只显示该 trace 的完整 span 树")
+
+    memory_p = sub.add_parser("memory", help="查看运行中服务的内存核算（需设置 ADMIN_TOKEN）")
+    memory_p.add_argument("--url", type=str, default=None, help="服务地址（默认 http://127.0.0.1:$PORT）")
+    memory_p.add_argument("--token", type=str, default=None, help="管理令牌（默认读取 ADMIN_TOKEN 环境变量）")
+    memory_p.add_argument("--top", type=int, default=10, help="列出最大的前 N 个 session / 增长最多的前 N 个分配位置")
+    memory_p.add_argument("--snapshot", action="store_true", help="取 tracemalloc 快照（第一次开启追踪并记下基线）")
+    memory_p.add_argument("--since-baseline", action="store_true", help="快照与基线比较（默认与上一次快照比较）")
+    memory_p.add_argument("--frames", type=int, default=1, help="开启追踪时保留的调用栈层数")
+    memory_p.add_argument("--stop-tracing", action="store_true", help="停止 tracemalloc")
+    memory_p.add_argument("--json", action="store_true", help="输出原始 JSON")
 
     args = parser.parse_args()
 
     if args.command == "ingest":
-        rag = RAG(collection_name=args.collection, persist_directory=args.persist)
+        collection = args.collection
+        if collection is None:
+            from web.stores import StoreRegistry
+
+            collection = StoreRegistry(persist_directory=args.persist).get(args.store).collection_name
+        rag = RAG(collection_name=collection, persist_directory=args.persist)
         try:
             n = rag.ingest_file(args.file, encoding=args.encoding)
             print(f"已录入 {n} 个文本块到知识库。")
@@ -37,9 +163,207 @@ def main():
             sys.exit(1)
 
     elif args.command == "serve":
-        import uvicorn
-        port = int(os.environ.get("PORT", 8080))
-        uvicorn.run("api:app", host="0.0.0.0", port=port, reload=True)
+        _serve(args)
+
+    elif args.command == "precompute-faq":
+        from web.app import _get_stores, answer_knowledge_question
+        from web.faq import build_faq_table
+        from web.stores import UnknownStoreError
+
+        try:
+            store = _get_stores().get(args.store)
+        except UnknownStoreError:
+            print(f"门店不存在: {args.store}", file=sys.stderr)
+            sys.exit(1)
+        store.load_knowledge()
+        output = args.output or store.config.faq_path
+
+        def _progress(done: int, total: int, job: dict) -> None:
+            status = "ERR " if job.get("error") else "SKIP" if job.get("skipped") else "OK  "
+            print(f"  [{done:3d}/{total}] {status}{job['name']} · {job['intent']}")
+
+        table = build_faq_table(
+            lambda q: answer_knowledge_question(q, strict=True, store=store),
+            store.menu_index.menu,
+            store.config.knowledge_hash(),
+            concurrency=args.concurrency,
+            on_progress=_progress,
+        )
+        table.save(output)
+        print(f"已生成 {len(table)} 条 FAQ 答案 → {output}")
+
+    elif args.command == "ask":
+        import json
+        import logging
+        from pathlib import Path
+
+        from core import scheduler
+        from web.app import LLM_RPM, RAG_MIN_SCORE, _get_stores
+        from web.batch import answered_questions, batch_summary, iter_batch_answers, read_questions
+        from web.stores import UnknownStoreError
+
+        try:
+            store = _get_stores().get(args.store)
+        except UnknownStoreError:
+            print(f"门店不存在: {args.store}", file=sys.stderr)
+            sys.exit(1)
+        try:
+            questions = read_questions(args.input)
+        except FileNotFoundError:
+            print(f"问题文件不存在: {args.input}", file=sys.stderr)
+            sys.exit(1)
+        output = Path(args.output)
+        skipped = answered_questions(output) if args.resume else set()
+        indexed = [(i, q) for i, q in enumerate(questions) if q not in skipped]
+        print(f"共 {len(questions)} 个问题，{len(questions) - len(indexed)} 个已作答跳过，待回答 {len(indexed)} 个")
+        if not indexed:
+            return 0
+        # 离线任务：并发上限即 --concurrency，排队时限放宽到一天（只限速，不甩负载）
+        concurrency = max(1, args.concurrency)
+        scheduler.configure(
+            max_concurrency=concurrency,
+            rpm=LLM_RPM if args.rpm is None else args.rpm,
+            queue_timeout=24 * 3600.0,
+            max_queue=max(scheduler.DEFAULT_MAX_QUEUE, concurrency),
+        )
+        logging.getLogger("core.rag").setLevel(logging.WARNING)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        if not args.resume:
+            output.write_text("", encoding="utf-8")
+        elif output.exists() and output.stat().st_size and not output.read_bytes().endswith(b"\n"):
+            # 上次中断时末行可能只写了一半：另起一行，残缺行在续跑时被忽略
+            with output.open("a", encoding="utf-8") as f:
+                f.write("\n")
+        t0 = time.perf_counter()
+        done = errors = 0
+        with output.open("a", encoding="utf-8") as f:
+            rows = iter_batch_answers(
+                store, [q for _, q in indexed], concurrency=concurrency, min_score=RAG_MIN_SCORE, strict=True
+            )
+            for row in rows:
+                row["index"] = indexed[row["index"]][0]
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                f.flush()
+                done += 1
+                errors += bool(row.get("error"))
+                status = "ERR " if row.get("error") else "OK  "
+                print(f"  [{done:4d}/{len(indexed)}] {status}{row['source']:<3} {row['question']}")
+        summary = batch_summary(done, errors, time.perf_counter() - t0)
+        print(
+            f"已回答 {done} 个问题（失败 {errors}），耗时 {summary['elapsed_s']:.1f} s，"
+            f"{summary['questions_per_s']} 问/秒 → {output}"
+        )
+        if errors:
+            print("有失败的问题，可加 --resume 重跑", file=sys.stderr)
+            return 1
+
+    elif args.command == "build-index":
+        from core.rag import build_index_bundle
+        from web.stores import StoreRegistry, UnknownStoreError
+
+        registry = StoreRegistry()
+        store_ids = registry.store_ids() if args.all else [args.store]
+        for store_id in store_ids:
+            try:
+                cfg = registry.config(store_id)
+            except UnknownStoreError:
+                print(f"门店不存在: {store_id}", file=sys.stderr)
+                sys.exit(1)
+            output = (args.output if not args.all else None) or cfg.index_dir
+            t0 = time.perf_counter()
+            manifest = build_index_bundle(
+                cfg.knowledge_files(), output, cfg.knowledge_hash(), embeddings=registry.get_embeddings()
+            )
+            print(
+                f"门店 {store_id}：已构建索引包 {manifest['count']} 个文本块（dim={manifest['dim']}）"
+                f" → {output}（{(time.perf_counter() - t0) * 1000:.0f} ms）"
+            )
+
+    elif args.command == "eval-retrieval":
+        import json
+        import logging
+        import shutil
+        import tempfile
+        from pathlib import Path
+
+        from web.retrieval_eval import (
+            DEFAULT_EVAL_CONFIGS,
+            GOLDEN_FILENAME,
+            RetrievalConfig,
+            evaluate,
+            format_results,
+            load_golden_file,
+            menu_golden_questions,
+        )
+        from web.stores import StoreRegistry, UnknownStoreError
+
+        try:
+            configs = [RetrievalConfig.parse(c) for c in args.config] if args.config else DEFAULT_EVAL_CONFIGS
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(2)
+        try:
+            store = StoreRegistry().get(args.store)
+        except UnknownStoreError:
+            print(f"门店不存在: {args.store}", file=sys.stderr)
+            sys.exit(1)
+        questions = [] if args.no_menu_questions else menu_golden_questions(store.menu_index.menu)
+        questions += load_golden_file(args.golden or store.config.knowledge_dir / GOLDEN_FILENAME)
+        if not questions:
+            print("黄金问题集为空", file=sys.stderr)
+            sys.exit(1)
+        print(f"门店 {args.store}：{len(questions)} 条黄金问题，{len(configs)} 组配置")
+        # 每题的上下文组装日志对评测没有意义
+        logging.getLogger("core.rag").setLevel(logging.WARNING)
+        persist = tempfile.mkdtemp(prefix="eval_retrieval_")
+        try:
+            results = evaluate(store, questions, configs, persist, repeat=args.repeat)
+        finally:
+            shutil.rmtree(persist, ignore_errors=True)
+        print(format_results(results))
+        if args.show_misses:
+            for r in results:
+                if r.misses:
+                    print(f"\n[{r.config.name}] 未命中 {len(r.misses)} 条：")
+                    for q in r.misses:
+                        print(f"  - {q}")
+        if args.output:
+            Path(args.output).write_text(
+                json.dumps([r.as_dict() for r in results], ensure_ascii=False, indent=1), encoding="utf-8"
+            )
+            print(f"完整结果 → {args.output}")
+
+    elif args.command == "traces":
+        from core.trace_summary import format_trace, load_traces, summarize
+        from core.tracing import DEFAULT_TRACE_FILE
+
+        traces = load_traces(args.file or os.environ.get("TRACE_FILE", DEFAULT_TRACE_FILE))
+        if args.trace_id:
+            trace = next((t for t in traces if t.get("trace_id") == args.trace_id), None)
+            if trace is None:
+                print(f"未找到 trace: {args.trace_id}", file=sys.stderr)
+                sys.exit(1)
+            print(format_trace(trace))
+        else:
+            print(summarize(traces, top=args.top))
+
+    elif args.command == "memory":
+        import json
+
+        from core.memory import format_report
+
+        url = args.url or f"http://127.0.0.1:{os.environ.get('PORT', 8080)}"
+        token = args.token or os.environ.get("ADMIN_TOKEN", "")
+        if not token:
+            print("需要管理令牌：--token 或 ADMIN_TOKEN 环境变量", file=sys.stderr)
+            sys.exit(1)
+        report = _admin_request(url, f"/api/admin/memory?top={args.top}", token)
+        if args.snapshot:
+            body = {"top": args.top, "frames": args.frames, "since_baseline": args.since_baseline}
+            report["tracemalloc"] = _admin_request(url, "/api/admin/memory/snapshot", token, "POST", body)
+        elif args.stop_tracing:
+            report["tracemalloc"] = _admin_request(url, "/api/admin/memory/snapshot", token, "DELETE")
+        print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
 
     return 0
 
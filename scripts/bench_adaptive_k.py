@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：自适应检索 vs 固定窗口检索（不调用 Gemini，只做检索与相关度判断）。
+
+问题集：
+  - 食材问题：菜单中每种食材 / 锅底各一条「X 怎么涮，有什么特点？」（按 /api/chat 的方式带实体扩展与 boost）
+  - 通用问题：锅底、蘸料、点餐相关的若干条
+  - 无关问题：与火锅无关的若干条（理想情况下不应调用 LLM）
+对每个问题分别用固定窗口（adaptive=False，即原来的行为）与自适应检索跑一遍，记录：
+  - 平均扫描候选数（从向量库取回的块数，含扩大窗口与备用检索）
+  - 检索耗时
+  - 需要调用 LLM 的问题数 / 低于相关度下限而省掉的 LLM 调用数
+  - 两种方式交给上下文组装的第一名候选是否一致
+
+用法（在项目根目录执行）：
+  python scripts/bench_adaptive_k.py
+  python scripts/bench_adaptive_k.py --min-score 0.25 --margin 0.05
+  python scripts/bench_adaptive_k.py --fake-embeddings   # 不加载 embedding 模型（相似度分布与真实模型不同）
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from bench_helpers import FakeEmbeddings
+from core.query import QueryContext
+from core.rag import DEFAULT_MIN_SCORE, DEFAULT_SCORE_MARGIN
+from web.stores import StoreRegistry
+
+_GENERAL = [
+    "番茄锅适合小朋友吗？",
+    "麻辣锅底有多辣？",
+    "蘸料怎么调比较好吃？",
+    "两个人点多少菜合适？",
+    "有哪些素食可以点？",
+    "涮肉一般要煮多久？",
+    "店里有什么招牌菜？",
+    "清汤锅底是用什么熬的？",
+]
+_OFF_TOPIC = [
+    "明天北京天气怎么样？",
+    "如何重置路由器密码？",
+    "帮我写一首关于大海的诗",
+    "Python 的列表推导式怎么写？",
+    "最近股市行情如何？",
+    "How do I renew my passport?",
+    "推荐一部科幻电影",
+    "地球到月球有多远？",
+]
+
+
+def question_set(store) -> list[tuple[str, str]]:
+    """(类别, 问题) 列表。"""
+    names = [e.name for e in store.entities]
+    return (
+        [("食材", f"{n}怎么涮，有什么特点？") for n in names]
+        + [("通用", q) for q in _GENERAL]
+        + [("无关", q) for q in _OFF_TOPIC]
+    )
+
+
+def run(store, questions, top_k: int, adaptive: bool, min_score: float, margin: float) -> list[dict]:
+    rag = store.rag
+    rag.adaptive, rag.min_score, rag.score_margin = adaptive, min_score, margin
+    rows = []
+    for kind, q in questions:
+        entity, query_vec, boost_vec = store.retrieval_vectors(QueryContext(q, store.embeddings))
+        boost = entity.name if entity else None
+        t0 = time.perf_counter()
+        found = rag.search(q, top_k=top_k, boost_contains=boost, query_vec=query_vec, boost_vec=boost_vec)
+        ms = (time.perf_counter() - t0) * 1000
+        rows.append({
+            "kind": kind,
+            "scanned": found.scanned,
+            "ms": ms,
+            "llm": rag.is_relevant(found, boost),
+            "top": found.docs[0].page_content if found.docs else None,
+            "best": found.best_score,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自适应检索 vs 固定窗口检索")
+    parser.add_argument("--top-k", type=int, default=8, help="与 /api/chat 一致")
+    parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE, help="相关度下限")
+    parser.add_argument("--margin", type=float, default=DEFAULT_SCORE_MARGIN, help="停止扩大窗口的分数差距")
+    parser.add_argument("--fake-embeddings", action="store_true")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_adaptive_"))
+    try:
+        data = tmp / "data"
+        data.mkdir()
+        for f in (_ROOT / "data").glob("*"):
+            if f.is_file():
+                shutil.copy(f, data / f.name)
+        registry = StoreRegistry(
+            data_dir=data,
+            persist_directory=str(tmp / "chroma"),
+            embeddings=FakeEmbeddings() if args.fake_embeddings else None,
+        )
+        store = registry.get()
+        store.load_knowledge()
+        questions = question_set(store)
+        fixed = run(store, questions, args.top_k, False, args.min_score, args.margin)
+        adaptive = run(store, questions, args.top_k, True, args.min_score, args.margin)
+
+        print(f"知识库 {store.rag.count()} 个文本块，问题 {len(questions)} 条，top_k={args.top_k}，"
+              f"相关度下限 {args.min_score}，停止差距 {args.margin}")
+        print(f"  {'类别':<4} {'条数':>4} {'固定:扫描':>9} {'自适应:扫描':>9} {'固定:ms':>8} {'自适应:ms':>8}"
+              f" {'LLM 调用(固定→自适应)':>18} {'首位一致':>6}")
+        for kind in ("食材", "通用", "无关", None):
+            idx = [i for i, (k, _) in enumerate(questions) if kind is None or k == kind]
+            if not idx:
+                continue
+            mean = lambda rows, key: statistics.mean(rows[i][key] for i in idx)  # noqa: E731
+            calls = lambda rows: sum(rows[i]["llm"] for i in idx)  # noqa: E731
+            same = sum(fixed[i]["top"] == adaptive[i]["top"] for i in idx)
+            print(f"  {kind or '全部':<4} {len(idx):>6} {mean(fixed, 'scanned'):>11.1f} {mean(adaptive, 'scanned'):>12.1f}"
+                  f" {mean(fixed, 'ms'):>9.2f} {mean(adaptive, 'ms'):>10.2f}"
+                  f" {calls(fixed):>12} → {calls(adaptive):<8} {same:>5}/{len(idx)}")
+        avoided = sum(f["llm"] and not a["llm"] for f, a in zip(fixed, adaptive))
+        print(f"省掉的 LLM 调用：{avoided} / {len(questions)}")
+        for kind in ("食材", "通用", "无关"):
+            best = [r["best"] for r in adaptive if r["kind"] == kind]
+            if best:
+                print(f"  {kind} 最高相似度：min={min(best):.3f} 中位={statistics.median(best):.3f} max={max(best):.3f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
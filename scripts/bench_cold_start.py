@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：冷启动耗时（有 / 无预构建索引包）。
+
+模拟一个新实例：每次在全新子进程、全新（空的）Chroma 目录里加载默认门店知识库，直到可以检索。
+  - 无索引包：打开空集合 → 分块 → 编码全部文本块 → 写入 Chroma
+  - 有索引包：读清单 → 内存映射 vectors.npy → 读 chunks.jsonl
+记录子进程总耗时（含 import 与 embedding 模型加载）以及其中「知识库就绪」一段的耗时。
+
+用法（在项目根目录执行）：
+  python scripts/bench_cold_start.py
+  python scripts/bench_cold_start.py --runs 5
+  python scripts/bench_cold_start.py --fake-embeddings   # 不加载 embedding 模型，只看录入 vs 打开的差别
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+
+def _fake_embeddings():
+    from bench_helpers import FakeEmbeddings
+
+    return FakeEmbeddings()
+
+
+def child(data_dir: str, persist_dir: str, fake: bool) -> None:
+    """子进程：加载默认门店知识库并检索一次，把各阶段耗时以 JSON 打到 stdout。"""
+    t0 = time.perf_counter()
+    from web.stores import StoreRegistry
+
+    t_import = time.perf_counter()
+    registry = StoreRegistry(
+        data_dir=data_dir, persist_directory=persist_dir, embeddings=_fake_embeddings() if fake else None
+    )
+    registry.get_embeddings().embed_query("预热")
+    t_model = time.perf_counter()
+    store = registry.get()
+    store.load_knowledge()
+    t_kb = time.perf_counter()
+    store.rag.retrieve("毛肚涮多久", top_k=3)
+    t_query = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (t_import - t0) * 1000,
+        "model_ms": (t_model - t_import) * 1000,
+        "knowledge_ms": (t_kb - t_model) * 1000,
+        "first_query_ms": (t_query - t_kb) * 1000,
+        "chunks": store.rag.count(),
+        "read_only": store.rag.read_only,
+    }))
+
+
+def run_once(data_dir: Path, fake: bool) -> dict:
+    persist = Path(tempfile.mkdtemp(prefix="bench_cold_chroma_"))
+    cmd = [sys.executable, __file__, "--child", str(data_dir), str(persist)]
+    if fake:
+        cmd.append("--fake-embeddings")
+    try:
+        t0 = time.perf_counter()
+        out = subprocess.run(cmd, cwd=_ROOT, capture_output=True, text=True, check=True).stdout
+        wall = (time.perf_counter() - t0) * 1000
+    finally:
+        shutil.rmtree(persist, ignore_errors=True)
+    result = json.loads(out.strip().splitlines()[-1])
+    result["wall_ms"] = wall
+    return result
+
+
+def _row(label: str, runs: list[dict]) -> str:
+    med = lambda k: statistics.median(r[k] for r in runs)  # noqa: E731
+    return (
+        f"  {label:<8} {med('wall_ms'):>9.0f} {med('import_ms'):>9.0f} {med('model_ms'):>9.0f}"
+        f" {med('knowledge_ms'):>9.0f} {med('first_query_ms'):>9.1f} {runs[0]['chunks']:>7}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动基准（有 / 无预构建索引包）")
+    parser.add_argument("--runs", type=int, default=3, help="每种模式的子进程次数（取中位数）")
+    parser.add_argument("--fake-embeddings", action="store_true")
+    parser.add_argument("--child", nargs=2, metavar=("DATA_DIR", "PERSIST_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # 子进程的 [RAG] 提示照常输出，父进程只取最后一行 JSON
+        logging.disable(logging.WARNING)
+        child(*args.child, fake=args.fake_embeddings)
+        return
+
+    from core.rag import build_index_bundle
+    from web.stores import StoreRegistry
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_cold_"))
+    try:
+        data = tmp / "data"
+        data.mkdir()
+        for f in (_ROOT / "data").glob("*"):
+            if f.is_file():
+                shutil.copy(f, data / f.name)
+        without = [run_once(data, args.fake_embeddings) for _ in range(args.runs)]
+
+        registry = StoreRegistry(data_dir=data, embeddings=_fake_embeddings() if args.fake_embeddings else None)
+        cfg = registry.config("default")
+        t0 = time.perf_counter()
+        manifest = build_index_bundle(
+            cfg.knowledge_files(), cfg.index_dir, cfg.knowledge_hash(), embeddings=registry.get_embeddings()
+        )
+        build_ms = (time.perf_counter() - t0) * 1000
+        with_bundle = [run_once(data, args.fake_embeddings) for _ in range(args.runs)]
+        assert all(r["read_only"] for r in with_bundle) and not any(r["read_only"] for r in without)
+
+        print(f"索引包：{manifest['count']} 个文本块，dim={manifest['dim']}，离线构建 {build_ms:.0f} ms")
+        print(f"冷启动（中位数，{args.runs} 次，单位 ms）")
+        print(f"  {'模式':<6} {'总耗时':>7} {'import':>9} {'模型':>8} {'知识库':>7} {'首次检索':>6} {'块数':>5}")
+        print(_row("无索引包", without))
+        print(_row("有索引包", with_bundle))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：长对话下点餐顾问的 prompt 大小、单轮延迟与 session 占用（不调用 Gemini，用假 LLM）。
+
+对比有界记忆（默认窗口）与不裁剪（窗口极大）两种配置，逐轮记录：
+  - profiler prompt 估算 token 数
+  - 单轮 run_concierge_once 耗时
+  - session 中消息条数与序列化大小
+
+用法（在项目根目录执行）：
+  python scripts/bench_concierge_memory.py
+  python scripts/bench_concierge_memory.py --turns 200 --window 6
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import pickle
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from langchain_core.messages import AIMessage
+
+from concierge.graph import run_concierge_once
+from concierge.memory import DEFAULT_MESSAGE_WINDOW, ConversationMemory
+from core.context import estimate_tokens
+
+
+class _FakeLLM:
+    def __init__(self):
+        self.last_prompt = ""
+
+    def invoke(self, messages):
+        self.last_prompt = "\n".join(m.content for m in messages)
+        out = {
+            "profile": {"spice_tolerance": "mild", "allergies": [], "num_guests": 2},
+            "need_more": True,
+            "next_question": "请问还有其他忌口或偏好吗？比如喜欢脆的还是嫩的口感？",
+        }
+        return AIMessage(content=json.dumps(out, ensure_ascii=False))
+
+
+def run(turns: int, memory: ConversationMemory) -> list[dict]:
+    fake = _FakeLLM()
+    rows = []
+    state = None
+    with mock.patch("concierge.graph.get_llm", return_value=fake):
+        for i in range(1, turns + 1):
+            t0 = time.perf_counter()
+            state = run_concierge_once(f"第{i}轮：我们两个人，微辣，不吃香菜，喜欢牛肉和虾滑", state, memory=memory)
+            dt = (time.perf_counter() - t0) * 1000
+            rows.append({
+                "turn": i,
+                "prompt_tokens": estimate_tokens(fake.last_prompt),
+                "latency_ms": dt,
+                "messages": len(state.get("messages") or []),
+                "state_bytes": len(pickle.dumps(state)),
+            })
+    return rows
+
+
+def _print(title: str, rows: list[dict]) -> None:
+    print(title)
+    print(f"  {'turn':>5} {'prompt_tok':>10} {'latency_ms':>10} {'messages':>8} {'state_KB':>9}")
+    for r in rows:
+        if r["turn"] in (1, 10, 25, 50, 75, 100) or r["turn"] == len(rows):
+            print(
+                f"  {r['turn']:>5} {r['prompt_tokens']:>10} {r['latency_ms']:>10.2f} "
+                f"{r['messages']:>8} {r['state_bytes'] / 1024:>9.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="点餐顾问长对话基准（假 LLM）")
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--window", type=int, default=DEFAULT_MESSAGE_WINDOW)
+    args = parser.parse_args()
+
+    bounded = run(args.turns, ConversationMemory(window=args.window))
+    unbounded = run(args.turns, ConversationMemory(window=10 ** 9))
+    _print(f"有界记忆（window={args.window}）", bounded)
+    _print("不裁剪（对照）", unbounded)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：「常一起点」同现模型的统计、刷新与购物车路径查表耗时（纯本地计算，不调用 Gemini）。
+
+生成 --orders 个订单（每单约 --items 种食材，取自真实菜单，按 Zipf 分布抽取，并混入若干固定搭配），测：
+  - 回放：从历史一次统计同现（CooccurrenceModel.rebuild）vs 逐单 Python 累加（CooccurrenceModel.record），
+          并单列两者共有的订单解析与去掉解析后的计数（pair_counts 向量化 vs 两两组合累加）；
+  - 增量：每来一单的更新耗时；
+  - 刷新：重算邻居表（NPMI + 每种食材前 top_n）与重建门店建议表（食材 × 过敏项组合）的耗时（后台执行）；
+  - 查表：SuggestionTable.suggest 在购物车路径上的耗时。
+
+用法（在项目根目录执行）：
+  python scripts/bench_cooccurrence.py
+  python scripts/bench_cooccurrence.py --orders 200000
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from concierge.menu_loader import get_menu_index
+from web.cooccurrence import CooccurrenceModel, SuggestionTable, pair_counts
+
+STORE = "default"
+
+
+def _orders(n: int, items: int, rng: random.Random) -> list[dict]:
+    ids = [it["id"] for it in get_menu_index().ingredients]
+    rng.shuffle(ids)
+    weights = [1.0 / (r + 1) for r in range(len(ids))]
+    combos = [rng.sample(ids, 3) for _ in range(6)]
+    out = []
+    for _ in range(n):
+        picked = set(rng.choices(ids, weights=weights, k=items))
+        if rng.random() < 0.3:
+            picked.update(rng.choice(combos))
+        out.append({"items": [{"menu_item_id": iid, "quantity": 1.0} for iid in picked]})
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="「常一起点」：同现统计、刷新与查表")
+    parser.add_argument("--orders", type=int, default=50000, help="历史订单数")
+    parser.add_argument("--items", type=int, default=12, help="每单抽取的食材数（去重后略少）")
+    parser.add_argument("--updates", type=int, default=2000, help="计时的增量订单数")
+    parser.add_argument("--lookups", type=int, default=100000, help="查表次数")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    history = _orders(args.orders, args.items, rng)
+    updates = _orders(args.updates, args.items, rng)
+
+    vectorized = CooccurrenceModel()
+    t0 = time.perf_counter()
+    vectorized.rebuild((STORE, o) for o in history)
+    rebuild_s = time.perf_counter() - t0
+
+    looped = CooccurrenceModel()
+    t0 = time.perf_counter()
+    for order in history:
+        looped.record(order, STORE)
+    loop_s = time.perf_counter() - t0
+    assert looped.refresh().neighbours == vectorized.refresh().neighbours
+
+    t0 = time.perf_counter()
+    baskets = [sorted(set(vectorized._codes(o))) for o in history]
+    parse_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    pair_counts(baskets, len(vectorized._ids))
+    count_vec_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    pairs: dict[tuple[int, int], int] = {}
+    for basket in baskets:
+        for key in itertools.combinations(basket, 2):
+            pairs[key] = pairs.get(key, 0) + 1
+    count_loop_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for order in updates:
+        vectorized.record(order, STORE)
+    record_us = (time.perf_counter() - t0) / len(updates) * 1e6
+
+    t0 = time.perf_counter()
+    snapshot = vectorized.refresh()
+    refresh_ms = (time.perf_counter() - t0) * 1000
+    neighbours = snapshot.for_store(STORE)
+
+    menu = get_menu_index()
+    t0 = time.perf_counter()
+    table = SuggestionTable(menu, neighbours, snapshot.version)
+    table_ms = (time.perf_counter() - t0) * 1000
+
+    keys = list(neighbours)
+    cases = [(k, a) for k in keys for a in ([], ["海鲜"], ["花生", "面筋"])]
+    cart = {iid: 1 for iid in keys[:10]}
+    t0 = time.perf_counter()
+    for i in range(args.lookups):
+        item_id, allergies = cases[i % len(cases)]
+        table.suggest(item_id, allergies, cart)
+    lookup_us = (time.perf_counter() - t0) / args.lookups * 1e6
+
+    print(f"{len(history):,} 个历史订单、每单约 {args.items} 种食材（{len(vectorized):,} 个食材对）：")
+    print(f"  回放 向量化  {rebuild_s * 1000:>10.1f} ms")
+    print(f"  回放 逐单    {loop_s * 1000:>10.1f} ms   （{loop_s / rebuild_s:.1f}×）")
+    print(f"    其中解析订单 {parse_s * 1000:>8.1f} ms；只计数：向量化 {count_vec_s * 1000:.1f} ms，"
+          f"两两累加 {count_loop_s * 1000:.1f} ms（{count_loop_s / count_vec_s:.1f}×）")
+    print(f"  增量         {record_us:>10.1f} µs/单")
+    print(f"  刷新邻居表   {refresh_ms:>10.1f} ms   （{len(neighbours)} 种食材有邻居）")
+    print(f"  重建建议表   {table_ms:>10.1f} ms   （{len(table)} 条）")
+    print(f"\n购物车路径查表：{lookup_us:.2f} µs/次")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准 / 浸泡脚本共用的辅助：确定性的假 embedding（不加载真实模型，便于只测检索、接口与内存）。
+
+脚本从项目根目录以 python scripts/xxx.py 运行时，scripts/ 在 sys.path 上，直接 from bench_helpers import 即可。
+"""
+from __future__ import annotations
+
+import hashlib
+
+from langchain_core.embeddings import Embeddings
+
+
+class FakeEmbeddings(Embeddings):
+    """按字符二元组哈希到固定维度的确定性向量；缺省 384 维，与默认 embedding 模型一致。"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vec(self, text: str) -> list[float]:
+        v = [0.0] * self.dim
+        for i in range(len(text) - 1):
+            v[int(hashlib.md5(text[i:i + 2].encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        n = sum(x * x for x in v) ** 0.5 or 1.0
+        return [x / n for x in v]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._vec(text)
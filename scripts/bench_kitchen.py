@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：厨房备料合计的更新代价与推送帧数（纯本地计算，不调用 Gemini）。
+
+已有 --open 个未完成订单（每单 --items 种食材，取自真实菜单）时，对比每来一单：
+  - 增量维护：KitchenBoard.apply，只加减该订单的贡献；
+  - 全量重算：重新扫描全部 open 订单求和（没有看板时每次刷新厨房屏幕的做法）。
+再模拟一波集中下单（--burst 单在 --burst-ms 毫秒内陆续到达），统计一个 SSE 订阅者收到的 update 帧数。
+
+用法（在项目根目录执行）：
+  python scripts/bench_kitchen.py
+  python scripts/bench_kitchen.py --open 5000 --burst 500
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from concierge.menu_loader import get_menu_index
+from web.kitchen import DEFAULT_PUSH_INTERVAL_S, KitchenBoard, board_events, order_portions
+
+
+def _orders(n: int, items: int, rng: random.Random) -> list[dict]:
+    menu = get_menu_index()
+    ids = [it["id"] for it in menu.ingredients]
+    broths = [b["id"] for b in menu.soup_bases]
+    return [
+        {
+            "order_id": k, "store_id": "default", "status": "open",
+            "order": {
+                "num_guests": rng.randint(1, 8),
+                "broths": [{"broth_id": rng.choice(broths), "quantity": 1}],
+                "items": [{"menu_item_id": iid, "quantity": rng.choice([0.5, 1.0, 1.5, 2.0])}
+                          for iid in rng.sample(ids, min(items, len(ids)))],
+            },
+        }
+        for k in range(n)
+    ]
+
+
+def _rescan(records: list[dict]) -> tuple[dict, dict]:
+    ingredients: dict[str, float] = {}
+    broths: dict[str, int] = {}
+    for r in records:
+        items, pots = order_portions(r["order"])
+        for k, q in items.items():
+            ingredients[k] = ingredients.get(k, 0.0) + q
+        for k, q in pots.items():
+            broths[k] = broths.get(k, 0) + q
+    return ingredients, broths
+
+
+async def _burst(board: KitchenBoard, records: list[dict], span_s: float, push_interval: float) -> tuple[int, float]:
+    events = board_events(board, "default", push_interval=push_interval)
+    await events.__anext__()
+    frames = 0
+    target = board.version + len(records)
+
+    async def _consume() -> None:
+        nonlocal frames
+        async for frame in events:
+            frames += 1
+            if f"\"version\":{target}," in frame:
+                return
+
+    consumer = asyncio.ensure_future(_consume())
+    t0 = time.perf_counter()
+    for k, r in enumerate(records):
+        board.apply(r)
+        await asyncio.sleep(max(0.0, t0 + span_s * (k + 1) / len(records) - time.perf_counter()))
+    await consumer
+    elapsed = time.perf_counter() - t0
+    await events.aclose()
+    return frames, elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="厨房看板：增量维护 vs 全量重算")
+    parser.add_argument("--open", type=int, default=2000, help="已有的未完成订单数")
+    parser.add_argument("--items", type=int, default=12, help="每单食材种数")
+    parser.add_argument("--updates", type=int, default=500, help="计时的新订单数")
+    parser.add_argument("--burst", type=int, default=200, help="集中下单的订单数")
+    parser.add_argument("--burst-ms", type=float, default=1000, help="集中下单持续的毫秒数")
+    parser.add_argument("--push-ms", type=float, default=DEFAULT_PUSH_INTERVAL_S * 1000, help="推送合并窗口")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    records = _orders(args.open + args.updates + args.burst, args.items, rng)
+    base, updates, burst = records[:args.open], records[args.open:args.open + args.updates], records[args.open + args.updates:]
+    board = KitchenBoard()
+    for r in base:
+        board.apply(r)
+
+    t0 = time.perf_counter()
+    for r in updates:
+        board.apply(r)
+    incremental_us = (time.perf_counter() - t0) / len(updates) * 1e6
+
+    sample = updates[:20]
+    open_records = list(base)
+    t0 = time.perf_counter()
+    for r in sample:
+        open_records.append(r)
+        _rescan(open_records)
+    rescan_us = (time.perf_counter() - t0) / len(sample) * 1e6
+
+    ingredients, _ = _rescan(base + updates)
+    snap = board.snapshot("default")
+    assert snap["ingredients"] == {k: round(v, 2) for k, v in sorted(ingredients.items())}
+
+    print(f"{args.open:,} 个未完成订单、每单 {args.items} 种食材，每来一单更新合计：")
+    print(f"  增量维护   {incremental_us:>10.1f} µs/单")
+    print(f"  全量重算   {rescan_us:>10.1f} µs/单   （{rescan_us / incremental_us:,.0f}×）")
+
+    frames, elapsed = asyncio.run(_burst(board, burst, args.burst_ms / 1000.0, args.push_ms / 1000.0))
+    print(f"\n{len(burst)} 单在 {elapsed * 1000:.0f} ms 内到达，合并窗口 {args.push_ms:g} ms：订阅者收到 {frames} 帧 update"
+          f"（不合并为 {len(burst)} 帧）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
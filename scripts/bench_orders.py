@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：订单日志的持续确认吞吐与写入期间的厨房查询延迟（本地 SQLite，不调用 Gemini）。
+
+--writers 个线程各自循环确认下单（append 后等待落盘），同时一个厨房线程反复翻页查询待出餐订单；
+对比组提交（默认窗口）与每条订单单独提交（max_batch=1），输出每秒确认数、确认延迟 p50 / p95、
+平均每次提交的订单数与厨房查询 p50 / p95。synchronous=FULL，每次提交一次 fsync，结果与磁盘相关。
+
+用法（在项目根目录执行）：
+  python scripts/bench_orders.py
+  python scripts/bench_orders.py --writers 64 --seconds 10 --commit-delay-ms 5
+"""
+from __future__ import annotations
+
+import argparse
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from concierge.menu_loader import get_menu_index
+from core import metrics
+from web.orders import DEFAULT_COMMIT_DELAY_S, ORDER_OPEN, OrderStore
+
+
+def _sample_order(num_guests: int) -> dict:
+    menu = get_menu_index()
+    broth = menu.soup_bases[0]
+    return {
+        "num_guests": num_guests,
+        "broths": [{"broth_id": broth["id"], "broth_name_cn": broth["name_cn"], "broth_name_en": broth.get("name_en"),
+                    "quantity": 1}],
+        "items": [
+            {"menu_item_id": it["id"], "name_cn": it["name_cn"], "name_en": it.get("name_en"), "category": it.get("category"),
+             "quantity": 2.0, "unit": "份", "reason": ""}
+            for it in menu.ingredients[:12]
+        ],
+        "dipping_sauce_recipe": "芝麻酱、蒜泥、香油",
+    }
+
+
+def _pct(values: list[float], p: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, int(len(s) * p / 100))] if s else 0.0
+
+
+def _run(path: Path, writers: int, seconds: float, commit_delay: float, max_batch: int) -> dict:
+    metrics.reset()
+    store = OrderStore(path, commit_delay=commit_delay, max_batch=max_batch)
+    order = _sample_order(4)
+    stop = threading.Event()
+    confirm_ms: list[list[float]] = [[] for _ in range(writers)]
+    kitchen_ms: list[float] = []
+
+    def _writer(k: int) -> None:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            store.append(order, f"bench-{k}", "default").result()
+            confirm_ms[k].append((time.perf_counter() - t0) * 1000)
+
+    def _kitchen() -> None:
+        cursor = None
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            page = store.list_orders(status=ORDER_OPEN, cursor=cursor, limit=50, oldest_first=True)
+            kitchen_ms.append((time.perf_counter() - t0) * 1000)
+            cursor = page["next_cursor"]
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=_writer, args=(k,)) for k in range(writers)]
+    threads.append(threading.Thread(target=_kitchen))
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    store.close()
+    lat = [x for per in confirm_ms for x in per]
+    return {
+        "orders_per_s": len(lat) / elapsed,
+        "p50": _pct(lat, 50),
+        "p95": _pct(lat, 95),
+        "per_commit": metrics.get("orders.appended") / max(1, metrics.get("orders.commits")),
+        "kitchen_p50": _pct(kitchen_ms, 50),
+        "kitchen_p95": _pct(kitchen_ms, 95),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="订单日志：组提交 vs 逐条提交")
+    parser.add_argument("--writers", type=int, default=32, help="并发确认下单的线程数")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每种配置的持续时间")
+    parser.add_argument("--commit-delay-ms", type=float, default=DEFAULT_COMMIT_DELAY_S * 1000, help="组提交窗口")
+    parser.add_argument("--dir", default=None, help="数据库所在目录（默认临时目录；测真实磁盘时指定）")
+    args = parser.parse_args()
+
+    base = Path(args.dir) if args.dir else Path(tempfile.mkdtemp())
+    base.mkdir(parents=True, exist_ok=True)
+    configs = [("逐条提交", 0.0, 1), (f"组提交 {args.commit_delay_ms:g} ms", args.commit_delay_ms / 1000.0, 256)]
+    print(f"{args.writers} 个线程持续确认下单 {args.seconds:g} s，厨房线程同时翻页查询待出餐订单（目录 {base}）\n")
+    print(f"  {'配置':<12} {'确认/秒':>9} {'确认 p50 ms':>12} {'确认 p95 ms':>12} {'单/提交':>8} {'厨房 p50 ms':>12} {'厨房 p95 ms':>12}")
+    try:
+        for k, (name, delay, max_batch) in enumerate(configs):
+            r = _run(base / f"bench_orders_{k}.db", args.writers, args.seconds, delay, max_batch)
+            print(f"  {name:<12} {r['orders_per_s']:>9,.0f} {r['p50']:>12.2f} {r['p95']:>12.2f} {r['per_commit']:>8.1f}"
+                  f" {r['kitchen_p50']:>12.2f} {r['kitchen_p95']:>12.2f}")
+    finally:
+        if not args.dir:
+            shutil.rmtree(base, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
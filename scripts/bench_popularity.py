@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：点单热度统计的更新代价、刷新与推荐表重建耗时，以及请求路径查表延迟（纯本地计算，不调用 Gemini）。
+
+按 Zipf 分布生成 --orders 个订单（每单 --items 种食材，取自真实菜单，时间分布在最近 --days 天），测：
+  - 统计：PopularityEngine.record 每单耗时（总体与所在时段各累加一次）；
+  - 刷新：refresh 生成排名快照、按新排名重建一个门店推荐表的耗时（后台线程执行，不在请求路径上）；
+  - 查表：RecommendationTable.get 在按热度重建前后的耗时（请求路径不变）；
+  - 准确度：容量为 --capacity 的草图得到的前 20 名与精确计数前 20 名的重合数。
+
+用法（在项目根目录执行）：
+  python scripts/bench_popularity.py
+  python scripts/bench_popularity.py --orders 200000 --capacity 32
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from concierge.menu_loader import get_menu_index
+from web.popularity import DEFAULT_CAPACITY, PopularityEngine, daypart_of
+from web.recommendation import RecommendationTable
+
+STORE = "default"
+
+
+def _orders(n: int, items: int, days: float, rng: random.Random, now: float) -> list[tuple[dict, float]]:
+    menu = get_menu_index()
+    ids = [it["id"] for it in menu.ingredients]
+    rng.shuffle(ids)
+    weights = [1.0 / (r + 1) for r in range(len(ids))]
+    broths = [b["id"] for b in menu.soup_bases]
+    out = []
+    for _ in range(n):
+        picked = set(rng.choices(ids, weights=weights, k=items))
+        order = {"broths": [{"broth_id": rng.choice(broths), "quantity": 1}],
+                 "items": [{"menu_item_id": iid, "quantity": 1.0} for iid in picked]}
+        out.append((order, now - rng.random() * days * 86400))
+    out.sort(key=lambda x: x[1])
+    return out
+
+
+def _lookup_us(table: RecommendationTable, rounds: int, daypart: str) -> float:
+    cases = [(g, a) for g in range(1, 7) for a in ([], ["海鲜"], ["花生", "面筋"])]
+    t0 = time.perf_counter()
+    for k in range(rounds):
+        g, a = cases[k % len(cases)]
+        table.get(g, a, daypart)
+    return (time.perf_counter() - t0) / rounds * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="点单热度：统计、刷新与推荐表重建")
+    parser.add_argument("--orders", type=int, default=50000, help="历史订单数")
+    parser.add_argument("--items", type=int, default=12, help="每单抽取的食材数（去重后略少）")
+    parser.add_argument("--days", type=float, default=7, help="订单时间分布的天数")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="每个草图的容量")
+    parser.add_argument("--lookups", type=int, default=100000, help="查表次数")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    now = time.time()
+
+    orders = _orders(args.orders, args.items, args.days, rng, now)
+    engine = PopularityEngine(capacity=args.capacity, clock=lambda: now)
+    t0 = time.perf_counter()
+    for order, ts in orders:
+        engine.record(order, STORE, ts)
+    record_us = (time.perf_counter() - t0) / len(orders) * 1e6
+
+    t0 = time.perf_counter()
+    snapshot = engine.refresh()
+    refresh_ms = (time.perf_counter() - t0) * 1000
+    rankings = snapshot.for_store(STORE)
+
+    menu = get_menu_index()
+    plain = RecommendationTable(menu)
+    t0 = time.perf_counter()
+    learned = RecommendationTable(menu, rankings, snapshot.version)
+    rebuild_ms = (time.perf_counter() - t0) * 1000
+
+    exact = Counter(i["menu_item_id"] for order, _ in orders for i in order["items"])
+    exact_top = {k for k, _ in exact.most_common(20)}
+    sketch_top = set(rankings.get(None, ())[:20])
+
+    daypart = daypart_of(now)
+    plain_us = _lookup_us(plain, args.lookups, daypart)
+    learned_us = _lookup_us(learned, args.lookups, daypart)
+
+    print(f"{len(orders):,} 个订单、每单约 {args.items} 种食材，草图容量 {args.capacity}：")
+    print(f"  统计       {record_us:>10.1f} µs/单")
+    print(f"  刷新快照   {refresh_ms:>10.1f} ms   （排名 {len(rankings)} 个：{', '.join(str(k or 'all') for k in rankings)}）")
+    print(f"  重建推荐表 {rebuild_ms:>10.1f} ms   （{len(learned)} 条，原 {len(plain)} 条）")
+    print(f"  前 20 名与精确计数重合 {len(exact_top & sketch_top)}/20（未衰减的精确计数，仅作参考）")
+    print(f"\n请求路径查表（时段 {daypart}）：")
+    print(f"  手工人气顺序 {plain_us:>8.2f} µs/次")
+    print(f"  热度排名     {learned_us:>8.2f} µs/次")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：/api/recommend 路由延迟，逐请求计算推荐 vs 查门店加载时预计算的推荐表（不调用 Gemini，不加载 embedding 模型）。
+
+  - per-request：原先的写法，每次请求重新做替代品替换、过敏原过滤与展示顺序查找（逐个 next() 线性查找）；
+  - table：查 RecommendationTable，路由只合并 session 购物车。
+请求在人数 1–6 × 过敏项组合（含无法识别的过敏项）间轮换；session 循环复用，大部分请求走再推荐的合并分支。
+
+用法（在项目根目录执行）：
+  python scripts/bench_recommend.py
+  python scripts/bench_recommend.py --requests 20000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import itertools
+import statistics
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from web.recommendation import (
+    ALLERGY_GLUTEN,
+    ALLERGY_PEANUT,
+    ALLERGY_SEAFOOD,
+    DEFAULT_RECOMMEND_IDS,
+    GLUTEN_IDS,
+    GLUTEN_REPLACEMENTS,
+    SEAFOOD_IDS,
+    SEAFOOD_REPLACEMENTS,
+    Recommendation,
+    RecommendationTable,
+    ingredient_has_allergen,
+    recommend_items,
+)
+from web.schemas import RecommendRequest
+from web.stores import StoreRegistry
+
+ALLERGY_SETS = [
+    [], [ALLERGY_SEAFOOD], [ALLERGY_GLUTEN], [ALLERGY_PEANUT], [ALLERGY_SEAFOOD, ALLERGY_GLUTEN],
+    [ALLERGY_GLUTEN, ALLERGY_PEANUT], [ALLERGY_SEAFOOD, ALLERGY_PEANUT], [ALLERGY_SEAFOOD, ALLERGY_GLUTEN, ALLERGY_PEANUT],
+    ["芒果", ALLERGY_SEAFOOD],
+]
+
+
+class _PerRequestTable:
+    """原先 /api/recommend 的逐请求计算（推荐 + 过滤 + 展示顺序），接口与 RecommendationTable 相同。"""
+
+    def __init__(self, menu_index):
+        self.menu_index = menu_index
+
+    def get(self, num_guests: int, allergies: list[str], daypart: str | None = None) -> Recommendation:
+        items, _ = recommend_items(num_guests, allergies, self.menu_index)
+        filtered_all = [
+            it for it in self.menu_index.ingredients
+            if not any(a and ingredient_has_allergen(it, a.strip()) for a in allergies)
+        ]
+        ordered_ids = list(DEFAULT_RECOMMEND_IDS)
+        if any(a.strip() == ALLERGY_SEAFOOD for a in allergies if a):
+            repl_iter = iter(SEAFOOD_REPLACEMENTS)
+            ordered_ids = [next(repl_iter) if x in SEAFOOD_IDS else x for x in ordered_ids]
+        if any(a.strip() == ALLERGY_GLUTEN for a in allergies if a):
+            repl_iter = iter(GLUTEN_REPLACEMENTS)
+            ordered_ids = [next(repl_iter) if x in GLUTEN_IDS else x for x in ordered_ids]
+        valid_ids = {it.get("id") for it in filtered_all}
+        display_order = [iid for iid in ordered_ids if iid in valid_ids]
+        for it in filtered_all:
+            iid = it.get("id")
+            if iid and iid not in display_order:
+                display_order.append(iid)
+        all_items = []
+        for iid in display_order:
+            it = next((x for x in filtered_all if x.get("id") == iid), None)
+            if it:
+                all_items.append({"id": it.get("id"), "name_cn": it.get("name_cn"), "name_en": it.get("name_en")})
+        return Recommendation(
+            items=tuple(
+                {"id": it.get("id"), "name_cn": it.get("name_cn"), "name_en": it.get("name_en"), "category": it.get("category")}
+                for it in items
+            ),
+            item_ids=tuple(it["id"] for it in items if it.get("id")),
+            all_items=tuple(all_items),
+        )
+
+
+async def _drive(web_app, requests: list[RecommendRequest]) -> list[float]:
+    latencies = []
+    for req in requests:
+        t0 = time.perf_counter()
+        await web_app.recommend(req)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def _pct(values: list[float], p: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, int(len(s) * p / 100))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="/api/recommend：逐请求计算 vs 预计算推荐表")
+    parser.add_argument("--requests", type=int, default=5000, help="每种模式的请求数")
+    parser.add_argument("--sessions", type=int, default=200, help="轮换使用的 session 数（再推荐走合并分支）")
+    args = parser.parse_args()
+
+    web_app = importlib.import_module("web.app")
+    registry = StoreRegistry()
+    web_app._stores = registry
+    store = registry.get()
+    t0 = time.perf_counter()
+    table = RecommendationTable(store.menu_index)
+    build_ms = (time.perf_counter() - t0) * 1000
+    print(f"菜单 {len(store.menu_index.ingredients)} 种食材；预计算推荐表 {len(table)} 条，耗时 {build_ms:.1f} ms")
+
+    combos = itertools.cycle(itertools.product(range(1, 7), ALLERGY_SETS))
+    requests = []
+    for i in range(args.requests):
+        n, allergies = next(combos)
+        requests.append(RecommendRequest(num_guests=n, allergies=allergies, session_id=f"bench-{i % args.sessions}"))
+
+    print(f"\n  {'模式':<12} {'p50 µs':>9} {'p95 µs':>9} {'平均 µs':>9} {'req/s':>9}")
+    results = {}
+    for name, tbl in (("per-request", _PerRequestTable(store.menu_index)), ("table", table)):
+        store.recommendations = tbl
+        web_app._sessions.clear()
+        asyncio.run(_drive(web_app, requests[: min(200, len(requests))]))  # 预热
+        web_app._sessions.clear()
+        lat = asyncio.run(_drive(web_app, requests))
+        results[name] = lat
+        mean = statistics.mean(lat)
+        print(
+            f"  {name:<14} {_pct(lat, 50) * 1000:>9.1f} {_pct(lat, 95) * 1000:>9.1f} {mean * 1000:>9.1f}"
+            f" {1000 / mean:>9.0f}"
+        )
+    speedup = statistics.mean(results["per-request"]) / statistics.mean(results["table"])
+    print(f"\n平均延迟降为原来的 1/{speedup:.1f}")
+    web_app._sessions.clear()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：食材搜索索引在大目录上的建索引耗时、内存与查询延迟（纯本地计算，不调用 Gemini）。
+
+目录由真实菜单的食材名随机加前缀修饰词扩充到 --items 条（中文名、英文名、popularity_rank），
+查询分为中文前缀、中文中缀、拼音全拼、拼音首字母、英文前缀、英文拼写错误、无结果七类，
+各输出 p50 / p95 / 最大延迟；对照为逐条子串过滤全部名称（相当于前端拿到全量列表后本地过滤，且不支持拼音与纠错）。
+
+用法（在项目根目录执行）：
+  python scripts/bench_search.py
+  python scripts/bench_search.py --items 100000 --queries 2000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from concierge.menu_loader import get_menu_index
+from core.memory import deep_sizeof
+from web.pinyin import PINYIN, syllables
+from web.recommendation import INGREDIENT_SYNONYMS
+from web.search import IngredientSearch, normalize_query
+
+_MODIFIERS_CN = ["鲜", "嫩", "精选", "招牌", "手切", "秘制", "冰鲜", "农家", "特级", "有机", "香辣", "清汤"]
+_MODIFIERS_EN = ["Fresh", "Tender", "Select", "Signature", "Hand Cut", "Secret", "Chilled", "Farm", "Premium", "Organic"]
+
+
+def _catalog(n: int, rng: random.Random) -> list[dict]:
+    base = get_menu_index().ingredients
+    chars = sorted(PINYIN)
+    items = []
+    for k in range(n):
+        it = base[k % len(base)]
+        if k < len(base):
+            items.append(dict(it))
+            continue
+        prefix_cn = rng.choice(_MODIFIERS_CN) + "".join(rng.choice(chars) for _ in range(rng.randint(0, 2)))
+        prefix_en = f"{rng.choice(_MODIFIERS_EN)} {rng.choice(_MODIFIERS_EN)}"
+        items.append({
+            "id": f"{it['id']}_{k}",
+            "name_cn": prefix_cn + it["name_cn"],
+            "name_en": f"{prefix_en} {it['name_en']}",
+            "category": it.get("category"),
+            "popularity_rank": rng.randint(1, n),
+        })
+    return items
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:] if rng.random() < 0.5 else word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def _queries(items: list[dict], count: int, rng: random.Random) -> dict[str, list[str]]:
+    base = get_menu_index().ingredients
+    out: dict[str, list[str]] = {k: [] for k in ("中文前缀", "中文中缀", "拼音全拼", "拼音首字母", "英文前缀", "英文拼错", "无结果")}
+    for _ in range(count):
+        it = rng.choice(base)
+        cn, en = it["name_cn"], it["name_en"].lower()
+        syl = syllables(cn) or []
+        out["中文前缀"].append(cn[:rng.randint(1, len(cn))])
+        out["中文中缀"].append(cn[-2:] if len(cn) > 2 else cn)
+        out["拼音全拼"].append("".join(syl)[:rng.randint(2, max(2, len("".join(syl))))])
+        out["拼音首字母"].append("".join(s[0] for s in syl))
+        out["英文前缀"].append(en[:rng.randint(2, len(en))])
+        word = max(en.split(), key=len)
+        out["英文拼错"].append(_typo(word, rng) if len(word) > 4 else word)
+        out["无结果"].append("".join(rng.choice("qxzj") for _ in range(5)))
+    return out
+
+
+def _linear(items: list[dict], q: str, limit: int) -> list[dict]:
+    q = normalize_query(q)
+    hits = [it for it in items if q in (it.get("name_cn") or "") or q in (it.get("name_en") or "").lower()]
+    return sorted(hits, key=lambda it: it.get("popularity_rank") or 0)[:limit]
+
+
+def _pct(values: list[float], p: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, int(len(s) * p / 100))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="食材搜索：索引查询 vs 逐条过滤")
+    parser.add_argument("--items", type=int, default=100_000, help="扩充后的目录条数")
+    parser.add_argument("--queries", type=int, default=1000, help="每类查询条数")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    items = _catalog(args.items, rng)
+    t0 = time.perf_counter()
+    index = IngredientSearch(items, INGREDIENT_SYNONYMS)
+    build_s = time.perf_counter() - t0
+    print(f"{len(items):,} 条食材：建索引 {build_s:.2f} s，索引约 {deep_sizeof(index) / 2**20:.0f} MB")
+
+    print(f"\n  {'查询类型':<8} {'p50 µs':>9} {'p95 µs':>9} {'最大 µs':>9} {'有结果':>7}   {'逐条过滤 p50 ms':>14}")
+    for kind, queries in _queries(items, args.queries, rng).items():
+        lat, found = [], 0
+        for q in queries:
+            t0 = time.perf_counter()
+            res = index.search(q, args.limit)
+            lat.append((time.perf_counter() - t0) * 1e6)
+            found += bool(res)
+        linear = []
+        for q in queries[:20]:
+            t0 = time.perf_counter()
+            _linear(items, q, args.limit)
+            linear.append((time.perf_counter() - t0) * 1000)
+        print(f"  {kind:<10} {_pct(lat, 50):>9.1f} {_pct(lat, 95):>9.1f} {max(lat):>9.1f} {found / len(queries):>7.0%}"
+              f"   {_pct(linear, 50):>14.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：一次页面加载的请求数与下行字节数（响应头 + 响应体），对比改造前后（进程内 TestClient，不调用 Gemini）。
+
+  改造前：index.html 引用 /static/ 下的原始文件（style.css 再 @import 4 个 CSS），不压缩、无 Cache-Control；
+          再次打开页面时浏览器对每个文件用 If-None-Match 协商（StaticFiles 回 304），/api/ingredients 每次完整返回。
+  改造后：带内容哈希的 /assets/ 文件（CSS 已内联）以 immutable 长缓存 + 预压缩下发，再次打开时不再请求；
+          index.html 与 /api/ingredients 协商后回 304。
+首次访问（冷缓存）与再次访问（热缓存）分别统计。
+
+用法（在项目根目录执行）：
+  python scripts/bench_static.py
+  python scripts/bench_static.py --encoding gzip
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import logging
+import re
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from fastapi.testclient import TestClient
+
+from bench_helpers import FakeEmbeddings
+from web.assets import AssetManifest, brotli
+from web.stores import StoreRegistry
+
+_REF_RE = re.compile(r"""\b(?:src|href)=["']([^"']+\.(?:css|js))["']""")
+_IMPORT_RE = re.compile(r"""@import\s+(?:url\()?\s*['"]?([^'")\s]+)""")
+
+
+class _Browser:
+    """记录每个 URL 的 ETag 与 Cache-Control，按浏览器的方式决定是否请求、是否带 If-None-Match；累计下行字节。"""
+
+    def __init__(self, client: TestClient, accept_encoding: str, api_etags: bool = True):
+        self.client = client
+        self.accept_encoding = accept_encoding
+        # 改造前 /api/ 接口不带 ETag：模拟时不发 If-None-Match
+        self.api_etags = api_etags
+        self.cache: dict[str, tuple[str | None, bool, str]] = {}
+        self.requests = self.bytes = 0
+
+    def get(self, url: str) -> str:
+        etag, immutable, text = self.cache.get(url, (None, False, ""))
+        if immutable:
+            return text
+        headers = {"Accept-Encoding": self.accept_encoding}
+        if etag and (self.api_etags or not url.startswith("/api/")):
+            headers["If-None-Match"] = etag
+        resp = self.client.get(url, headers=headers)
+        self.requests += 1
+        # 下行字节：状态行 + 响应头 + 线上（压缩后）的响应体
+        self.bytes += len("HTTP/1.1 200 OK\r\n\r\n") + sum(len(k) + len(v) + 4 for k, v in resp.headers.items())
+        self.bytes += int(resp.headers.get("content-length", len(resp.content)))
+        if resp.status_code == 304:
+            return text
+        self.cache[url] = (resp.headers.get("etag"), "immutable" in resp.headers.get("cache-control", ""), resp.text)
+        return resp.text
+
+
+def _load_page(browser: _Browser, index_url: str) -> tuple[int, int]:
+    start = (browser.requests, browser.bytes)
+    html = browser.get(index_url)
+    for ref in _REF_RE.findall(html):
+        body = browser.get(ref)
+        if ref.endswith(".css"):
+            base = ref.rsplit("/", 1)[0]
+            for imported in _IMPORT_RE.findall(body):
+                browser.get(f"{base}/{imported}")
+    browser.get("/api/ingredients")
+    return browser.requests - start[0], browser.bytes - start[1]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="页面加载的请求数与下行字节：改造前 vs 内容哈希 + 预压缩 + ETag")
+    parser.add_argument("--encoding", default="br, gzip" if brotli is not None else "gzip",
+                        help="改造后浏览器的 Accept-Encoding（默认 br, gzip；未安装 brotli 时 gzip）")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_static_"))
+    web_app = importlib.import_module("web.app")
+    saved = (web_app._stores, web_app._assets)
+    try:
+        data = tmp / "data"
+        (data / "stores").mkdir(parents=True)
+        shutil.copy(_ROOT / "data" / "hotpot_menu.json", data / "hotpot_menu.json")
+        web_app._stores = StoreRegistry(data_dir=data, persist_directory=str(tmp / "chroma"), embeddings=FakeEmbeddings(dim=64))
+        web_app._assets = AssetManifest(web_app.STATIC_DIR)
+        client = TestClient(web_app.app)
+
+        # 改造前：原始文件、不压缩（原实现没有压缩中间件）
+        before = _Browser(client, "identity", api_etags=False)
+        after = _Browser(client, args.encoding)
+        rows = [
+            ("改造前", before, "/static/index.html"),
+            ("改造后", after, "/"),
+        ]
+        print(f"Accept-Encoding（改造后）: {args.encoding}")
+        print(f"\n  {'':<8} {'首次 请求':>10} {'首次 字节':>12} {'再次 请求':>10} {'再次 字节':>12}")
+        result = {}
+        for name, browser, index_url in rows:
+            cold = _load_page(browser, index_url)
+            warm = _load_page(browser, index_url)
+            result[name] = (cold, warm)
+            print(f"  {name:<8} {cold[0]:>12} {cold[1]:>14,} {warm[0]:>12} {warm[1]:>14,}")
+        (cold_b, warm_b), (cold_a, warm_a) = result["改造前"], result["改造后"]
+        print(f"\n首次访问字节减少 {1 - cold_a[1] / cold_b[1]:.1%}，再次访问字节减少 {1 - warm_a[1] / warm_b[1]:.1%}")
+        return 0
+    finally:
+        web_app._stores, web_app._assets = saved
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：多门店懒加载与 LRU 驻留（不调用 Gemini，只做检索）。
+
+在临时目录生成 N 家门店（各自的菜单副本与知识文档），依次对每家门店发一次「首请求」
+（加载菜单 → 打开/录入集合 → 检索），再发一次「热请求」，记录：
+  - 首请求 / 热请求延迟
+  - 进程 RSS 与注册表估算的驻留内存、驻留门店数、逐出次数
+
+用法（在项目根目录执行）：
+  python scripts/bench_stores.py
+  python scripts/bench_stores.py --stores 50 --cap-mb 4
+  python scripts/bench_stores.py --fake-embeddings   # 不加载 embedding 模型，只看注册表开销
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from bench_helpers import FakeEmbeddings
+from web.stores import StoreRegistry
+
+
+def rss_mb() -> float:
+    """当前进程常驻内存（MB）；非 Linux 退化为峰值 RSS。"""
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_stores(data_dir: Path, n: int, paragraphs: int) -> list[str]:
+    stores_dir = data_dir / "stores"
+    stores_dir.mkdir(parents=True)
+    shutil.copy(_ROOT / "data" / "hotpot_menu.json", data_dir / "hotpot_menu.json")
+    ids = []
+    for i in range(n):
+        sid = f"store{i:03d}"
+        d = stores_dir / sid
+        d.mkdir()
+        shutil.copy(_ROOT / "data" / "hotpot_menu.json", d / "hotpot_menu.json")
+        text = "\n\n".join(
+            f"{sid} 第{j}条：本店招牌锅底第{j}号，牛油与番茄双拼，建议毛肚涮 15 秒、虾滑煮 3 分钟。"
+            for j in range(paragraphs)
+        )
+        (d / "knowledge.txt").write_text(text, encoding="utf-8")
+        ids.append(sid)
+    return ids
+
+
+def _ms(values: list[float]) -> str:
+    values = sorted(values)
+    p95 = values[max(0, int(len(values) * 0.95) - 1)]
+    return f"p50 {statistics.median(values):7.1f} ms   p95 {p95:7.1f} ms   max {values[-1]:7.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多门店懒加载 / LRU 驻留基准")
+    parser.add_argument("--stores", type=int, default=50)
+    parser.add_argument("--paragraphs", type=int, default=40, help="每家门店知识文档的段落数")
+    parser.add_argument("--cap-mb", type=float, default=4.0, help="注册表驻留内存上限（估算，MB）")
+    parser.add_argument("--fake-embeddings", action="store_true")
+    args = parser.parse_args()
+    logging.getLogger("web.stores").setLevel(logging.WARNING)
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_stores_"))
+    try:
+        ids = make_stores(tmp / "data", args.stores, args.paragraphs)
+        t0 = time.perf_counter()
+        embeddings = FakeEmbeddings() if args.fake_embeddings else None
+        registry = StoreRegistry(
+            data_dir=tmp / "data",
+            persist_directory=str(tmp / "chroma"),
+            memory_cap_bytes=int(args.cap_mb * 1024 * 1024),
+            embeddings=embeddings,
+        )
+        if embeddings is None:
+            registry.get_embeddings().embed_query("预热")
+        print(f"配置门店 {len(registry.store_ids()) - 1} 家；embedding 就绪 {(time.perf_counter() - t0) * 1000:.0f} ms，RSS {rss_mb():.0f} MB")
+
+        def request(sid: str) -> float:
+            t = time.perf_counter()
+            registry.get(sid).rag.retrieve("招牌锅底怎么涮", top_k=3)
+            return (time.perf_counter() - t) * 1000
+
+        cold = [request(sid) for sid in ids]
+        rss_cold = rss_mb()
+        warm = [request(sid) for sid in ids[-5:]]
+        stats = registry.stats()
+        print(f"首请求（懒加载 + 录入）：{_ms(cold)}")
+        print(f"热请求（已驻留）：      {_ms(warm)}")
+        print(
+            f"驻留门店 {len(stats['resident'])}/{args.stores}，估算驻留 {stats['resident_bytes'] / 1024 / 1024:.1f} MB"
+            f"（上限 {args.cap_mb} MB），逐出 {stats['evictions']} 次，RSS {rss_cold:.0f} MB"
+        )
+        # 被逐出的门店再次访问：集合已在磁盘上，只需重新打开，不重复录入
+        reload_ = [request(sid) for sid in ids[:5]]
+        print(f"逐出后再访问：          {_ms(reload_)}；RSS {rss_mb():.0f} MB")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
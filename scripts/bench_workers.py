@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：多 worker 部署的吞吐与总内存（embedding 服务共用模型 vs 每个 worker 各自加载）。
+
+依次以 1/2/4/8 个 worker 启动 python main.py serve，对 /api/chat 发知识类问题压测，记录：
+  - 吞吐（req/s）与 p50 / p95 延迟
+  - 整个进程树（启动进程 + embedding 服务 + worker）的 RSS 之和
+
+压测时把 RAG_LATENCY_BUDGET_MS 设为 1：检索照常执行（embedding + 向量检索），
+Gemini 调用因预算耗尽直接降级为抽取式答案，因此不需要 API Key，测的是 embedding 与检索路径。
+
+用法（在项目根目录执行，需已下载 embedding 模型）：
+  python scripts/bench_workers.py
+  python scripts/bench_workers.py --workers 1 2 4 --duration 20 --concurrency 32
+  python scripts/bench_workers.py --no-sidecar        # 对照：每个 worker 各自加载模型
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+
+QUESTIONS = [
+    "毛肚涮多久比较好？", "番茄锅底有什么特点？", "虾滑怎么煮才嫩？", "吃火锅怎么蘸料比较健康？",
+    "牛油锅底适合什么人？", "鸭血要煮几分钟？", "菌汤锅有什么营养？", "吃火锅有什么礼仪需要注意？",
+]
+
+
+def _children(pid: int) -> list[int]:
+    out = []
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            child = int(stat.parent.name)
+            out.append(child)
+            out += _children(child)
+    return out
+
+
+def tree_rss_mb(pid: int) -> float:
+    """进程及其全部子进程的 RSS 之和（MB，仅 Linux）。"""
+    total = 0
+    for p in [pid] + _children(pid):
+        try:
+            for line in Path(f"/proc/{p}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+def _post(url: str, body: dict) -> float:
+    t0 = time.perf_counter()
+    req = urllib.request.Request(
+        url, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        resp.read()
+    return (time.perf_counter() - t0) * 1000
+
+
+def _wait_ready(port: int, timeout: float = 300.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=2):
+                return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def run(workers: int, port: int, duration: float, concurrency: int, sidecar: bool) -> dict:
+    env = {**os.environ, "RAG_LATENCY_BUDGET_MS": "1", "LOG_LEVEL": "WARNING"}
+    env.pop("EMBEDDING_SOCKET", None)
+    cmd = [sys.executable, "main.py", "serve", "--workers", str(workers), "--port", str(port), "--no-reload"]
+    if not sidecar:
+        cmd.append("--no-sidecar")
+    proc = subprocess.Popen(cmd, cwd=_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not _wait_ready(port):
+            raise RuntimeError(f"{workers} worker 服务未能启动")
+        url = f"http://127.0.0.1:{port}/api/chat"
+        for q in QUESTIONS:
+            _post(url, {"message": q})
+        latencies: list[float] = []
+        stop_at = time.monotonic() + duration
+
+        def loop(i: int) -> None:
+            n = i
+            while time.monotonic() < stop_at:
+                latencies.append(_post(url, {"message": QUESTIONS[n % len(QUESTIONS)]}))
+                n += 1
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(loop, range(concurrency)))
+        elapsed = time.perf_counter() - t0
+        latencies.sort()
+        return {
+            "workers": workers,
+            "rps": len(latencies) / elapsed,
+            "p50": statistics.median(latencies),
+            "p95": latencies[int(len(latencies) * 0.95) - 1],
+            "rss_mb": tree_rss_mb(proc.pid),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多 worker 吞吐与内存基准")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=15.0, help="每档压测秒数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发客户端数")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--no-sidecar", action="store_true", help="每个 worker 各自加载模型（对照）")
+    args = parser.parse_args()
+
+    mode = "每 worker 各自加载模型" if args.no_sidecar else "共用 embedding 服务"
+    print(f"模式：{mode}；并发 {args.concurrency}，每档 {args.duration:.0f}s")
+    print(f"  {'workers':>7} {'req/s':>8} {'p50_ms':>8} {'p95_ms':>8} {'RSS_MB':>8}")
+    for i, n in enumerate(args.workers):
+        r = run(n, args.port + i, args.duration, args.concurrency, sidecar=not args.no_sidecar)
+        print(f"  {r['workers']:>7} {r['rps']:>8.1f} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['rss_mb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
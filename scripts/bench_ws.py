@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准：同一组点餐交互走 REST 与走 WebSocket（/ws）的消息吞吐与延迟（真实 uvicorn 服务 + 本机回环，不调用 Gemini）。
+
+每轮交互模拟前端：
+  - 改勾选后再推荐：REST 为 PATCH /api/cart + POST /api/recommend 两次往返，WebSocket 为一个附带增量的 recommend 帧；
+  - 改勾选：REST 为 PATCH /api/cart，WebSocket 为 cart 帧；
+  - 对话：「确认」（未选锅底，直接返回提示，不走 LLM），REST 为 POST /api/chat，WebSocket 为 chat 帧。
+REST 客户端复用 keep-alive 连接（同浏览器）。--clients 个并发客户端各自一个 session。
+输出每种操作的 p50 / p95 延迟与整体 消息/秒（一轮交互计 3 条用户操作）。
+
+用法（在项目根目录执行）：
+  python scripts/bench_ws.py
+  python scripts/bench_ws.py --rounds 500 --clients 8
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import logging
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+import httpx
+import uvicorn
+from websockets.sync.client import connect
+
+from bench_helpers import FakeEmbeddings
+from web.sessions import SessionStore
+from web.stores import StoreRegistry
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _toggle_ops(items: list[dict], i: int) -> list[dict]:
+    """交替去掉 / 加回推荐里的一样食材。"""
+    iid = items[(i // 2) % len(items)]["id"]
+    return [{"op": "remove", "id": iid}] if i % 2 == 0 else [{"op": "set", "id": iid, "quantity": 1}]
+
+
+def run_rest(base: str, rounds: int, lat: dict) -> None:
+    with httpx.Client(base_url=base, timeout=30) as client:
+        rec = client.post("/api/recommend", json={"num_guests": 2}).json()
+        sid, version = rec["session_id"], rec["cart_version"]
+        for i in range(rounds):
+            t0 = time.perf_counter()
+            client.patch("/api/cart", json={"session_id": sid, "version": version, "ops": _toggle_ops(rec["items"], i)})
+            rec = client.post("/api/recommend", json={"num_guests": 2, "session_id": sid}).json()
+            version = rec["cart_version"]
+            t1 = time.perf_counter()
+            patch = client.patch("/api/cart", json={"session_id": sid, "version": version, "ops": _toggle_ops(rec["items"], i + 1)}).json()
+            version = patch["version"]
+            t2 = time.perf_counter()
+            client.post("/api/chat", json={"session_id": sid, "message": "确认"})
+            t3 = time.perf_counter()
+            lat["recommend"].append(t1 - t0)
+            lat["cart"].append(t2 - t1)
+            lat["chat"].append(t3 - t2)
+
+
+def run_ws(base: str, rounds: int, lat: dict) -> None:
+    with connect(base.replace("http://", "ws://") + "/ws") as ws:
+        json.loads(ws.recv())
+
+        def request(frame: dict) -> dict:
+            ws.send(json.dumps(frame, ensure_ascii=False))
+            while True:
+                reply = json.loads(ws.recv())
+                if reply.get("id") == frame["id"] and reply["type"] != "chat.accepted":
+                    return reply
+
+        rec = request({"type": "recommend", "id": "0", "num_guests": 2})
+        version = rec["cart_version"]
+        for i in range(rounds):
+            t0 = time.perf_counter()
+            rec = request({"type": "recommend", "id": "r", "num_guests": 2,
+                           "cart": {"version": version, "ops": _toggle_ops(rec["items"], i)}})
+            version = rec["cart_version"]
+            t1 = time.perf_counter()
+            version = request({"type": "cart", "id": "c", "version": version, "ops": _toggle_ops(rec["items"], i + 1)})["version"]
+            t2 = time.perf_counter()
+            request({"type": "chat", "id": "k", "message": "确认"})
+            t3 = time.perf_counter()
+            lat["recommend"].append(t1 - t0)
+            lat["cart"].append(t2 - t1)
+            lat["chat"].append(t3 - t2)
+
+
+def _pct(values: list[float], p: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, int(len(s) * p / 100))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="REST vs WebSocket：消息吞吐与延迟")
+    parser.add_argument("--rounds", type=int, default=300, help="每个客户端的交互轮数（每轮 3 条用户操作）")
+    parser.add_argument("--clients", type=int, default=1, help="并发客户端数（各自一个 session）")
+    args = parser.parse_args()
+    for name in ("web.stores", "httpx", "uvicorn.access", "uvicorn.error"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_ws_"))
+    web_app = importlib.import_module("web.app")
+    saved = (web_app._stores, web_app._router, web_app._sessions)
+    server = None
+    try:
+        data = tmp / "data"
+        (data / "stores").mkdir(parents=True)
+        shutil.copy(_ROOT / "data" / "hotpot_menu.json", data / "hotpot_menu.json")
+        web_app._stores = StoreRegistry(data_dir=data, persist_directory=str(tmp / "chroma"), embeddings=FakeEmbeddings(dim=64))
+        web_app._router = None
+        web_app._sessions = SessionStore()
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(web_app.app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.01)
+        base = f"http://127.0.0.1:{port}"
+
+        print(f"{args.clients} 个客户端 × {args.rounds} 轮（每轮：改勾选+再推荐、改勾选、对话）")
+        print(f"\n  {'通道':<10} {'操作':<10} {'p50 ms':>8} {'p95 ms':>8} {'平均 ms':>8}")
+        summary = {}
+        for name, run in (("rest", run_rest), ("websocket", run_ws)):
+            run(base, min(20, args.rounds), defaultdict(list))  # 预热
+            per_client = [defaultdict(list) for _ in range(args.clients)]
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as pool:
+                for f in [pool.submit(run, base, args.rounds, lat) for lat in per_client]:
+                    f.result()
+            elapsed = time.perf_counter() - t0
+            for op in ("recommend", "cart", "chat"):
+                values = [v * 1000 for lat in per_client for v in lat[op]]
+                print(f"  {name:<12} {op:<10} {_pct(values, 50):>8.2f} {_pct(values, 95):>8.2f} {statistics.mean(values):>8.2f}")
+            summary[name] = args.clients * args.rounds * 3 / elapsed
+        print()
+        for name, rate in summary.items():
+            print(f"  {name:<12} {rate:>8.0f} 消息/秒")
+        print(f"\nWebSocket 吞吐为 REST 的 {summary['websocket'] / summary['rest']:.2f} 倍")
+        return 0
+    finally:
+        if server is not None:
+            server.should_exit = True
+        web_app._stores, web_app._router, web_app._sessions = saved
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
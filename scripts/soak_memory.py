@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+浸泡测试：连续跑数千个脚本化的用餐 session，检查内存是否有界（不调用 Gemini，用假 LLM 与假 embedding）。
+
+每个 session：推荐 → 增量改购物车 → 若干轮点餐对话（LangGraph 顾问，假 LLM）→ 一个知识问答（抽取式答案）
+→ 选锅底并确认下单。session 表按 --max-sessions 做 LRU 上限。
+预热 10% 的 session 后记下 RSS 基线，之后每 10% 打印一次 RSS、session 数与估算占用；结束时断言：
+  - session 数不超过上限，单个 session 的估算大小不超过 --session-kb；
+  - 预热后的 RSS 增长不超过 --rss-growth-mb。
+任一不满足时退出码为 1。--tracemalloc 额外列出预热后增长最多的分配位置，便于定位泄漏。
+
+用法（在项目根目录执行）：
+  python scripts/soak_memory.py
+  python scripts/soak_memory.py --sessions 10000 --max-sessions 500 --turns 8 --tracemalloc
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import importlib
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from langchain_core.messages import AIMessage
+
+from bench_helpers import FakeEmbeddings
+from core import memory
+from web.recommendation import ALLERGY_GLUTEN, ALLERGY_SEAFOOD
+from web.kitchen import KitchenBoard
+from web.orders import OrderStore
+from web.schemas import BrothSelectionBody, CartOp, CartPatchRequest, ChatRequest, RecommendRequest
+from web.sessions import SessionStore
+from web.stores import DEFAULT_STORE_ID, StoreRegistry
+
+ALLERGY_SETS = [[], [ALLERGY_SEAFOOD], [ALLERGY_GLUTEN], [ALLERGY_SEAFOOD, ALLERGY_GLUTEN]]
+QUESTIONS = ["毛肚涮多久比较好？", "虾滑要煮几分钟？", "番茄锅底辣不辣？"]
+
+
+class _FakeLLM:
+    def invoke(self, messages):
+        out = {
+            "profile": {"spice_tolerance": "mild", "allergies": [], "num_guests": 3},
+            "need_more": True,
+            "next_question": "请问还有其他忌口或偏好吗？比如喜欢脆的还是嫩的口感？",
+        }
+        return AIMessage(content=json.dumps(out, ensure_ascii=False))
+
+
+async def run_session(web_app, i: int, turns: int, broth: str) -> None:
+    sid = f"soak-{i:07d}"
+    rec = await web_app.recommend(
+        RecommendRequest(num_guests=1 + i % 6, allergies=ALLERGY_SETS[i % len(ALLERGY_SETS)], session_id=sid)
+    )
+    first = rec.items[0]["id"]
+    await web_app.cart_patch(CartPatchRequest(
+        session_id=sid, version=rec.cart_version,
+        ops=[CartOp(op="add", id=first, quantity=2), CartOp(op="remove", id=rec.items[-1]["id"])],
+    ))
+    for t in range(turns):
+        await web_app.chat(ChatRequest(session_id=sid, message=f"第{t + 1}轮：我们三个人，微辣，不吃香菜，喜欢牛肉和虾滑"))
+    await web_app.chat(ChatRequest(session_id=sid, message=QUESTIONS[i % len(QUESTIONS)]))
+    await web_app.chat(ChatRequest(session_id=sid, message="确认", broths=[BrothSelectionBody(name_cn=broth)]))
+
+
+def _mb(n: float | None) -> str:
+    return "-" if n is None else f"{n / 1024 / 1024:.1f}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="内存浸泡测试：数千个脚本化 session 下内存是否有界")
+    parser.add_argument("--sessions", type=int, default=2000, help="session 总数")
+    parser.add_argument("--turns", type=int, default=4, help="每个 session 的点餐对话轮数")
+    parser.add_argument("--max-sessions", type=int, default=500, help="session 表上限（LRU）")
+    parser.add_argument("--session-kb", type=float, default=64.0, help="单个 session 估算大小上限（KB）")
+    parser.add_argument("--rss-growth-mb", type=float, default=64.0, help="预热后 RSS 增长上限（MB）")
+    parser.add_argument("--tracemalloc", action="store_true", help="预热后开启 tracemalloc，结束时列出增长最多的位置")
+    args = parser.parse_args()
+    for name in ("web.stores", "core.rag"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    tmp = Path(tempfile.mkdtemp(prefix="soak_memory_"))
+    web_app = importlib.import_module("web.app")
+    saved = (web_app._stores, web_app._router, web_app._sessions, web_app._orders, web_app._kitchen,
+             web_app.RAG_LATENCY_BUDGET_MS)
+    try:
+        data = tmp / "data"
+        (data / "stores").mkdir(parents=True)
+        shutil.copy(_ROOT / "data" / "hotpot_menu.json", data / "hotpot_menu.json")
+        for f in _ROOT.glob("data/*.txt"):
+            shutil.copy(f, data / f.name)
+        web_app._stores = StoreRegistry(data_dir=data, persist_directory=str(tmp / "chroma"), embeddings=FakeEmbeddings(dim=64))
+        web_app._router = None
+        web_app._sessions = SessionStore(max_sessions=args.max_sessions)
+        web_app._orders = OrderStore(tmp / "orders.db")
+        web_app._kitchen = KitchenBoard()
+        # 预算为 0：知识问答只做检索并返回抽取式答案
+        web_app.RAG_LATENCY_BUDGET_MS = 0
+        store = web_app._stores.get(DEFAULT_STORE_ID)
+        store.load_knowledge()
+        broth = store.menu_index.menu["soup_bases"][0]["name_cn"]
+
+        heap = memory.HeapSnapshots()
+        warmup = max(1, args.sessions // 10)
+        baseline_rss = None
+        t0 = time.perf_counter()
+        print(f"  {'session':>8} {'RSS MB':>8} {'增长 MB':>8} {'驻留 session':>12} {'估算 MB':>8} {'最大 KB':>8} {'耗时 s':>7}")
+        # 用 new= 而不是 return_value=：MagicMock 会记录每次调用，本身就会在浸泡中持续增长
+        fake_llm = _FakeLLM()
+        with mock.patch("concierge.graph.get_llm", new=lambda *a, **kw: fake_llm):
+            for i in range(args.sessions):
+                asyncio.run(run_session(web_app, i, args.turns, broth))
+                done = i + 1
+                if done == warmup:
+                    gc.collect()
+                    baseline_rss = memory.process_rss_bytes()
+                    if args.tracemalloc:
+                        heap.snapshot(top=10, frames=3)
+                if done % max(1, args.sessions // 10) == 0 or done == args.sessions:
+                    gc.collect()
+                    rss = memory.process_rss_bytes()
+                    fp = memory.session_footprint(web_app._sessions.snapshot(), top=1)
+                    largest = fp["largest"][0]["bytes"] if fp["largest"] else 0
+                    growth = rss - baseline_rss if rss is not None and baseline_rss is not None else None
+                    print(
+                        f"  {done:>8} {_mb(rss):>8} {_mb(growth):>8} {fp['count']:>12} "
+                        f"{_mb(fp['total_bytes']):>8} {largest / 1024:>8.1f} {time.perf_counter() - t0:>7.1f}"
+                    )
+
+        stats = web_app._sessions.stats()
+        fp = memory.session_footprint(web_app._sessions.snapshot(), top=1)
+        largest = fp["largest"][0]["bytes"] if fp["largest"] else 0
+        rss = memory.process_rss_bytes()
+        print(f"\nsession：驻留 {stats['count']}（上限 {stats['max_sessions']}），逐出 {stats['evicted']}；平均 {fp['mean_bytes'] / 1024:.1f} KB")
+        if args.tracemalloc:
+            report = heap.snapshot(top=10, since_baseline=True)
+            heap.stop()
+            print(memory.format_report({"tracemalloc": report}).strip())
+
+        failures = []
+        if stats["count"] > args.max_sessions:
+            failures.append(f"session 数 {stats['count']} 超过上限 {args.max_sessions}")
+        if largest > args.session_kb * 1024:
+            failures.append(f"最大 session {largest / 1024:.1f} KB 超过 {args.session_kb} KB")
+        if rss is not None and baseline_rss is not None and rss - baseline_rss > args.rss_growth_mb * 1024 * 1024:
+            failures.append(f"预热后 RSS 增长 {_mb(rss - baseline_rss)} MB 超过 {args.rss_growth_mb} MB")
+        for f in failures:
+            print(f"FAIL: {f}")
+        if not failures:
+            print("OK：内存有界")
+        return 1 if failures else 0
+    finally:
+        if web_app._orders is not None:
+            web_app._orders.close()
+        (web_app._stores, web_app._router, web_app._sessions, web_app._orders, web_app._kitchen,
+         web_app.RAG_LATENCY_BUDGET_MS) = saved
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
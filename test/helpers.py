@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试共用的夹具：确定性的假 embedding、临时数据目录与门店注册表，以及替换 web.app 全局对象的接口测试基类。
+都不加载真实模型、不调用 Gemini。
+"""
+from __future__ import annotations
+
+import hashlib
+import importlib
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from fastapi.testclient import TestClient
+from langchain_core.embeddings import Embeddings
+
+from web.sessions import SessionStore
+from web.stores import StoreRegistry
+
+# web 包导出了同名的 FastAPI 实例 app，这里取模块本身
+web_app = importlib.import_module("web.app")
+
+MENU_PATH = _ROOT / "data" / "hotpot_menu.json"
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    按字符二元组哈希到固定维度的确定性向量。
+    记录 embed_documents / embed_query 的调用次数（document_calls / query_calls）与编码的文本总条数（texts）。
+    """
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self.document_calls = 0
+        self.query_calls = 0
+        self.texts = 0
+
+    def _vec(self, text: str) -> list[float]:
+        v = [0.0] * self.dim
+        for i in range(len(text) - 1):
+            v[int(hashlib.md5(text[i:i + 2].encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        n = sum(x * x for x in v) ** 0.5 or 1.0
+        return [x / n for x in v]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.document_calls += 1
+        self.texts += len(texts)
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.query_calls += 1
+        self.texts += 1
+        return self._vec(text)
+
+
+def temp_dir(case: unittest.TestCase) -> Path:
+    """临时目录；删除最先注册，因而在用例其它清理（关闭订单库等）之后执行。"""
+    tmp = Path(tempfile.mkdtemp())
+    case.addCleanup(shutil.rmtree, tmp, True)
+    return tmp
+
+
+def make_data_dir(root: Path, knowledge: str | None = None) -> Path:
+    """root/data：复制默认菜单、建好空的 stores/；给出 knowledge 时写入默认门店的知识文档 sample.txt。"""
+    data = root / "data"
+    (data / "stores").mkdir(parents=True, exist_ok=True)
+    shutil.copy(MENU_PATH, data / "hotpot_menu.json")
+    if knowledge is not None:
+        (data / "sample.txt").write_text(knowledge, encoding="utf-8")
+    return data
+
+
+def make_registry(
+    root: Path, knowledge: str | None = None, embeddings: Embeddings | None = None, **kwargs
+) -> StoreRegistry:
+    """在 root 下建数据目录与 Chroma 目录的门店注册表（缺省用 FakeEmbeddings）。"""
+    return StoreRegistry(
+        data_dir=make_data_dir(root, knowledge),
+        persist_directory=str(root / "chroma"),
+        embeddings=embeddings or FakeEmbeddings(),
+        **kwargs,
+    )
+
+
+class AppTestCase(unittest.TestCase):
+    """
+    接口测试基类：临时目录、默认菜单的门店注册表（类属性 KNOWLEDGE 为默认门店的知识文档）与空 session 表，
+    替换进 web.app 并建好 TestClient。子类在 super().setUp() 之后用 patch_app 追加要替换的全局对象。
+    """
+
+    KNOWLEDGE: str | None = None
+
+    def setUp(self) -> None:
+        self.web_app = web_app
+        self.tmp = temp_dir(self)
+        self.embeddings = FakeEmbeddings()
+        self.registry = make_registry(self.tmp, self.KNOWLEDGE, self.embeddings)
+        self.sessions = SessionStore()
+        self.patch_app(_stores=self.registry, _router=None, _sessions=self.sessions)
+        self.client = TestClient(web_app.app)
+
+    def patch_app(self, **attrs) -> None:
+        """在本用例期间替换 web.app 的模块级对象（用例结束时恢复）。"""
+        for name, value in attrs.items():
+            patcher = mock.patch.object(self.web_app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试自适应检索：候选带相似度返回、命中即停止扩大窗口、分数平坦时窗口翻倍、
+低于相关度下限时不调用 LLM。用临时目录与假 embedding，不加载真实模型。
+"""
+from __future__ import annotations
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+import numpy as np
+
+from core import RAG, metrics
+from core.rag import _EMPTY_ANSWER, BOOST_FETCH_K, CONTEXT_CANDIDATE_FACTOR
+from helpers import FakeEmbeddings
+
+_NAMES = [
+    "鱼丸", "虾丸", "墨鱼丸", "牛肉丸", "撒尿牛丸", "蟹棒", "竹轮", "鱼豆腐", "午餐肉", "火腿肠",
+    "毛肚", "鸭肠", "黄喉", "肥牛", "羊肉卷", "虾滑", "鸭血", "豆腐", "冻豆腐", "腐竹",
+    "藕片", "土豆片", "冬瓜", "海带", "金针菇", "香菇", "平菇", "娃娃菜", "生菜", "菠菜",
+    "茼蒿", "宽粉", "粉丝", "年糕", "鹌鹑蛋", "玉米", "山药", "莴笋", "木耳", "鱿鱼花",
+]
+_TEXT = "【67 种食材详细介绍】\n" + "\n".join(
+    f"{i + 1}. {name}：下锅后煮 {i % 7 + 2} 分钟，适合搭配麻酱碟。" for i, name in enumerate(_NAMES)
+)
+
+
+class _FakeChain:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, inputs: dict) -> str:
+        self.calls += 1
+        return "好的"
+
+
+class TestAdaptiveRetrieval(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp = Path(tempfile.mkdtemp())
+        kb = cls.tmp / "sample.txt"
+        kb.write_text(_TEXT, encoding="utf-8")
+        cls.emb = FakeEmbeddings(dim=256)
+        cls.rag = RAG(collection_name="adaptive", persist_directory=str(cls.tmp / "chroma"), embeddings=cls.emb)
+        cls.rag.ingest_file(str(kb))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def setUp(self) -> None:
+        metrics.reset()
+        self.rag.adaptive, self.rag.score_margin, self.rag.min_score = True, 0.08, 0.2
+        self.chain = _FakeChain()
+        self.rag._get_combine_chain = lambda: self.chain
+
+    def test_scores_are_cosine_similarities(self) -> None:
+        self.rag.score_margin = 0.0
+        found = self.rag.search("毛肚煮几分钟", top_k=3)
+        self.assertEqual(len(found.docs), len(found.scores))
+        self.assertEqual(len(found.docs), 3 * CONTEXT_CANDIDATE_FACTOR)
+        q = np.asarray(self.emb.embed_query("毛肚煮几分钟"))
+        for d, s in zip(found.docs, found.scores):
+            self.assertAlmostEqual(s, float(q @ np.asarray(self.emb.embed_query(d.page_content))), places=4)
+        self.assertIn("毛肚", found.docs[0].page_content)
+        self.assertEqual(found.best_score, max(found.scores))
+
+    def test_boost_stops_at_first_hit(self) -> None:
+        found = self.rag.search("毛肚煮几分钟", top_k=3, boost_contains="毛肚")
+        self.assertIn("毛肚", found.docs[0].page_content)
+        self.assertEqual(found.scanned, 3 * CONTEXT_CANDIDATE_FACTOR)
+        self.rag.adaptive = False
+        fixed = self.rag.search("毛肚煮几分钟", top_k=3, boost_contains="毛肚")
+        self.assertEqual(fixed.scanned, min(BOOST_FETCH_K, self.rag.count()))
+        self.assertEqual(fixed.docs[0].page_content, found.docs[0].page_content)
+        self.assertEqual(metrics.get("rag.candidates_scanned"), found.scanned + fixed.scanned)
+
+    def test_window_grows_only_when_scores_are_flat(self) -> None:
+        pool = 2 * CONTEXT_CANDIDATE_FACTOR
+        self.rag.score_margin = 0.0
+        self.assertEqual(self.rag.search("毛肚煮几分钟", top_k=2).scanned, pool)
+        # 差距永远达不到：窗口 4 → 8，累计扫描 12
+        self.rag.score_margin = 2.0
+        found = self.rag.search("毛肚煮几分钟", top_k=2)
+        self.assertEqual(found.scanned, pool + pool * 2)
+        self.assertEqual(len(found.docs), pool * 2)
+
+    def test_below_floor_skips_llm(self) -> None:
+        question = "How do I reset my router password?"
+        self.assertLess(self.rag.search(question, top_k=3).best_score, 0.2)
+        result = self.rag.answer(question, top_k=3)
+        self.assertEqual(result.answer, _EMPTY_ANSWER)
+        self.assertFalse(result.degraded)
+        self.assertEqual(self.chain.calls, 0)
+        self.assertEqual(metrics.get("rag.below_floor"), 1)
+        # 非自适应模式保留旧行为：照常生成
+        self.rag.adaptive = False
+        self.assertEqual(self.rag.answer(question, top_k=3).answer, "好的")
+        self.assertEqual(self.chain.calls, 1)
+
+    def test_relevant_question_calls_llm(self) -> None:
+        self.assertEqual(self.rag.answer("毛肚煮几分钟", top_k=3).answer, "好的")
+        self.assertEqual(self.rag.answer("鱿鱼花", top_k=3, boost_contains="鱿鱼花", min_score=1.0).answer, "好的")
+        self.assertEqual(self.chain.calls, 2)
+        self.assertEqual(metrics.get("rag.below_floor"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试可缓存响应：静态资源内容哈希与 index.html 引用改写、CSS @import 内联、immutable 长缓存与预压缩变体、
+If-None-Match 回 304，以及 /api/ingredients 预序列化响应的 ETag 随菜单版本变化。用临时目录与假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import gzip
+import importlib
+import json
+import sys
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from core import metrics
+from helpers import AppTestCase, temp_dir
+from web.assets import IMMUTABLE_CACHE_CONTROL, AssetManifest, CachedBody
+from web.stores import DEFAULT_STORE_ID
+
+web_app = importlib.import_module("web.app")
+
+
+class TestAssetManifest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = temp_dir(self)
+        (self.tmp / "css").mkdir()
+        (self.tmp / "js").mkdir()
+        (self.tmp / "css" / "base.css").write_text("body { margin: 0; }\n", encoding="utf-8")
+        (self.tmp / "css" / "style.css").write_text("@import url('base.css');\nh1 { color: red; }\n", encoding="utf-8")
+        (self.tmp / "js" / "app.js").write_text("var x = 1;\n" * 100, encoding="utf-8")
+        (self.tmp / "index.html").write_text(
+            '<link rel="stylesheet" href="/static/css/style.css" />\n'
+            '<script src="/static/js/app.js"></script>\n<img src="/static/logo.png" />\n',
+            encoding="utf-8",
+        )
+
+    def test_hashes_inlines_and_rewrites(self) -> None:
+        manifest = AssetManifest(self.tmp)
+        html = manifest.index.body.decode("utf-8")
+        self.assertIn(f'href="{manifest.urls["css/style.css"]}"', html)
+        self.assertIn(f'src="{manifest.urls["js/app.js"]}"', html)
+        self.assertIn('src="/static/logo.png"', html)  # 不认识的文件保持原样
+        self.assertRegex(manifest.urls["js/app.js"], r"^/assets/js/app\.[0-9a-f]{10}\.js$")
+
+        style = manifest.files[manifest.urls["css/style.css"].removeprefix("/assets/")]
+        self.assertEqual(style.body.decode("utf-8"), "body { margin: 0; }\n\nh1 { color: red; }\n")
+        self.assertEqual(style.cache_control, IMMUTABLE_CACHE_CONTROL)
+        app_js = manifest.files[manifest.urls["js/app.js"].removeprefix("/assets/")]
+        self.assertEqual(gzip.decompress(app_js.variants["gzip"]), app_js.body)
+
+        # 被内联的文件变了，聚合文件的哈希也跟着变
+        (self.tmp / "css" / "base.css").write_text("body { margin: 1px; }\n", encoding="utf-8")
+        changed = AssetManifest(self.tmp)
+        self.assertNotEqual(changed.urls["css/style.css"], manifest.urls["css/style.css"])
+        self.assertEqual(changed.urls["js/app.js"], manifest.urls["js/app.js"])
+
+    def test_negotiation_and_conditional(self) -> None:
+        body = CachedBody(b"x" * 1000, "text/plain", etag="v1")
+        self.assertIsNone(CachedBody(b"tiny", "text/plain").encoding_for("gzip"))
+        self.assertEqual(body.encoding_for("gzip, deflate"), "gzip")
+        self.assertIsNone(body.encoding_for("gzip;q=0, identity"))
+        self.assertIsNone(body.encoding_for(""))
+        self.assertTrue(body.not_modified('"other", "v1-gz"'))
+        self.assertTrue(body.not_modified('W/"v1"'))
+        self.assertFalse(body.not_modified('"v2"'))
+        self.assertFalse(body.not_modified(None))
+
+
+class TestCachedEndpoints(AppTestCase):
+    def setUp(self) -> None:
+        metrics.reset()
+        super().setUp()
+        self.menu_path = self.tmp / "data" / "hotpot_menu.json"
+        self.patch_app(_assets=AssetManifest(web_app.STATIC_DIR))
+
+    def test_index_and_hashed_assets(self) -> None:
+        page = self.client.get("/")
+        self.assertEqual(page.headers["cache-control"], "no-cache")
+        self.assertNotIn("/static/js/", page.text)
+        again = self.client.get("/", headers={"If-None-Match": page.headers["etag"]})
+        self.assertEqual((again.status_code, again.content), (304, b""))
+
+        url = web_app._assets.urls["js/chat.js"]
+        self.assertIn(url, page.text)
+        asset = self.client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(asset.status_code, 200)
+        self.assertEqual(asset.headers["cache-control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(asset.headers["content-encoding"], "gzip")
+        self.assertEqual(asset.content, (web_app.STATIC_DIR / "js" / "chat.js").read_bytes())
+        plain = self.client.get(url, headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", plain.headers)
+        self.assertEqual(self.client.get("/assets/js/chat.0000000000.js").status_code, 404)
+        # 原路径仍可访问（调试与旧页面）
+        self.assertEqual(self.client.get("/static/js/chat.js").status_code, 200)
+
+    def test_ingredients_etag_follows_menu_version(self) -> None:
+        resp = self.client.get("/api/ingredients")
+        self.assertEqual(resp.status_code, 200)
+        items = resp.json()["ingredients"]
+        menu = self.registry.get(DEFAULT_STORE_ID).menu_index
+        self.assertEqual(len(items), len(menu.ingredients))
+        self.assertEqual(set(items[0]), {"id", "name_cn", "name_en"})
+        etag = resp.headers["etag"]
+        self.assertIn(menu.version, etag)
+        self.assertEqual(self.client.get("/api/ingredients", headers={"If-None-Match": etag}).status_code, 304)
+        self.assertEqual(metrics.get("http.not_modified"), 1)
+
+        raw = json.loads(self.menu_path.read_text(encoding="utf-8"))
+        raw["ingredients"] = raw["ingredients"][1:]
+        self.menu_path.write_text(json.dumps(raw, ensure_ascii=False), encoding="utf-8")
+        self.registry.reload(DEFAULT_STORE_ID)
+        fresh = self.client.get("/api/ingredients", headers={"If-None-Match": etag})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh.headers["etag"], etag)
+        self.assertEqual(len(fresh.json()["ingredients"]), len(items) - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试离线批量问答：多 query 检索与逐条检索结果一致（Chroma 与只读索引包）、问题只批量编码一次、
+FAQ 命中直接输出、并发受限与失败记录、结果文件续跑，以及 python main.py ask 与 POST /api/rag/batch。
+用临时目录、假 embedding 与假生成链，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import importlib
+import io
+import json
+import sys
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from fastapi.testclient import TestClient
+
+from helpers import FakeEmbeddings, make_registry, temp_dir
+import main as cli
+from core import RAG, metrics, scheduler
+from core.query import QueryContext
+from core.rag import build_index_bundle
+from web.batch import answered_questions, iter_batch_answers, read_questions
+from web.faq import FAQTable
+from web.stores import DEFAULT_STORE_ID
+
+web_app = importlib.import_module("web.app")
+
+QUESTIONS = ["毛肚涮多久比较好？", "虾滑要煮几分钟？", "鸭血适合什么人？", "番茄锅底辣不辣？", "海带怎么涮？"]
+FAILING = "毛肚涮多久比较好？fail"
+_KB = "【67 种食材详细介绍】\n" + "\n".join([
+    "1. 毛肚：七上八下，涮约 15 秒口感最脆。",
+    "2. 虾滑：下锅后煮 3 分钟浮起即可。",
+    "3. 鸭血：煮 5 分钟左右，嫩滑入味，适合老人和小孩。",
+    "4. 海带：煮 3 分钟，口感爽滑。",
+    "5. 肥牛：涮 10 秒变色即可，蘸麻酱。",
+    "6. 藕片：煮 4 分钟，脆口清甜。",
+]) + "\n\n番茄锅底：酸甜不辣，适合不吃辣的客人。"
+
+
+class _FakeChain:
+    """记录最大并发数；问题含 fail 时抛异常。"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = self.peak = self.calls = 0
+
+    def invoke(self, inputs: dict) -> str:
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay)
+            if "fail" in inputs["input"]:
+                raise RuntimeError("quota exceeded")
+            return f"答：{inputs['input']}"
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class _BatchCase(unittest.TestCase):
+    def setUp(self) -> None:
+        metrics.reset()
+        self.tmp = temp_dir(self)
+        self.emb = FakeEmbeddings()
+        self.registry = make_registry(self.tmp, _KB, self.emb)
+        self.store = self.registry.get(DEFAULT_STORE_ID)
+        self.store.load_knowledge()
+        self.chain = _FakeChain()
+        patch = mock.patch.object(self.store.rag, "_get_combine_chain", new=lambda: self.chain)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+
+class TestSearchBatch(_BatchCase):
+    def _assert_same(self, rag: RAG) -> None:
+        vecs = [self.emb._vec(q) for q in QUESTIONS]
+        boosts = [None, "虾滑", None, None, "海带"]
+        batch = rag.search_batch(QUESTIONS, vecs, top_k=2, boosts=boosts)
+        for q, v, b, found in zip(QUESTIONS, vecs, boosts, batch):
+            single = rag.search(q, top_k=2, boost_contains=b, query_vec=v)
+            self.assertEqual([d.page_content for d in found.docs], [d.page_content for d in single.docs])
+            self.assertEqual([round(s, 5) for s in found.scores], [round(s, 5) for s in single.scores])
+
+    def test_chroma_matches_single_queries(self) -> None:
+        self._assert_same(self.store.rag)
+
+    def test_index_bundle_matches_single_queries(self) -> None:
+        index_dir = self.tmp / "index"
+        build_index_bundle([self.tmp / "data" / "sample.txt"], index_dir, "h", embeddings=self.emb)
+        rag = RAG.open_prebuilt(index_dir, "h", embeddings=self.emb)
+        self.assertTrue(rag.read_only)
+        self._assert_same(rag)
+        many = rag._vectorstore.search_many_with_vectors([self.emb._vec(q) for q in QUESTIONS[:2]], 3)
+        self.assertEqual([len(docs) for docs, _ in many], [3, 3])
+
+    def test_query_context_batch_embeds_once(self) -> None:
+        calls = self.emb.document_calls
+        queries = QueryContext.batch(QUESTIONS, self.emb)
+        self.assertEqual(self.emb.document_calls, calls + 1)
+        self.assertAlmostEqual(float((queries[0].vector ** 2).sum()), 1.0, places=5)
+        self.assertEqual(self.emb.query_calls, 0)
+        self.assertEqual(metrics.get("embed.batch_queries"), len(QUESTIONS))
+
+
+class TestBatchAnswers(_BatchCase):
+    def test_answers_all_with_bounded_concurrency(self) -> None:
+        self.chain.delay = 0.05
+        calls = self.emb.document_calls
+        rows = list(iter_batch_answers(self.store, QUESTIONS * 2, concurrency=3))
+        self.assertEqual(sorted(r["index"] for r in rows), list(range(len(QUESTIONS) * 2)))
+        self.assertTrue(all(r["answer"] == f"答：{r['question']}" and r["source"] == "rag" for r in rows))
+        self.assertLessEqual(self.chain.peak, 3)
+        self.assertGreater(self.chain.peak, 1)
+        # 问题只在开头批量编码一次，逐条作答时不再编码
+        self.assertEqual(self.emb.document_calls, calls + 1)
+        self.assertEqual(self.emb.query_calls, 0)
+
+    def test_faq_hits_skip_generation(self) -> None:
+        entry = {"question": QUESTIONS[0], "questions": [QUESTIONS[0]], "answer": "15 秒"}
+        self.store._faq_table = FAQTable(self.store.kb_hash, [entry])
+        rows = list(iter_batch_answers(self.store, QUESTIONS[:2]))
+        self.assertEqual(rows[0], {**rows[0], "index": 0, "source": "faq", "answer": "15 秒"})
+        self.assertEqual(rows[1]["source"], "rag")
+        self.assertEqual((self.chain.calls, metrics.get("batch.faq_hits")), (1, 1))
+
+    def test_errors_recorded_and_resume(self) -> None:
+        rows = list(iter_batch_answers(self.store, [FAILING, QUESTIONS[1]], strict=True))
+        failed = next(r for r in rows if r["index"] == 0)
+        self.assertIn("quota exceeded", failed["error"])
+        self.assertEqual(metrics.get("batch.errors"), 1)
+
+        out = self.tmp / "answers.jsonl"
+        out.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in rows) + '\n{"question": "半行', encoding="utf-8")
+        self.assertEqual(answered_questions(out), {QUESTIONS[1]})
+        self.assertEqual(answered_questions(self.tmp / "missing.jsonl"), set())
+
+    def test_early_close_cancels_pending(self) -> None:
+        self.chain.delay = 0.05
+        rows = iter_batch_answers(self.store, QUESTIONS * 4, concurrency=1)
+        next(rows)
+        rows.close()
+        time.sleep(0.2)
+        self.assertLess(self.chain.calls, len(QUESTIONS) * 4)
+
+
+class TestAskCommand(_BatchCase):
+    def _ask(self, *extra: str) -> int:
+        argv = ["main.py", "ask", "--input", str(self.input), "--output", str(self.output), "--concurrency", "2", *extra]
+        saved = scheduler.get_scheduler()
+        try:
+            with mock.patch.object(sys, "argv", argv), mock.patch.object(web_app, "_stores", self.registry), \
+                    redirect_stdout(io.StringIO()) as out, mock.patch("sys.stderr", io.StringIO()):
+                code = cli.main()
+        finally:
+            scheduler._scheduler = saved
+        self.printed = out.getvalue()
+        return code or 0
+
+    def test_ask_and_resume(self) -> None:
+        self.input = self.tmp / "questions.txt"
+        self.output = self.tmp / "out" / "answers.jsonl"
+        self.input.write_text("# 注释\n" + "\n".join(QUESTIONS[:3]) + "\n\n" + FAILING + "\n", encoding="utf-8")
+        self.assertEqual(read_questions(self.input), QUESTIONS[:3] + [FAILING])
+
+        self.assertEqual(self._ask(), 1)
+        rows = [json.loads(line) for line in self.output.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual(sorted(r["index"] for r in rows), [0, 1, 2, 3])
+        self.assertIn("问/秒", self.printed)
+
+        # 续跑：已成功的跳过，只回答新的一条
+        self.input.write_text("\n".join(QUESTIONS[:3] + [QUESTIONS[4]]) + "\n", encoding="utf-8")
+        calls = self.chain.calls
+        self.assertEqual(self._ask("--resume"), 0)
+        self.assertEqual(self.chain.calls, calls + 1)
+        rows = [json.loads(line) for line in self.output.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual(rows[-1]["index"], 3)
+        self.assertEqual(answered_questions(self.output), set(QUESTIONS[:3]) | {QUESTIONS[4]})
+
+
+class TestBatchEndpoint(_BatchCase):
+    TOKEN = "secret-token"
+
+    def setUp(self) -> None:
+        super().setUp()
+        for p in (mock.patch.object(web_app, "ADMIN_TOKEN", self.TOKEN), mock.patch.object(web_app, "_stores", self.registry)):
+            p.start()
+            self.addCleanup(p.stop)
+        self.client = TestClient(web_app.app)
+
+    def test_streams_ndjson_with_summary(self) -> None:
+        body = {"questions": QUESTIONS, "concurrency": 2}
+        self.assertEqual(self.client.post("/api/rag/batch", json=body).status_code, 401)
+        self.assertEqual(
+            self.client.post("/api/rag/batch", json={"questions": []}, headers={"X-Admin-Token": self.TOKEN}).status_code,
+            422,
+        )
+        resp = self.client.post("/api/rag/batch", json=body, headers={"X-Admin-Token": self.TOKEN})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.headers["content-type"].startswith("application/x-ndjson"))
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        summary = lines.pop()
+        self.assertEqual((summary["done"], summary["questions"], summary["errors"]), (True, len(QUESTIONS), 0))
+        self.assertGreater(summary["questions_per_s"], 0)
+        self.assertEqual(sorted(r["index"] for r in lines), list(range(len(QUESTIONS))))
+
+
+if __name__ == "__main__":
+    unittest.main()
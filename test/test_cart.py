@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试服务端购物车：增量操作、旧格式兼容、PATCH /api/cart 的版本冲突处理，
+以及对话增减食材期间（await 路由时）落地的 PATCH 不被覆盖。对话部分用临时目录与假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from langchain_core.messages import AIMessage
+
+from concierge.menu_generator import generate_order_struct
+from concierge.menu_loader import get_menu_index
+from helpers import AppTestCase
+from web.cart import MAX_ITEM_QUANTITY, apply_cart_ops, merge_cart, normalize_cart
+from web.schemas import CartOp, CartPatchRequest
+
+# web 包导出了同名的 FastAPI 实例 app，这里取模块本身
+web_app = importlib.import_module("web.app")
+
+VALID = {"beef_sliced", "potato_slices", "bean_sprouts"}
+
+
+class TestCartOps(unittest.TestCase):
+    def test_normalize_legacy_list(self) -> None:
+        self.assertEqual(normalize_cart(["a", "b", "a"]), {"a": 2, "b": 1})
+        self.assertEqual(normalize_cart({"a": 1, "b": 0}), {"a": 1})
+        self.assertEqual(normalize_cart(None), {})
+
+    def test_apply_ops(self) -> None:
+        cart, rejected = apply_cart_ops(
+            {"beef_sliced": 1},
+            [
+                {"op": "add", "id": "beef_sliced"},
+                {"op": "set", "id": "potato_slices", "quantity": 3},
+                {"op": "add", "id": "unknown"},
+                {"op": "remove", "id": "bean_sprouts"},
+                {"op": "set", "id": "beef_sliced", "quantity": 999},
+            ],
+            VALID,
+        )
+        self.assertEqual(cart, {"beef_sliced": MAX_ITEM_QUANTITY, "potato_slices": 3})
+        self.assertEqual([op["id"] for op in rejected], ["unknown"])
+        cart, _ = apply_cart_ops(cart, [{"op": "set", "id": "potato_slices", "quantity": 0}], VALID)
+        self.assertEqual(cart, {"beef_sliced": MAX_ITEM_QUANTITY})
+
+    def test_merge_cart(self) -> None:
+        base = {"beef_sliced": 1, "potato_slices": 1}
+        ours = {"beef_sliced": 2, "bean_sprouts": 1}
+        theirs = {"beef_sliced": 1, "potato_slices": 4, "tofu": 1}
+        # ours 改动的食材（加量、移除、新增）以 ours 为准，其余保留 theirs
+        self.assertEqual(merge_cart(base, ours, theirs), {"beef_sliced": 2, "bean_sprouts": 1, "tofu": 1})
+        self.assertEqual(merge_cart(base, base, theirs), theirs)
+
+    def test_order_uses_quantity(self) -> None:
+        profile = {"num_guests": 2, "broth_id": "tomato_herbs"}
+        one = generate_order_struct(profile, {"beef_sliced": 1})
+        two = generate_order_struct(profile, {"beef_sliced": 2})
+        self.assertEqual(two.items[0].quantity, one.items[0].quantity * 2)
+
+
+class TestCartPatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.session_id = "test-cart-session"
+        web_app._sessions[self.session_id] = {"cart": ["beef_sliced"], "cart_version": 3}
+
+    def tearDown(self) -> None:
+        web_app._sessions.pop(self.session_id, None)
+
+    def _patch(self, version: int, *ops: CartOp) -> dict:
+        req = CartPatchRequest(session_id=self.session_id, version=version, ops=list(ops))
+        return asyncio.run(web_app.cart_patch(req))
+
+    def test_patch_applies_delta_and_bumps_version(self) -> None:
+        out = self._patch(3, CartOp(op="add", id="potato_slices"), CartOp(op="remove", id="beef_sliced"))
+        self.assertTrue(out["ok"])
+        self.assertEqual(out["cart"], {"potato_slices": 1})
+        self.assertEqual(out["version"], 4)
+        # 无实际变化的操作不增加版本号
+        out = self._patch(4, CartOp(op="remove", id="beef_sliced"))
+        self.assertEqual(out["version"], 4)
+
+    def test_stale_version_conflicts(self) -> None:
+        out = self._patch(2, CartOp(op="add", id="potato_slices"))
+        self.assertFalse(out["ok"])
+        self.assertEqual(out["error"], "version_conflict")
+        self.assertEqual(out["cart"], {"beef_sliced": 1})
+        self.assertEqual(out["version"], 3)
+
+    def test_menu_index_cached(self) -> None:
+        self.assertIs(get_menu_index(), get_menu_index())
+        self.assertIn("beef_sliced", get_menu_index().ingredient_ids)
+
+
+class TestChatCartRace(AppTestCase):
+    """对话在线程池里路由 / 跑 Concierge 时，前端的 PATCH 可能先落地：写回时不能覆盖它，版本号也不能回退。"""
+
+    def setUp(self) -> None:
+        super().setUp()
+        rec = self.client.post("/api/recommend", json={"num_guests": 1}).json()
+        self.sid, self.version = rec["session_id"], rec["cart_version"]
+
+    def _concurrent_patch(self, *ops: dict) -> None:
+        """模拟 await 期间落地的 PATCH /api/cart。"""
+        version = self.sessions[self.sid]["cart_version"]
+        out = self.client.patch("/api/cart", json={"session_id": self.sid, "version": version, "ops": list(ops)}).json()
+        self.assertTrue(out["ok"])
+
+    def test_chat_edit_keeps_concurrent_patch(self) -> None:
+        def route(query, store):
+            self._concurrent_patch({"op": "set", "id": "potato_slices", "quantity": 3})
+            return web_app.INTENT_CART_EDIT
+
+        with mock.patch.object(web_app, "_route_intent", side_effect=route), \
+                mock.patch.object(web_app, "parse_add_remove_item", return_value=("taro_slices", True)):
+            self.client.post("/api/chat", json={"session_id": self.sid, "message": "加芋头片"})
+        state = self.sessions[self.sid]
+        self.assertEqual(state["cart"]["potato_slices"], 3)
+        self.assertIn("taro_slices", state["cart"])
+        self.assertEqual(state["cart_version"], self.version + 2)
+
+    def test_concierge_merges_concurrent_patch(self) -> None:
+        def concierge(user_msg, state, **kwargs):
+            self._concurrent_patch({"op": "set", "id": "potato_slices", "quantity": 3})
+            cart = {**state["cart"], "taro_slices": 1}
+            return {**state, "cart": cart, "messages": [AIMessage(content="已加芋头片")]}
+
+        with mock.patch.object(web_app, "_route_intent", return_value=web_app.INTENT_ORDER), \
+                mock.patch.object(web_app, "run_concierge_once", side_effect=concierge):
+            resp = self.client.post("/api/chat", json={"session_id": self.sid, "message": "再来点芋头"}).json()
+        self.assertEqual(resp["reply"], "已加芋头片")
+        state = self.sessions[self.sid]
+        self.assertEqual(state["cart"]["potato_slices"], 3)
+        self.assertIn("taro_slices", state["cart"])
+        self.assertEqual(state["cart_version"], self.version + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
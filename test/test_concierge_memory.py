@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试点餐顾问的有界对话记忆：消息窗口裁剪、原话窗口长度上限、早期要点（人数、过敏）在长对话中不丢失、长对话下 prompt 大小恒定。
+LLM 用假对象代替，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from concierge.graph import run_concierge_once
+from concierge.memory import FACT_LIST_MAX_ITEMS, PROFILE_LIST_MAX_ITEMS, ConversationMemory, merge_facts, prompt_lines
+
+
+class _FakeLLM:
+    """记录每次收到的 prompt，始终要求继续追问（停留在 profiler）。"""
+
+    def __init__(self):
+        self.prompts: list[str] = []
+
+    def invoke(self, messages):
+        self.prompts.append("\n".join(m.content for m in messages))
+        n = len(self.prompts)
+        out = {
+            "profile": {"spice_tolerance": "mild", "allergies": [f"a{i}" for i in range(n)], "num_guests": 2},
+            "need_more": True,
+            "next_question": f"第 {n} 个问题：还有什么忌口吗？",
+        }
+        return AIMessage(content=json.dumps(out, ensure_ascii=False))
+
+
+class TestConversationMemory(unittest.TestCase):
+    def test_compact_keeps_window_and_folds_overflow(self) -> None:
+        memory = ConversationMemory(window=4, digest_max_chars=200)
+        msgs = [HumanMessage(content=f"消息{i}") for i in range(10)]
+        out = memory.compact({"messages": msgs})
+        self.assertEqual([m.content for m in out["messages"]], ["消息6", "消息7", "消息8", "消息9"])
+        self.assertIn("消息5", out["conversation_digest"])
+        self.assertIn("消息0", out["conversation_digest"])
+
+    def test_digest_is_bounded(self) -> None:
+        memory = ConversationMemory(window=2, digest_max_chars=100)
+        state: dict = {"messages": []}
+        for i in range(200):
+            state["messages"] = list(state["messages"]) + [HumanMessage(content=f"第{i}轮：我想要微辣的锅底")]
+            state.update(memory.compact(state))
+        self.assertLessEqual(len(state["conversation_digest"]), 100)
+        self.assertIn("第199轮", state["messages"][-1].content)
+        self.assertIn("第197轮", state["conversation_digest"])
+
+    def test_early_facts_survive_folding(self) -> None:
+        memory = ConversationMemory(window=2, digest_max_chars=60)
+        state: dict = {"messages": [], "customer_profile": {"num_guests": 4, "allergies": ["海鲜"], "spice_tolerance": "mild"}}
+        for i in range(50):
+            state["messages"] = list(state["messages"]) + [HumanMessage(content=f"第{i}轮：再看看有什么好吃的")]
+            state.update(memory.compact(state))
+            if i >= 2:
+                # 第 0 轮移出窗口之后，画像漏写了人数与过敏、换了辣度（模型只看得到窗口内的消息）
+                state["customer_profile"] = {"spice_tolerance": "high"}
+        self.assertNotIn("第0轮", state["conversation_digest"])
+        self.assertEqual(state["conversation_facts"], {"num_guests": 4, "spice_tolerance": "high", "allergies": ["海鲜"]})
+        self.assertIn("过敏 海鲜", "\n".join(prompt_lines(state, state["customer_profile"])))
+
+        many = merge_facts({}, {"allergies": [f"a{i}" for i in range(FACT_LIST_MAX_ITEMS + 5)]})
+        self.assertEqual(many["allergies"], [f"a{i}" for i in range(5, FACT_LIST_MAX_ITEMS + 5)])
+
+    def test_withdrawn_allergy_leaves_facts(self) -> None:
+        memory = ConversationMemory(window=2, digest_max_chars=60)
+        state: dict = {"messages": [], "customer_profile": {"num_guests": 2, "allergies": ["海鲜", "花生"], "dislikes": ["香菜"]}}
+        for i in range(6):
+            state["messages"] = list(state["messages"]) + [HumanMessage(content=f"第{i}轮：再看看")]
+            state.update(memory.compact(state))
+        self.assertEqual(state["conversation_facts"]["allergies"], ["海鲜", "花生"])
+        # 窗口已经滑过之后客人说其实不过敏花生、香菜也可以吃
+        state["customer_profile"] = {"num_guests": 2, "allergies": ["海鲜"], "dislikes": []}
+        for i in range(6, 9):
+            state["messages"] = list(state["messages"]) + [HumanMessage(content=f"第{i}轮：花生没问题，香菜也能吃")]
+            state.update(memory.compact(state))
+        self.assertEqual(state["conversation_facts"], {"num_guests": 2, "allergies": ["海鲜"]})
+        self.assertEqual(prompt_lines(state, state["customer_profile"])[0], "更早的对话中已确认：人数 2；过敏 海鲜")
+
+    def test_long_conversation_prompt_and_state_stay_flat(self) -> None:
+        fake = _FakeLLM()
+        memory = ConversationMemory(window=6, digest_max_chars=300)
+        state = None
+        with mock.patch("concierge.graph.get_llm", return_value=fake):
+            for i in range(100):
+                state = run_concierge_once(f"第{i}轮：我们 2 个人，微辣", state, memory=memory)
+        self.assertLessEqual(len(state["messages"]), 6)
+        self.assertLessEqual(len(state["conversation_digest"]), 300)
+        self.assertLessEqual(len(state["customer_profile"]["allergies"]), PROFILE_LIST_MAX_ITEMS)
+        # 窗口与摘要填满之后，每轮 prompt 长度基本不变
+        steady = [len(p) for p in fake.prompts[20:]]
+        self.assertLess(max(steady) - min(steady), 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
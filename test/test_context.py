@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试上下文组装（去重、MMR、token 预算装箱），用手写向量，不加载 embedding 模型。
+"""
+from __future__ import annotations
+
+import sys
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from langchain_core.documents import Document
+
+from core.context import build_context, estimate_tokens
+
+
+def _docs(*texts: str) -> list[Document]:
+    return [Document(page_content=t) for t in texts]
+
+
+class TestContextBuilder(unittest.TestCase):
+    def test_estimate_tokens(self) -> None:
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("牛肉片"), 3)
+        self.assertEqual(estimate_tokens("beef"), 1)
+
+    def test_exact_and_near_duplicates_dropped(self) -> None:
+        docs = _docs("牛肉片涮 8 秒。", "牛肉片涮 8 秒。", "牛肉片涮八秒。", "豆芽煮 10 秒。")
+        vecs = [[1, 0, 0], [1, 0, 0], [0.99, 0.01, 0], [0, 1, 0]]
+        out, stats = build_context([1, 0, 0], docs, vecs, max_docs=4)
+        self.assertEqual([d.page_content for d in out], ["牛肉片涮 8 秒。", "豆芽煮 10 秒。"])
+        self.assertEqual(stats.duplicates, 2)
+        self.assertLess(stats.tokens_out, stats.tokens_in)
+
+    def test_mmr_prefers_diverse_chunks(self) -> None:
+        docs = _docs("甲", "乙", "丙")
+        # 乙与甲高度相似（但未到近重复阈值），丙相关度略低但信息不同
+        vecs = [[1, 0, 0], [0.9, 0.43, 0], [0.7, 0, 0.71]]
+        out, _ = build_context([1, 0, 0], docs, vecs, max_docs=2, mmr_lambda=0.3)
+        self.assertEqual([d.page_content for d in out], ["甲", "丙"])
+
+    def test_priority_chunk_stays_first(self) -> None:
+        docs = _docs("锅底介绍。", "竹轮煮 3 分钟。")
+        vecs = [[1, 0], [0, 1]]
+        out, _ = build_context([1, 0], docs, vecs, max_docs=2, priority="竹轮")
+        self.assertEqual(out[0].page_content, "竹轮煮 3 分钟。")
+
+    def test_token_budget_trims_by_sentence(self) -> None:
+        docs = _docs("一二三四五。六七八九十。", "甲乙丙丁戊己庚辛壬癸。")
+        vecs = [[1, 0], [0, 1]]
+        out, stats = build_context([1, 0], docs, vecs, max_docs=2, token_budget=16)
+        self.assertEqual(out[0].page_content, "一二三四五。六七八九十。")
+        # 第二块放不下整句，被裁掉
+        self.assertEqual(len(out), 1)
+        self.assertLessEqual(stats.tokens_out, 16)
+        out, stats = build_context([0, 1], docs, vecs, max_docs=2, token_budget=18)
+        self.assertEqual([d.page_content for d in out], ["甲乙丙丁戊己庚辛壬癸。", "一二三四五。"])
+        self.assertEqual(stats.trimmed, 1)
+
+    def test_empty_docs(self) -> None:
+        out, stats = build_context([1, 0], [], [], max_docs=3)
+        self.assertEqual(out, [])
+        self.assertEqual(stats.chunks_out, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
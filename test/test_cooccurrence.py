@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试「常一起点」：向量化统计与逐单增量的同现计数一致、NPMI 邻居的排序与门槛（人人都点的食材不算互补）、
+邻居不变时不换快照、从订单日志读取（首次整体统计、之后增量，跳过已取消）、建议表按过敏项过滤并跳过购物车中的食材，
+以及 PATCH /api/cart 与对话加菜返回的建议。用临时目录与假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import importlib
+import itertools
+import random
+import sys
+import unittest
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from concierge.menu_loader import get_menu_index
+from helpers import AppTestCase, temp_dir
+from web import cooccurrence
+from web.cooccurrence import CooccurrenceModel, SuggestionTable, pair_counts
+from web.orders import ORDER_CANCELLED, OrderStore, SnapshotRefresher
+from web.recommendation import ALLERGY_SEAFOOD
+from web.stores import DEFAULT_STORE_ID, StoreContext
+
+web_app = importlib.import_module("web.app")
+
+
+def _order(*item_ids: str) -> dict:
+    return {"broths": [{"broth_id": "tomato_herbs", "quantity": 1}],
+            "items": [{"menu_item_id": iid, "quantity": 1.0} for iid in item_ids]}
+
+
+# 芋头片常与黑木耳、鱼丸（海鲜）同单；甜玉米每单都有，与谁都不算互补
+HISTORY = (
+    [_order("taro_slices", "black_fungus", "fish_ball", "sweet_corn")] * 6
+    + [_order("taro_slices", "black_fungus", "sweet_corn")]
+    + [_order("white_mushroom", "sweet_corn")] * 6
+    + [_order("rice_cake", "sweet_corn")] * 4
+)
+
+
+class TestCooccurrenceModel(unittest.TestCase):
+    def test_pair_counts_vectorized(self) -> None:
+        rng = random.Random(3)
+        # 订单内可有重复食材（同一食材分两行下单）
+        baskets = [rng.choices(range(40), k=rng.randint(0, 12)) for _ in range(300)]
+        expected = Counter(p for b in baskets for p in itertools.combinations(sorted(set(b)), 2))
+        # 稠密矩阵乘法、枚举食材对后 bincount / 排序计数三种实现，分批处理
+        for vocab_limit, count_limit in ((cooccurrence.DENSE_VOCAB_LIMIT, 64 * 40), (0, 64 * 40), (0, 100)):
+            with mock.patch.object(cooccurrence, "DENSE_VOCAB_LIMIT", vocab_limit), \
+                    mock.patch.object(cooccurrence, "REBUILD_CHUNK_ORDERS", 64), \
+                    mock.patch.object(cooccurrence, "DENSE_COUNT_LIMIT", count_limit):
+                rows, cols, pairs, items = pair_counts(baskets, 40)
+                self.assertEqual(len(pair_counts([], 5)[0]), 0)
+            self.assertEqual(dict(zip(zip(rows.tolist(), cols.tolist()), pairs.tolist())), dict(expected))
+            self.assertEqual(items.tolist(), [sum(i in b for b in baskets) for i in range(40)])
+
+    def test_npmi_neighbours(self) -> None:
+        model = CooccurrenceModel(min_pairs=3)
+        for order in HISTORY:
+            model.record(order, DEFAULT_STORE_ID)
+        neighbours = model.refresh().for_store(DEFAULT_STORE_ID)
+        self.assertEqual([b for b, _ in neighbours["taro_slices"]], ["black_fungus", "fish_ball"])
+        self.assertEqual(neighbours["taro_slices"][0][1], 1.0)
+        self.assertAlmostEqual(neighbours["taro_slices"][1][1], 0.852, places=3)
+        self.assertNotIn("sweet_corn", neighbours)
+        self.assertNotIn("white_mushroom", neighbours)
+
+        strict = CooccurrenceModel(min_pairs=7)
+        for order in HISTORY:
+            strict.record(order, DEFAULT_STORE_ID)
+        self.assertEqual(strict.refresh().for_store(DEFAULT_STORE_ID)["taro_slices"], (("black_fungus", 1.0),))
+
+    def test_rebuild_matches_incremental(self) -> None:
+        incremental, rebuilt = CooccurrenceModel(min_pairs=1), CooccurrenceModel(min_pairs=1)
+        for order in HISTORY:
+            incremental.record(order, DEFAULT_STORE_ID)
+        incremental.record(_order("taro_slices", "rice_cake"), "east")
+        self.assertEqual(rebuilt.rebuild([(DEFAULT_STORE_ID, o) for o in HISTORY] + [("east", _order("taro_slices", "rice_cake"))]), 18)
+        snap = rebuilt.refresh()
+        self.assertEqual(snap.neighbours, incremental.refresh().neighbours)
+        self.assertEqual(snap.for_store("east"), {"taro_slices": (("rice_cake", 1.0),), "rice_cake": (("taro_slices", 1.0),)})
+        self.assertEqual(len(rebuilt), len(incremental))
+
+        # 邻居不变时不换快照
+        rebuilt.record(_order("taro_slices", "black_fungus", "sweet_corn"), DEFAULT_STORE_ID)
+        self.assertIs(rebuilt.refresh(), snap)
+        stats = rebuilt.stats(DEFAULT_STORE_ID, "taro_slices")["stores"][DEFAULT_STORE_ID]
+        self.assertEqual(stats["orders"], 18)
+        self.assertEqual(stats["neighbours"][0][::2], ["black_fungus", 8])
+
+    def test_ingest_from_order_log(self) -> None:
+        tmp = temp_dir(self)
+        orders = OrderStore(tmp / "orders.db", commit_delay=0)
+        self.addCleanup(orders.close)
+        for order in HISTORY:
+            orders.append(order, "s", DEFAULT_STORE_ID).result()
+        cancelled = orders.append(_order("taro_slices", "rice_cake"), "s", DEFAULT_STORE_ID).result()
+        orders.update_status(cancelled["order_id"], ORDER_CANCELLED).result()
+        model = CooccurrenceModel(min_pairs=3)
+        with mock.patch.object(model, "record", wraps=model.record) as record:
+            self.assertEqual(model.ingest(orders), len(HISTORY))
+            record.assert_not_called()
+        self.assertEqual(model.ingest(orders), 0)
+        orders.append(_order("taro_slices", "fish_ball"), "s", DEFAULT_STORE_ID).result()
+        self.assertEqual(model.ingest(orders), 1)
+        taro = model.refresh().for_store(DEFAULT_STORE_ID)["taro_slices"]
+        self.assertEqual({b for b, _ in taro}, {"black_fungus", "fish_ball"})
+        self.assertNotIn("rice_cake", {b for b, _ in taro})
+
+        # 计入之后被取消的订单逐对扣回，计数与从未计入时一致
+        before = model.stats(DEFAULT_STORE_ID, "taro_slices")
+        late = orders.append(_order("taro_slices", "rice_cake", "fish_ball"), "s", DEFAULT_STORE_ID).result()
+        self.assertEqual(model.ingest(orders), 1)
+        orders.update_status(late["order_id"], ORDER_CANCELLED).result()
+        self.assertEqual(model.ingest(orders), 1)
+        self.assertEqual(model.ingest(orders), 0)
+        model.refresh()
+        self.assertEqual(model.stats(DEFAULT_STORE_ID, "taro_slices"), before)
+        self.assertNotIn((min(model._index["rice_cake"], model._index["fish_ball"]),
+                          max(model._index["rice_cake"], model._index["fish_ball"])),
+                         model._stores[DEFAULT_STORE_ID].pairs)
+
+
+class TestSuggestionTable(unittest.TestCase):
+    def test_allergies_and_cart(self) -> None:
+        menu = get_menu_index()
+        neighbours = {
+            "taro_slices": (("fish_ball", 0.9), ("black_fungus", 0.8), ("not_on_menu", 0.7), ("rice_cake", 0.6)),
+            "not_on_menu": (("taro_slices", 0.9),),
+        }
+        table = SuggestionTable(menu, neighbours, cooccurrence_version=2)
+        self.assertEqual(table.cooccurrence_version, 2)
+        self.assertEqual(table.suggest("taro_slices", []), ["fish_ball", "black_fungus"])
+        self.assertEqual(table.suggest("taro_slices", [ALLERGY_SEAFOOD, "香菜"]), ["black_fungus", "rice_cake"])
+        self.assertEqual(table.suggest("taro_slices", [], cart={"fish_ball": 1}, k=3), ["black_fungus", "rice_cake"])
+        self.assertEqual(table.suggest("not_on_menu", []), [])
+        self.assertEqual(SuggestionTable(menu).suggest("taro_slices", []), [])
+
+
+class TestSuggestionEndpoints(AppTestCase):
+    TOKEN = "admin-token"
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.orders = OrderStore(self.tmp / "orders.db", commit_delay=0)
+        self.addCleanup(self.orders.close)
+        self.model = CooccurrenceModel(min_pairs=3)
+        self.patch_app(_orders=self.orders, _cooccurrence=self.model, ADMIN_TOKEN=self.TOKEN)
+        for order in HISTORY:
+            self.orders.append(order, "s", DEFAULT_STORE_ID).result()
+
+    def test_cart_patch_suggestions(self) -> None:
+        rec = self.client.post("/api/recommend", json={"num_guests": 1}).json()
+        patch = {"session_id": rec["session_id"], "version": rec["cart_version"],
+                 "ops": [{"op": "set", "id": "taro_slices", "quantity": 1}]}
+        self.assertEqual(self.client.patch("/api/cart", json=patch).json()["suggestions"], [])
+
+        headers = {"X-Admin-Token": self.TOKEN}
+        self.assertEqual(self.client.post("/api/admin/cooccurrence/refresh").status_code, 401)
+        refreshed = self.client.post("/api/admin/cooccurrence/refresh", headers=headers).json()
+        self.assertEqual(refreshed, {"version": 1, "stores_rebuilt": 1})
+        self.assertEqual(self.registry.get(DEFAULT_STORE_ID).suggestions.cooccurrence_version, 1)
+
+        patch = {"session_id": rec["session_id"], "version": rec["cart_version"] + 1, "ops": [{"op": "remove", "id": "taro_slices"}]}
+        resp = self.client.patch("/api/cart", json=patch).json()
+        self.assertEqual(resp["suggestions"], [])
+        patch = {"session_id": rec["session_id"], "version": resp["version"], "ops": [{"op": "add", "id": "taro_slices"}]}
+        resp = self.client.patch("/api/cart", json=patch).json()
+        self.assertTrue(resp["ok"])
+        self.assertEqual([s["id"] for s in resp["suggestions"]], ["black_fungus", "fish_ball"])
+        self.assertEqual(resp["suggestions"][0]["name_cn"], "黑木耳")
+
+        # 已在购物车中的不再建议（按同一批里最后加入的食材查表）
+        self.client.patch("/api/cart", json={"session_id": rec["session_id"], "version": resp["version"],
+                                             "ops": [{"op": "remove", "id": "taro_slices"}]})
+        patch = {"session_id": rec["session_id"], "version": resp["version"] + 1,
+                 "ops": [{"op": "set", "id": "black_fungus", "quantity": 1}, {"op": "set", "id": "taro_slices", "quantity": 1}]}
+        resp = self.client.patch("/api/cart", json=patch).json()
+        self.assertEqual([s["id"] for s in resp["suggestions"]], ["fish_ball"])
+
+        self.client.post("/api/cart/update", json={"session_id": rec["session_id"], "cart": [it["id"] for it in rec["items"]]})
+        legacy = self.client.post("/api/cart/update", json={
+            "session_id": rec["session_id"], "cart": [it["id"] for it in rec["items"]] + ["taro_slices"],
+        }).json()
+        self.assertEqual([s["id"] for s in legacy["suggestions"]], ["black_fungus", "fish_ball"])
+        stats = self.client.get("/api/admin/cooccurrence", params={"item_id": "taro_slices"}, headers=headers).json()
+        self.assertEqual(stats["stores"][DEFAULT_STORE_ID]["neighbours"][0], ["black_fungus", 1.0, 7])
+
+    def test_chat_add_respects_allergies(self) -> None:
+        # 刷新只作用于已驻留的门店
+        self.registry.get(DEFAULT_STORE_ID)
+        SnapshotRefresher(self.model, self.orders, self.registry, StoreContext.apply_cooccurrence).refresh_once()
+        rec = self.client.post("/api/recommend", json={"num_guests": 1, "allergies": [ALLERGY_SEAFOOD]}).json()
+        with mock.patch.object(web_app, "_route_intent", return_value=web_app.INTENT_CART_EDIT), \
+                mock.patch.object(web_app, "parse_add_remove_item", return_value=("taro_slices", True)):
+            resp = self.client.post("/api/chat", json={"session_id": rec["session_id"], "message": "加芋头片"}).json()
+        self.assertEqual([s["id"] for s in resp["suggestions"]], ["black_fungus"])
+        self.assertIn("「黑木耳」", resp["reply"])
+        self.assertIn("确认", resp["reply"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试延迟预算、对冲调用与抽取式降级答案（不调用 LLM，用 sleep 模拟慢请求）。
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from core import metrics
+from core.deadline import Deadline, DeadlineExceeded, hedged_call
+from core.rag import _DEGRADED_PREFIX, _extractive_answer
+
+
+class TestDeadline(unittest.TestCase):
+    def setUp(self) -> None:
+        metrics.reset()
+
+    def test_deadline_remaining_and_expired(self) -> None:
+        d = Deadline.from_ms(50)
+        self.assertFalse(d.expired())
+        self.assertGreater(d.remaining(), 0)
+        time.sleep(0.06)
+        self.assertTrue(d.expired())
+        self.assertEqual(d.remaining(), 0.0)
+
+    def test_fast_primary_no_hedge(self) -> None:
+        result = hedged_call(lambda: "ok", Deadline(1.0), hedge_delay=0.2)
+        self.assertEqual(result, "ok")
+        self.assertEqual(metrics.get("llm.hedge_fired"), 0)
+
+    def test_slow_primary_hedge_wins(self) -> None:
+        calls = []
+        lock = threading.Lock()
+
+        def fn():
+            with lock:
+                calls.append(1)
+                n = len(calls)
+            # 第一次（主请求）很慢，第二次（对冲）很快
+            time.sleep(0.5 if n == 1 else 0.01)
+            return n
+
+        result = hedged_call(fn, Deadline(1.0), hedge_delay=0.05)
+        self.assertEqual(result, 2)
+        self.assertEqual(metrics.get("llm.hedge_fired"), 1)
+        self.assertEqual(metrics.get("llm.hedge_won"), 1)
+
+    def test_budget_exhausted_raises(self) -> None:
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            hedged_call(lambda: time.sleep(0.5), Deadline(0.1), hedge_delay=0.03)
+        self.assertLess(time.monotonic() - start, 0.3)
+
+    def test_both_fail_raises_last_error(self) -> None:
+        def fn():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            hedged_call(fn, Deadline(1.0), hedge_delay=0.01)
+
+    def test_extractive_answer_picks_matching_sentences(self) -> None:
+        chunks = [
+            "火锅起源于中国。肥牛卷涮 8-10 秒即可食用。毛肚七上八下。",
+            "蘸料可以用芝麻酱。",
+        ]
+        ans = _extractive_answer("肥牛卷涮多久", chunks, max_sentences=1)
+        self.assertTrue(ans.startswith(_DEGRADED_PREFIX))
+        self.assertIn("肥牛卷涮 8-10 秒", ans)
+        self.assertNotIn("毛肚", ans)
+
+
+if __name__ == "__main__":
+    unittest.main()
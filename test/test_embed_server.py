@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试本机 embedding 服务：客户端结果与直接编码一致、并发请求被合并成批、服务端错误透传。
+用假 embedding，不加载真实模型。
+"""
+from __future__ import annotations
+
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from langchain_core.embeddings import Embeddings
+
+from core.embed_server import EmbeddingClient, EmbeddingServer, wait_for_server
+
+
+class _FakeEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        if any(t == "boom" for t in texts):
+            raise ValueError("bad text")
+        return [[float(len(t)), float(ord(t[0]) if t else 0), 1.0] for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class TestEmbeddingServer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.socket_path = str(Path(self.tmp) / "embed.sock")
+        self.fake = _FakeEmbeddings()
+        self.server = EmbeddingServer(self.socket_path, self.fake, max_batch=64, max_wait_ms=50).start()
+        self.assertTrue(wait_for_server(self.socket_path, timeout=5))
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_client_matches_direct(self) -> None:
+        client = EmbeddingClient(self.socket_path)
+        texts = ["牛肉", "番茄锅底", "a"]
+        self.assertEqual(client.embed_documents(texts), _FakeEmbeddings().embed_documents(texts))
+        self.assertEqual(client.embed_query("虾滑"), [2.0, float(ord("虾")), 1.0])
+        self.assertEqual(client.embed_documents([]), [])
+
+    def test_concurrent_requests_are_batched(self) -> None:
+        client = EmbeddingClient(self.socket_path)
+        results: dict[int, list] = {}
+        barrier = threading.Barrier(8)
+
+        def worker(i: int) -> None:
+            barrier.wait()
+            results[i] = client.embed_query("x" * (i + 1))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([results[i][0] for i in range(8)], [float(i + 1) for i in range(8)])
+        self.assertEqual(self.server.requests, 8)
+        self.assertLess(self.server.batches, 8)
+
+    def test_server_error_is_raised(self) -> None:
+        client = EmbeddingClient(self.socket_path)
+        with self.assertRaises(RuntimeError):
+            client.embed_documents(["boom"])
+        # 出错后连接仍可继续使用
+        self.assertEqual(client.embed_query("ok")[0], 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试预计算 FAQ 答案表（生成时跳过无相关内容与降级答案、版本校验、问题归一化查表、语义查表只命中同一实体同一意图的条目）。
+不调用 LLM：answer_fn 用假函数代替。
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from langchain_core.embeddings import Embeddings
+
+from core.rag import _EMPTY_ANSWER, RAGAnswer
+from web.faq import FAQ_INTENTS, FAQTable, build_faq_table, normalize_question, question_intents
+
+_MENU = {
+    "ingredients": [
+        {"id": "beef_sliced", "name_cn": "牛肉片", "name_en": "Beef Slices"},
+        {"id": "bean_sprouts", "name_cn": "豆芽", "name_en": "Bean Sprouts"},
+    ],
+    "soup_bases": [
+        {"id": "tomato", "name_cn": "番茄火锅汤底", "name_en": "Tomato"},
+    ],
+}
+
+
+class _SameEmbeddings(Embeddings):
+    """所有文本同一个向量：相似度总为 1，语义查表是否命中只取决于实体与意图核对。"""
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [[1.0, 0.0] for _ in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return [1.0, 0.0]
+
+
+class TestFAQ(unittest.TestCase):
+    def test_normalize_question_ignores_punct_and_case(self) -> None:
+        self.assertEqual(normalize_question(" 牛肉片有什么特点？ "), normalize_question("牛肉片有什么特点?"))
+        self.assertEqual(normalize_question("Beef Slices 涮多久"), "beefslices涮多久")
+
+    def test_build_covers_every_entity_and_intent(self) -> None:
+        table = build_faq_table(lambda q: f"答：{q}", _MENU, "hash1", concurrency=3)
+        self.assertEqual(len(table), 3 * len(FAQ_INTENTS))
+        # 前端下拉发出的问题应直接命中
+        self.assertEqual(table.lookup("牛肉片有什么特点和涮煮建议？"), "答：牛肉片有什么特点和涮煮建议？")
+        self.assertIsNotNone(table.lookup("番茄火锅汤底有什么特点和适合什么人？"))
+        # 等价问法与英文名命中同一答案
+        self.assertEqual(table.lookup("豆芽煮多久"), table.lookup("豆芽涮多久？"))
+        self.assertIsNotNone(table.lookup("Bean Sprouts涮多久？"))
+        self.assertIsNone(table.lookup("火星菜有什么特点？"))
+
+    def test_semantic_lookup_checks_entity_and_intent(self) -> None:
+        table = build_faq_table(lambda q: f"答：{q}", _MENU, "hash1")
+        table.entries.append({"name": "", "intent": "特点", "question": "有什么特点？", "answer": "无实体"})
+        table.index_vectors(_SameEmbeddings())
+        vec = [1.0, 0.0]
+        self.assertEqual(table.lookup("牛肉片要涮多长时间呢", vec, entity="牛肉片"), "答：牛肉片涮多久？")
+        self.assertEqual(table.lookup("豆芽要涮多长时间呢", vec, entity="豆芽"), "答：豆芽涮多久？")
+        self.assertEqual(table.lookup("牛肉片怎么蘸才好吃", vec, entity="牛肉片"), "答：牛肉片配什么蘸料？")
+        self.assertEqual(question_intents("番茄火锅汤底有什么特点和适合什么人"), {"特点", "适合人群"})
+        # 没有匹配到菜单实体、实体不在表中、问题不属于任何意图时都不命中
+        self.assertIsNone(table.lookup("要涮多长时间呢", vec))
+        self.assertIsNone(table.lookup("毛肚要涮多长时间呢", vec, entity="毛肚"))
+        self.assertIsNone(table.lookup("牛肉片贵不贵", vec, entity="牛肉片"))
+        self.assertIsNone(table.lookup("这个有什么特点", vec, entity=""))
+
+    def test_failed_answers_are_skipped(self) -> None:
+        def answer_fn(q: str) -> str:
+            if q.startswith("豆芽"):
+                raise RuntimeError("quota")
+            return "ok"
+
+        table = build_faq_table(answer_fn, _MENU, "hash1", concurrency=2)
+        self.assertIsNone(table.lookup("豆芽有什么特点和涮煮建议？"))
+        self.assertEqual(table.lookup("牛肉片有什么特点和涮煮建议？"), "ok")
+
+    def test_empty_and_degraded_answers_are_skipped(self) -> None:
+        def answer_fn(q: str) -> RAGAnswer:
+            if q.startswith("豆芽"):
+                return RAGAnswer(_EMPTY_ANSWER)
+            if q.startswith("番茄"):
+                return RAGAnswer("（知识库快速摘要）番茄锅底酸甜开胃。", degraded=True)
+            return RAGAnswer("ok")
+
+        skipped: dict[str, str] = {}
+        table = build_faq_table(
+            answer_fn, _MENU, "hash1", on_progress=lambda done, total, job: skipped.update(
+                {job["name"]: job["skipped"]} if job.get("skipped") else {}
+            ),
+        )
+        self.assertEqual({e["name"] for e in table.entries}, {"牛肉片"})
+        self.assertIsNone(table.lookup("豆芽涮多久？"))
+        self.assertIsNone(table.lookup("番茄火锅汤底配什么蘸料？"))
+        self.assertEqual(table.lookup("牛肉片涮多久？"), "ok")
+        self.assertEqual(skipped, {"豆芽": "empty", "番茄火锅汤底": "degraded"})
+
+    def test_bounded_concurrency(self) -> None:
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def answer_fn(q: str) -> str:
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.005)
+            with lock:
+                active[0] -= 1
+            return "ok"
+
+        build_faq_table(answer_fn, _MENU, "hash1", concurrency=2)
+        self.assertLessEqual(active[1], 2)
+
+    def test_save_load_checks_kb_hash(self) -> None:
+        table = build_faq_table(lambda q: "ok", _MENU, "hash1")
+        with tempfile.TemporaryDirectory() as d:
+            path = Path(d) / "faq.json"
+            table.save(path)
+            loaded = FAQTable.load(path, kb_hash="hash1")
+            self.assertIsNotNone(loaded)
+            self.assertEqual(loaded.lookup("牛肉片涮多久"), "ok")
+            self.assertIsNone(FAQTable.load(path, kb_hash="hash2"))
+        self.assertIsNone(FAQTable.load(Path(d) / "missing.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
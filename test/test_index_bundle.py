@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试预构建只读索引包：构建、打开、检索结果与 Chroma 一致、过期回退与只读保护。
+用临时目录与假 embedding，不加载真实模型。
+"""
+from __future__ import annotations
+
+import sys
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from langchain_core.documents import Document
+
+from core import RAG, knowledge_hash
+from core.index_bundle import IndexBundle, ReadOnlyIndexError, read_manifest
+from core.rag import build_index_bundle, split_knowledge_file
+from helpers import FakeEmbeddings, temp_dir
+from web.stores import StoreRegistry
+
+_TEXT = "\n\n".join(
+    f"第{i}条：{name}建议涮{i + 5}秒，口感{taste}。"
+    for i, (name, taste) in enumerate([
+        ("毛肚", "爽脆"), ("鸭肠", "脆嫩"), ("肥牛", "鲜嫩"), ("虾滑", "弹牙"), ("黄喉", "爽口"), ("藕片", "清甜"),
+    ])
+) + "\n\n【67 种食材详细介绍】\n1. 鱼丸：煮至浮起即可。\n2. 虾丸：煮 3 分钟。\n3. 墨鱼丸：煮 4 分钟。"
+
+
+class TestIndexBundle(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = temp_dir(self)
+        self.data = self.tmp / "data"
+        self.data.mkdir()
+        self.kb = self.data / "sample.txt"
+        self.kb.write_text(_TEXT, encoding="utf-8")
+        self.emb = FakeEmbeddings(dim=32)
+        self.index_dir = self.data / "index"
+        self.kb_hash = knowledge_hash([self.kb])
+
+    def _build(self) -> dict:
+        return build_index_bundle([self.kb], self.index_dir, self.kb_hash, embeddings=self.emb, batch_size=4)
+
+    def test_manifest_describes_bundle(self) -> None:
+        manifest = self._build()
+        self.assertEqual(manifest, read_manifest(self.index_dir))
+        self.assertEqual(manifest["count"], len(split_knowledge_file(self.kb)))
+        self.assertEqual(manifest["dim"], 32)
+        self.assertEqual(manifest["source_hash"], self.kb_hash)
+        self.assertEqual(manifest["source_files"], ["sample.txt"])
+        self.assertTrue(manifest["splitter"]["ingredient_splitting"])
+        # 食材章节每条单独成块
+        bundle = IndexBundle(self.index_dir)
+        texts = [d.page_content for d in bundle.similarity_search_by_vector(self.emb._vec("虾丸"), k=20)]
+        self.assertIn("2. 虾丸：煮 3 分钟。", texts)
+
+    def test_search_matches_chroma(self) -> None:
+        self._build()
+        prebuilt = RAG.open_prebuilt(self.index_dir, self.kb_hash, embeddings=self.emb)
+        self.assertIsNotNone(prebuilt)
+        self.assertTrue(prebuilt.read_only)
+        chroma = RAG(collection_name="cmp", persist_directory=str(self.tmp / "chroma"), embeddings=self.emb)
+        chroma.ingest_file(str(self.kb))
+        self.assertEqual(prebuilt.count(), chroma.count())
+        n = chroma.count()
+        for q in ("毛肚涮多久", "虾丸煮几分钟", "藕片口感"):
+            # 假向量下多个块与问题等距，只比较第一名与全量集合（等距块的先后顺序不确定）
+            self.assertEqual(prebuilt.retrieve(q, top_k=1), chroma.retrieve(q, top_k=1), q)
+            self.assertEqual(sorted(prebuilt.retrieve(q, top_k=n)), sorted(chroma.retrieve(q, top_k=n)), q)
+            docs, vecs = prebuilt._search_by_vector(self.emb._vec(q), 3)
+            self.assertEqual(len(docs), len(vecs))
+
+    def test_stale_or_missing_bundle_is_ignored(self) -> None:
+        self.assertIsNone(RAG.open_prebuilt(self.index_dir, self.kb_hash, embeddings=self.emb))
+        self._build()
+        self.assertIsNone(RAG.open_prebuilt(self.index_dir, "other-hash", embeddings=self.emb))
+        self.assertIsNone(RAG.open_prebuilt(self.index_dir, self.kb_hash, embeddings=self.emb, chunk_size=200))
+        self.assertIsNone(
+            RAG.open_prebuilt(self.index_dir, self.kb_hash, embeddings=self.emb, embed_model_name="other-model")
+        )
+
+    def test_read_only(self) -> None:
+        self._build()
+        rag = RAG.open_prebuilt(self.index_dir, self.kb_hash, embeddings=self.emb)
+        with self.assertRaises(ReadOnlyIndexError):
+            rag.ingest_text("新增内容")
+        with self.assertRaises(ReadOnlyIndexError):
+            rag._vectorstore.add_documents([Document(page_content="x")])
+
+    def test_rebuild_replaces_bundle(self) -> None:
+        self._build()
+        self.kb.write_text(_TEXT + "\n\n第99条：午餐肉煮 1 分钟。", encoding="utf-8")
+        manifest = build_index_bundle([self.kb], self.index_dir, knowledge_hash([self.kb]), embeddings=self.emb)
+        self.assertEqual(IndexBundle(self.index_dir).count(), manifest["count"])
+        self.assertEqual(sorted(p.name for p in self.data.iterdir()), ["index", "sample.txt"])
+
+    def test_store_skips_ingest_with_bundle(self) -> None:
+        self._build()
+        registry = StoreRegistry(data_dir=self.data, persist_directory=str(self.tmp / "chroma"), embeddings=self.emb)
+        self.emb.texts = 0
+        store = registry.get()
+        store.load_knowledge()
+        self.assertTrue(store.rag.read_only)
+        self.assertEqual(store.rag.count(), read_manifest(self.index_dir)["count"])
+        # 知识块不再编码：只剩菜单实体向量（名称 + 扩展词各一条）
+        self.assertEqual(self.emb.texts, 2 * len(store.entities))
+        self.assertFalse((self.tmp / "chroma").exists())
+
+    def test_store_falls_back_when_stale(self) -> None:
+        self._build()
+        self.kb.write_text(_TEXT + "\n\n第99条：午餐肉煮 1 分钟。", encoding="utf-8")
+        registry = StoreRegistry(data_dir=self.data, persist_directory=str(self.tmp / "chroma"), embeddings=self.emb)
+        store = registry.get()
+        self.assertFalse(store.rag.read_only)
+        self.assertEqual(store.rag.count(), len(split_knowledge_file(self.kb)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试厨房备料看板：订单的食材份数 / 锅底锅数、确认 / 修改 / 关闭订单时合计的增量更新与幂等、按门店分开、
+增量帧只含变化项、从订单日志加载与同步其它 worker 的写入、SSE 合并一波下单为一帧，
+以及 /api/chat 确认与改订单状态后 GET /api/kitchen/board 的合计。用临时目录与假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import json
+import sys
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from core import metrics
+from helpers import AppTestCase, temp_dir
+from web.kitchen import KitchenBoard, board_events, order_portions
+from web.orders import ORDER_CLOSED, ORDER_OPEN, OrderStore
+from web.stores import DEFAULT_STORE_ID
+
+web_app = importlib.import_module("web.app")
+
+
+def _order(items: dict[str, float], broths: dict[str, int] | None = None) -> dict:
+    return {
+        "num_guests": 2,
+        "broths": [{"broth_id": b, "quantity": q} for b, q in (broths or {"tomato_herbs": 1}).items()],
+        "items": [{"menu_item_id": iid, "quantity": q} for iid, q in items.items()],
+    }
+
+
+def _record(order_id: int, order: dict, status: str = ORDER_OPEN, store_id: str = DEFAULT_STORE_ID) -> dict:
+    return {"order_id": order_id, "store_id": store_id, "status": status, "order": order}
+
+
+def _parse(frame: str) -> tuple[str, dict]:
+    fields = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+    return fields["event"], json.loads(fields["data"])
+
+
+class TestKitchenBoard(unittest.TestCase):
+    def setUp(self) -> None:
+        metrics.reset()
+        self.board = KitchenBoard()
+
+    def test_order_portions(self) -> None:
+        order = _order({"beef_sliced": 1.5}, {"tomato_herbs": 2})
+        order["items"].append({"menu_item_id": "beef_sliced", "quantity": 1.0})
+        self.assertEqual(order_portions(order), ({"beef_sliced": 2.5}, {"tomato_herbs": 2}))
+        self.assertEqual(order_portions({"broth_id": "spicy", "items": []}), ({}, {"spicy": 1}))
+
+    def test_confirm_modify_close(self) -> None:
+        self.assertTrue(self.board.apply(_record(1, _order({"beef_sliced": 2, "tofu": 1}))))
+        self.board.apply(_record(2, _order({"beef_sliced": 1.5}, {"spicy": 1})))
+        self.board.apply(_record(3, _order({"lamb": 1}), store_id="east"))
+        snap = self.board.snapshot(DEFAULT_STORE_ID)
+        self.assertEqual(snap["open_orders"], 2)
+        self.assertEqual(snap["ingredients"], {"beef_sliced": 3.5, "tofu": 1})
+        self.assertEqual(snap["broths"], {"spicy": 1, "tomato_herbs": 1})
+        self.assertEqual(self.board.snapshot("east")["ingredients"], {"lamb": 1})
+
+        # 重复应用同一条记录不改变合计
+        version = self.board.version
+        self.assertFalse(self.board.apply(_record(1, _order({"beef_sliced": 2, "tofu": 1}))))
+        self.assertEqual(self.board.version, version)
+
+        # 修改：换成新贡献；关闭：减去贡献，清零的项移除
+        self.board.apply(_record(1, _order({"beef_sliced": 1})))
+        self.assertEqual(self.board.snapshot(DEFAULT_STORE_ID)["ingredients"], {"beef_sliced": 2.5})
+        self.board.apply(_record(2, {}, status=ORDER_CLOSED))
+        snap = self.board.snapshot(DEFAULT_STORE_ID)
+        self.assertEqual((snap["open_orders"], snap["ingredients"], snap["broths"]), (1, {"beef_sliced": 1}, {"tomato_herbs": 1}))
+        self.assertFalse(self.board.apply(_record(2, {}, status=ORDER_CLOSED)))
+        self.assertEqual(len(self.board), 2)
+
+    def test_changes_only_changed_keys(self) -> None:
+        self.board.apply(_record(1, _order({"beef_sliced": 2, "tofu": 1})))
+        self.board.apply(_record(9, _order({"lamb": 1}), store_id="east"))
+        version = self.board.version
+        self.assertIsNone(self.board.changes(DEFAULT_STORE_ID, version))
+        self.board.apply(_record(2, _order({"tofu": 1}, {"spicy": 1})))
+        self.board.apply(_record(1, {}, status=ORDER_CLOSED))
+        delta = self.board.changes(DEFAULT_STORE_ID, version)
+        self.assertEqual(delta["ingredients"], {"beef_sliced": 0, "tofu": 1})
+        self.assertEqual(delta["broths"], {"spicy": 1, "tomato_herbs": 0})
+        self.assertEqual(delta["open_orders"], 1)
+        self.assertIsNone(self.board.changes("east", version))
+
+    def test_coalesced_stream(self) -> None:
+        async def _run() -> list[tuple[str, dict]]:
+            events = board_events(self.board, DEFAULT_STORE_ID, push_interval=0.05)
+            frames = [_parse(await events.__anext__())]
+            nxt = asyncio.ensure_future(events.__anext__())
+            await asyncio.sleep(0)
+            for i in range(50):
+                self.board.apply(_record(i, _order({"beef_sliced": 1})))
+            frames.append(_parse(await nxt))
+            self.assertEqual(self.board.subscribers(), 1)
+            await events.aclose()
+            return frames
+
+        frames = asyncio.run(_run())
+        self.assertEqual(self.board.subscribers(), 0)
+        self.assertEqual([e for e, _ in frames], ["snapshot", "update"])
+        self.assertEqual(frames[0][1]["ingredients"], {})
+        self.assertEqual(frames[1][1]["ingredients"], {"beef_sliced": 50})
+        self.assertEqual(frames[1][1]["open_orders"], 50)
+        self.assertEqual(metrics.get("kitchen.pushes"), 1)
+        self.assertEqual(metrics.get("kitchen.updates"), 50)
+
+
+class TestKitchenSync(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = temp_dir(self)
+
+    def test_load_and_sync_other_worker(self) -> None:
+        mine, other = OrderStore(self.tmp / "orders.db", commit_delay=0), OrderStore(self.tmp / "orders.db", commit_delay=0)
+        self.addCleanup(mine.close)
+        self.addCleanup(other.close)
+        first = mine.append(_order({"beef_sliced": 2}), "s1", DEFAULT_STORE_ID).result()
+        done = mine.append(_order({"tofu": 1}), "s1", DEFAULT_STORE_ID).result()
+        mine.update_status(done["order_id"], ORDER_CLOSED).result()
+
+        board = KitchenBoard()
+        self.assertEqual(board.load(mine), 1)
+        self.assertEqual(board.snapshot(DEFAULT_STORE_ID)["ingredients"], {"beef_sliced": 2})
+        self.assertEqual(board.sync(mine), 0)
+
+        # 另一个 worker 写入的新订单与状态变化
+        other.append(_order({"lamb": 3}), "s2", DEFAULT_STORE_ID).result()
+        other.update_status(first["order_id"], ORDER_CLOSED).result()
+        self.assertEqual(board.sync(mine), 2)
+        snap = board.snapshot(DEFAULT_STORE_ID)
+        self.assertEqual((snap["open_orders"], snap["ingredients"]), (1, {"lamb": 3}))
+        self.assertEqual(board.sync(mine), 0)
+
+
+class TestKitchenEndpoints(AppTestCase):
+    TOKEN = "kitchen-token"
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.orders = OrderStore(self.tmp / "orders.db")
+        self.addCleanup(self.orders.close)
+        self.patch_app(_orders=self.orders, _kitchen=None, ADMIN_TOKEN=self.TOKEN)
+        self.menu = self.registry.get(DEFAULT_STORE_ID).menu_index
+
+    def test_board_follows_orders(self) -> None:
+        rec = self.client.post("/api/recommend", json={"num_guests": 2}).json()
+        broth = self.menu.soup_bases[0]
+        resp = self.client.post("/api/chat", json={
+            "session_id": rec["session_id"], "message": "确认", "broths": [{"name_cn": broth["name_cn"], "quantity": 2}],
+        }).json()
+        headers = {"X-Admin-Token": self.TOKEN}
+        self.assertEqual(self.client.get("/api/kitchen/board").status_code, 401)
+        self.assertEqual(self.client.get("/api/kitchen/board/stream", params={"token": "wrong"}).status_code, 401)
+        board = self.client.get("/api/kitchen/board", headers=headers).json()
+        expected = {it["menu_item_id"]: round(it["quantity"], 2) for it in resp["order_json"]["items"]}
+        self.assertEqual((board["open_orders"], board["ingredients"]), (1, expected))
+        self.assertEqual(board["broths"], {broth["id"]: 2})
+
+        self.client.patch(f"/api/kitchen/orders/{resp['order_id']}", json={"status": "closed"}, headers=headers)
+        board = self.client.get("/api/kitchen/board", headers=headers).json()
+        self.assertEqual((board["open_orders"], board["ingredients"], board["broths"]), (0, {}, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试内存核算：深度大小估算、session 大小分布、SessionStore 的 LRU 上限与空闲过期、
+tracemalloc 快照对比，以及 /api/admin/memory 管理接口。用临时目录与假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage
+
+from core import metrics
+from core.memory import HeapSnapshots, deep_sizeof, format_report, histogram, session_footprint
+from helpers import AppTestCase
+from web.sessions import SessionStore
+from web.stores import DEFAULT_STORE_ID
+
+web_app = importlib.import_module("web.app")
+
+
+class TestDeepSizeof(unittest.TestCase):
+    def test_counts_shared_objects_once(self) -> None:
+        payload = "毛肚" * 1000
+        one = deep_sizeof([payload])
+        self.assertGreater(one, sys.getsizeof(payload))
+        self.assertEqual(deep_sizeof([payload, payload]), one + 8)
+        self.assertEqual(deep_sizeof({"a": [payload]}, exclude=[payload]), deep_sizeof({"a": []}) + 8)
+
+    def test_objects_and_messages(self) -> None:
+        short = {"messages": [HumanMessage(content="两位")]}
+        long = {"messages": [HumanMessage(content="两位"), AIMessage(content="微辣可以吗？" * 200)]}
+        self.assertGreater(deep_sizeof(long) - deep_sizeof(short), 2000)
+
+    def test_numpy_views_count_base_once(self) -> None:
+        base = np.zeros((100, 64), dtype=np.float32)
+        views = {i: base[i] for i in range(100)}
+        size = deep_sizeof(views)
+        self.assertGreater(size, base.nbytes)
+        self.assertLess(size, base.nbytes * 2)
+
+    def test_histogram_and_footprint(self) -> None:
+        self.assertEqual(
+            [b["count"] for b in histogram([10, 1024, 1025, 10 ** 9], buckets=(1024, 4096))], [2, 1, 1]
+        )
+        sessions = [("session-small", {"cart": {}}), ("session-large-0001", {"messages": [AIMessage(content="x" * 5000)]})]
+        fp = session_footprint(sessions, top=1)
+        self.assertEqual(fp["count"], 2)
+        self.assertEqual(fp["largest"], [{"session": "session-…", "bytes": fp["largest"][0]["bytes"], "messages": 1}])
+        self.assertGreater(fp["largest"][0]["bytes"], 5000)
+        self.assertIn("最大的 session", format_report({"sessions": fp}))
+
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self) -> None:
+        metrics.reset()
+        self.now = 0.0
+
+    def _store(self, **kwargs) -> SessionStore:
+        return SessionStore(clock=lambda: self.now, **kwargs)
+
+    def test_lru_eviction(self) -> None:
+        store = self._store(max_sessions=2)
+        store["a"] = {"n": 1}
+        store["b"] = {"n": 2}
+        self.assertEqual(store["a"], {"n": 1})  # 读取刷新 a，b 成为最久未用
+        store["c"] = {"n": 3}
+        self.assertEqual(sorted(store), ["a", "c"])
+        self.assertNotIn("b", store)
+        self.assertEqual((store.stats()["evicted"], metrics.get("session.evicted")), (1, 1))
+
+    def test_idle_expiry(self) -> None:
+        store = self._store(ttl_s=60)
+        store["a"] = {}
+        store["b"] = {}
+        self.now = 30
+        store.get("b")
+        self.now = 80
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.get("b"), {})
+        self.now = 200
+        store["c"] = {}  # 写入时清理过期的 b
+        self.assertEqual(list(store), ["c"])
+        self.assertEqual(store.stats()["expired"], 2)
+        self.assertEqual(metrics.get("session.expired"), 2)
+
+    def test_dict_interface(self) -> None:
+        store = self._store()
+        store["a"] = {"cart": {"beef": 1}}
+        self.assertEqual(store.pop("a"), {"cart": {"beef": 1}})
+        self.assertEqual(len(store), 0)
+        store["b"] = {}
+        self.assertEqual(store.snapshot(), [("b", {})])
+        store.clear()
+        self.assertEqual(store.get("b", "missing"), "missing")
+
+
+class TestHeapSnapshots(unittest.TestCase):
+    def test_diff_shows_growth(self) -> None:
+        heap = HeapSnapshots()
+        try:
+            self.assertTrue(heap.snapshot()["started"])
+            hold = [bytearray(1024) for _ in range(500)]
+            report = heap.snapshot(top=5)
+            self.assertEqual(report["compared_to"], "previous")
+            self.assertTrue(any(__file__ in s["where"][0] and s["size_diff"] >= 500 * 1024 for s in report["top"]))
+            # 再取一次：与上一次相比已没有这批增长，与基线相比仍有
+            self.assertFalse(any(__file__ in s["where"][0] and s["size_diff"] >= 500 * 1024 for s in heap.snapshot()["top"]))
+            since = heap.snapshot(since_baseline=True)
+            self.assertTrue(any(__file__ in s["where"][0] for s in since["top"]))
+            del hold
+        finally:
+            self.assertEqual(heap.stop(), {"tracing": False})
+
+
+class TestAdminMemory(AppTestCase):
+    TOKEN = "secret-token"
+    KNOWLEDGE = "毛肚：七上八下，涮约 15 秒口感最脆。\n\n虾滑：下锅后煮 3 分钟浮起即可。"
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.registry.get(DEFAULT_STORE_ID).load_knowledge()
+        sessions = SessionStore(max_sessions=10)
+        sessions["table-000001"] = {"cart": {"beef": 1}, "messages": [AIMessage(content="微辣可以吗？" * 100)]}
+        sessions["table-000002"] = {"cart": {}}
+        self.patch_app(ADMIN_TOKEN=self.TOKEN, _sessions=sessions)
+        self.admin = {"X-Admin-Token": self.TOKEN}
+
+    def test_memory_report(self) -> None:
+        self.assertEqual(self.client.get("/api/admin/memory").status_code, 401)
+        report = self.client.get("/api/admin/memory", params={"top": 1}, headers=self.admin).json()
+        self.assertEqual(report["sessions"]["count"], 2)
+        self.assertEqual(report["sessions"]["max_sessions"], 10)
+        [largest] = report["sessions"]["largest"]
+        self.assertEqual((largest["session"], largest["messages"]), ("table-00…", 1))
+        caches = report["caches"]
+        for name in ("menu_index", "recommendations", "entity_vectors", "knowledge_chunks"):
+            self.assertGreater(caches[f"stores.default.{name}"]["bytes"], 0)
+        self.assertEqual(caches["stores.default.recommendations"]["entries"], 48)
+        # 假 embedding 没有模型权重
+        self.assertIsNone(caches["embedding_model"]["bytes"])
+        if report["process"]["rss_bytes"] is not None:
+            self.assertGreater(report["process"]["rss_bytes"], 0)
+        self.assertIn("stores.default.menu_index", format_report(report))
+
+    def test_snapshot_endpoints(self) -> None:
+        try:
+            started = self.client.post("/api/admin/memory/snapshot", json={}, headers=self.admin).json()
+            self.assertTrue(started["started"] and started["tracing"])
+            diff = self.client.post("/api/admin/memory/snapshot", json={"top": 3}, headers=self.admin).json()
+            self.assertLessEqual(len(diff["top"]), 3)
+        finally:
+            stopped = self.client.delete("/api/admin/memory/snapshot", headers=self.admin).json()
+        self.assertEqual(stopped, {"tracing": False})
+
+
+if __name__ == "__main__":
+    unittest.main()
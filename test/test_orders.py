@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试订单日志（SQLite WAL + 组提交）：并发确认合并为少量提交、重开数据库后订单仍在、按状态 / 会话 / 时间过滤与游标翻页、
+写入进行中读取不受阻塞、提交失败时整批调用方都收到异常、数据库打不开时启动即报错、写线程异常退出后写入不会悬挂，
+以及 /api/chat 确认下单落盘并返回单号、厨房查询接口的管理令牌鉴权。用临时目录与假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import importlib
+import sqlite3
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from core import metrics
+from helpers import AppTestCase, temp_dir
+from web import orders
+from web.kitchen import KitchenBoard
+from web.orders import ORDER_CLOSED, ORDER_OPEN, OrderStore
+from web.stores import DEFAULT_STORE_ID
+
+web_app = importlib.import_module("web.app")
+
+
+def _order(n: int = 2) -> dict:
+    return {"num_guests": n, "broths": [{"broth_id": "tomato_herbs", "quantity": 1}],
+            "items": [{"menu_item_id": "beef_sliced", "quantity": 2.0}]}
+
+
+class TestOrderStore(unittest.TestCase):
+    def setUp(self) -> None:
+        metrics.reset()
+        self.tmp = temp_dir(self)
+        self.path = self.tmp / "orders.db"
+
+    def _store(self, **kwargs) -> OrderStore:
+        store = OrderStore(self.path, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_group_commit_and_durability(self) -> None:
+        store = self._store(commit_delay=0.02)
+        with ThreadPoolExecutor(16) as pool:
+            futures = list(pool.map(lambda i: store.append(_order(), f"s{i % 4}", DEFAULT_STORE_ID), range(200)))
+        records = [f.result(timeout=10) for f in futures]
+        self.assertEqual(len({r["order_id"] for r in records}), 200)
+        self.assertEqual(metrics.get("orders.appended"), 200)
+        self.assertLess(metrics.get("orders.commits"), 200)
+        store.close()
+
+        with sqlite3.connect(self.path) as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        reopened = self._store()
+        self.assertEqual(reopened.count_by_status(), {"open": 200, "closed": 0, "cancelled": 0})
+        self.assertEqual(reopened.get(records[0]["order_id"])["order"], _order())
+
+    def test_filters_and_pagination(self) -> None:
+        store = self._store(commit_delay=0)
+        ids = [store.append(_order(i), f"s{i % 3}", "east" if i % 2 else DEFAULT_STORE_ID).result()["order_id"]
+               for i in range(1, 13)]
+        cut = time.time()
+        later = store.append(_order(), "s0", DEFAULT_STORE_ID).result()
+        self.assertEqual(store.update_status(ids[0], ORDER_CLOSED).result()["status"], ORDER_CLOSED)
+        self.assertIsNone(store.update_status(99999, ORDER_CLOSED).result())
+        with self.assertRaises(ValueError):
+            store.update_status(ids[0], "eaten")
+
+        seen, cursor = [], None
+        while True:
+            page = store.list_orders(status=ORDER_OPEN, cursor=cursor, limit=5, oldest_first=True)
+            seen.extend(r["order_id"] for r in page["orders"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, ids[1:] + [later["order_id"]])
+        newest = store.list_orders(limit=3)
+        self.assertEqual([r["order_id"] for r in newest["orders"]], [later["order_id"], ids[-1], ids[-2]])
+        self.assertEqual({r["session_id"] for r in store.list_orders(session_id="s1")["orders"]}, {"s1"})
+        self.assertEqual({r["store_id"] for r in store.list_orders(store_id="east")["orders"]}, {"east"})
+        self.assertEqual([r["order_id"] for r in store.list_orders(since=cut)["orders"]], [later["order_id"]])
+        self.assertEqual(len(store.list_orders(until=cut)["orders"]), 12)
+        self.assertEqual(store.count_by_status("east"), {"open": 5, "closed": 1, "cancelled": 0})
+
+    def test_reads_during_writes(self) -> None:
+        store = self._store(commit_delay=0.001)
+        store.append(_order(), "s", DEFAULT_STORE_ID).result()
+        stop = threading.Event()
+        counts: list[int] = []
+
+        def _read() -> None:
+            while not stop.is_set():
+                counts.append(len(store.list_orders(limit=10)["orders"]))
+
+        reader = threading.Thread(target=_read)
+        reader.start()
+        futures = [store.append(_order(), "s", DEFAULT_STORE_ID) for _ in range(300)]
+        for f in futures:
+            f.result(timeout=10)
+        stop.set()
+        reader.join()
+        self.assertTrue(counts)
+        self.assertEqual(store.count_by_status()["open"], 301)
+
+    def test_failed_commit_fails_whole_batch(self) -> None:
+        store = self._store(commit_delay=0.05)
+
+        def _boom(conn, *args):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        ok = store.append(_order(), "s", DEFAULT_STORE_ID)
+        ok.result(timeout=5)
+        futures = [store._submit(orders._insert, _order(), "s", DEFAULT_STORE_ID), store._submit(_boom)]
+        for f in futures:
+            with self.assertRaises(sqlite3.OperationalError):
+                f.result(timeout=5)
+        self.assertEqual(metrics.get("orders.errors"), 2)
+        self.assertEqual(store.count_by_status()["open"], 1)
+        store.close()
+        with self.assertRaises(RuntimeError):
+            store.append(_order(), "s", DEFAULT_STORE_ID)
+
+    def test_unopenable_database_fails_at_startup(self) -> None:
+        self.path.mkdir()
+        with self.assertRaises(sqlite3.Error):
+            OrderStore(self.path)
+
+    def test_writer_crash_fails_pending_writes(self) -> None:
+        store = self._store(commit_delay=0.05)
+        with mock.patch.object(store, "_commit", side_effect=MemoryError("boom")):
+            first = store.append(_order(), "s", DEFAULT_STORE_ID)
+            with self.assertRaises(RuntimeError):
+                first.result(timeout=5)
+        store._writer.join(timeout=5)
+        self.assertFalse(store._writer.is_alive())
+        with self.assertRaises(RuntimeError):
+            store.append(_order(), "s", DEFAULT_STORE_ID)
+        self.assertEqual(metrics.get("orders.errors"), 1)
+
+
+class TestOrderEndpoints(AppTestCase):
+    TOKEN = "kitchen-token"
+
+    def setUp(self) -> None:
+        metrics.reset()
+        super().setUp()
+        self.orders = OrderStore(self.tmp / "orders.db")
+        self.addCleanup(self.orders.close)
+        self.board = KitchenBoard()
+        self.patch_app(_orders=self.orders, _kitchen=self.board, ADMIN_TOKEN=self.TOKEN)
+        self.menu = self.registry.get(DEFAULT_STORE_ID).menu_index
+
+    def test_confirm_persists_and_kitchen_queries(self) -> None:
+        rec = self.client.post("/api/recommend", json={"num_guests": 2}).json()
+        broth = self.menu.menu["soup_bases"][0]["name_cn"]
+        resp = self.client.post("/api/chat", json={
+            "session_id": rec["session_id"], "message": "确认", "broths": [{"name_cn": broth}],
+        }).json()
+        order_id = resp["order_id"]
+        self.assertIsInstance(order_id, int)
+        self.assertIn(str(order_id), resp["reply"])
+
+        headers = {"X-Admin-Token": self.TOKEN}
+        self.assertEqual(self.client.get("/api/kitchen/orders").status_code, 401)
+        page = self.client.get("/api/kitchen/orders", params={"status": "open"}, headers=headers).json()
+        self.assertEqual([r["order_id"] for r in page["orders"]], [order_id])
+        self.assertEqual(page["orders"][0]["order"], resp["order_json"])
+        self.assertEqual(page["orders"][0]["session_id"], rec["session_id"])
+        self.assertIsNone(page["next_cursor"])
+
+        closed = self.client.patch(f"/api/kitchen/orders/{order_id}", json={"status": "closed"}, headers=headers)
+        self.assertEqual(closed.json()["status"], "closed")
+        self.assertEqual(self.client.get(f"/api/kitchen/orders/{order_id}", headers=headers).json()["status"], "closed")
+        self.assertEqual(self.client.patch(f"/api/kitchen/orders/{order_id}", json={"status": "eaten"},
+                                           headers=headers).status_code, 422)
+        self.assertEqual(self.client.get("/api/kitchen/orders/99999", headers=headers).status_code, 404)
+
+    def test_repeat_confirm_is_idempotent(self) -> None:
+        rec = self.client.post("/api/recommend", json={"num_guests": 2}).json()
+        broth = self.menu.menu["soup_bases"][0]["name_cn"]
+        first = self.client.post("/api/chat", json={
+            "session_id": rec["session_id"], "message": "确认", "broths": [{"name_cn": broth}],
+        }).json()
+        board = self.board.snapshot(DEFAULT_STORE_ID)
+        for msg in ("确认", "好的", "这样可以"):
+            again = self.client.post("/api/chat", json={"session_id": rec["session_id"], "message": msg}).json()
+            self.assertEqual(again["order_id"], first["order_id"])
+            self.assertEqual(again["order_json"], first["order_json"])
+        self.assertEqual(self.orders.count_by_status()["open"], 1)
+        self.assertEqual(self.board.snapshot(DEFAULT_STORE_ID), board)
+        self.assertEqual(metrics.get("orders.duplicate_confirm"), 3)
+
+        # 购物车改动后再确认是新的方案，生成新订单
+        chosen = {i["id"] for i in rec["items"]}
+        item = next(i for i in self.menu.ingredient_ids if i not in chosen)
+        patched = self.client.patch("/api/cart", json={
+            "session_id": rec["session_id"], "version": rec["cart_version"], "ops": [{"op": "add", "id": item}],
+        }).json()
+        self.assertTrue(patched["ok"])
+        changed = self.client.post("/api/chat", json={"session_id": rec["session_id"], "message": "确认"}).json()
+        self.assertNotEqual(changed["order_id"], first["order_id"])
+        self.assertEqual(self.orders.count_by_status()["open"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试点单热度：Space-Saving 草图的精确计数与有界内存、按下单时间的指数衰减（含长时间运行后的整体缩放）、
+按时段分开统计与证据不足时不出排名、排名不变时不换快照、从订单日志增量读取（每单只计一次、跳过已取消），
+以及推荐表按热度排名重建后 /api/recommend 的顺序（过敏项仍被过滤）。用临时目录与假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import importlib
+import random
+import sys
+import time
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from concierge.menu_loader import get_menu_index
+from helpers import AppTestCase, temp_dir
+from web.orders import ORDER_CANCELLED, ORDER_OPEN, OrderStore, SnapshotRefresher
+from web.popularity import HeavyHitters, PopularityEngine, PopularitySnapshot, daypart_of
+from web.recommendation import ALLERGY_SEAFOOD, DEFAULT_RECOMMEND_IDS, RecommendationTable, ingredient_has_allergen
+from web.stores import DEFAULT_STORE_ID, StoreContext
+
+web_app = importlib.import_module("web.app")
+
+HOUR = 3600.0
+
+
+class _Clock:
+    def __init__(self, t: float):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def _order(*item_ids: str, broth: str = "tomato_herbs") -> dict:
+    return {"broths": [{"broth_id": broth, "quantity": 1}],
+            "items": [{"menu_item_id": iid, "quantity": 2.0} for iid in item_ids]}
+
+
+def _at_hour(hour: int) -> float:
+    """今天本地时间 hour 点的时间戳。"""
+    t = time.localtime()
+    return time.mktime((t.tm_year, t.tm_mon, t.tm_mday, hour, 0, 0, 0, 0, -1))
+
+
+class TestHeavyHitters(unittest.TestCase):
+    def test_exact_under_capacity(self) -> None:
+        hh = HeavyHitters(capacity=4)
+        for key, n in (("a", 5), ("b", 3), ("c", 1)):
+            for _ in range(n):
+                hh.add(key, 1.0)
+        self.assertEqual(hh.top(2), [("a", 5.0), ("b", 3.0)])
+        self.assertEqual(hh.errors, {})
+
+    def test_bounded_keeps_heavy_hitters(self) -> None:
+        hh = HeavyHitters(capacity=8)
+        for i in range(2000):
+            hh.add("hot" if i % 3 == 0 else "warm" if i % 5 == 0 else f"tail{i}", 1.0)
+        self.assertEqual(len(hh), 8)
+        self.assertEqual([k for k, _ in hh.top(2)], ["hot", "warm"])
+        # Space-Saving 的计数不低估，误差不超过计数中的最小值
+        self.assertGreaterEqual(hh.counts["hot"], 667)
+        self.assertLessEqual(hh.counts["hot"] - hh.errors.get("hot", 0), 667)
+
+    def test_matches_linear_scan_eviction(self) -> None:
+        # 与逐项扫描找最小项的朴素实现一致（实数权重无并列），其间整体缩放一次
+        rng = random.Random(5)
+        hh = HeavyHitters(capacity=16)
+        counts: dict[str, float] = {}
+        for i in range(5000):
+            key, w = f"k{int(rng.paretovariate(1.2)) % 200}", rng.random() + 0.5
+            hh.add(key, w)
+            if key in counts:
+                counts[key] += w
+            else:
+                floor = counts.pop(min(counts, key=counts.__getitem__)) if len(counts) >= 16 else 0.0
+                counts[key] = floor + w
+            if i == 2500:
+                hh.scale(0.25)
+                counts = {k: c * 0.25 for k, c in counts.items()}
+        self.assertEqual(hh.counts, counts)
+        self.assertEqual(len(hh._heap), len(hh))
+
+    def test_negative_weights_match_linear_scan(self) -> None:
+        # 撤销（负权重）只扣已跟踪的键，扣到零的键移除；之后替换最小项仍与朴素实现一致
+        rng = random.Random(7)
+        hh = HeavyHitters(capacity=16)
+        counts: dict[str, float] = {}
+        added: list[tuple[str, float]] = []
+        for i in range(5000):
+            if added and rng.random() < 0.2:
+                key, w = added.pop(rng.randrange(len(added)))
+                hh.add(key, -w)
+                if key in counts:
+                    counts[key] -= w
+                    if counts[key] <= 1e-9 * w:
+                        del counts[key]
+                continue
+            key, w = f"k{int(rng.paretovariate(1.2)) % 200}", rng.random() + 0.5
+            added.append((key, w))
+            hh.add(key, w)
+            if key in counts:
+                counts[key] += w
+            else:
+                floor = counts.pop(min(counts, key=counts.__getitem__)) if len(counts) >= 16 else 0.0
+                counts[key] = floor + w
+        self.assertEqual(hh.counts, counts)
+        hh.scale(0.5)
+        self.assertEqual(len(hh._heap), len(hh))
+
+
+class TestPopularityEngine(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = _Clock(_at_hour(19))
+        self.engine = PopularityEngine(half_life_s=24 * HOUR, min_orders=3, clock=self.clock)
+
+    def test_decay_favors_recent(self) -> None:
+        for _ in range(8):
+            self.engine.record(_order("lamb_sliced"), DEFAULT_STORE_ID, self.clock.t - 72 * HOUR)
+        for _ in range(2):
+            self.engine.record(_order("beef_sliced"), DEFAULT_STORE_ID)
+        snap = self.engine.refresh()
+        # 8 单在 3 个半衰期前（权重 1/8，合计 1）不如 2 单新订单
+        self.assertEqual(snap.for_store(DEFAULT_STORE_ID)[None][:2], ("beef_sliced", "lamb_sliced"))
+        stats = self.engine.stats(DEFAULT_STORE_ID)["stores"][DEFAULT_STORE_ID]["all"]
+        self.assertAlmostEqual(stats["orders"], 3.0, places=2)
+        self.assertEqual(stats["broths"], [["tomato_herbs", 3.0]])
+
+    def test_rescale_after_long_run(self) -> None:
+        self.engine.record(_order("lamb_sliced"), DEFAULT_STORE_ID)
+        self.clock.t += 24 * HOUR * 200
+        for _ in range(3):
+            self.engine.record(_order("beef_sliced"), DEFAULT_STORE_ID)
+        snap = self.engine.refresh()
+        self.assertEqual(snap.for_store(DEFAULT_STORE_ID)[None][0], "beef_sliced")
+        self.assertAlmostEqual(self.engine.stats()["stores"][DEFAULT_STORE_ID]["all"]["orders"], 3.0, places=2)
+
+    def test_dayparts_and_min_orders(self) -> None:
+        # 午市的 4 单在 7 小时前，衰减后仍够 min_orders=3
+        for _ in range(4):
+            self.engine.record(_order("beef_sliced"), DEFAULT_STORE_ID, _at_hour(12))
+        self.engine.record(_order("shrimp_ball"), DEFAULT_STORE_ID, _at_hour(19))
+        self.engine.record(_order("shrimp_ball"), "east", _at_hour(19))
+        snap = self.engine.refresh()
+        self.assertEqual(daypart_of(_at_hour(12)), "lunch")
+        self.assertEqual(set(snap.for_store(DEFAULT_STORE_ID)), {None, "lunch"})
+        self.assertEqual(snap.for_store(DEFAULT_STORE_ID)["lunch"], ("beef_sliced",))
+        self.assertEqual(snap.for_store("east"), {})
+
+        self.assertIs(self.engine.refresh(), snap)
+        self.engine.record(_order("beef_sliced"), DEFAULT_STORE_ID, _at_hour(12))
+        self.assertIs(self.engine.refresh(), snap)
+        for _ in range(5):
+            self.engine.record(_order("shrimp_ball"), DEFAULT_STORE_ID, _at_hour(19))
+        self.assertEqual(self.engine.refresh().version, snap.version + 1)
+
+    def test_ingest_from_order_log(self) -> None:
+        tmp = temp_dir(self)
+        orders = OrderStore(tmp / "orders.db", commit_delay=0)
+        self.addCleanup(orders.close)
+        engine = PopularityEngine(half_life_s=24 * HOUR, min_orders=1)
+        for _ in range(3):
+            orders.append(_order("beef_sliced"), "s", DEFAULT_STORE_ID).result()
+        cancelled = orders.append(_order("lamb_sliced"), "s", DEFAULT_STORE_ID).result()
+        orders.update_status(cancelled["order_id"], ORDER_CANCELLED).result()
+        self.assertEqual(engine.ingest(orders), 3)
+        self.assertEqual(engine.ingest(orders), 0)
+        orders.append(_order("tofu"), "s", DEFAULT_STORE_ID).result()
+        self.assertEqual(engine.ingest(orders), 1)
+        self.assertEqual(engine.refresh().for_store(DEFAULT_STORE_ID)[None], ("beef_sliced", "tofu"))
+
+        # 计入之后被取消的订单扣回；取消后又恢复的再计入
+        tofu = orders.append(_order("tofu", "lamb_sliced"), "s", DEFAULT_STORE_ID).result()
+        self.assertEqual(engine.ingest(orders), 1)
+        orders.update_status(tofu["order_id"], ORDER_CANCELLED).result()
+        self.assertEqual(engine.ingest(orders), 1)
+        self.assertEqual(engine.ingest(orders), 0)
+        self.assertEqual(engine.refresh().for_store(DEFAULT_STORE_ID)[None], ("beef_sliced", "tofu"))
+        stats = engine.stats(DEFAULT_STORE_ID)["stores"][DEFAULT_STORE_ID]["all"]
+        self.assertAlmostEqual(stats["orders"], 4, delta=0.01)
+        self.assertEqual([k for k, _ in stats["ingredients"]], ["beef_sliced", "tofu"])
+        orders.update_status(cancelled["order_id"], ORDER_OPEN).result()
+        self.assertEqual(engine.ingest(orders), 1)
+        self.assertIn("lamb_sliced", engine.refresh().for_store(DEFAULT_STORE_ID)[None])
+
+
+class TestPopularRecommendations(unittest.TestCase):
+    def setUp(self) -> None:
+        self.menu = get_menu_index()
+        # 热度排名：菜单末尾的 20 种食材（与手工人气顺序不同），其中含海鲜
+        self.ranking = tuple(it["id"] for it in self.menu.ingredients[-20:])
+
+    def test_table_uses_rankings(self) -> None:
+        table = RecommendationTable(self.menu, {None: self.ranking, "lunch": self.ranking[::-1]}, popularity_version=3)
+        self.assertEqual(table.popularity_version, 3)
+        self.assertEqual(len(table), 96)
+        self.assertEqual(table.get(6, []).item_ids, self.ranking[:17])
+        self.assertEqual(table.get(6, [], "lunch").item_ids, self.ranking[::-1][:17])
+        self.assertEqual(table.get(6, [], "dinner").item_ids, self.ranking[:17])
+        self.assertEqual([it["id"] for it in table.get(6, []).all_items[:20]], list(self.ranking))
+
+        safe = table.get(6, [ALLERGY_SEAFOOD])
+        by_id = self.menu.item_by_id
+        self.assertFalse(any(ingredient_has_allergen(by_id[i], ALLERGY_SEAFOOD) for i in safe.item_ids))
+        self.assertEqual(len(safe.item_ids), 17)
+
+        plain = RecommendationTable(self.menu)
+        self.assertEqual(plain.get(6, [], "lunch").item_ids[:5], tuple(DEFAULT_RECOMMEND_IDS[:5]))
+
+
+class TestPopularityEndpoints(AppTestCase):
+    TOKEN = "admin-token"
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.orders = OrderStore(self.tmp / "orders.db", commit_delay=0)
+        self.addCleanup(self.orders.close)
+        self.engine = PopularityEngine(min_orders=2)
+        self.patch_app(_orders=self.orders, _popularity=self.engine, ADMIN_TOKEN=self.TOKEN)
+
+    def test_recommend_follows_popularity(self) -> None:
+        store = self.registry.get(DEFAULT_STORE_ID)
+        before = self.client.post("/api/recommend", json={"num_guests": 1}).json()
+        self.assertEqual([it["id"] for it in before["items"]], DEFAULT_RECOMMEND_IDS[:8])
+
+        for _ in range(3):
+            self.orders.append(_order("black_fungus", "kelp", "beef_sliced"), "s", DEFAULT_STORE_ID).result()
+        self.orders.append(_order("black_fungus"), "s", DEFAULT_STORE_ID).result()
+        headers = {"X-Admin-Token": self.TOKEN}
+        self.assertEqual(self.client.post("/api/admin/popularity/refresh").status_code, 401)
+        refreshed = self.client.post("/api/admin/popularity/refresh", headers=headers).json()
+        self.assertEqual(refreshed, {"version": 1, "stores_rebuilt": 1})
+        self.assertEqual(store.recommendations.popularity_version, 1)
+
+        after = self.client.post("/api/recommend", json={"num_guests": 1}).json()
+        ids = [it["id"] for it in after["items"]]
+        self.assertEqual(ids[:3], ["black_fungus", "beef_sliced", "kelp"])
+        self.assertEqual(ids[3:], [i for i in DEFAULT_RECOMMEND_IDS if i not in ids[:3]][:5])
+        stats = self.client.get("/api/admin/popularity", params={"top": 1}, headers=headers).json()
+        self.assertEqual(stats["stores"][DEFAULT_STORE_ID]["all"]["ingredients"][0][0], "black_fungus")
+
+        # 快照版本未变时不重建
+        refresher = SnapshotRefresher(self.engine, self.orders, self.registry, StoreContext.apply_popularity)
+        self.assertEqual(refresher.refresh_once(), 0)
+        self.assertFalse(store.apply_popularity(PopularitySnapshot(version=1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试按需 CPU 剖析：事件循环与线程池样本归属到被剖析的请求、未剖析的请求不被记录、
+同时剖析数与每路由栈数上限、collapsed stack 文件的写出与多 worker 合并，以及 /api/admin/profile 管理接口。
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from fastapi.testclient import TestClient
+from starlette.concurrency import run_in_threadpool
+
+from core import metrics, profiling
+from core.profiling import ProfilingMiddleware, StackSampler, attach, list_profiles, load_collapsed
+
+web_app = importlib.import_module("web.app")
+
+
+def _spin(seconds: float) -> int:
+    n = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+async def _handler(scope, receive, send) -> None:
+    _spin(0.08)
+    await run_in_threadpool(attach(_spin), 0.08)
+
+
+async def _unprofiled(scope, receive, send) -> None:
+    await asyncio.sleep(0.01)
+    _spin(0.08)
+
+
+def _scope(path: str = "/api/chat", method: str = "POST") -> dict:
+    return {"type": "http", "method": method, "path": path, "headers": []}
+
+
+class _ProfilingCase(unittest.TestCase):
+    def setUp(self) -> None:
+        metrics.reset()
+        self.tmp = Path(tempfile.mkdtemp())
+        self.sampler = StackSampler(self.tmp, interval=0.002)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _wait_idle(self) -> None:
+        deadline = time.monotonic() + 2
+        while self.sampler._thread is not None and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+
+class TestStackSampler(_ProfilingCase):
+    def test_event_loop_and_worker_stacks(self) -> None:
+        mw = ProfilingMiddleware(_handler, self.sampler, lambda scope: True)
+        asyncio.run(mw(_scope(), None, None))
+        self._wait_idle()
+        stats = self.sampler.routes()["POST /api/chat"]
+        self.assertEqual(stats["requests"], 1)
+        self.assertGreater(stats["samples"], 0)
+        self.assertEqual(metrics.get("profile.requests"), 1)
+
+        text = load_collapsed(self.tmp, "POST /api/chat")
+        lines = text.splitlines()
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        # 事件循环的栈从中间件以下开始，线程池的栈从 attach 包装以下开始
+        self.assertTrue(any(line.startswith(f"event_loop;{__name__}:_handler;{__name__}:_spin ") for line in lines))
+        self.assertTrue(any(line.startswith(f"worker_thread;{__name__}:_spin ") for line in lines))
+        self.assertEqual(list(list_profiles(self.tmp)), ["POST_api_chat"])
+
+    def test_concurrent_unprofiled_request_not_counted(self) -> None:
+        picked = {"/profiled"}
+        mw = ProfilingMiddleware(
+            lambda scope, r, s: (_handler if scope["path"] == "/profiled" else _unprofiled)(scope, r, s),
+            self.sampler,
+            lambda scope: scope["path"] in picked,
+        )
+
+        async def both() -> None:
+            await asyncio.gather(mw(_scope("/profiled"), None, None), mw(_scope("/other"), None, None))
+
+        asyncio.run(both())
+        self._wait_idle()
+        self.assertEqual(list(self.sampler.routes()), ["POST /profiled"])
+        self.assertNotIn("_unprofiled", load_collapsed(self.tmp, "POST /profiled"))
+
+    def test_disabled_starts_nothing(self) -> None:
+        mw = ProfilingMiddleware(_unprofiled, self.sampler, lambda scope: False)
+        asyncio.run(mw(_scope(), None, None))
+        self.assertIsNone(self.sampler._thread)
+        self.assertEqual(self.sampler.routes(), {})
+        self.assertEqual(list_profiles(self.tmp), {})
+
+    def test_max_active(self) -> None:
+        sampler = StackSampler(self.tmp, interval=0.002, max_active=1)
+        first = sampler.begin(sys._getframe())
+        self.assertIsNotNone(first)
+        self.assertIsNone(sampler.begin(sys._getframe()))
+        self.assertEqual(metrics.get("profile.skipped_busy"), 1)
+        sampler.end(first, "GET /x")
+        self.assertEqual(sampler.active(), 0)
+
+    def test_stacks_per_route_capped(self) -> None:
+        session = self.sampler.begin(sys._getframe())
+        session.samples.update({"a;b": 2, "a;c": 1, "a;d": 1})
+        with mock.patch.object(profiling, "MAX_STACKS_PER_ROUTE", 1):
+            self.sampler.end(session, "GET /x")
+        self._wait_idle()
+        self.assertEqual(load_collapsed(self.tmp, "GET /x"), "[truncated] 2\na;b 2\n")
+
+    def test_merge_workers_and_clear(self) -> None:
+        (self.tmp / "GET_x.1.folded").write_text("a;b 2\na;c 1\n", encoding="utf-8")
+        (self.tmp / "GET_x.2.folded").write_text("a;b 3\n", encoding="utf-8")
+        self.assertEqual(load_collapsed(self.tmp, "GET /x"), "a;b 5\na;c 1\n")
+        self.assertEqual(load_collapsed(self.tmp, "GET_x"), "a;b 5\na;c 1\n")
+        self.assertEqual(list_profiles(self.tmp), {"GET_x": 6})
+        self.sampler.clear()
+        self.assertEqual(list_profiles(self.tmp), {})
+
+
+class TestAdminProfile(_ProfilingCase):
+    TOKEN = "secret-token"
+
+    def setUp(self) -> None:
+        super().setUp()
+        patches = [
+            mock.patch.object(web_app, "ADMIN_TOKEN", self.TOKEN),
+            mock.patch.object(web_app, "PROFILE_DIR", str(self.tmp)),
+            mock.patch.object(web_app, "_profiler", self.sampler),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(setattr, web_app, "_profile_until", 0.0)
+        # 测试进程未设置 ADMIN_TOKEN，app 上没有挂中间件，这里在外面包一层
+        self.client = TestClient(ProfilingMiddleware(web_app.app, self.sampler, web_app._should_profile))
+        self.admin = {"X-Admin-Token": self.TOKEN}
+
+    def test_header_trigger_requires_admin_token(self) -> None:
+        self.client.get("/api/health", headers={"X-Profile": "1", "X-Admin-Token": "wrong"})
+        self.client.get("/api/health")
+        self.assertEqual(self.sampler.routes(), {})
+        self.client.get("/api/health", headers={"X-Profile": "1", **self.admin})
+        self.assertEqual(self.sampler.routes()["GET /api/health"]["requests"], 1)
+
+        status = self.client.get("/api/admin/profile", headers=self.admin).json()
+        self.assertEqual(status["local"]["GET /api/health"]["requests"], 1)
+        self.assertEqual(self.client.get("/api/admin/profile").status_code, 401)
+        self.assertEqual(
+            self.client.get("/api/admin/profile", params={"route": "GET /nothing"}, headers=self.admin).status_code, 404
+        )
+
+    def test_toggle_and_collapsed_download(self) -> None:
+        self.assertFalse(web_app._should_profile(_scope()))
+        status = self.client.post("/api/admin/profile", json={"duration_s": 30}, headers=self.admin).json()
+        self.assertTrue(status["toggle"]["enabled"])
+        self.assertTrue(web_app._should_profile(_scope()))
+        # 管理接口自身不被剖析
+        self.assertFalse(web_app._should_profile(_scope("/api/admin/profile", "GET")))
+
+        session = self.sampler.begin(sys._getframe())
+        session.samples["event_loop;web.app:chat"] += 3
+        self.sampler.end(session, "POST /api/chat")
+        resp = self.client.get("/api/admin/profile", params={"route": "POST /api/chat"}, headers=self.admin)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.text, "event_loop;web.app:chat 3\n")
+
+        self.client.post("/api/admin/profile", json={"enabled": False}, headers=self.admin)
+        self.assertFalse(web_app._should_profile(_scope()))
+        status = self.client.delete("/api/admin/profile", headers=self.admin).json()
+        self.assertEqual((status["routes"], status["local"]), ({}, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
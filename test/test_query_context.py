@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试请求级 query 向量复用：/api/chat 一次知识问答只编码用户问题一次，
+意图路由与 FAQ 语义查表复用同一向量。用临时门店与计数假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import importlib
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from langchain_core.embeddings import Embeddings
+
+from core.query import QueryContext
+from web.faq import FAQTable
+from web.routing import INTENT_CART_EDIT, INTENT_KNOWLEDGE, INTENT_ORDER, IntentRouter
+from web.schemas import ChatRequest
+from web.stores import DEFAULT_STORE_ID, StoreRegistry
+
+web_app = importlib.import_module("web.app")
+
+
+class _CountingEmbeddings(Embeddings):
+    """按字符二元组哈希到固定维度的确定性向量，并记录编码的文本条数。"""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self.query_calls = 0
+        self.document_texts = 0
+
+    def _vec(self, text: str) -> list[float]:
+        v = [0.0] * self.dim
+        for i in range(len(text) - 1):
+            v[int(hashlib.md5(text[i:i + 2].encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        n = sum(x * x for x in v) ** 0.5 or 1.0
+        return [x / n for x in v]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.document_texts += len(texts)
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.query_calls += 1
+        return self._vec(text)
+
+    def reset(self) -> None:
+        self.query_calls = 0
+        self.document_texts = 0
+
+
+class TestQueryContext(unittest.TestCase):
+    def test_vector_is_lazy_and_cached(self) -> None:
+        emb = _CountingEmbeddings()
+        q = QueryContext("毛肚涮多久？", emb)
+        self.assertEqual(emb.query_calls, 0)
+        v1 = q.vector
+        v2 = q.blended(emb.embed_query("毛肚 介绍"))
+        self.assertIs(q.vector, v1)
+        self.assertEqual(q.embed_count, 1)
+        self.assertAlmostEqual(float((v2 * v2).sum()), 1.0, places=5)
+
+
+class TestIntentRouter(unittest.TestCase):
+    def test_route_to_nearest_centroid(self) -> None:
+        emb = _CountingEmbeddings()
+        examples = {
+            INTENT_KNOWLEDGE: ["毛肚涮多久", "虾滑煮多久"],
+            INTENT_ORDER: ["我们三个人", "我们两个人"],
+            INTENT_CART_EDIT: ["加一份肥牛", "加一份鸭血"],
+        }
+        router = IntentRouter(emb, examples=examples, min_similarity=0.1, min_margin=0.0)
+        self.assertEqual(router.route(emb.embed_query("鸭肠涮多久")), INTENT_KNOWLEDGE)
+        self.assertEqual(router.route(emb.embed_query("我们四个人")), INTENT_ORDER)
+        self.assertEqual(router.route(emb.embed_query("加一份虾滑")), INTENT_CART_EDIT)
+        # 质心只编码一次
+        n = emb.document_texts
+        router.route(emb.embed_query("再来一份"))
+        self.assertEqual(emb.document_texts, n)
+
+    def test_uncertain_returns_none(self) -> None:
+        emb = _CountingEmbeddings()
+        router = IntentRouter(emb, examples={INTENT_KNOWLEDGE: ["毛肚涮多久"], INTENT_ORDER: ["我们三个人"]},
+                              min_similarity=0.99)
+        self.assertIsNone(router.route(emb.embed_query("今天天气")))
+
+
+class TestFAQSemanticLookup(unittest.TestCase):
+    def test_semantic_hit_requires_entity_name(self) -> None:
+        emb = _CountingEmbeddings()
+        entries = [
+            {"name": "毛肚", "intent": "涮煮时间", "question": "毛肚涮多久？", "questions": ["毛肚涮多久？"], "answer": "15 秒"},
+            {"name": "鸭肠", "intent": "涮煮时间", "question": "鸭肠涮多久？", "questions": ["鸭肠涮多久？"], "answer": "10 秒"},
+        ]
+        table = FAQTable("h", entries)
+        table.index_vectors(emb)
+        self.assertEqual(table.lookup("毛肚涮多久"), "15 秒")
+        # 精确未命中：语义相近且问题开头匹配到「毛肚」
+        q = "毛肚涮多久呀？"
+        vec = emb.embed_query("毛肚涮多久？")
+        self.assertIsNone(table.lookup(q))
+        self.assertIsNone(table.lookup(q, query_vec=vec))
+        self.assertEqual(table.lookup(q, query_vec=vec, entity="毛肚"), "15 秒")
+        # 向量相近但问到的是另一实体，不命中
+        self.assertIsNone(table.lookup("牛肚涮多久呀？", query_vec=vec, entity="牛肚"))
+
+
+class TestChatEmbedsOnce(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = Path(tempfile.mkdtemp())
+        data = self.tmp / "data"
+        (data / "stores").mkdir(parents=True)
+        shutil.copy(_ROOT / "data" / "hotpot_menu.json", data / "hotpot_menu.json")
+        (data / "sample.txt").write_text(
+            "毛肚：七上八下，涮约 15 秒口感最脆。\n\n虾滑：下锅后煮 3 分钟浮起即可。\n\n番茄锅底酸甜开胃，适合不吃辣的人。",
+            encoding="utf-8",
+        )
+        self.emb = _CountingEmbeddings()
+        self.registry = StoreRegistry(
+            data_dir=data, persist_directory=str(self.tmp / "chroma"), embeddings=self.emb
+        )
+        self._saved = (web_app._stores, web_app._router, web_app.RAG_LATENCY_BUDGET_MS)
+        web_app._stores = self.registry
+        web_app._router = None
+        # 预算为 0：检索照常执行，生成直接降级为抽取式答案，不调用 Gemini
+        web_app.RAG_LATENCY_BUDGET_MS = 0
+        self.registry.get(DEFAULT_STORE_ID).load_knowledge()
+        web_app._get_router().warm()
+        self.emb.reset()
+
+    def tearDown(self) -> None:
+        web_app._stores, web_app._router, web_app.RAG_LATENCY_BUDGET_MS = self._saved
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_knowledge_question_embeds_once(self) -> None:
+        for msg in ("毛肚涮多久比较好？", "虾滑有什么特点？", "吃火锅怎么蘸料比较健康？"):
+            self.emb.reset()
+            resp = asyncio.run(web_app.chat(ChatRequest(message=msg)))
+            self.assertEqual(resp.source, "rag", msg)
+            self.assertTrue(resp.reply, msg)
+            self.assertEqual(self.emb.query_calls + self.emb.document_texts, 1, msg)
+
+
+if __name__ == "__main__":
+    unittest.main()
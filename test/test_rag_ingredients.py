@@ -23,6 +23,7 @@ if str(_ROOT) not in sys.path:
 
 from concierge.menu_loader import load_menu
 from core import RAG
+from web.stores import StoreRegistry
 
 
 def _expand_query(name_cn: str, name_en: str) -> str:
@@ -70,7 +71,8 @@ def run_tests(use_llm: bool = False) -> tuple[int, int, list[dict]]:
         print("未找到食材列表，请检查 data/hotpot_menu.json")
         return 0, 0, []
 
-    rag = RAG()
+    # 与 Web 服务使用同一个集合（默认门店，集合名带知识库指纹；存在预构建索引包时直接打开）
+    rag = StoreRegistry().get().rag
     total = len(ingredients)
     hit = 0
     missed = []
@@ -13,8 +13,16 @@ _ROOT = Path(__file__).resolve().parent.parent
 if str(_ROOT) not in sys.path:
     sys.path.insert(0, str(_ROOT))
 
+from concierge.menu_loader import get_menu_index
 from web.recommendation import (
+    DEFAULT_RECOMMEND_IDS,
+    GLUTEN_IDS,
+    GLUTEN_REPLACEMENTS,
     GUESTS_TO_PORTIONS,
+    SEAFOOD_IDS,
+    SEAFOOD_REPLACEMENTS,
+    RecommendationTable,
+    canonical_allergies,
     recommend_items,
     ingredient_has_allergen,
     parse_add_remove_item,
@@ -177,5 +185,60 @@ class TestRecommendation(unittest.TestCase):
         self.assertEqual(len(items), 17)
 
 
+def _reference_display_ids(allergies: list[str], menu_index) -> list[str]:
+    """/api/recommend 原先逐请求计算展示顺序的写法，用作对照。"""
+    filtered_all = [
+        it for it in menu_index.ingredients
+        if not any(a and ingredient_has_allergen(it, a.strip()) for a in allergies)
+    ]
+    ordered_ids = list(DEFAULT_RECOMMEND_IDS)
+    if any(a.strip() == ALLERGY_SEAFOOD for a in allergies if a):
+        repl_iter = iter(SEAFOOD_REPLACEMENTS)
+        ordered_ids = [next(repl_iter) if x in SEAFOOD_IDS else x for x in ordered_ids]
+    if any(a.strip() == ALLERGY_GLUTEN for a in allergies if a):
+        repl_iter = iter(GLUTEN_REPLACEMENTS)
+        ordered_ids = [next(repl_iter) if x in GLUTEN_IDS else x for x in ordered_ids]
+    valid_ids = {it.get("id") for it in filtered_all}
+    display_order = [iid for iid in ordered_ids if iid in valid_ids]
+    for it in filtered_all:
+        iid = it.get("id")
+        if iid and iid not in display_order:
+            display_order.append(iid)
+    return display_order
+
+
+class TestRecommendationTable(unittest.TestCase):
+    def setUp(self) -> None:
+        menu_path = Path(__file__).resolve().parent.parent / "data" / "hotpot_menu.json"
+        if not menu_path.exists():
+            self.skipTest("菜单文件不存在: data/hotpot_menu.json")
+        self.index = get_menu_index()
+        self.table = RecommendationTable(self.index)
+
+    def test_all_combinations_match_per_request_computation(self) -> None:
+        """48 种组合与逐请求计算的结果一致。"""
+        self.assertEqual(len(self.table), 48)
+        subsets = [[], [ALLERGY_SEAFOOD], [ALLERGY_GLUTEN], [ALLERGY_PEANUT],
+                   [ALLERGY_SEAFOOD, ALLERGY_GLUTEN], [ALLERGY_GLUTEN, ALLERGY_PEANUT],
+                   [ALLERGY_SEAFOOD, ALLERGY_PEANUT], [ALLERGY_PEANUT, ALLERGY_GLUTEN, ALLERGY_SEAFOOD]]
+        for n in GUESTS_TO_PORTIONS:
+            for allergies in subsets:
+                rec = self.table.get(n, allergies)
+                items, total = recommend_items(n, allergies, self.index)
+                self.assertEqual(rec.total, total)
+                self.assertEqual(list(rec.item_ids), [it["id"] for it in items])
+                self.assertEqual(
+                    [it["id"] for it in rec.all_items], _reference_display_ids(allergies, self.index), (n, allergies)
+                )
+
+    def test_canonical_keys(self) -> None:
+        """过敏项的顺序、重复、空白与无法识别的过敏项映射到同一条目。"""
+        self.assertEqual(canonical_allergies([" 海鲜", "花生", "海鲜", "", "芒果"]), tuple(sorted((ALLERGY_PEANUT, ALLERGY_SEAFOOD))))
+        base = self.table.get(3, [ALLERGY_SEAFOOD, ALLERGY_PEANUT])
+        self.assertIs(self.table.get(3, ["芒果", ALLERGY_PEANUT, " 海鲜 "]), base)
+        self.assertIs(self.table.get(10, []), self.table.get(6, []))
+        self.assertIs(self.table.get(0, []), self.table.get(1, []))
+
+
 if __name__ == "__main__":
     unittest.main()
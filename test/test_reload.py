@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试门店热更新：源文件变化检测、快照原子替换、旧集合宽限期后删除、构建失败保留旧快照、
+文件监视去抖，以及管理接口鉴权。用临时目录与假 embedding，不加载真实模型。
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import json
+import sys
+import time
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from fastapi import HTTPException
+
+from concierge.graph import inventory_node
+from helpers import FakeEmbeddings, make_registry, temp_dir
+from web.schemas import ReloadRequest
+from web.stores import StoreRegistry
+from web.watcher import SourceWatcher
+
+web_app = importlib.import_module("web.app")
+
+
+def _menu(*names: str) -> dict:
+    return {
+        "ingredients": [{"id": f"item{i}", "name_cn": n, "category": "meat"} for i, n in enumerate(names)],
+        "soup_bases": [{"id": "tomato", "name_cn": "番茄锅", "spicy": False}],
+    }
+
+
+class TestStoreReload(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = temp_dir(self)
+        self.data = self.tmp / "data"
+        self.data.mkdir()
+        self.menu_path = self.data / "hotpot_menu.json"
+        self.kb = self.data / "sample.txt"
+        self._write(self.menu_path, json.dumps(_menu("肥牛", "毛肚"), ensure_ascii=False))
+        self._write(self.kb, "毛肚：七上八下，涮 15 秒。")
+        self.registry = StoreRegistry(
+            data_dir=self.data,
+            persist_directory=str(self.tmp / "chroma"),
+            embeddings=FakeEmbeddings(),
+            reload_grace_s=0,
+        )
+
+    def _write(self, path: Path, text: str) -> None:
+        # 保证修改时间变化（部分文件系统时间精度较粗）
+        before = path.stat().st_mtime_ns if path.exists() else 0
+        path.write_text(text, encoding="utf-8")
+        while path.stat().st_mtime_ns == before:
+            time.sleep(0.01)
+            path.write_text(text, encoding="utf-8")
+
+    def test_unchanged_and_not_loaded(self) -> None:
+        self.assertEqual(self.registry.reload("default")["reason"], "not_loaded")
+        self.registry.get()
+        result = self.registry.reload("default")
+        self.assertFalse(result["swapped"])
+        self.assertEqual(result["reason"], "unchanged")
+        self.assertTrue(self.registry.reload("default", force=True)["swapped"])
+
+    def test_menu_change_swaps_snapshot(self) -> None:
+        old = self.registry.get()
+        self._write(self.menu_path, json.dumps(_menu("肥牛", "毛肚", "虾滑"), ensure_ascii=False))
+        result = self.registry.reload("default")
+        self.assertTrue(result["swapped"])
+        self.assertEqual(result["changed"], ["menu"])
+        new = self.registry.get()
+        self.assertIsNot(new, old)
+        # 进行中的请求持有旧快照，内容不受影响
+        self.assertEqual(len(old.menu_index.ingredients), 2)
+        self.assertEqual(len(new.menu_index.ingredients), 3)
+        self.assertEqual(self.registry.stats()["reloads"], 1)
+
+    def test_knowledge_change_uses_new_collection_and_drops_old(self) -> None:
+        old = self.registry.get()
+        old.load_knowledge()
+        self.assertIn("15 秒", old.rag.retrieve("毛肚", top_k=1)[0])
+        self._write(self.kb, "毛肚：七上八下，涮 10 秒即可。")
+        result = self.registry.reload("default")
+        self.assertEqual(result["changed"], ["knowledge"])
+        new = self.registry.get()
+        self.assertTrue(new.knowledge_loaded)
+        self.assertNotEqual(new.collection_name, old.collection_name)
+        self.assertIn("10 秒", new.rag.retrieve("毛肚", top_k=1)[0])
+        # 宽限期为 0：旧集合立即删除
+        names = {c.name for c in new.rag._vectorstore._client.list_collections()}
+        self.assertNotIn(old.collection_name, names)
+
+    def test_shared_collections_kept_until_startup_prune(self) -> None:
+        # 多 worker：热更新不删除旧集合（其它 worker 可能仍在用），下次启动时统一清理
+        self.registry.drop_retired = False
+        old = self.registry.get()
+        old.load_knowledge()
+        self._write(self.kb, "毛肚：七上八下，涮 10 秒即可。")
+        self.registry.reload("default")
+        new = self.registry.get()
+        names = {c.name for c in new.rag._vectorstore._client.list_collections()}
+        self.assertIn(old.collection_name, names)
+        self.assertIn("15 秒", old.rag.retrieve("毛肚", top_k=1)[0])
+
+        restarted = StoreRegistry(
+            data_dir=self.data, persist_directory=str(self.tmp / "chroma"), embeddings=FakeEmbeddings(),
+        )
+        self.assertEqual(restarted.prune_collections(), [old.collection_name])
+        names = {c.name for c in new.rag._vectorstore._client.list_collections()}
+        self.assertEqual(names, {new.collection_name})
+        self.assertEqual(restarted.prune_collections(), [])
+
+    def test_same_collection_is_kept(self) -> None:
+        old = self.registry.get()
+        old.load_knowledge()
+        self._write(self.menu_path, json.dumps(_menu("肥牛"), ensure_ascii=False))
+        self.registry.reload("default")
+        new = self.registry.get()
+        self.assertEqual(new.collection_name, old.collection_name)
+        self.assertEqual(new.rag.count(), 1)
+
+    def test_failed_build_keeps_old_snapshot(self) -> None:
+        old = self.registry.get()
+        self._write(self.menu_path, "{ 不是 JSON")
+        result = self.registry.reload("default")
+        self.assertFalse(result["swapped"])
+        self.assertTrue(result["reason"].startswith("error"))
+        self.assertIs(self.registry.get(), old)
+
+    def test_watcher_debounces(self) -> None:
+        self.registry.get()
+        watcher = SourceWatcher(self.registry, interval_s=0)
+        self.assertEqual(watcher.poll_once(), [])
+        self._write(self.menu_path, json.dumps(_menu("肥牛", "鸭血"), ensure_ascii=False))
+        # 第一次发现变化只记下签名，下一轮签名不变才重新加载
+        self.assertEqual(watcher.poll_once(), [])
+        results = watcher.poll_once()
+        self.assertEqual([r["swapped"] for r in results], [True])
+        self.assertEqual(watcher.poll_once(), [])
+
+    def test_concierge_uses_snapshot_menu(self) -> None:
+        state = {"customer_profile": {"num_guests": 2, "allergies": []}}
+        out = inventory_node(state, {"configurable": {"menu": _menu("鸭血")}})
+        self.assertEqual(out["cart"], ["item0"])
+
+
+class TestAdminReload(unittest.TestCase):
+    def setUp(self) -> None:
+        self._saved = (web_app.ADMIN_TOKEN, web_app._stores)
+        web_app._stores = make_registry(temp_dir(self))
+
+    def tearDown(self) -> None:
+        web_app.ADMIN_TOKEN, web_app._stores = self._saved
+
+    def test_token_required(self) -> None:
+        web_app.ADMIN_TOKEN = ""
+        with self.assertRaises(HTTPException) as cm:
+            web_app.require_admin("anything")
+        self.assertEqual(cm.exception.status_code, 403)
+        web_app.ADMIN_TOKEN = "s3cret"
+        with self.assertRaises(HTTPException) as cm:
+            web_app.require_admin("wrong")
+        self.assertEqual(cm.exception.status_code, 401)
+        self.assertIsNone(web_app.require_admin("s3cret"))
+
+    def test_reload_endpoint(self) -> None:
+        web_app._stores.get()
+        resp = asyncio.run(web_app.admin_reload(ReloadRequest(force=True)))
+        self.assertEqual([r["store_id"] for r in resp.results], ["default"])
+        self.assertTrue(resp.results[0]["swapped"])
+        with self.assertRaises(HTTPException) as cm:
+            asyncio.run(web_app.admin_reload(ReloadRequest(store_id="nowhere")))
+        self.assertEqual(cm.exception.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试检索评测：黄金问题集生成与读取、配置解析、recall@k / MRR 计算与分块配置复用。
+用临时目录与假 embedding，不加载真实模型、不调用 LLM。
+"""
+from __future__ import annotations
+
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from helpers import FakeEmbeddings, temp_dir
+from web.retrieval_eval import (
+    GOLDEN_FILENAME,
+    GoldenQuestion,
+    RetrievalConfig,
+    evaluate,
+    format_results,
+    load_golden_file,
+    menu_golden_questions,
+)
+from web.stores import StoreRegistry
+
+_NAMES = ["毛肚", "鸭肠", "黄喉", "肥牛", "虾滑", "鸭血", "藕片", "海带"]
+_TEXT = (
+    "【蘸料搭配知识】\n万能蘸料：蒜泥 + 香油 + 蚝油 + 香菜 + 葱花，适合所有锅底和食材。\n\n"
+    "【67 种食材详细介绍】\n"
+    + "\n".join(f"{i + 1}. {n}：下锅后煮 {i + 2} 分钟，口感很好。" for i, n in enumerate(_NAMES))
+)
+
+
+def _menu() -> dict:
+    return {
+        "ingredients": [{"id": f"item{i}", "name_cn": n, "category": "meat"} for i, n in enumerate(_NAMES)],
+        "soup_bases": [{"id": "tomato", "name_cn": "番茄锅", "spicy": False}],
+    }
+
+
+class TestGoldenSet(unittest.TestCase):
+    def test_menu_questions(self) -> None:
+        questions = menu_golden_questions(_menu())
+        self.assertEqual(len(questions), len(_NAMES) + 1)
+        self.assertEqual(questions[0].question, "毛肚有什么特点和涮煮建议？")
+        self.assertEqual(questions[-1].question, "番茄锅有什么特点和适合什么人？")
+        self.assertTrue(questions[0].relevant("11. 毛肚：七上八下"))
+        self.assertFalse(questions[0].relevant("12. 鸭肠：脆嫩"))
+
+    def test_repo_golden_file_matches_knowledge(self) -> None:
+        questions = load_golden_file(_ROOT / "data" / GOLDEN_FILENAME)
+        self.assertGreater(len(questions), 10)
+        text = (_ROOT / "data" / "sample.txt").read_text(encoding="utf-8")
+        for q in questions:
+            self.assertTrue(any(k in text for k in q.expect), q.question)
+
+    def test_invalid_golden_file(self) -> None:
+        tmp = Path(tempfile.mkdtemp())
+        try:
+            self.assertEqual(load_golden_file(tmp / "missing.json"), [])
+            path = tmp / GOLDEN_FILENAME
+            path.write_text(json.dumps([{"question": "没有期望"}], ensure_ascii=False), encoding="utf-8")
+            with self.assertRaises(ValueError):
+                load_golden_file(path)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def test_parse_config(self) -> None:
+        cfg = RetrievalConfig.parse("small:chunk_size=300,chunk_overlap=30,ingredient_splitting=0")
+        self.assertEqual((cfg.name, cfg.chunk_size, cfg.chunk_overlap), ("small", 300, 30))
+        self.assertFalse(cfg.ingredient_splitting)
+        self.assertEqual(cfg.top_k, RetrievalConfig("x").top_k)
+        self.assertEqual(RetrievalConfig.parse("baseline"), RetrievalConfig("baseline"))
+        with self.assertRaises(ValueError):
+            RetrievalConfig.parse("bad:unknown=1")
+
+
+class TestEvaluate(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = temp_dir(self)
+        data = self.tmp / "data"
+        data.mkdir()
+        (data / "hotpot_menu.json").write_text(json.dumps(_menu(), ensure_ascii=False), encoding="utf-8")
+        (data / "sample.txt").write_text(_TEXT, encoding="utf-8")
+        registry = StoreRegistry(data_dir=data, persist_directory=str(self.tmp / "chroma"), embeddings=FakeEmbeddings(dim=256))
+        self.store = registry.get()
+        self.questions = menu_golden_questions(_menu())[: len(_NAMES)] + [
+            GoldenQuestion("万能蘸料怎么调？", ("万能蘸料",)),
+        ]
+
+    def test_side_by_side(self) -> None:
+        configs = [
+            RetrievalConfig("baseline"),
+            RetrievalConfig("top1", top_k=1),
+            RetrievalConfig("no-split", ingredient_splitting=False),
+        ]
+        results = evaluate(self.store, self.questions, configs, str(self.tmp / "eval"), recall_ks=(1, 3), repeat=2)
+        base, top1, nosplit = results
+        self.assertEqual(base.questions, len(self.questions))
+        # 每种食材单独成块 + 名称 boost：第一名即为对应食材
+        self.assertEqual(base.recall[1], 1.0)
+        self.assertEqual(base.mrr, 1.0)
+        self.assertEqual(base.misses, [])
+        self.assertLessEqual(top1.avg_context_tokens, base.avg_context_tokens)
+        # 同样分块的配置共用一个集合
+        self.assertEqual((top1.chunks, top1.build_ms), (base.chunks, base.build_ms))
+        self.assertLess(nosplit.chunks, base.chunks)
+        for r in results:
+            self.assertLessEqual(r.latency_ms["p50"], r.latency_ms["p95"])
+            self.assertLessEqual(r.latency_ms["p95"], r.latency_ms["p99"])
+            self.assertEqual(set(r.as_dict()["recall"]), {"@1", "@3"})
+        table = format_results(results)
+        self.assertIn("no-split", table)
+        self.assertIn("R@3", table)
+
+
+if __name__ == "__main__":
+    unittest.main()
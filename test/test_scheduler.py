@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试 LLM 准入控制：并发上限、优先级、会话公平、令牌桶限速、排队超时 / 队列已满甩负载，
+以及 /api/chat 在繁忙时的快速回复。用假 LLM 与假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from core import metrics, scheduler, tracing
+from core.scheduler import PRIORITY_CONCIERGE, PRIORITY_KNOWLEDGE, PRIORITY_ORDER, LLMBusy, LLMScheduler
+from helpers import make_registry, temp_dir
+from web.schemas import ChatRequest
+from web.stores import DEFAULT_STORE_ID
+
+web_app = importlib.import_module("web.app")
+
+
+def _wait_queued(s: LLMScheduler, n: int) -> None:
+    deadline = time.monotonic() + 2
+    while s.gauges()["llm.queue_depth"] < n and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+class TestLLMScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        metrics.reset()
+
+    def _enqueue(self, s: LLMScheduler, label: str, priority: int, session: str, served: list) -> threading.Thread:
+        def run() -> None:
+            s.acquire(priority, session)
+            served.append(label)
+            s.release(session)
+
+        t = threading.Thread(target=run)
+        t.start()
+        return t
+
+    def test_concurrency_bound(self) -> None:
+        s = LLMScheduler(max_concurrency=2)
+        lock = threading.Lock()
+        active, peak = [0], [0]
+
+        def call(i: int) -> None:
+            s.acquire(PRIORITY_KNOWLEDGE, f"s{i}")
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.03)
+            with lock:
+                active[0] -= 1
+            s.release(f"s{i}")
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(metrics.get("llm.admitted"), 6)
+        self.assertGreater(metrics.get("llm.queue_wait_ms"), 0)
+        g = s.gauges()
+        self.assertEqual((g["llm.queue_depth"], g["llm.inflight"]), (0, 0))
+        self.assertIn("llm.queue_wait_p95_ms", g)
+
+    def test_priority_order(self) -> None:
+        s = LLMScheduler(max_concurrency=1)
+        s.acquire(PRIORITY_KNOWLEDGE, "holder")
+        served: list[str] = []
+        threads = []
+        for i, (label, prio) in enumerate(
+            (("knowledge", PRIORITY_KNOWLEDGE), ("concierge", PRIORITY_CONCIERGE), ("order", PRIORITY_ORDER))
+        ):
+            threads.append(self._enqueue(s, label, prio, f"s{i}", served))
+            _wait_queued(s, i + 1)
+        self.assertEqual(s.gauges()["llm.queue_depth.order"], 1)
+        s.release("holder")
+        for t in threads:
+            t.join()
+        self.assertEqual(served, ["order", "concierge", "knowledge"])
+
+    def test_session_fairness(self) -> None:
+        s = LLMScheduler(max_concurrency=1)
+        s.acquire(PRIORITY_KNOWLEDGE, "holder")
+        served: list[str] = []
+        threads = []
+        for i, (label, session) in enumerate((("a1", "a"), ("a2", "a"), ("a3", "a"), ("b1", "b"))):
+            threads.append(self._enqueue(s, label, PRIORITY_KNOWLEDGE, session, served))
+            _wait_queued(s, i + 1)
+        s.release("holder")
+        for t in threads:
+            t.join()
+        # 同一优先级内，b 的第一条排在 a 的第二、三条之前
+        self.assertEqual(served, ["a1", "b1", "a2", "a3"])
+
+    def test_shed_on_queue_timeout(self) -> None:
+        s = LLMScheduler(max_concurrency=1, queue_timeout=0.05)
+        s.acquire(PRIORITY_ORDER, "holder")
+        t0 = time.monotonic()
+        with self.assertRaises(LLMBusy):
+            s.acquire(PRIORITY_KNOWLEDGE, "a")
+        self.assertLess(time.monotonic() - t0, 1.0)
+        self.assertEqual(metrics.get("llm.shed.timeout"), 1)
+        self.assertEqual(s.gauges()["llm.queue_depth"], 0)
+        # 超时离队的队首不会卡住后面的请求
+        s.release("holder")
+        s.acquire(PRIORITY_KNOWLEDGE, "b")
+        s.release("b")
+
+    def test_shed_on_full_queue(self) -> None:
+        s = LLMScheduler(max_concurrency=1, max_queue=1)
+        s.acquire(PRIORITY_ORDER, "holder")
+        served: list[str] = []
+        waiting = self._enqueue(s, "a", PRIORITY_KNOWLEDGE, "a", served)
+        _wait_queued(s, 1)
+        with self.assertRaises(LLMBusy):
+            s.acquire(PRIORITY_ORDER, "b")
+        self.assertEqual(metrics.get("llm.shed.queue_full"), 1)
+        s.release("holder")
+        waiting.join()
+        self.assertEqual(served, ["a"])
+
+    def test_token_bucket_paces_calls(self) -> None:
+        s = LLMScheduler(max_concurrency=4, rpm=1200, burst=1)
+        t0 = time.monotonic()
+        for i in range(5):
+            s.acquire(PRIORITY_KNOWLEDGE, "a")
+            s.release("a")
+        # 每秒 20 个令牌、桶容量 1：第 1 个立即放行，其余每个约 50 ms
+        self.assertGreaterEqual(time.monotonic() - t0, 0.18)
+
+    def test_request_context_reaches_worker_threads(self) -> None:
+        s = scheduler.configure(max_concurrency=1)
+        try:
+            s.acquire(PRIORITY_KNOWLEDGE, "holder")
+
+            def call() -> None:
+                with scheduler.slot():
+                    pass
+
+            with scheduler.request(PRIORITY_ORDER, "table-1"), ThreadPoolExecutor(1) as pool:
+                fut = pool.submit(tracing.bind(call))
+                _wait_queued(s, 1)
+                self.assertEqual(s.gauges()["llm.queue_depth.order"], 1)
+                s.release("holder")
+                fut.result(timeout=2)
+        finally:
+            scheduler.configure()
+
+
+class TestChatWhenBusy(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = temp_dir(self)
+        registry = make_registry(
+            self.tmp,
+            "毛肚：七上八下，涮约 15 秒口感最脆。\n\n虾滑：下锅后煮 3 分钟浮起即可。\n\n番茄锅底酸甜开胃，适合不吃辣的人。",
+        )
+        self._saved = (web_app._stores, web_app._router)
+        web_app._stores = registry
+        web_app._router = None
+        registry.get(DEFAULT_STORE_ID).load_knowledge()
+        # 唯一的槽位被占住，排队 50 ms 即甩负载
+        self.scheduler = scheduler.configure(max_concurrency=1, queue_timeout=0.05)
+        self.scheduler.acquire(PRIORITY_ORDER, "holder")
+
+    def tearDown(self) -> None:
+        self.scheduler.release("holder")
+        scheduler.configure()
+        web_app._stores, web_app._router = self._saved
+
+    def test_concierge_gets_busy_reply(self) -> None:
+        llm = mock.MagicMock()
+        with mock.patch("concierge.graph.get_llm", return_value=llm):
+            resp = asyncio.run(web_app.chat(ChatRequest(message="我们三个人，微辣，没有忌口")))
+        self.assertEqual(resp.reply, web_app.BUSY_REPLY)
+        self.assertTrue(resp.degraded)
+        llm.invoke.assert_not_called()
+        # 本轮没有写入对话状态，用户重发即可
+        self.assertNotIn("messages", web_app._sessions.get(resp.session_id, {}))
+
+    def test_knowledge_question_degrades_to_extractive_answer(self) -> None:
+        chain = mock.MagicMock()
+        store = web_app._stores.get(DEFAULT_STORE_ID)
+        with mock.patch.object(store.rag, "_get_combine_chain", return_value=chain):
+            resp = asyncio.run(web_app.chat(ChatRequest(message="毛肚涮多久比较好？")))
+        self.assertEqual(resp.source, "rag")
+        self.assertTrue(resp.degraded)
+        self.assertIn("毛肚", resp.reply)
+        chain.invoke.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试食材搜索索引与 GET /api/ingredients/search：中英文前缀与中缀、俗称、拼音全拼与首字母、拼写错误的模糊匹配、
+按匹配质量与 popularity_rank 排序、预排好的短前缀结果与直接扫描一致，以及内置拼音字表覆盖菜单用字。不调用 Gemini。
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from concierge.menu_loader import get_menu_index
+from helpers import AppTestCase
+from web import search
+from web.pinyin import PINYIN
+from web.search import IngredientSearch
+
+web_app = importlib.import_module("web.app")
+
+
+class TestIngredientSearch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.menu = get_menu_index()
+        cls.index = IngredientSearch.from_menu(cls.menu)
+
+    def _top(self, q: str, limit: int = 10) -> list[tuple[str, str]]:
+        return [(r["id"], r["match"]) for r in self.index.search(q, limit)]
+
+    def test_pinyin_table_covers_menu(self) -> None:
+        names = [it["name_cn"] for it in self.menu.ingredients + self.menu.soup_bases]
+        self.assertEqual({ch for name in names for ch in name} - set(PINYIN), set())
+
+    def test_names_synonyms_and_pinyin(self) -> None:
+        self.assertEqual(self._top("肥牛")[0], ("beef_sliced", "exact"))
+        self.assertEqual(self._top("feiniu")[0], ("beef_sliced", "pinyin"))
+        self.assertEqual(self._top("fn")[0], ("beef_sliced", "pinyin"))
+        self.assertEqual(self._top("xlh")[0], ("broccoli", "pinyin"))
+        self.assertEqual(self._top("tudou")[0], ("potato_slices", "pinyin"))
+        self.assertEqual(self._top("Fei Niu")[0], ("beef_sliced", "pinyin"))
+        self.assertEqual(self._top("  Beef   SL")[0], ("beef_sliced", "prefix"))
+
+    def test_infix_ranked_after_prefix(self) -> None:
+        results = self._top("豆腐")
+        self.assertEqual(results[0], ("bean_curd_wrapper", "prefix"))
+        self.assertTrue({"frozen_tofu", "regular_tofu", "fish_tofu"} <= {iid for iid, _ in results})
+        self.assertEqual({m for _, m in results[1:]}, {"infix"})
+        self.assertIn("frozen_tofu", [iid for iid, _ in self._top("tofu")])
+
+    def test_ranked_by_popularity_within_tier(self) -> None:
+        results = self.index.search("牛", 10)
+        ranks = [self.menu.item_by_id[r["id"]]["popularity_rank"] for r in results if r["match"] == "prefix"]
+        self.assertEqual(ranks, sorted(ranks))
+        self.assertEqual(len(self.index.search("b", 3)), 3)
+
+    def test_fuzzy_typos(self) -> None:
+        self.assertEqual(self._top("brocoli")[0], ("broccoli", "fuzzy"))
+        self.assertEqual(self._top("feinui")[0], ("beef_sliced", "fuzzy"))
+        self.assertEqual(self._top("lobstr ball")[0], ("lobster_ball", "fuzzy"))
+        self.assertEqual(self.index.search("zzqx"), [])
+        self.assertEqual(self.index.search("  "), [])
+
+    def test_hot_prefixes_match_scan(self) -> None:
+        # SCAN_LIMIT 调小后几乎每个前缀都走预排好的结果，排序须与直接扫描一致
+        with mock.patch.object(search, "SCAN_LIMIT", 2):
+            hot = IngredientSearch.from_menu(self.menu)
+        self.assertGreater(len(hot._hot), len(self.index._hot))
+        for q in ("牛", "b", "be", "n", "niu", "豆", "豆腐", "f", "fish", "x", "鱼", "d"):
+            self.assertEqual(hot.search(q, 10), self.index.search(q, 10), q)
+
+
+class TestSearchEndpoint(AppTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        east = self.tmp / "data" / "stores" / "east"
+        east.mkdir()
+        (east / "hotpot_menu.json").write_text(
+            '{"ingredients": [{"id": "wagyu", "name_cn": "和牛", "name_en": "Wagyu Beef", "popularity_rank": 1}]}',
+            encoding="utf-8",
+        )
+
+    def test_search_endpoint(self) -> None:
+        resp = self.client.get("/api/ingredients/search", params={"q": "feiniu", "limit": 3})
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["query"], "feiniu")
+        self.assertEqual(body["results"][0]["id"], "beef_sliced")
+        self.assertEqual(set(body["results"][0]), {"id", "name_cn", "name_en", "category", "match"})
+
+        east = self.client.get("/api/ingredients/search", params={"q": "wagyu", "store_id": "east"}).json()
+        self.assertEqual([r["id"] for r in east["results"]], ["wagyu"])
+        self.assertEqual(self.client.get("/api/ingredients/search", params={"q": ""}).status_code, 422)
+        self.assertEqual(self.client.get("/api/ingredients/search", params={"q": "a", "limit": 500}).status_code, 422)
+        self.assertEqual(self.client.get("/api/ingredients/search", params={"q": "a", "store_id": "nowhere"}).status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试多门店注册表：门店配置解析、懒加载、LRU 驻留与共享 embedding。
+用临时目录与假 embedding，不加载真实模型。
+"""
+from __future__ import annotations
+
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from helpers import make_registry, temp_dir
+from web import stores
+from web.stores import DEFAULT_STORE_ID, UnknownStoreError
+
+
+class TestStoreRegistry(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = temp_dir(self)
+        self.registry = make_registry(self.tmp, "默认门店：番茄锅底酸甜开胃。")
+        data = self.registry.data_dir
+        small_menu = {"ingredients": [{"id": "tofu_only", "name_cn": "嫩豆腐", "category": "tofu"}], "soup_bases": []}
+        for sid in ("east", "west"):
+            d = data / "stores" / sid
+            d.mkdir()
+            (d / "knowledge.txt").write_text(f"{sid} 门店：本店招牌是麻辣牛油锅。", encoding="utf-8")
+        (data / "stores" / "west" / "hotpot_menu.json").write_text(
+            json.dumps(small_menu, ensure_ascii=False), encoding="utf-8"
+        )
+
+    def test_config_and_menu_fallback(self) -> None:
+        self.assertEqual(self.registry.store_ids(), [DEFAULT_STORE_ID, "east", "west"])
+        east = self.registry.get("east")
+        west = self.registry.get("west")
+        # east 没有自己的菜单，沿用默认菜单；west 使用门店菜单
+        self.assertIn("beef_sliced", east.menu_index.ingredient_ids)
+        self.assertEqual(west.menu_index.ingredient_ids, frozenset({"tofu_only"}))
+        self.assertNotEqual(east.config.collection_name, west.config.collection_name)
+        with self.assertRaises(UnknownStoreError):
+            self.registry.get("north")
+        with self.assertRaises(UnknownStoreError):
+            self.registry.get("../data")
+
+    def test_failed_loads_leave_no_loading_locks(self) -> None:
+        for i in range(100):
+            with self.assertRaises(UnknownStoreError):
+                self.registry.get(f"bogus{i}")
+        self.assertEqual(self.registry._loading, {})
+        with mock.patch.object(stores, "StoreContext", side_effect=OSError("menu unreadable")):
+            with self.assertRaises(OSError):
+                self.registry.get("east")
+        self.assertEqual(self.registry._loading, {})
+        # 失败后再次访问可以正常加载
+        self.assertEqual(self.registry.get("east").store_id, "east")
+        self.assertEqual(self.registry._loading, {})
+
+    def test_knowledge_is_lazy_and_embeddings_shared(self) -> None:
+        east = self.registry.get("east")
+        self.assertFalse(east.knowledge_loaded)
+        self.assertIn("麻辣牛油锅", " ".join(east.rag.retrieve("招牌", top_k=1)))
+        west = self.registry.get("west")
+        self.assertIs(east.rag._embeddings, west.rag._embeddings)
+        self.assertIs(self.registry.get("east"), east)
+        self.assertEqual(self.registry.loads, 2)
+
+    def test_lru_eviction_under_memory_cap(self) -> None:
+        for sid in ("east", "west", DEFAULT_STORE_ID):
+            self.registry.get(sid).load_knowledge()
+        one_store = self.registry.get("east").approx_bytes()
+        self.registry.memory_cap_bytes = one_store * 2
+        self.registry.get("west")
+        stats = self.registry.stats()
+        resident = [r["store_id"] for r in stats["resident"]]
+        # 最久未用的默认门店被逐出，最近使用的两家保留
+        self.assertEqual(resident, ["east", "west"])
+        self.assertGreaterEqual(stats["evictions"], 1)
+        # 逐出后再次访问会重新加载，集合已有数据，不重复录入
+        again = self.registry.get(DEFAULT_STORE_ID)
+        again.load_knowledge()
+        self.assertEqual(again.rag.count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
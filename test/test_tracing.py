@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试请求追踪：嵌套 span 与父子关系、跨线程池传递、尾部采样、JSONL 导出与轮转、关键路径汇总，
+以及 /api/chat 一次知识问答的完整 trace。用临时目录与假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import json
+import sys
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from starlette.concurrency import run_in_threadpool
+
+from core import tracing
+from core.deadline import Deadline, hedged_call
+from core.trace_summary import critical_path, format_trace, load_traces, summarize, trace_files
+from helpers import make_registry, temp_dir
+from web.schemas import ChatRequest
+from web.stores import DEFAULT_STORE_ID
+
+web_app = importlib.import_module("web.app")
+
+
+class _TracingCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = temp_dir(self)
+        self.path = self.tmp / "traces.jsonl"
+
+    def tearDown(self) -> None:
+        tracing.flush()
+        tracing.configure(None)
+
+    def _read(self) -> list[dict]:
+        tracing.flush()
+        return load_traces(self.path)
+
+
+class TestSpans(_TracingCase):
+    def test_disabled_is_noop(self) -> None:
+        tracing.configure(self.path)
+        self.assertFalse(tracing.enabled())
+        with tracing.start_trace("chat") as trace:
+            with tracing.span("retrieve") as sp:
+                sp.set(k=8)
+                self.assertIsNone(tracing.current_trace_id())
+        self.assertFalse(trace.exported)
+        self.assertFalse(self.path.exists())
+
+    def test_nested_spans_and_threads(self) -> None:
+        tracing.configure(self.path, sample_rate=1.0)
+
+        def work(name: str) -> str:
+            with tracing.span(name):
+                return tracing.current_trace_id()
+
+        async def handler() -> list:
+            with tracing.span("outer") as outer:
+                outer.set(k=16)
+                ids = [await run_in_threadpool(work, "threadpool")]
+                with ThreadPoolExecutor(1) as pool:
+                    ids.append(pool.submit(tracing.bind(work), "bound").result())
+                    # 未 bind 的任务看不到调用方的 trace
+                    ids.append(pool.submit(work, "unbound").result())
+            return ids
+
+        with tracing.start_trace("chat", store_id="default") as trace:
+            ids = asyncio.run(handler())
+        self.assertEqual(ids, [trace.trace_id, trace.trace_id, None])
+        self.assertTrue(trace.exported)
+
+        [t] = self._read()
+        by_name = {s["name"]: s for s in t["spans"]}
+        self.assertEqual(set(by_name), {"chat", "outer", "threadpool", "bound"})
+        self.assertIsNone(by_name["chat"]["parent_id"])
+        self.assertEqual(by_name["outer"]["parent_id"], by_name["chat"]["span_id"])
+        self.assertEqual(by_name["threadpool"]["parent_id"], by_name["outer"]["span_id"])
+        self.assertEqual(by_name["bound"]["parent_id"], by_name["outer"]["span_id"])
+        self.assertEqual(by_name["outer"]["attrs"], {"k": 16})
+        self.assertEqual(t["attrs"], {"store_id": "default"})
+
+    def test_hedged_call_span_under_caller(self) -> None:
+        tracing.configure(self.path, sample_rate=1.0)
+        calls = []
+
+        def slow_llm() -> str:
+            calls.append(1)
+            with tracing.span("llm"):
+                time.sleep(0.15 if len(calls) == 1 else 0.0)
+            return "ok"
+
+        with tracing.start_trace("chat"):
+            with tracing.span("rag_answer"):
+                self.assertEqual(hedged_call(slow_llm, Deadline(2.0), hedge_delay=0.05), "ok")
+        [t] = self._read()
+        rag = next(s for s in t["spans"] if s["name"] == "rag_answer")
+        llm = [s for s in t["spans"] if s["name"] == "llm"]
+        self.assertEqual(len(llm), 2)
+        self.assertTrue(all(s["parent_id"] == rag["span_id"] for s in llm))
+        self.assertEqual(rag["attrs"].get("hedge"), "won")
+
+
+class TestSamplingAndExport(_TracingCase):
+    def test_slow_requests_always_kept(self) -> None:
+        tracing.configure(self.path, slow_ms=20)
+        with tracing.start_trace("fast") as fast:
+            pass
+        with tracing.start_trace("slow") as slow:
+            time.sleep(0.03)
+        self.assertFalse(fast.exported)
+        self.assertTrue(slow.exported)
+        self.assertEqual([t["name"] for t in self._read()], ["slow"])
+
+    def test_rotation(self) -> None:
+        tracing.configure(self.path, sample_rate=1.0, max_bytes=600, backups=2)
+        for i in range(30):
+            with tracing.start_trace("chat", i=i):
+                with tracing.span("retrieve"):
+                    pass
+        traces = self._read()
+        self.assertEqual(len(trace_files(self.path)), 3)
+        self.assertLess(len(traces), 30)
+        # 轮转文件按从旧到新读取，最新的 trace 在最后
+        self.assertEqual(traces[-1]["attrs"]["i"], 29)
+        self.assertEqual([t["attrs"]["i"] for t in traces], sorted(t["attrs"]["i"] for t in traces))
+
+
+def _span(name, span_id, parent, start, dur, **attrs) -> dict:
+    return {"name": name, "span_id": span_id, "parent_id": parent, "start_ms": start, "duration_ms": dur, "attrs": attrs}
+
+
+class TestSummary(unittest.TestCase):
+    TRACE = {
+        "trace_id": "t1",
+        "duration_ms": 100.0,
+        "attrs": {"source": "rag"},
+        "spans": [
+            _span("chat", "a", None, 0, 100),
+            _span("route", "b", "a", 2, 8, intent="knowledge"),
+            _span("rag_answer", "c", "a", 12, 85),
+            _span("retrieve", "d", "c", 13, 10, k=16),
+            _span("llm", "e", "c", 25, 70),
+            # 被放弃的对冲调用：未结束，不参与关键路径
+            _span("llm", "f", "c", 40, None),
+        ],
+    }
+
+    def test_critical_path_self_time(self) -> None:
+        path = critical_path(self.TRACE)
+        self.assertEqual([s["name"] for s in path], ["chat", "route", "rag_answer", "retrieve", "llm"])
+        self.assertEqual([s["depth"] for s in path], [0, 1, 1, 2, 2])
+        self.assertAlmostEqual(sum(s["self_ms"] for s in path), 100.0)
+        self.assertAlmostEqual(path[0]["self_ms"], 7.0)
+        self.assertAlmostEqual(path[2]["self_ms"], 5.0)
+
+    def test_parallel_children_take_latest(self) -> None:
+        trace = {"spans": [
+            _span("root", "a", None, 0, 50),
+            _span("x", "b", "a", 0, 20),
+            _span("y", "c", "a", 0, 45),
+        ]}
+        self.assertEqual([s["name"] for s in critical_path(trace)], ["root", "y"])
+
+    def test_summarize_and_format(self) -> None:
+        fast = {**self.TRACE, "trace_id": "t0", "duration_ms": 10.0, "spans": [_span("chat", "z", None, 0, 10)]}
+        text = summarize([fast, self.TRACE], top=1)
+        self.assertIn("共 2 条 trace", text)
+        self.assertIn("t1", text)
+        self.assertNotIn("t0  ", text)
+        self.assertLess(text.index("llm"), text.index("route"))
+        tree = format_trace(self.TRACE)
+        self.assertIn("未结束", tree)
+        self.assertIn("intent=knowledge", tree)
+
+
+class TestChatTrace(_TracingCase):
+    def setUp(self) -> None:
+        super().setUp()
+        registry = make_registry(
+            self.tmp,
+            "毛肚：七上八下，涮约 15 秒口感最脆。\n\n虾滑：下锅后煮 3 分钟浮起即可。\n\n番茄锅底酸甜开胃，适合不吃辣的人。",
+        )
+        self._saved = (web_app._stores, web_app._router, web_app.RAG_LATENCY_BUDGET_MS)
+        web_app._stores = registry
+        web_app._router = None
+        # 预算为 0：检索照常执行，生成直接降级为抽取式答案，不调用 Gemini
+        web_app.RAG_LATENCY_BUDGET_MS = 0
+        registry.get(DEFAULT_STORE_ID).load_knowledge()
+        tracing.configure(self.path, sample_rate=1.0)
+
+    def tearDown(self) -> None:
+        web_app._stores, web_app._router, web_app.RAG_LATENCY_BUDGET_MS = self._saved
+        super().tearDown()
+
+    def test_knowledge_question_trace(self) -> None:
+        resp = asyncio.run(web_app.chat(ChatRequest(message="毛肚涮多久比较好？")))
+        self.assertEqual(resp.source, "rag")
+        self.assertIsNotNone(resp.trace_id)
+        [t] = self._read()
+        self.assertEqual(t["trace_id"], resp.trace_id)
+        self.assertEqual(t["attrs"]["source"], "rag")
+        names = [s["name"] for s in t["spans"]]
+        for name in ("route", "embed_query", "faq_lookup", "rag_answer", "expand", "retrieve", "vector_search", "assemble_context"):
+            self.assertIn(name, names)
+        # query 只编码一次
+        self.assertEqual(names.count("embed_query"), 1)
+        by_id = {s["span_id"]: s for s in t["spans"]}
+        retrieve = next(s for s in t["spans"] if s["name"] == "retrieve")
+        self.assertEqual(by_id[retrieve["parent_id"]]["name"], "rag_answer")
+        self.assertGreater(retrieve["attrs"]["scanned"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试 WebSocket 通道（/ws）：连接绑定 session、推荐帧附带购物车增量、购物车版本冲突、
+下单确认推送 order_confirmed、对话增减食材推送 cart_updated、无效帧与未知门店。用临时目录与假 embedding，不调用 Gemini。
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from core import metrics
+from helpers import AppTestCase
+from web.kitchen import KitchenBoard
+from web.orders import OrderStore
+from web.stores import DEFAULT_STORE_ID
+
+web_app = importlib.import_module("web.app")
+
+
+class TestWebSocket(AppTestCase):
+    def setUp(self) -> None:
+        metrics.reset()
+        super().setUp()
+        self.orders = OrderStore(self.tmp / "orders.db")
+        self.addCleanup(self.orders.close)
+        self.patch_app(_orders=self.orders, _kitchen=KitchenBoard())
+        self.menu = self.registry.get(DEFAULT_STORE_ID).menu_index
+
+    def _recommend(self, ws, **extra) -> dict:
+        ws.send_json({"type": "recommend", "id": "r", "num_guests": 2, **extra})
+        return ws.receive_json()
+
+    def test_session_bound_and_recommend_with_cart(self) -> None:
+        with self.client.websocket_connect("/ws") as ws:
+            hello = ws.receive_json()
+            self.assertEqual((hello["type"], hello["store_id"]), ("hello", DEFAULT_STORE_ID))
+            sid = hello["session_id"]
+            ws.send_json({"type": "ping", "id": "p"})
+            self.assertEqual(ws.receive_json(), {"type": "pong", "id": "p"})
+
+            rec = self._recommend(ws, session_id="ignored")
+            self.assertEqual((rec["type"], rec["id"], rec["session_id"]), ("recommend", "r", sid))
+            dropped = rec["items"][0]["id"]
+            # 增量与再推荐一帧完成：去掉的食材在新推荐里保持未勾选
+            rec2 = self._recommend(ws, cart={"version": rec["cart_version"], "ops": [{"op": "remove", "id": dropped}]})
+            self.assertTrue(rec2["cart"]["ok"])
+            self.assertFalse(next(it for it in rec2["all_items"] if it["id"] == dropped)["checked"])
+            self.assertNotIn(dropped, self.sessions[sid]["cart"])
+
+        # 重连时续用同一 session，REST 与 WebSocket 共用购物车
+        with self.client.websocket_connect(f"/ws?session_id={sid}") as ws:
+            self.assertEqual(ws.receive_json()["session_id"], sid)
+            version = self.sessions[sid]["cart_version"]
+            ws.send_json({"type": "cart", "id": "c", "version": version - 1, "ops": [{"op": "add", "id": dropped}]})
+            conflict = ws.receive_json()
+            self.assertEqual((conflict["type"], conflict["error"], conflict["version"]), ("cart", "version_conflict", version))
+            ws.send_json({"type": "cart", "id": "c2", "version": version, "ops": [{"op": "add", "id": dropped}]})
+            self.assertTrue(ws.receive_json()["ok"])
+        self.assertIn(dropped, self.sessions[sid]["cart"])
+        self.assertEqual(metrics.get("ws.connected"), 2)
+
+    def test_confirm_pushes_order_event(self) -> None:
+        broth = self.menu.menu["soup_bases"][0]["name_cn"]
+        with self.client.websocket_connect("/ws") as ws:
+            ws.receive_json()
+            self._recommend(ws)
+            ws.send_json({"type": "chat", "id": "k", "message": "确认", "broths": [{"name_cn": broth}]})
+            frames = [ws.receive_json() for _ in range(3)]
+        self.assertEqual([f["type"] for f in frames], ["chat.accepted", "chat", "event"])
+        self.assertEqual(frames[1]["source"], "concierge")
+        self.assertEqual(frames[2]["event"], "order_confirmed")
+        self.assertEqual(frames[2]["order"], frames[1]["order_json"])
+        self.assertEqual(frames[2]["order_id"], frames[1]["order_id"])
+        self.assertEqual(self.orders.get(frames[2]["order_id"])["order"], frames[2]["order"])
+
+    def test_chat_cart_edit_pushes_cart_updated(self) -> None:
+        with self.client.websocket_connect("/ws") as ws:
+            sid = ws.receive_json()["session_id"]
+            rec = self._recommend(ws)
+            item = next(it for it in rec["all_items"] if not it["checked"])
+            with mock.patch.object(web_app, "_route_intent", return_value=web_app.INTENT_CART_EDIT), \
+                    mock.patch.object(web_app, "parse_add_remove_item", return_value=(item["id"], True)):
+                ws.send_json({"type": "chat", "id": "k", "message": f"加一份{item['name_cn']}"})
+                frames = [ws.receive_json() for _ in range(3)]
+        self.assertEqual([f["type"] for f in frames], ["chat.accepted", "chat", "event"])
+        self.assertEqual(frames[2]["event"], "cart_updated")
+        self.assertEqual(frames[2]["version"], rec["cart_version"] + 1)
+        self.assertIn(item["id"], frames[2]["cart"])
+        self.assertEqual(self.sessions[sid]["cart_version"], frames[2]["version"])
+
+    def test_invalid_frames(self) -> None:
+        with self.client.websocket_connect("/ws") as ws:
+            ws.receive_json()
+            ws.send_text("{not json")
+            self.assertEqual(ws.receive_json()["error"], "invalid_json")
+            ws.send_json({"type": "order", "id": "x"})
+            self.assertEqual(ws.receive_json(), {"type": "error", "id": "x", "error": "unknown_type"})
+            ws.send_json({"type": "cart", "id": "y", "version": "v"})
+            bad = ws.receive_json()
+            self.assertEqual((bad["id"], bad["error"]), ("y", "invalid_frame"))
+            self.assertEqual({tuple(e["loc"]) for e in bad["detail"]}, {("version",), ("ops",)})
+            # 连接仍可用
+            ws.send_json({"type": "ping"})
+            self.assertEqual(ws.receive_json()["type"], "pong")
+
+    def test_unknown_store(self) -> None:
+        with self.client.websocket_connect("/ws?store_id=nowhere") as ws:
+            frame = ws.receive_json()
+        self.assertEqual(frame["error"], "unknown_store")
+
+
+if __name__ == "__main__":
+    unittest.main()
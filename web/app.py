@@ -3,75 +3,292 @@
 FastAPI 后端：智能火锅点餐顾问 + RAG 知识问答。
 前置路由：知识类问题 → RAG 检索回答；点餐类问题 → LangGraph Concierge。
 """
+import asyncio
+import json
+import logging
 import os
+import random
+import secrets
+import threading
+import time
 import uuid
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from langchain_core.messages import AIMessage
 
-from core import RAG
+from core import memory, metrics, profiling, scheduler, tracing
+from core.deadline import Deadline
+from core.query import QueryContext
+from core.rag import DEFAULT_MIN_SCORE, RAGAnswer
+from core.tracing import DEFAULT_TRACE_FILE
 from concierge import generate_order_struct, run_concierge_once
-from concierge.menu_loader import get_all_items_with_prices, load_menu
-
-from .recommendation import (
-    ALLERGY_GLUTEN,
-    ALLERGY_SEAFOOD,
-    DEFAULT_RECOMMEND_IDS,
-    GLUTEN_IDS,
-    GLUTEN_REPLACEMENTS,
-    SEAFOOD_IDS,
-    SEAFOOD_REPLACEMENTS,
-    ingredient_has_allergen,
-    parse_add_remove_item,
-    recommend_items,
+from concierge.menu_loader import cached_indexes
+
+from . import realtime
+from .assets import ASSET_PREFIX, AssetManifest
+from .batch import batch_summary, iter_batch_answers
+from .cart import CART_OP_ADD, CART_OP_REMOVE, apply_cart_ops, merge_cart, normalize_cart
+from .cooccurrence import (
+    DEFAULT_COOCCURRENCE_REFRESH_S,
+    DEFAULT_MIN_PAIRS,
+    CooccurrenceModel,
+)
+from .kitchen import DEFAULT_PUSH_INTERVAL_S, DEFAULT_SYNC_INTERVAL_S, KitchenBoard, KitchenSync, board_events
+from .orders import (
+    DEFAULT_COMMIT_DELAY_S,
+    DEFAULT_ORDER_DB,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    OrderStore,
+    SnapshotRefresher,
+)
+from .popularity import (
+    DEFAULT_HALF_LIFE_S,
+    DEFAULT_MIN_ORDERS,
+    DEFAULT_REFRESH_INTERVAL_S,
+    PopularityEngine,
+    daypart_of,
 )
+from .recommendation import parse_add_remove_item
+from .routing import INTENT_CART_EDIT, INTENT_KNOWLEDGE, INTENT_ORDER, IntentRouter
 from .schemas import (
+    BatchAskRequest,
     BrothSelectionBody,
+    CartPatchRequest,
     CartUpdateRequest,
     ChatRequest,
     ChatResponse,
+    MemorySnapshotRequest,
+    OrderStatusRequest,
+    ProfileToggleRequest,
     RecommendRequest,
     RecommendResponse,
+    ReloadRequest,
+    ReloadResponse,
 )
+from .search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+from .sessions import DEFAULT_MAX_SESSIONS, DEFAULT_SESSION_TTL_S, SessionStore
+from .stores import (
+    DEFAULT_RELOAD_GRACE_S,
+    DEFAULT_STORE_ID,
+    DEFAULT_STORE_MEMORY_CAP_MB,
+    StoreContext,
+    StoreRegistry,
+    UnknownStoreError,
+)
+from .watcher import DEFAULT_WATCH_INTERVAL_S, SourceWatcher
 
 load_dotenv()
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
 
-# 项目根目录（web 上一级），数据目录与静态目录
-_ROOT = Path(__file__).resolve().parent.parent
-_KNOWLEDGE_DIR = _ROOT / "data"
+# 静态目录；ASSET_HASHING=1（默认）时启动即为 CSS / JS 生成带内容哈希的 /assets/ 地址（长缓存 + 预压缩），
+# 改写 index.html 的引用。调试前端时设为 0，index.html 原样引用 /static/ 下的文件
 STATIC_DIR = Path(__file__).resolve().parent / "static"
+ASSET_HASHING = os.environ.get("ASSET_HASHING", "1") not in ("0", "false", "no", "")
+_assets = AssetManifest(STATIC_DIR) if ASSET_HASHING and STATIC_DIR.exists() else None
+
+# 知识问答的延迟预算与对冲延迟（毫秒）：超过对冲延迟再发一次 Gemini 请求，预算耗尽返回抽取式快速答案
+RAG_LATENCY_BUDGET_MS = float(os.environ.get("RAG_LATENCY_BUDGET_MS", 10000))
+RAG_HEDGE_DELAY_MS = float(os.environ.get("RAG_HEDGE_DELAY_MS", 3000))
+RAG_MIN_SCORE = float(os.environ.get("RAG_MIN_SCORE", DEFAULT_MIN_SCORE))
 
-# ---------- RAG 单例 ----------
-_rag: RAG | None = None
+# 请求追踪：随机采样比例、慢请求阈值（毫秒，超过一律保留）与导出文件；两者均为 0 时关闭
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 0))
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", 0))
+TRACE_FILE = os.environ.get("TRACE_FILE", DEFAULT_TRACE_FILE)
+tracing.configure(TRACE_FILE, sample_rate=TRACE_SAMPLE_RATE, slow_ms=TRACE_SLOW_MS)
 
+# LLM 准入控制：并发上限、供应商配额（每分钟请求数，0 不限速）、排队超时与队列上限，超出时快速回复「繁忙」
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", scheduler.DEFAULT_MAX_CONCURRENCY))
+LLM_RPM = float(os.environ.get("LLM_RPM", 0))
+LLM_QUEUE_TIMEOUT_MS = float(os.environ.get("LLM_QUEUE_TIMEOUT_MS", scheduler.DEFAULT_QUEUE_TIMEOUT_S * 1000))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", scheduler.DEFAULT_MAX_QUEUE))
+scheduler.configure(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    rpm=LLM_RPM,
+    queue_timeout=LLM_QUEUE_TIMEOUT_MS / 1000.0,
+    max_queue=LLM_MAX_QUEUE,
+)
+BUSY_REPLY = "当前用餐高峰，顾问有点忙不过来，请稍等几秒再发一次～"
 
-def _get_rag() -> RAG:
-    global _rag
-    if _rag is None:
-        _rag = RAG()
-    return _rag
+# CPU 剖析：随机剖析的请求比例（0 关闭）、采样间隔、同时剖析的请求上限与 collapsed stack 输出目录。
+# 另可由管理开关（POST /api/admin/profile）或带 X-Profile + X-Admin-Token 请求头的单个请求触发
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", profiling.DEFAULT_INTERVAL_S * 1000))
+PROFILE_MAX_ACTIVE = int(os.environ.get("PROFILE_MAX_ACTIVE", profiling.DEFAULT_MAX_ACTIVE))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", profiling.DEFAULT_PROFILE_DIR)
+_profiler = profiling.StackSampler(PROFILE_DIR, interval=PROFILE_INTERVAL_MS / 1000.0, max_active=PROFILE_MAX_ACTIVE)
+# 管理开关：到期时间（monotonic）与期间的剖析比例
+_profile_until = 0.0
+_profile_rate = 0.0
 
+# WebSocket 通道：每条连接未处理的请求帧上限（超出时新帧返回 busy）
+WS_MAX_PENDING = int(os.environ.get("WS_MAX_PENDING", realtime.DEFAULT_WS_MAX_PENDING))
+
+# ---------- 门店注册表（每店菜单 / 知识集合 / 蘸料规则，懒加载 + LRU 驻留） ----------
+STORE_MEMORY_CAP_MB = float(os.environ.get("STORE_MEMORY_CAP_MB", DEFAULT_STORE_MEMORY_CAP_MB))
+# 热更新：数据文件轮询间隔（0 关闭监视）、旧快照宽限期、管理接口令牌（未设置时管理接口不可用）
+STORE_WATCH_INTERVAL_S = float(os.environ.get("STORE_WATCH_INTERVAL_S", DEFAULT_WATCH_INTERVAL_S))
+RELOAD_GRACE_S = float(os.environ.get("RELOAD_GRACE_S", DEFAULT_RELOAD_GRACE_S))
+# 共用同一持久化目录的 worker 进程数（main.py serve --workers N 自动设置）；多于 1 个时热更新不删除旧向量集合
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", 1))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+_stores: StoreRegistry | None = None
+
+
+def _get_stores() -> StoreRegistry:
+    global _stores
+    if _stores is None:
+        _stores = StoreRegistry(
+            memory_cap_bytes=int(STORE_MEMORY_CAP_MB * 1024 * 1024),
+            reload_grace_s=RELOAD_GRACE_S,
+            drop_retired=SERVE_WORKERS <= 1,
+        )
+    return _stores
+
+
+def get_store(store_id: str | None = None) -> StoreContext:
+    """按 store_id 取门店（缺省为默认门店）；门店不存在时返回 404。"""
+    try:
+        return _get_stores().get(store_id)
+    except UnknownStoreError:
+        raise HTTPException(status_code=404, detail=f"门店不存在: {store_id}")
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    """管理接口鉴权：请求头 X-Admin-Token 须与 ADMIN_TOKEN 一致；未配置 ADMIN_TOKEN 时一律拒绝。"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="管理接口未启用（未设置 ADMIN_TOKEN）")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="管理令牌无效")
+
+
+def _should_profile(scope: dict) -> bool:
+    """是否剖析本请求：管理开关期间或按 PROFILE_SAMPLE_RATE 随机选中，或带 X-Profile 且管理令牌正确。"""
+    if scope["path"].startswith("/api/admin/profile"):
+        return False
+    if _profile_until and time.monotonic() < _profile_until and random.random() < _profile_rate:
+        return True
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return True
+    if ADMIN_TOKEN:
+        headers = dict(scope["headers"])
+        token = headers.get(b"x-admin-token")
+        if b"x-profile" in headers and token and secrets.compare_digest(token, ADMIN_TOKEN.encode("utf-8")):
+            return True
+    return False
+
+
+async def _run_in_thread(fn, *args, **kwargs):
+    """run_in_threadpool，被剖析的请求把线程池中的样本也记到自己名下。"""
+    return await run_in_threadpool(profiling.attach(fn), *args, **kwargs)
+
+
+# ---------- 订单日志（SQLite WAL，组提交；多 worker 共用同一文件） ----------
+ORDER_DB_PATH = os.environ.get("ORDER_DB_PATH", DEFAULT_ORDER_DB)
+# 组提交窗口（毫秒）：第一条确认到达后最多再等这么久，把同期的确认合并成一次提交
+ORDER_COMMIT_DELAY_MS = float(os.environ.get("ORDER_COMMIT_DELAY_MS", DEFAULT_COMMIT_DELAY_S * 1000))
+_orders: OrderStore | None = None
+
+
+def _get_orders() -> OrderStore:
+    global _orders
+    if _orders is None:
+        _orders = OrderStore(ORDER_DB_PATH, commit_delay=ORDER_COMMIT_DELAY_MS / 1000.0)
+    return _orders
+
+
+# 厨房备料看板：增量推送的合并窗口（毫秒）与从订单日志同步其它 worker 写入的间隔（秒，0 关闭）
+KITCHEN_PUSH_INTERVAL_MS = float(os.environ.get("KITCHEN_PUSH_INTERVAL_MS", DEFAULT_PUSH_INTERVAL_S * 1000))
+KITCHEN_SYNC_INTERVAL_S = float(os.environ.get("KITCHEN_SYNC_INTERVAL_S", DEFAULT_SYNC_INTERVAL_S))
+_kitchen: KitchenBoard | None = None
+
+
+def _get_kitchen() -> KitchenBoard:
+    """首次使用时从订单日志加载全部 open 订单。"""
+    global _kitchen
+    if _kitchen is None:
+        board = KitchenBoard()
+        board.load(_get_orders())
+        _kitchen = board
+    return _kitchen
+
+
+# ---------- 点单热度（从订单日志流式统计，驱动推荐顺序） ----------
+# 刷新间隔（秒，0 关闭：推荐沿用手工维护的人气顺序）、衰减半衰期（小时）与启用排名所需的最少（衰减后）订单数
+POPULARITY_REFRESH_S = float(os.environ.get("POPULARITY_REFRESH_S", DEFAULT_REFRESH_INTERVAL_S))
+POPULARITY_HALF_LIFE_H = float(os.environ.get("POPULARITY_HALF_LIFE_H", DEFAULT_HALF_LIFE_S / 3600))
+POPULARITY_MIN_ORDERS = float(os.environ.get("POPULARITY_MIN_ORDERS", DEFAULT_MIN_ORDERS))
+_popularity: PopularityEngine | None = None
+
+
+def _get_popularity() -> PopularityEngine:
+    global _popularity
+    if _popularity is None:
+        _popularity = PopularityEngine(half_life_s=POPULARITY_HALF_LIFE_H * 3600, min_orders=POPULARITY_MIN_ORDERS)
+    return _popularity
+
+
+def _popularity_refresher(interval_s: float = 0.0) -> SnapshotRefresher:
+    return SnapshotRefresher(
+        _get_popularity(), _get_orders(), _get_stores(), StoreContext.apply_popularity, interval_s, name="popularity"
+    )
+
+
+# ---------- 「常一起点」（订单同现，购物车加菜时建议互补食材） ----------
+# 刷新间隔（秒，0 关闭：不给建议）与计入邻居所需的最少同单次数
+COOCCURRENCE_REFRESH_S = float(os.environ.get("COOCCURRENCE_REFRESH_S", DEFAULT_COOCCURRENCE_REFRESH_S))
+COOCCURRENCE_MIN_PAIRS = int(os.environ.get("COOCCURRENCE_MIN_PAIRS", DEFAULT_MIN_PAIRS))
+_cooccurrence: CooccurrenceModel | None = None
+
+
+def _get_cooccurrence() -> CooccurrenceModel:
+    global _cooccurrence
+    if _cooccurrence is None:
+        _cooccurrence = CooccurrenceModel(min_pairs=COOCCURRENCE_MIN_PAIRS)
+    return _cooccurrence
+
+
+def _cooccurrence_refresher(interval_s: float = 0.0) -> SnapshotRefresher:
+    return SnapshotRefresher(
+        _get_cooccurrence(), _get_orders(), _get_stores(), StoreContext.apply_cooccurrence, interval_s, name="cooccurrence"
+    )
+
+
+def _cart_suggestions(store: StoreContext, state: dict, added: list[str], cart) -> list[dict]:
+    """购物车新加入食材后的「常一起点」：按最后加入的食材查门店的预计算表（排除会话过敏项与已在购物车中的食材）。"""
+    if not added:
+        return []
+    allergies = (state.get("customer_profile") or {}).get("allergies") or []
+    ids = store.suggestions.suggest(added[-1], allergies, cart)
+    if ids:
+        metrics.incr("cart.suggestions")
+    by_id = store.menu_index.item_by_id
+    return [{"id": iid, "name_cn": by_id[iid].get("name_cn"), "name_en": by_id[iid].get("name_en")} for iid in ids]
 
-def _auto_ingest():
-    """启动时自动将 data/*.txt 灌入向量数据库（幂等：ChromaDB 会去重）。"""
-    rag = _get_rag()
-    if not _KNOWLEDGE_DIR.exists():
-        return
-    total = 0
-    for f in _KNOWLEDGE_DIR.glob("*.txt"):
-        n = rag.ingest_file(str(f))
-        total += n
-    if total > 0:
-        print(f"[RAG] 已自动录入 {total} 个文本块到知识库。")
 
+# ---------- 意图路由器（质心向量，跨门店共用） ----------
+_router: IntentRouter | None = None
 
-# ---------- 知识类问题路由 ----------
+
+def _get_router() -> IntentRouter:
+    global _router
+    if _router is None:
+        _router = IntentRouter(_get_stores().get_embeddings())
+    return _router
+
+
+# ---------- 知识类问题路由（关键词规则，路由器拿不准时使用） ----------
 KNOWLEDGE_KEYWORDS = [
     "是什么", "什么是", "有什么", "怎么", "如何", "为什么", "适合", "区别",
     "技巧", "注意", "热量", "健康", "营养", "过敏", "禁忌",
@@ -90,41 +307,59 @@ def _is_knowledge_query(text: str) -> bool:
     return any(kw in t for kw in KNOWLEDGE_KEYWORDS)
 
 
-def _expand_rag_query_for_ingredient_or_broth(user_msg: str) -> tuple[str, str | None]:
+def _route_intent(query: QueryContext, store: StoreContext) -> str:
+    """
+    意图路由：先用 query 向量与意图质心比较；路由器拿不准时回退关键词规则。
+    返回 INTENT_KNOWLEDGE / INTENT_CART_EDIT / INTENT_ORDER。
+    """
+    with tracing.span("route") as sp:
+        intent = _get_router().route(query.vector)
+        if intent is not None:
+            sp.set(intent=intent, by="router")
+            return intent
+        if _is_knowledge_query(query.text):
+            intent = INTENT_KNOWLEDGE
+        else:
+            item_id, _ = parse_add_remove_item(query.text, store.menu_index)
+            intent = INTENT_CART_EDIT if item_id else INTENT_ORDER
+        sp.set(intent=intent, by="keywords")
+        return intent
+
+
+def answer_knowledge_question(
+    user_msg: str,
+    strict: bool = False,
+    deadline: Deadline | None = None,
+    store: StoreContext | None = None,
+    query: QueryContext | None = None,
+) -> RAGAnswer:
     """
-    对「XX有什么特点/涮煮建议」类问题做查询扩展，补上英文名与关键词；
-    并返回匹配到的食材/锅底名，供检索后重排优先命中。
-    返回 (扩展后的问题, 用于重排的食材名或 None)。
+    知识类问题的完整 RAG 流程：实体扩展 → 检索重排 → Gemini 生成。/api/chat 与离线 FAQ 预计算共用。
+    问题以食材/锅底名开头时，把预计算的实体扩展向量叠加到 query 向量上，并用实体名称向量做备用检索；
+    整个流程只编码用户问题一次（query 由调用方传入时复用其向量）。
     """
-    t = user_msg.strip()
-    if not t:
-        return user_msg, None
-    menu = load_menu()
-    # 先匹配食材：按中文名长度降序，优先长名称（如「豆腐皮」先于「豆腐」）
-    ingredients = sorted(
-        menu.get("ingredients", []),
-        key=lambda x: len((x.get("name_cn") or "").strip()),
-        reverse=True,
+    store = store or _get_stores().get(DEFAULT_STORE_ID)
+    query = query or QueryContext(user_msg, store.embeddings)
+    with tracing.span("expand") as sp:
+        entity, query_vec, boost_vec = store.retrieval_vectors(query)
+        sp.set(entity=entity.name if entity else None)
+    return store.rag.answer(
+        user_msg,
+        top_k=8,
+        boost_contains=entity.name if entity else None,
+        strict=strict,
+        deadline=deadline,
+        hedge_delay=RAG_HEDGE_DELAY_MS / 1000.0 if deadline is not None else None,
+        query_vec=query_vec,
+        boost_vec=boost_vec,
+        min_score=RAG_MIN_SCORE,
     )
-    for it in ingredients:
-        nc = (it.get("name_cn") or "").strip()
-        ne = (it.get("name_en") or "").strip()
-        if (nc and t.startswith(nc)) or (ne and t.startswith(ne)):
-            extra = " ".join(filter(None, [ne, nc, "介绍", "涮煮", "时间", "特点", "丸子", "煮法", "分钟", "口感"]))
-            return f"{user_msg} {extra}", nc or ne
-    # 再匹配锅底
-    soup_bases = menu.get("soup_bases", [])
-    for b in soup_bases:
-        nc = (b.get("name_cn") or "").strip()
-        ne = (b.get("name_en") or "").strip()
-        if (nc and t.startswith(nc)) or (ne and t.startswith(ne)):
-            extra = " ".join(filter(None, [ne, nc, "介绍", "特点", "适合"]))
-            return f"{user_msg} {extra}", nc or ne
-    return user_msg, None
-
-
-# ---------- 内存 Session Store ----------
-_sessions: dict[str, dict] = {}
+
+
+# ---------- 内存 Session Store（LRU + 空闲过期） ----------
+SESSION_MAX = int(os.environ.get("SESSION_MAX", DEFAULT_MAX_SESSIONS))
+SESSION_TTL_S = float(os.environ.get("SESSION_TTL_S", DEFAULT_SESSION_TTL_S))
+_sessions = SessionStore(max_sessions=SESSION_MAX, ttl_s=SESSION_TTL_S)
 
 
 def _get_session(session_id: str) -> dict:
@@ -133,6 +368,59 @@ def _get_session(session_id: str) -> dict:
     return _sessions[session_id]
 
 
+_cart_lock = threading.Lock()
+
+
+def _store_cart(session_id: str, state: dict, cart: dict[str, int], expected_version: int | None = None) -> dict | None:
+    """
+    写回购物车（份数映射）与 state 的其它字段；内容有变化时版本号 +1。
+    是否变化、版本号都以 session 中当前的购物车为准（state 可能是 await 之前读到的，版本号不能回退）；
+    给出 expected_version 而当前版本不同（期间被其它请求修改）时不写入，返回 None。
+    """
+    with _cart_lock:
+        latest = _sessions.get(session_id) or {}
+        version = int(latest.get("cart_version") or 0)
+        if expected_version is not None and expected_version != version:
+            return None
+        if normalize_cart(latest.get("cart")) != cart:
+            version += 1
+        new_state = {**state, "cart": cart, "cart_version": version}
+        _sessions[session_id] = new_state
+        return new_state
+
+
+# 正在落盘的确认：session_id -> (购物车版本, 订单 JSON, 写入 future)。并发的重复确认等待同一次写入
+_confirming: dict[str, tuple[int, dict, asyncio.Future]] = {}
+
+
+async def _persist_confirmed(session_id: str, store_id: str, version: int, order_dict: dict) -> tuple[dict, bool]:
+    """
+    落盘确认的订单，返回 (订单记录, 是否新写入)。
+    同一 session 在同一购物车版本上确认出相同的订单 JSON 视为重复确认（重发「确认」、客户端重试、
+    回复里带「可以」等），直接返回已有订单，不再追加订单、也不重复计入厨房看板。
+    """
+    confirmed = (_sessions.get(session_id) or {}).get("confirmed_order") or {}
+    if confirmed.get("cart_version") == version and confirmed.get("order") == order_dict:
+        return {"order_id": confirmed["order_id"]}, False
+    pending = _confirming.get(session_id)
+    if pending and pending[0] == version and pending[1] == order_dict:
+        return await asyncio.shield(pending[2]), False
+    fut = asyncio.wrap_future(_get_orders().append(order_dict, session_id=session_id, store_id=store_id))
+    _confirming[session_id] = (version, order_dict, fut)
+    try:
+        record = await fut
+    finally:
+        if session_id in _confirming and _confirming[session_id][2] is fut:
+            del _confirming[session_id]
+    with _cart_lock:
+        latest = _sessions.get(session_id)
+        if latest is not None:
+            _sessions[session_id] = {**latest, "confirmed_order": {
+                "cart_version": version, "order": order_dict, "order_id": record["order_id"],
+            }}
+    return record, True
+
+
 # ---------- 确认关键词 ----------
 CONFIRM_KEYWORDS = {"确认", "可以", "就这些", "好的", "行", "ok", "yes", "confirm", "sure"}
 
@@ -153,9 +441,30 @@ def _last_ai_message(state: dict) -> str | None:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    _auto_ingest()
+    # 单进程时先清理上次运行热更新留下的旧向量集合（多 worker 时由主进程在派生 worker 前清理）
+    if SERVE_WORKERS <= 1:
+        _get_stores().prune_collections()
+    # 预热默认门店（录入知识库、加载 FAQ 答案表）；其它门店首次访问时再加载
+    _get_stores().get(DEFAULT_STORE_ID).load_knowledge()
+    _get_router().warm()
+    # 监视已驻留门店的数据文件，变化后自动热更新
+    watcher = SourceWatcher(_get_stores(), STORE_WATCH_INTERVAL_S).start()
+    # 厨房看板加载 open 订单，并定期同步其它 worker 写入的订单
+    kitchen_sync = KitchenSync(_get_kitchen(), _get_orders(), KITCHEN_SYNC_INTERVAL_S).start()
+    # 点单热度：回放订单日志后定期刷新排名，已驻留门店的推荐表随之重建
+    refresher = _popularity_refresher(POPULARITY_REFRESH_S).start()
+    # 「常一起点」：一次统计订单日志的历史同现，之后逐单增量更新，已驻留门店的建议表随之重建
+    suggester = _cooccurrence_refresher(COOCCURRENCE_REFRESH_S).start()
     yield
+    watcher.stop()
+    kitchen_sync.stop()
+    refresher.stop()
+    suggester.stop()
+    if _orders is not None:
+        _orders.close()
     _sessions.clear()
+    tracing.flush()
+    _profiler.flush()
 
 
 app = FastAPI(
@@ -173,6 +482,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 剖析的三种触发方式都不可用时不挂中间件，请求路径上零开销
+if PROFILE_SAMPLE_RATE > 0 or ADMIN_TOKEN:
+    app.add_middleware(profiling.ProfilingMiddleware, sampler=_profiler, should_profile=_should_profile)
+
 
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(req: ChatRequest):
@@ -181,7 +494,19 @@ async def chat(req: ChatRequest):
     - 知识类问题 → RAG 检索 + Gemini 生成答案
     - 点餐流程   → LangGraph Concierge 多轮对话
     - 确认下单   → 生成结构化订单 JSON
+    启用追踪时每次请求一个 trace，被采样保留的 trace_id 随响应返回，可用 python main.py traces --trace-id 查看。
     """
+    with tracing.start_trace("chat", store_id=req.store_id or DEFAULT_STORE_ID) as trace:
+        resp = await _chat(req)
+        trace.set(source=resp.source, degraded=resp.degraded)
+    if trace.exported:
+        resp.trace_id = trace.trace_id
+    return resp
+
+
+async def _chat(req: ChatRequest) -> ChatResponse:
+    deadline = Deadline.from_ms(RAG_LATENCY_BUDGET_MS)
+    store = await _run_in_thread(get_store, req.store_id)
     session_id = req.session_id or str(uuid.uuid4())
     state = _get_session(session_id)
     user_msg = req.message.strip()
@@ -196,9 +521,7 @@ async def chat(req: ChatRequest):
         if req.broths is not None:
             profile["broths"] = []
             if len(req.broths) > 0:
-                menu = load_menu()
-                soup_bases = menu.get("soup_bases", [])
-                name_to_broth = {b.get("name_cn"): b for b in soup_bases if b.get("name_cn")}
+                name_to_broth = store.menu_index.broth_by_name
                 for sel in req.broths:
                     if (sel.quantity or 0) <= 0:
                         continue
@@ -216,9 +539,9 @@ async def chat(req: ChatRequest):
     if not user_msg:
         return ChatResponse(session_id=session_id, reply="请输入您的需求。", source="system")
 
-    # ① 已有方案 + 用户确认 → 生成结构化订单
+    # ① 已有方案 + 用户确认 → 生成结构化订单（最高优先级）
     if state and _is_confirm(user_msg):
-        cart = state.get("cart") or []
+        cart = normalize_cart(state.get("cart"))
         profile = state.get("customer_profile") or {}
         broths = profile.get("broths") or []
         if cart and profile:
@@ -229,60 +552,96 @@ async def chat(req: ChatRequest):
                     source="concierge",
                 )
             try:
-                order = generate_order_struct(profile, cart)
+                with scheduler.request(scheduler.PRIORITY_ORDER, session_id), tracing.span(
+                    "generate_order", items=len(cart)
+                ):
+                    order = generate_order_struct(
+                        profile, cart, store.menu_path, rules_path=store.rules_path,
+                        menu=store.menu_index.menu, rules=store.rules,
+                    )
                 order_dict = order.model_dump()
                 if order_dict.get("broths"):
                     order_dict.pop("broth_id", None)
                     order_dict.pop("broth_name_cn", None)
                     order_dict.pop("broth_name_en", None)
+                # 落盘（组提交）后才回复确认；写入失败按生成失败处理，不会出现已确认却丢失的订单
+                with tracing.span("persist_order"):
+                    record, created = await _persist_confirmed(
+                        session_id, store.store_id, int(state.get("cart_version") or 0), order_dict
+                    )
+                if not created:
+                    metrics.incr("orders.duplicate_confirm")
+                    return ChatResponse(
+                        session_id=session_id,
+                        reply=f"订单已确认（单号 {record['order_id']}），无需重复下单；如需调整请直接告诉我 ✅",
+                        source="concierge",
+                        order_json=order_dict,
+                        order_id=record["order_id"],
+                    )
+                _get_kitchen().apply(record)
                 return ChatResponse(
                     session_id=session_id,
-                    reply="已按您的要求生成订单，如下可交厨房执行 ✅",
+                    reply=f"已按您的要求生成订单（单号 {record['order_id']}），如下可交厨房执行 ✅",
                     source="concierge",
                     order_json=order_dict,
+                    order_id=record["order_id"],
                 )
             except Exception as e:
                 return ChatResponse(
                     session_id=session_id, reply=f"生成订单时出错：{e}", source="concierge"
                 )
 
+    # 意图路由：用户问题只编码一次，路由、FAQ 语义查表与向量检索共用同一个 query 向量
+    query = QueryContext(user_msg, store.embeddings)
+    intent = await _run_in_thread(_route_intent, query, store)
+    # await 期间可能有 PATCH /api/cart 等修改了购物车：之后的增减在 session 的当前状态上进行
+    state = _sessions.get(session_id) or state
+
     # ② 已有购物车 + 增减食材 → 直接修改 cart，不跑 Concierge
-    cart = state.get("cart") or []
+    cart = normalize_cart(state.get("cart"))
     profile = state.get("customer_profile") or {}
-    if cart and profile:
-        item_id, is_add = parse_add_remove_item(user_msg)
+    if cart and profile and intent != INTENT_KNOWLEDGE:
+        item_id, is_add = parse_add_remove_item(user_msg, store.menu_index)
         if item_id:
-            menu = load_menu()
-            valid_ids = {it.get("id") for it in menu.get("ingredients", [])}
-            if item_id in valid_ids:
+            menu_index = store.menu_index
+            if item_id in menu_index.ingredient_ids:
+                name = menu_index.item_name(item_id)
+                suggestions = []
                 if is_add:
-                    cart = list(cart) + [item_id]
-                    items = get_all_items_with_prices(menu)
-                    by_id = {it.get("id"): it for it in items}
-                    it = by_id.get(item_id, {})
-                    name = it.get("name_cn") or it.get("name_en") or item_id
-                    reply = f"已添加「{name}」。当前共 {len(cart)} 样食材。满意可回复「确认」下单。"
+                    cart, _ = apply_cart_ops(cart, [{"op": CART_OP_ADD, "id": item_id}], menu_index.ingredient_ids)
+                    suggestions = _cart_suggestions(store, state, [item_id], cart)
+                    reply = f"已添加「{name}」。当前共 {len(cart)} 样食材。"
+                    if suggestions:
+                        names = [menu_index.item_name(s["id"]) for s in suggestions]
+                        reply += f"常和它一起点的有{'、'.join(f'「{n}」' for n in names)}，需要可以说「加{names[0]}」。"
+                    reply += "满意可回复「确认」下单。"
+                elif item_id in cart:
+                    cart, _ = apply_cart_ops(cart, [{"op": CART_OP_REMOVE, "id": item_id}], menu_index.ingredient_ids)
+                    reply = f"已去掉「{name}」。当前共 {len(cart)} 样食材。"
                 else:
-                    try:
-                        cart = list(cart)
-                        cart.remove(item_id)
-                        items = get_all_items_with_prices(menu)
-                        by_id = {it.get("id"): it for it in items}
-                        it = by_id.get(item_id, {})
-                        name = it.get("name_cn") or it.get("name_en") or item_id
-                        reply = f"已去掉「{name}」。当前共 {len(cart)} 样食材。"
-                    except ValueError:
-                        reply = "当前列表中没有该食材。"
-                _sessions[session_id] = {**state, "cart": cart}
-                return ChatResponse(session_id=session_id, reply=reply, source="concierge")
-
-    # ③ 知识类问题 → RAG 检索回答
-    if _is_knowledge_query(user_msg):
+                    reply = "当前列表中没有该食材。"
+                # 从重新读取 state 到这里没有 await，版本核对只防御其它线程的写入
+                _store_cart(session_id, state, cart, expected_version=int(state.get("cart_version") or 0))
+                return ChatResponse(session_id=session_id, reply=reply, source="concierge", suggestions=suggestions or None)
+
+    # ③ 知识类问题 → 先查预计算 FAQ 答案表（精确 + 语义），未命中再 RAG 检索回答
+    if intent == INTENT_KNOWLEDGE:
+        # 门店知识库首次使用时才打开集合（可能需要录入文档），放到线程池里执行
+        with tracing.span("load_knowledge"):
+            await _run_in_thread(store.load_knowledge)
+        with tracing.span("faq_lookup") as sp:
+            cached = store.faq_answer(query)
+            sp.set(hit=bool(cached))
+        if cached:
+            return ChatResponse(session_id=session_id, reply=cached, source="rag")
         try:
-            rag = _get_rag()
-            rag_question, boost_name = _expand_rag_query_for_ingredient_or_broth(user_msg)
-            answer = rag.query(rag_question, top_k=8, boost_contains=boost_name)
-            return ChatResponse(session_id=session_id, reply=answer, source="rag")
+            with scheduler.request(scheduler.PRIORITY_KNOWLEDGE, session_id), tracing.span("rag_answer"):
+                result = await _run_in_thread(
+                    answer_knowledge_question, user_msg, deadline=deadline, store=store, query=query
+                )
+            return ChatResponse(
+                session_id=session_id, reply=result.answer, source="rag", degraded=result.degraded
+            )
         except Exception as e:
             return ChatResponse(
                 session_id=session_id,
@@ -290,9 +649,17 @@ async def chat(req: ChatRequest):
                 source="rag",
             )
 
-    # ④ 点餐流程 → LangGraph Concierge
+    # ④ 点餐流程 → LangGraph Concierge（画像调用 Gemini，排队时不阻塞事件循环）
+    base_cart = normalize_cart(state.get("cart"))
+    base_version = int(state.get("cart_version") or 0)
     try:
-        new_state = run_concierge_once(user_msg, state if state else None)
+        with scheduler.request(scheduler.PRIORITY_CONCIERGE, session_id), tracing.span("concierge"):
+            new_state = await _run_in_thread(
+                run_concierge_once,
+                user_msg, state if state else None, menu_path=store.menu_path, menu=store.menu_index.menu,
+            )
+    except scheduler.LLMBusy:
+        return ChatResponse(session_id=session_id, reply=BUSY_REPLY, source="concierge", degraded=True)
     except Exception as e:
         return ChatResponse(
             session_id=session_id,
@@ -307,32 +674,43 @@ async def chat(req: ChatRequest):
             source="concierge",
         )
 
-    _sessions[session_id] = new_state
+    # 状态图只返回 OrderState 中声明的字段，合并回 session 的当前状态以保留版本号等其它字段。
+    # 一轮 LLM 往返期间前端可能已提交 PATCH：购物车版本变了就只把本轮对购物车的改动合并到最新购物车上
+    latest = _sessions.get(session_id) or state
+    new_cart = normalize_cart(new_state.get("cart"))
+    latest_version = int(latest.get("cart_version") or 0)
+    if latest_version != base_version:
+        new_cart = merge_cart(base_cart, new_cart, normalize_cart(latest.get("cart")))
+        metrics.incr("cart.merged")
+    _store_cart(session_id, {**latest, **new_state}, new_cart, expected_version=latest_version)
     reply = _last_ai_message(new_state) or "正在为您准备方案…"
     return ChatResponse(session_id=session_id, reply=reply, source="concierge")
 
 
 @app.post("/api/recommend", response_model=RecommendResponse)
 async def recommend(req: RecommendRequest):
-    """根据人数与过敏项生成预选食材，并存入 session。再推荐时合并用户过往的增减。"""
+    """
+    根据人数与过敏项生成预选食材，并存入 session。再推荐时合并用户过往的增减。
+    推荐结果与展示顺序取自预计算的推荐表（按当前时段的点单热度排名，证据不足时为手工人气顺序），这里只合并 session 购物车。
+    """
+    store = await _run_in_thread(get_store, req.store_id)
     session_id = req.session_id or str(uuid.uuid4())
     num_guests = max(1, min(6, req.num_guests))
     allergies = [a.strip() for a in (req.allergies or []) if a and a.strip()]
-    items, total = recommend_items(num_guests, allergies)
-    new_ids = [it.get("id") for it in items if it.get("id")]
+    rec = store.recommendations.get(num_guests, allergies, daypart_of())
+    new_ids = list(rec.item_ids)
     new_ids_set = set(new_ids)
 
     # 再推荐时：合并用户过往的勾选/取消、添加的食材到新推荐
+    old_state = _sessions.get(session_id) or {}
+    old_cart_map = normalize_cart(old_state.get("cart"))
     if session_id in _sessions:
-        old_state = _sessions[session_id]
-        old_cart = set(old_state.get("cart") or [])
+        old_cart = set(old_cart_map)
         old_rec_ids = set(old_state.get("last_recommendation_ids") or [])
         merged = (old_cart & new_ids_set) | (old_cart - old_rec_ids) | (new_ids_set - old_rec_ids)
         cart_ids = list(merged)
     else:
         cart_ids = list(new_ids)
-        old_cart = set()
-        old_rec_ids = set()
 
     profile = {
         "spice_tolerance": "medium",
@@ -343,87 +721,268 @@ async def recommend(req: RecommendRequest):
         "language": "zh",
         "broth_id": "szechwan_spicy",
     }
-    _sessions[session_id] = {
-        "cart": cart_ids,
-        "last_recommendation_ids": new_ids_set,
-        "customer_profile": profile,
-        "messages": [],
-    }
+    new_state = _store_cart(
+        session_id,
+        {
+            **old_state,
+            "last_recommendation_ids": new_ids_set,
+            "customer_profile": profile,
+            "messages": [],
+        },
+        {iid: old_cart_map.get(iid, 1) for iid in cart_ids},
+    )
     cart_ids_set = set(cart_ids)
-    out = [
-        {"id": it.get("id"), "name_cn": it.get("name_cn"), "name_en": it.get("name_en"), "category": it.get("category")}
-        for it in items
-    ]
-    menu = load_menu()
-    all_ingredients = menu.get("ingredients", [])
-    filtered_all = []
-    for it in all_ingredients:
-        skip = any(a and ingredient_has_allergen(it, a.strip()) for a in allergies)
-        if skip:
-            continue
-        filtered_all.append(it)
-    ordered_ids = list(DEFAULT_RECOMMEND_IDS)
-    if any(a.strip() == ALLERGY_SEAFOOD for a in allergies if a):
-        repl_iter = iter(SEAFOOD_REPLACEMENTS)
-        ordered_ids = [next(repl_iter) if x in SEAFOOD_IDS else x for x in ordered_ids]
-    if any(a.strip() == ALLERGY_GLUTEN for a in allergies if a):
-        repl_iter = iter(GLUTEN_REPLACEMENTS)
-        ordered_ids = [next(repl_iter) if x in GLUTEN_IDS else x for x in ordered_ids]
-    display_order = []
-    valid_ids = {it.get("id") for it in filtered_all}
-    for iid in ordered_ids:
-        if iid in valid_ids:
-            display_order.append(iid)
-    for it in filtered_all:
-        iid = it.get("id")
-        if iid and iid not in display_order:
-            display_order.append(iid)
-    all_items = []
-    for iid in display_order:
-        it = next((x for x in filtered_all if x.get("id") == iid), None)
-        if it:
-            all_items.append({
-                "id": it.get("id"),
-                "name_cn": it.get("name_cn"),
-                "name_en": it.get("name_en"),
-                "checked": it.get("id") in cart_ids_set,
-            })
-    msg = f"已为 {num_guests} 人推荐 {total} 样食材，勾选/取消勾选即可调整，满意后回复「确认」下单。"
+    all_items = [{**it, "checked": it["id"] in cart_ids_set} for it in rec.all_items]
+    msg = f"已为 {num_guests} 人推荐 {rec.total} 样食材，勾选/取消勾选即可调整，满意后回复「确认」下单。"
     if allergies:
         msg = f"已排除 {', '.join(allergies)}。" + msg
     return RecommendResponse(
-        items=out,
+        items=list(rec.items),
         all_items=all_items,
-        total=total,
+        total=rec.total,
         num_guests=num_guests,
         message=msg,
         session_id=session_id,
+        cart_version=new_state["cart_version"],
     )
 
 
 @app.post("/api/cart/update")
 async def cart_update(req: CartUpdateRequest):
-    """根据勾选状态更新购物车。"""
+    """根据勾选状态整单更新购物车（兼容旧前端；新前端用 PATCH /api/cart 提交增量）。"""
     session_id = req.session_id
     if session_id not in _sessions:
         return {"ok": False, "error": "session_not_found"}
-    state = _sessions[session_id]
-    menu = load_menu()
-    valid_ids = {it.get("id") for it in menu.get("ingredients", [])}
-    cart = [iid for iid in req.cart if iid in valid_ids]
-    _sessions[session_id] = {**state, "cart": cart}
-    return {"ok": True, "cart": cart, "total": len(cart)}
+    # 门店可能尚未驻留（首次访问要读文件、建索引），放到线程池里加载
+    store = await _run_in_thread(get_store, req.store_id)
+    valid_ids = store.menu_index.ingredient_ids
+    cart = normalize_cart([iid for iid in req.cart if iid in valid_ids])
+    state = _sessions.get(session_id)
+    if state is None:
+        return {"ok": False, "error": "session_not_found"}
+    before = normalize_cart(state.get("cart"))
+    state = _store_cart(session_id, state, cart)
+    added = [iid for iid in cart if iid not in before]
+    return {
+        "ok": True,
+        "cart": list(cart),
+        "total": len(cart),
+        "version": state["cart_version"],
+        "suggestions": _cart_suggestions(store, state, added, cart),
+    }
+
+
+@app.patch("/api/cart")
+async def cart_patch(req: CartPatchRequest):
+    """
+    增量更新购物车：按顺序应用 add / remove / set 操作。
+    version 须与服务端当前版本一致（乐观并发），否则返回 version_conflict 与最新购物车，由前端重算增量后重试。
+    有新加入的食材时附「常一起点」建议（suggestions，按最后加入的食材查表）。
+    """
+    session_id = req.session_id
+    if session_id not in _sessions:
+        return {"ok": False, "error": "session_not_found"}
+    # 门店可能尚未驻留（首次访问要读文件、建索引），放到线程池里加载；之后再读 session，核对版本与写回之间没有 await
+    store = await _run_in_thread(get_store, req.store_id)
+    state = _sessions.get(session_id)
+    if state is None:
+        return {"ok": False, "error": "session_not_found"}
+    current = normalize_cart(state.get("cart"))
+    version = int(state.get("cart_version") or 0)
+    if req.version != version:
+        return {"ok": False, "error": "version_conflict", "cart": current, "version": version}
+    cart, rejected = apply_cart_ops(current, [op.model_dump() for op in req.ops], store.menu_index.ingredient_ids)
+    state = _store_cart(session_id, state, cart, expected_version=version)
+    if state is None:
+        latest = _sessions.get(session_id) or {}
+        return {"ok": False, "error": "version_conflict", "cart": normalize_cart(latest.get("cart")),
+                "version": int(latest.get("cart_version") or 0)}
+    added = [op.id for op in req.ops if op.id in cart and op.id not in current]
+    return {
+        "ok": True,
+        "cart": cart,
+        "version": state["cart_version"],
+        "total": len(cart),
+        "rejected": rejected,
+        "suggestions": _cart_suggestions(store, state, added, cart),
+    }
+
+
+# ---------- WebSocket 通道（REST 接口保留兼容） ----------
+async def _ws_chat(conn: realtime.Connection, frame: dict) -> list[dict]:
+    """对话帧：先回 chat.accepted，应答后推送本轮引起的购物车变化与下单事件。"""
+    req = ChatRequest.model_validate({**frame, "session_id": conn.session_id, "store_id": conn.store_id})
+    await conn.send({"type": "chat.accepted", "id": frame.get("id")})
+    before = (_sessions.get(conn.session_id) or {}).get("cart_version")
+    resp = await chat(req)
+    out = [{"type": "chat", "id": frame.get("id"), **resp.model_dump()}]
+    state = _sessions.get(conn.session_id) or {}
+    if state.get("cart_version") != before:
+        out.append({
+            "type": "event", "event": "cart_updated",
+            "cart": normalize_cart(state.get("cart")), "version": state.get("cart_version"),
+        })
+    if resp.order_json:
+        out.append({"type": "event", "event": "order_confirmed", "order_id": resp.order_id, "order": resp.order_json})
+    return out
+
+
+async def _ws_cart(conn: realtime.Connection, frame: dict) -> list[dict]:
+    req = CartPatchRequest.model_validate({**frame, "session_id": conn.session_id, "store_id": conn.store_id})
+    return [{"type": "cart", "id": frame.get("id"), **await cart_patch(req)}]
+
+
+async def _ws_recommend(conn: realtime.Connection, frame: dict) -> list[dict]:
+    """
+    推荐帧：可附带上一张卡片未提交的购物车增量（cart），先应用增量再推荐，省去一次往返。
+    增量版本冲突时以服务端当前购物车为基准再应用一次（同前端 REST 路径的重试；set / remove 可重复应用）。
+    """
+    req = RecommendRequest.model_validate({**frame, "session_id": conn.session_id, "store_id": conn.store_id})
+    out = {"type": "recommend", "id": frame.get("id")}
+    if frame.get("cart"):
+        patch = CartPatchRequest.model_validate(
+            {**frame["cart"], "session_id": conn.session_id, "store_id": conn.store_id}
+        )
+        result = await cart_patch(patch)
+        if result.get("error") == "version_conflict":
+            result = await cart_patch(patch.model_copy(update={"version": result["version"]}))
+        out["cart"] = result
+    resp = await recommend(req)
+    return [{**out, **resp.model_dump()}]
+
+
+_WS_HANDLERS = {"chat": _ws_chat, "cart": _ws_cart, "recommend": _ws_recommend}
+
+
+@app.websocket("/ws")
+async def ws_channel(websocket: WebSocket, session_id: str | None = None, store_id: str | None = None):
+    """
+    WebSocket 通道：连接绑定 session（?session_id= 续用已有 session，缺省新建）与门店（?store_id=），
+    以 chat / cart / recommend 帧复用 /api/chat、PATCH /api/cart、/api/recommend 的处理逻辑，帧格式见 web.realtime。
+    """
+    await websocket.accept()
+    try:
+        await _run_in_thread(get_store, store_id)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "id": None, "error": "unknown_store", "detail": e.detail})
+        await websocket.close(code=4404)
+        return
+    conn = realtime.Connection(websocket, session_id or str(uuid.uuid4()), store_id)
+    await realtime.serve(conn, _WS_HANDLERS, max_pending=WS_MAX_PENDING)
+
+
+@app.post("/api/rag/batch", dependencies=[Depends(require_admin)])
+async def rag_batch(req: BatchAskRequest):
+    """
+    批量知识问答（管理接口）：一次编码、一次多 query 检索，Gemini 调用按 concurrency 并发并经全局调度器限速。
+    以 NDJSON 流式返回，每答完一条输出一行，最后一行为汇总（questions_per_s 为吞吐）。
+    整批以一个 batch- 会话排队，在线请求按会话公平排在它前面。
+    """
+    store = await _run_in_thread(get_store, req.store_id)
+    session_id = f"batch-{uuid.uuid4().hex[:12]}"
+    questions = [q.strip() for q in req.questions]
+
+    def _lines():
+        t0 = time.perf_counter()
+        count = errors = 0
+        for row in iter_batch_answers(
+            store, questions, concurrency=req.concurrency, min_score=RAG_MIN_SCORE, session_id=session_id
+        ):
+            count += 1
+            errors += bool(row.get("error"))
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+        yield json.dumps(batch_summary(count, errors, time.perf_counter() - t0), ensure_ascii=False) + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
 
 
 @app.get("/api/ingredients")
-async def list_ingredients():
-    """返回全部食材列表（id/name_cn/name_en），供前端「食材信息」下拉使用。"""
-    menu = load_menu()
-    items = [
-        {"id": it.get("id"), "name_cn": it.get("name_cn"), "name_en": it.get("name_en")}
-        for it in menu.get("ingredients", [])
-    ]
-    return {"ingredients": items}
+async def list_ingredients(request: Request, store_id: str | None = None):
+    """
+    返回门店全部食材列表（id/name_cn/name_en），供前端「食材信息」下拉使用。
+    响应体随菜单快照预先序列化与压缩，ETag 绑定菜单版本，If-None-Match 命中时回 304。
+    """
+    store = await _run_in_thread(get_store, store_id)
+    return store.ingredients_body.response(request)
+
+
+@app.get("/api/ingredients/search")
+async def search_ingredients(
+    q: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    store_id: str | None = None,
+):
+    """
+    食材搜索：中英文名 / 俗称前缀、中缀、拼音全拼与首字母（feiniu、fn → 肥牛），拼写错误按字符二元组模糊匹配。
+    按匹配质量与 popularity_rank 排序，每项附 match（exact / prefix / pinyin / infix / fuzzy）。
+    """
+    store = await _run_in_thread(get_store, store_id)
+    return {"query": q, "results": store.ingredient_search.search(q, limit)}
+
+
+# ---------- 厨房订单查询（管理令牌） ----------
+@app.get("/api/kitchen/orders", dependencies=[Depends(require_admin)])
+async def kitchen_orders(
+    status: str | None = None,
+    store_id: str | None = None,
+    session_id: str | None = None,
+    since: float | None = None,
+    until: float | None = None,
+    cursor: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    oldest_first: bool = False,
+):
+    """
+    已确认订单分页查询（如 ?status=open&oldest_first=true 为待出餐队列）：按门店、会话、状态与下单时间
+    （since / until，Unix 秒）过滤；翻页把响应里的 next_cursor 作为 cursor 传回，为 null 时已到末页。
+    """
+    return await _run_in_thread(
+        _get_orders().list_orders, status=status, store_id=store_id, session_id=session_id,
+        since=since, until=until, cursor=cursor, limit=limit, oldest_first=oldest_first,
+    )
+
+
+@app.get("/api/kitchen/orders/{order_id}", dependencies=[Depends(require_admin)])
+async def kitchen_order(order_id: int):
+    record = await _run_in_thread(_get_orders().get, order_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"订单不存在: {order_id}")
+    return record
+
+
+@app.patch("/api/kitchen/orders/{order_id}", dependencies=[Depends(require_admin)])
+async def kitchen_order_status(order_id: int, req: OrderStatusRequest):
+    """修改订单状态（出餐完成 closed / 取消 cancelled / 重新打开 open），与下单确认走同一个组提交写线程。"""
+    record = await asyncio.wrap_future(_get_orders().update_status(order_id, req.status))
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"订单不存在: {order_id}")
+    _get_kitchen().apply(record)
+    return record
+
+
+def require_admin_stream(
+    token: str | None = Query(default=None), x_admin_token: str | None = Header(default=None)
+) -> None:
+    """SSE 鉴权：浏览器 EventSource 不能带自定义请求头，令牌也可放在查询参数 ?token= 中。"""
+    require_admin(x_admin_token or token)
+
+
+@app.get("/api/kitchen/board", dependencies=[Depends(require_admin)])
+async def kitchen_board(store_id: str | None = None):
+    """门店全部未完成订单的食材份数合计与锅底合计（增量维护，不扫描订单）。"""
+    return _get_kitchen().snapshot(store_id or DEFAULT_STORE_ID)
+
+
+@app.get("/api/kitchen/board/stream", dependencies=[Depends(require_admin_stream)])
+async def kitchen_board_stream(store_id: str | None = None):
+    """
+    厨房显示屏订阅（SSE）：先发 snapshot 帧（完整合计），之后有变化时发 update 帧（只含变化项，0 表示已清零），
+    KITCHEN_PUSH_INTERVAL_MS 内的变化合成一帧；断线重连后重新从 snapshot 开始。
+    """
+    events = board_events(_get_kitchen(), store_id or DEFAULT_STORE_ID, push_interval=KITCHEN_PUSH_INTERVAL_MS / 1000.0)
+    return StreamingResponse(
+        events, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/api/health")
@@ -431,13 +990,177 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/api/stores")
+async def list_stores():
+    """已配置门店数与当前驻留情况（估算内存、知识库是否已打开、空闲时长）。"""
+    return _get_stores().stats()
+
+
+@app.post("/api/admin/reload", response_model=ReloadResponse, dependencies=[Depends(require_admin)])
+async def admin_reload(req: ReloadRequest | None = None):
+    """
+    热更新门店数据（菜单、蘸料规则、知识文档）：后台构建新快照后原子替换，进行中的请求继续使用旧快照。
+    只作用于处理本请求的 worker；多 worker 部署时各 worker 由数据文件监视自行更新。
+    """
+    req = req or ReloadRequest()
+    t0 = time.perf_counter()
+    stores = _get_stores()
+    if req.store_id:
+        try:
+            stores.config(req.store_id)
+        except UnknownStoreError:
+            raise HTTPException(status_code=404, detail=f"门店不存在: {req.store_id}")
+        results = [await _run_in_thread(stores.reload, req.store_id, req.force)]
+    else:
+        results = await _run_in_thread(stores.reload_all, req.force)
+    return ReloadResponse(results=results, duration_ms=round((time.perf_counter() - t0) * 1000, 1))
+
+
+def _profile_status() -> dict:
+    remaining = max(0.0, _profile_until - time.monotonic())
+    return {
+        "sample_rate": PROFILE_SAMPLE_RATE,
+        "toggle": {"enabled": remaining > 0, "sample_rate": _profile_rate, "remaining_s": round(remaining, 1)},
+        "active": _profiler.active(),
+        # 各 worker 写出的文件合并后的样本数（键为路由的文件名形式，可直接用作 ?route=）
+        "routes": profiling.list_profiles(PROFILE_DIR),
+        # 本 worker 内存中的聚合：路由 -> 剖析请求数 / 样本数 / 不同栈数
+        "local": _profiler.routes(),
+    }
+
+
+@app.get("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def admin_profile(route: str | None = None):
+    """
+    CPU 剖析结果。不带 route 返回开关状态与各路由样本数；
+    带 route（如 POST /api/chat 或 POST_api_chat）返回该路由合并各 worker 后的 collapsed stack 文本，
+    可直接交给 flamegraph.pl / speedscope / inferno 生成火焰图。
+    """
+    _profiler.flush()
+    if route is None:
+        return _profile_status()
+    text = profiling.load_collapsed(PROFILE_DIR, route)
+    if not text:
+        raise HTTPException(status_code=404, detail=f"该路由没有剖析样本: {route}")
+    return PlainTextResponse(text)
+
+
+@app.post("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def admin_profile_toggle(req: ProfileToggleRequest | None = None):
+    """打开（或关闭）限时剖析开关；只作用于处理本请求的 worker，且需服务启动时已设置 ADMIN_TOKEN。"""
+    global _profile_until, _profile_rate
+    req = req or ProfileToggleRequest()
+    if req.enabled:
+        _profile_until = time.monotonic() + req.duration_s
+        _profile_rate = req.sample_rate
+    else:
+        _profile_until, _profile_rate = 0.0, 0.0
+    return _profile_status()
+
+
+@app.delete("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def admin_profile_clear():
+    """清空本 worker 的剖析聚合并删除剖析目录下的 collapsed stack 文件。"""
+    _profiler.clear()
+    return _profile_status()
+
+
+_heap = memory.HeapSnapshots()
+
+
+def _memory_report(top: int) -> dict:
+    caches = _get_stores().memory_usage()
+    if _router is not None:
+        caches["intent_router"] = _router.memory_usage()
+    caches["menu_index_cache"] = memory.sized(cached_indexes())
+    if _kitchen is not None:
+        caches["kitchen_board"] = memory.sized(_kitchen)
+    if _popularity is not None:
+        caches["popularity"] = memory.sized(_popularity)
+    if _cooccurrence is not None:
+        caches["cooccurrence"] = memory.sized(_cooccurrence)
+    return {
+        "process": memory.process_report(),
+        "sessions": {**_sessions.stats(), **memory.session_footprint(_sessions.snapshot(), top=top)},
+        "caches": dict(sorted(caches.items())),
+        "tracemalloc": memory.HeapSnapshots.status(),
+    }
+
+
+@app.get("/api/admin/memory", dependencies=[Depends(require_admin)])
+async def admin_memory(top: int = 10):
+    """
+    本 worker 的内存核算：进程 RSS、session 总量 / 大小分布 / 最大的 session、
+    各内部缓存（门店菜单、推荐表、FAQ 表、实体向量、知识库文本块、embedding 模型等）的条目数与估算大小。
+    """
+    return await _run_in_thread(_memory_report, max(0, min(top, 100)))
+
+
+@app.post("/api/admin/memory/snapshot", dependencies=[Depends(require_admin)])
+async def admin_memory_snapshot(req: MemorySnapshotRequest | None = None):
+    """tracemalloc 快照对比：第一次调用开启追踪并记下基线，之后返回与上一次（或基线）相比增长最多的分配位置。"""
+    req = req or MemorySnapshotRequest()
+    return await _run_in_thread(_heap.snapshot, top=req.top, frames=req.frames, since_baseline=req.since_baseline)
+
+
+@app.delete("/api/admin/memory/snapshot", dependencies=[Depends(require_admin)])
+async def admin_memory_snapshot_stop():
+    """停止 tracemalloc（开启期间每次分配都有额外开销）。"""
+    return _heap.stop()
+
+
+@app.get("/api/admin/popularity", dependencies=[Depends(require_admin)])
+async def admin_popularity(store_id: str | None = None, top: int = Query(10, ge=1, le=100)):
+    """点单热度：各门店总体与各时段的衰减订单数、前 top 名食材 / 锅底及其衰减计数，以及推荐表所用的快照版本。"""
+    return _get_popularity().stats(store_id, top)
+
+
+@app.post("/api/admin/popularity/refresh", dependencies=[Depends(require_admin)])
+async def admin_popularity_refresh():
+    """立即读取新订单并刷新排名（不等下一个刷新周期）；只作用于处理本请求的 worker。"""
+    refresher = _popularity_refresher()
+    rebuilt = await _run_in_thread(refresher.refresh_once)
+    return {"version": _get_popularity().snapshot.version, "stores_rebuilt": rebuilt}
+
+
+@app.get("/api/admin/cooccurrence", dependencies=[Depends(require_admin)])
+async def admin_cooccurrence(store_id: str | None = None, item_id: str | None = None):
+    """「常一起点」：各门店计入的订单数、食材数与食材对数；带 item_id 时列出该食材的邻居（NPMI 分数、同单次数）。"""
+    return _get_cooccurrence().stats(store_id, item_id)
+
+
+@app.post("/api/admin/cooccurrence/refresh", dependencies=[Depends(require_admin)])
+async def admin_cooccurrence_refresh():
+    """立即读取新订单并刷新邻居表（不等下一个刷新周期）；只作用于处理本请求的 worker。"""
+    refresher = _cooccurrence_refresher()
+    rebuilt = await _run_in_thread(refresher.refresh_once)
+    return {"version": _get_cooccurrence().snapshot.version, "stores_rebuilt": rebuilt}
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """进程内计数指标（对冲触发/胜出、降级回答等）与 LLM 调度器的当前队列深度、排队耗时。"""
+    return {**metrics.snapshot(), **scheduler.get_scheduler().gauges()}
+
+
 # ---------- 静态文件（前后端一体：web/static） ----------
 if STATIC_DIR.exists():
     app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 
+@app.get(ASSET_PREFIX + "/{path:path}")
+async def hashed_asset(path: str, request: Request):
+    """带内容哈希的静态资源：immutable 长缓存，按 Accept-Encoding 返回预压缩的 br / gzip 变体。"""
+    asset = _assets.files.get(path) if _assets is not None else None
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return asset.response(request)
+
+
 @app.get("/")
-async def index():
+async def index(request: Request):
+    if _assets is not None and _assets.index is not None:
+        return _assets.index.response(request)
     index_file = STATIC_DIR / "index.html"
     if index_file.exists():
         return FileResponse(str(index_file))
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+可缓存的响应：静态资源内容哈希 + 预压缩，菜单派生接口预序列化 + 强 ETag。
+
+  CachedBody：一份预先序列化好的响应体及其 gzip / brotli 预压缩变体，按 Accept-Encoding 选择；
+              强 ETag 取内容哈希（或调用方给定的版本号），If-None-Match 命中时回 304。
+  AssetManifest：启动时扫描 web/static 下的 CSS / JS，算内容哈希生成 /assets/<路径>.<哈希>.<后缀>，
+              CSS 的 @import 直接内联（省掉串行的二次请求），并改写 index.html 中的引用。
+              带哈希的文件内容不会变，以 immutable 长缓存下发；index.html 每次协商（no-cache + ETag）。
+
+未安装 brotli 时只提供 gzip 变体。指标：http.not_modified（回 304 的次数）。
+"""
+import gzip
+import hashlib
+import json
+import re
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli：只提供 gzip 预压缩
+    brotli = None
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from core import metrics
+
+ASSET_PREFIX = "/assets"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# 小于该字节数的响应不压缩（压缩收益抵不过 Content-Encoding 头）
+MIN_COMPRESS_BYTES = 256
+ASSET_SUFFIXES = (".css", ".js")
+# 内容协商时优先级从高到低
+_ENCODINGS = ("br", "gzip")
+_ETAG_SUFFIX = {"br": "-br", "gzip": "-gz"}
+_MEDIA_TYPES = {
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+}
+_CSS_IMPORT_RE = re.compile(r"""@import\s+(?:url\()?\s*['"]?([^'")\s]+)['"]?\s*\)?\s*;""")
+_HTML_REF_RE = re.compile(r"""(\b(?:src|href)=["'])/static/([^"'?#]+)(["'])""")
+
+
+def _compress(body: bytes) -> dict[str, bytes]:
+    if len(body) < MIN_COMPRESS_BYTES:
+        return {}
+    out = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        out["br"] = brotli.compress(body, quality=11)
+    return {enc: data for enc, data in out.items() if len(data) < len(body)}
+
+
+def _accepted(header: str) -> set[str]:
+    """Accept-Encoding 中 q>0 的编码（小写）。"""
+    out = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            out.add(name.strip().lower())
+    return out
+
+
+class CachedBody:
+    """预序列化、预压缩的响应体：每种编码一个强 ETag（内容相同，按编码加后缀），If-None-Match 命中任一个即回 304。"""
+
+    def __init__(self, body: bytes, media_type: str, etag: str | None = None,
+                 cache_control: str = REVALIDATE_CACHE_CONTROL):
+        self.body = body
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.tag = etag or hashlib.sha256(body).hexdigest()[:16]
+        self.variants = _compress(body)
+
+    @classmethod
+    def json(cls, payload, etag: str | None = None) -> "CachedBody":
+        """与 FastAPI 默认 JSONResponse 相同的序列化方式（UTF-8、紧凑分隔符）。"""
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return cls(body, "application/json", etag=etag)
+
+    def etag(self, encoding: str | None = None) -> str:
+        return f'"{self.tag}{_ETAG_SUFFIX.get(encoding, "")}"'
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+    def encoding_for(self, accept_encoding: str) -> str | None:
+        accepted = _accepted(accept_encoding)
+        return next((enc for enc in _ENCODINGS if enc in self.variants and enc in accepted), None)
+
+    def not_modified(self, if_none_match: str | None) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return any(self.etag(enc) in tags for enc in (None, *self.variants))
+
+    def response(self, request: Request) -> Response:
+        encoding = self.encoding_for(request.headers.get("accept-encoding", ""))
+        headers = {"ETag": self.etag(encoding), "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if self.not_modified(request.headers.get("if-none-match")):
+            metrics.incr("http.not_modified")
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            return Response(self.variants[encoding], media_type=self.media_type, headers=headers)
+        return Response(self.body, media_type=self.media_type, headers=headers)
+
+
+class AssetManifest:
+    """web/static 的内容哈希清单：原路径 → 带哈希的 URL，带哈希的路径 → 预压缩的文件内容，以及改写后的 index.html。"""
+
+    def __init__(self, static_dir: Path | str):
+        self.static_dir = Path(static_dir)
+        self.urls: dict[str, str] = {}
+        self.files: dict[str, CachedBody] = {}
+        self._sources: dict[str, bytes] = {}
+        for path in sorted(self.static_dir.rglob("*")):
+            if path.is_file() and path.suffix in ASSET_SUFFIXES:
+                self._add(path.relative_to(self.static_dir).as_posix())
+        index_file = self.static_dir / "index.html"
+        self.index: CachedBody | None = None
+        if index_file.exists():
+            html = _HTML_REF_RE.sub(self._rewrite_ref, index_file.read_text(encoding="utf-8"))
+            self.index = CachedBody(html.encode("utf-8"), _MEDIA_TYPES[".html"])
+
+    def _source(self, rel: str, seen: tuple[str, ...] = ()) -> bytes:
+        """文件内容；CSS 的 @import 递归内联（被内联的文件各自仍可按原路径单独访问）。"""
+        if rel in self._sources:
+            return self._sources[rel]
+        text = (self.static_dir / rel).read_text(encoding="utf-8")
+        if rel.endswith(".css"):
+            base = Path(rel).parent
+
+            def _inline(m: re.Match) -> str:
+                target = (base / m.group(1)).as_posix()
+                if target in seen or not (self.static_dir / target).is_file():
+                    return m.group(0)
+                return self._source(target, seen + (rel,)).decode("utf-8")
+
+            text = _CSS_IMPORT_RE.sub(_inline, text)
+        self._sources[rel] = text.encode("utf-8")
+        return self._sources[rel]
+
+    def _add(self, rel: str) -> None:
+        body = self._source(rel)
+        digest = hashlib.sha256(body).hexdigest()[:10]
+        stem, suffix = rel.rsplit(".", 1)
+        hashed = f"{stem}.{digest}.{suffix}"
+        self.urls[rel] = f"{ASSET_PREFIX}/{hashed}"
+        self.files[hashed] = CachedBody(
+            body, _MEDIA_TYPES["." + suffix], etag=digest, cache_control=IMMUTABLE_CACHE_CONTROL
+        )
+
+    def _rewrite_ref(self, m: re.Match) -> str:
+        url = self.urls.get(m.group(2))
+        return f"{m.group(1)}{url}{m.group(3)}" if url else m.group(0)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def stats(self) -> dict:
+        """文件数与原始 / 各编码的总字节数。"""
+        out = {"files": len(self.files), "bytes": sum(len(f.body) for f in self.files.values())}
+        for enc in _ENCODINGS:
+            out[f"{enc}_bytes"] = sum(len(f.variants.get(enc, f.body)) for f in self.files.values())
+        return out
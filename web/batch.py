@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+离线批量问答：一批知识问题一次性编码与检索，Gemini 调用按并发上限与调度器限速并发发出，答完一条输出一条。
+
+  1. 全部问题一次 embed_documents 编码（QueryContext.batch）；
+  2. 先查 FAQ 答案表，命中的直接输出；
+  3. 其余问题做一次多 query 向量检索（RAG.search_batch），再逐条自适应窗口与重排；
+  4. 线程池（concurrency 个线程）逐条生成答案，每条 LLM 调用经全局调度器以「知识问答」优先级排队取槽位，
+     限速（LLM_RPM）与在线流量共用同一配额，批量任务不会挤占在线请求；
+  5. 按完成顺序产出结果行，调用方可边产出边写盘（JSONL），中断后按已写出的结果续跑。
+
+由 python main.py ask 与 POST /api/rag/batch 使用。指标：batch.questions / batch.faq_hits / batch.errors。
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from core import metrics, scheduler, tracing
+from core.query import QueryContext
+
+from .stores import StoreContext
+
+DEFAULT_BATCH_CONCURRENCY = 4
+# 单次 /api/rag/batch 请求的问题数上限（更多的请用 python main.py ask 离线跑）
+MAX_BATCH_QUESTIONS = 1000
+BATCH_TOP_K = 8
+
+
+def read_questions(path: str | Path, encoding: str = "utf-8") -> list[str]:
+    """问题文件：每行一个问题，跳过空行与 # 开头的注释行。"""
+    lines = Path(path).read_text(encoding=encoding).splitlines()
+    return [q.strip() for q in lines if q.strip() and not q.strip().startswith("#")]
+
+
+def answered_questions(path: str | Path) -> set[str]:
+    """已写出的结果文件中成功作答（无 error）的问题，供续跑时跳过；文件不存在或末行残缺时忽略对应部分。"""
+    path = Path(path)
+    if not path.exists():
+        return set()
+    done = set()
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(row, dict) and row.get("question") and not row.get("error"):
+            done.add(row["question"])
+    return done
+
+
+def _row(index: int, question: str, source: str, answer: str = "", degraded: bool = False,
+         error: str | None = None, started: float | None = None) -> dict:
+    row = {"index": index, "question": question, "answer": answer, "source": source, "degraded": degraded}
+    if error:
+        row["error"] = error
+    if started is not None:
+        row["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return row
+
+
+def iter_batch_answers(
+    store: StoreContext,
+    questions: Iterable[str],
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    top_k: int = BATCH_TOP_K,
+    min_score: float | None = None,
+    strict: bool = False,
+    session_id: str = "batch",
+) -> Iterator[dict]:
+    """
+    批量回答知识问题，按完成顺序产出结果行：
+    {"index", "question", "answer", "source": "faq" | "rag", "degraded", "latency_ms"[, "error"]}。
+    index 为问题在输入中的序号；strict=True 时 Gemini 失败记为 error（不回退为抽取式答案），便于续跑时重试。
+    生成器提前关闭（如客户端断开）时取消尚未开始的问题。
+    """
+    questions = list(questions)
+    if not questions:
+        return
+    metrics.incr("batch.questions", len(questions))
+    store.load_knowledge()
+    t0 = time.perf_counter()
+    queries = QueryContext.batch(questions, store.embeddings)
+
+    # FAQ 答案表命中的直接输出（span 内不 yield：流式响应的每次 next 可能在不同线程、不同上下文中执行）
+    pending, hits = [], []
+    with tracing.span("faq_lookup", queries=len(queries)) as sp:
+        for i, query in enumerate(queries):
+            cached = store.faq_answer(query)
+            if cached:
+                hits.append(_row(i, query.text, "faq", cached, started=t0))
+            else:
+                pending.append(i)
+        sp.set(hits=len(hits))
+    metrics.incr("batch.faq_hits", len(hits))
+    yield from hits
+    if not pending:
+        return
+
+    # 一次多 query 检索
+    expanded = [store.retrieval_vectors(queries[i]) for i in pending]
+    boosts = [entity.name if entity else None for entity, _, _ in expanded]
+    rag = store.rag
+    found = rag.search_batch(
+        [questions[i] for i in pending],
+        [vec for _, vec, _ in expanded],
+        top_k=top_k,
+        boosts=boosts,
+        boost_vecs=[bv for _, _, bv in expanded],
+        min_score=min_score,
+    )
+
+    def _answer(i: int, boost: str | None, vec, boost_vec, candidates) -> dict:
+        started = time.perf_counter()
+        # 在工作线程内标记优先级：调度器按 session 做公平排队，整批任务只占一个 session 的份额
+        with scheduler.request(scheduler.PRIORITY_KNOWLEDGE, session_id):
+            result = rag.answer(
+                questions[i], top_k=top_k, boost_contains=boost, strict=strict,
+                query_vec=vec, boost_vec=boost_vec, min_score=min_score, found=candidates,
+            )
+        return _row(i, questions[i], "rag", result.answer, result.degraded, started=started)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
+    try:
+        futures = {
+            pool.submit(tracing.bind(_answer), i, boost, vec, boost_vec, cand): i
+            for i, boost, (_, vec, boost_vec), cand in zip(pending, boosts, expanded, found)
+        }
+        for fut in as_completed(futures):
+            i = futures[fut]
+            try:
+                yield fut.result()
+            except Exception as e:
+                metrics.incr("batch.errors")
+                yield _row(i, questions[i], "rag", error=f"{type(e).__name__}: {e}")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def batch_summary(count: int, errors: int, elapsed_s: float) -> dict:
+    """批量结束时的汇总行：问题数、失败数、耗时与吞吐（问题/秒）。"""
+    return {
+        "done": True,
+        "questions": count,
+        "errors": errors,
+        "elapsed_s": round(elapsed_s, 3),
+        "questions_per_s": round(count / elapsed_s, 2) if elapsed_s > 0 else None,
+    }
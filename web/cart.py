@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+服务端购物车：食材 id -> 份数倍数 的紧凑映射，配合版本号做乐观并发控制。
+前端以增量操作（add / remove / set）提交修改，不再整单覆盖。
+"""
+from collections import Counter
+from typing import Iterable
+
+CART_OP_ADD = "add"
+CART_OP_REMOVE = "remove"
+CART_OP_SET = "set"
+# 单个食材的份数倍数上限，防止异常请求
+MAX_ITEM_QUANTITY = 20
+
+
+def normalize_cart(cart) -> dict[str, int]:
+    """兼容旧格式：id 列表（可重复）→ 份数映射；映射则去掉非正数量。"""
+    if not cart:
+        return {}
+    if isinstance(cart, dict):
+        return {iid: int(q) for iid, q in cart.items() if iid and int(q) > 0}
+    return dict(Counter(iid for iid in cart if iid))
+
+
+def apply_cart_ops(
+    cart: dict[str, int],
+    ops: Iterable[dict],
+    valid_ids: Iterable[str],
+) -> tuple[dict[str, int], list[dict]]:
+    """
+    依次应用增量操作，返回 (新购物车, 被拒绝的操作)。
+      add:    数量 += quantity（默认 1）
+      remove: 移除该食材
+      set:    数量 = quantity（≤0 视为移除）
+    不在 valid_ids 中的食材与未知操作被拒绝，不影响其它操作。
+    """
+    out = dict(cart)
+    rejected: list[dict] = []
+    for op in ops:
+        kind = op.get("op")
+        iid = op.get("id")
+        qty = int(op.get("quantity") if op.get("quantity") is not None else 1)
+        if kind == CART_OP_REMOVE:
+            out.pop(iid, None)
+            continue
+        if iid not in valid_ids or kind not in (CART_OP_ADD, CART_OP_SET):
+            rejected.append(op)
+            continue
+        new_qty = out.get(iid, 0) + qty if kind == CART_OP_ADD else qty
+        new_qty = min(new_qty, MAX_ITEM_QUANTITY)
+        if new_qty > 0:
+            out[iid] = new_qty
+        else:
+            out.pop(iid, None)
+    return out, rejected
+
+
+def merge_cart(base: dict[str, int], ours: dict[str, int], theirs: dict[str, int]) -> dict[str, int]:
+    """
+    三方合并：ours 与 theirs 都由 base 修改而来（如一轮对话期间前端又提交了 PATCH）。
+    以 theirs（session 中的最新购物车）为准，只把 ours 相对 base 改动过的食材写上去；同一食材两边都改时以 ours 为准。
+    """
+    out = dict(theirs)
+    for iid in base.keys() | ours.keys():
+        if ours.get(iid) == base.get(iid):
+            continue
+        if iid in ours:
+            out[iid] = ours[iid]
+        else:
+            out.pop(iid, None)
+    return out
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+「常一起点」：从已确认订单统计食材两两同单出现的次数，按归一化 PMI 给出每种食材的互补食材。
+
+  计数：每个门店一个稀疏的上三角同现矩阵（只存出现过的食材对）与各食材的出单数；一个订单里的食材去重后
+       两两计 1 次，增量更新的代价与订单食材种数的平方成正比，与历史订单数无关；计入之后被取消的订单同样逐对扣回。
+       启动时第一次读取订单日志用 pair_counts 一次向量化统计全部历史（食材数不多时为 订单 × 食材 0/1 矩阵的 XᵀX，
+       否则枚举每单的食材对后计数），之后逐单增量累加。
+  打分：NPMI(a, b) = log(p(a,b) / (p(a) p(b))) / -log p(a,b)，取值 [-1, 1]；只保留同单次数不少于 min_pairs
+       且为正的食材对，避免少量订单里的偶然组合与「人人都点」的食材排到前面。
+  快照：后台刷新（orders.SnapshotRefresher）每 interval 秒读取新订单与状态变化（OrderFeed）、重算有变化的门店的邻居表（每种食材前 top_n 个），
+       邻居变化时生成新的 CooccurrenceSnapshot；已驻留门店据此重建 SuggestionTable（食材 × 过敏项组合 →
+       已排除过敏原的邻居），购物车增加食材时只查一次表（StoreContext.apply_cooccurrence）。
+"""
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from concierge.menu_loader import MenuIndex
+from core import metrics
+
+from .orders import OrderFeed, OrderStore
+from .recommendation import KNOWN_ALLERGIES, canonical_allergies, ingredient_has_allergen
+
+DEFAULT_COOCCURRENCE_REFRESH_S = 30.0
+DEFAULT_TOP_N = 10
+DEFAULT_MIN_PAIRS = 3
+DEFAULT_SUGGESTIONS = 2
+# 向量化回放时每批处理的订单数（每批的中间数组约为 Σ 每单食材数² 个整数）
+REBUILD_CHUNK_ORDERS = 20000
+# 食材数不超过该值时用稠密的 订单 × 食材 0/1 矩阵 X 计算 XᵀX（矩阵乘法），否则枚举每单的食材对
+DENSE_VOCAB_LIMIT = 2048
+# 稠密计算时每批矩阵的元素数上限；键空间不超过该值时用 bincount 直接计数，否则排序后数连续段
+DENSE_COUNT_LIMIT = 1 << 22
+
+Neighbours = tuple[tuple[str, float], ...]
+
+
+def order_ingredients(order: dict) -> set[str]:
+    """订单（HotpotOrder 的 dict）里的食材 id（去重，与份数无关）。"""
+    return {it.get("menu_item_id") for it in order.get("items") or []} - {None}
+
+
+def _count_keys(keys: np.ndarray, space: int) -> tuple[np.ndarray, np.ndarray]:
+    """0 ≤ 键 < space → (不同的键（升序）, 各自出现次数)。"""
+    if space <= DENSE_COUNT_LIMIT:
+        counts = np.bincount(keys, minlength=space)
+        nonzero = np.flatnonzero(counts)
+        return nonzero, counts[nonzero]
+    keys = np.sort(keys)
+    if not len(keys):
+        return keys, np.zeros(0, dtype=np.int64)
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[first], np.diff(np.r_[first, len(keys)])
+
+
+def pair_counts(baskets: Sequence[Sequence[int]], size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    一次向量化统计：baskets 为各订单的食材编号（0 ≤ 编号 < size，可重复、无序），
+    返回 (行, 列, 同单次数) 三个数组（只含 行 < 列 的食材对）与各食材的出单数。
+    """
+    if 0 < size <= DENSE_VOCAB_LIMIT:
+        return _dense_pair_counts(baskets, size)
+    rows: list[np.ndarray] = []
+    counts: list[np.ndarray] = []
+    item_counts = np.zeros(size, dtype=np.int64)
+    for start in range(0, len(baskets), REBUILD_CHUNK_ORDERS):
+        chunk = baskets[start:start + REBUILD_CHUNK_ORDERS]
+        lengths = np.fromiter(map(len, chunk), dtype=np.int64, count=len(chunk))
+        flat = np.fromiter(itertools.chain.from_iterable(chunk), dtype=np.int64, count=int(lengths.sum()))
+        # 同一订单内去重：按 (订单, 食材) 编码后排序去重，结果仍按订单分组
+        entries, _ = _count_keys(np.repeat(np.arange(len(chunk), dtype=np.int64), lengths) * size + flat, len(chunk) * size)
+        flat = entries % size
+        lengths = np.bincount(entries // size, minlength=len(chunk))
+        item_counts += np.bincount(flat, minlength=size)
+        # 每个条目与同一订单内的每个条目配对：left 重复 k 次，right 依次取该订单的 k 个条目
+        basket_start = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        reps = np.repeat(lengths, lengths)
+        left = np.repeat(flat, reps)
+        offsets = np.arange(int(reps.sum())) - np.repeat(np.cumsum(reps) - reps, reps)
+        right = flat[np.repeat(basket_start, reps) + offsets]
+        keep = left < right
+        keys, n = _count_keys(left[keep] * size + right[keep], size * size)
+        rows.append(keys)
+        counts.append(n)
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, item_counts
+    keys = np.concatenate(rows)
+    n = np.concatenate(counts)
+    if len(rows) > 1 and len(keys):
+        # 各批结果按键合并
+        order = np.argsort(keys, kind="stable")
+        keys, n = keys[order], n[order]
+        first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        keys, n = keys[first], np.add.reduceat(n, first)
+    return keys // size, keys % size, n, item_counts
+
+
+def _dense_pair_counts(baskets: Sequence[Sequence[int]], size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """食材数较少时：按批构造 订单 × 食材 的 0/1 矩阵 X（重复的食材自然去重），同现矩阵即 XᵀX。"""
+    co = np.zeros((size, size), dtype=np.int64)
+    step = max(1, DENSE_COUNT_LIMIT // size)
+    for start in range(0, len(baskets), step):
+        chunk = baskets[start:start + step]
+        lengths = np.fromiter(map(len, chunk), dtype=np.int64, count=len(chunk))
+        flat = np.fromiter(itertools.chain.from_iterable(chunk), dtype=np.int64, count=int(lengths.sum()))
+        x = np.zeros((len(chunk), size), dtype=np.float32)
+        x[np.repeat(np.arange(len(chunk)), lengths), flat] = 1.0
+        # 每批订单数远小于 2^24，float32 累加的计数是精确的
+        co += (x.T @ x).astype(np.int64)
+    rows, cols = np.nonzero(np.triu(co, 1))
+    return rows.astype(np.int64), cols.astype(np.int64), co[rows, cols], np.diagonal(co).copy()
+
+
+def neighbour_lists(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    pairs: np.ndarray,
+    item_counts: np.ndarray,
+    orders: int,
+    top_n: int = DEFAULT_TOP_N,
+    min_pairs: int = DEFAULT_MIN_PAIRS,
+    tiebreak: np.ndarray | None = None,
+) -> dict[int, list[tuple[int, float]]]:
+    """
+    按 NPMI 为每种食材取前 top_n 个正相关的食材（编号 → [(编号, 分数), ...]，分数从高到低）。
+    同分时按 tiebreak[编号] 从小到大（缺省按编号）。
+    """
+    keep = pairs >= min_pairs
+    rows, cols, pairs = rows[keep], cols[keep], pairs[keep].astype(np.float64)
+    if not len(pairs) or orders <= 0:
+        return {}
+    p_ab = pairs / orders
+    pmi = np.log(p_ab / (item_counts[rows] / orders * (item_counts[cols] / orders)))
+    denom = -np.log(p_ab)
+    # 每单都同时出现的食材对：p(a,b) = 1，NPMI 按定义取 1
+    score = np.divide(pmi, denom, out=np.ones_like(pmi), where=denom > 0)
+    src = np.concatenate([rows, cols])
+    dst = np.concatenate([cols, rows])
+    score = np.concatenate([score, score])
+    keep = score > 0
+    src, dst, score = src[keep], dst[keep], score[keep]
+    order = np.lexsort((dst if tiebreak is None else tiebreak[dst], -score, src))
+    src, dst, score = src[order], dst[order], score[order]
+    group_start = np.flatnonzero(np.r_[True, src[1:] != src[:-1]])
+    rank = np.arange(len(src)) - np.repeat(group_start, np.diff(np.r_[group_start, len(src)]))
+    keep = rank < top_n
+    out: dict[int, list[tuple[int, float]]] = {}
+    for a, b, s in zip(src[keep].tolist(), dst[keep].tolist(), score[keep].tolist()):
+        out.setdefault(a, []).append((b, round(s, 4)))
+    return out
+
+
+@dataclass(frozen=True)
+class CooccurrenceSnapshot:
+    """某一时刻的邻居表（只读，整体替换）：neighbours[store_id][食材 id] = ((食材 id, NPMI), ...)。"""
+    version: int = 0
+    created_at: float = 0.0
+    neighbours: dict[str, dict[str, Neighbours]] = field(default_factory=dict)
+
+    def for_store(self, store_id: str) -> dict[str, Neighbours]:
+        return self.neighbours.get(store_id, {})
+
+
+def _ids_of(neighbours: dict[str, dict[str, Neighbours]]) -> dict:
+    """邻居本身（不含分数），判断快照是否需要替换。"""
+    return {s: {k: tuple(i for i, _ in v) for k, v in by.items()} for s, by in neighbours.items()}
+
+
+class _StoreCounts:
+    """一个门店的稀疏同现计数：pairs[(a, b)]（a < b，食材编号）与各食材出单数。"""
+
+    __slots__ = ("orders", "items", "pairs")
+
+    def __init__(self):
+        self.orders = 0
+        self.items: dict[int, int] = {}
+        self.pairs: dict[tuple[int, int], int] = {}
+
+
+class CooccurrenceModel:
+    """各门店的食材同现计数与邻居表；record / ingest 由单个线程调用（后台刷新线程），snapshot 可在任意线程读取。"""
+
+    def __init__(self, top_n: int = DEFAULT_TOP_N, min_pairs: int = DEFAULT_MIN_PAIRS, clock=time.time):
+        self.top_n = top_n
+        self.min_pairs = min_pairs
+        self._clock = clock
+        self._index: dict[str, int] = {}
+        self._ids: list[str] = []
+        self._stores: dict[str, _StoreCounts] = {}
+        self._dirty: set[str] = set()
+        self._neighbours: dict[str, dict[str, Neighbours]] = {}
+        self._feed = OrderFeed()
+        self._lock = threading.Lock()
+        # 后台刷新与管理接口可能同时调用 ingest，同一批订单只能计入一次
+        self._ingest_lock = threading.Lock()
+        self.snapshot = CooccurrenceSnapshot()
+
+    def __len__(self) -> int:
+        return sum(len(c.pairs) for c in self._stores.values())
+
+    def _code(self, item_id: str) -> int:
+        code = self._index.get(item_id)
+        if code is None:
+            code = self._index[item_id] = len(self._ids)
+            self._ids.append(item_id)
+        return code
+
+    def _basket(self, order: dict) -> list[int]:
+        return sorted(self._code(iid) for iid in order_ingredients(order))
+
+    def _codes(self, order: dict) -> list[int]:
+        """订单里的食材编号（不去重；rebuild 交给 pair_counts 批量去重）。"""
+        index, code = self._index, self._code
+        return [
+            index[iid] if iid in index else code(iid)
+            for iid in (it.get("menu_item_id") for it in order.get("items") or ())
+            if iid
+        ]
+
+    def record(self, order: dict, store_id: str, sign: int = 1) -> None:
+        """增量计入一个已确认订单；sign 为 -1 时扣回（计入之后被取消的订单），计数扣到零的项移除。"""
+        with self._lock:
+            basket = self._basket(order)
+            counts = self._stores.get(store_id)
+            if counts is None:
+                counts = self._stores[store_id] = _StoreCounts()
+            counts.orders = max(0, counts.orders + sign)
+            for table, keys in ((counts.items, basket), (counts.pairs, itertools.combinations(basket, 2))):
+                for key in keys:
+                    n = table.get(key, 0) + sign
+                    if n > 0:
+                        table[key] = n
+                    else:
+                        table.pop(key, None)
+            self._dirty.add(store_id)
+        metrics.incr("cooccurrence.orders" if sign > 0 else "cooccurrence.cancelled")
+
+    def rebuild(self, orders: Iterable[tuple[str, dict]]) -> int:
+        """用 (门店, 订单) 序列整体重算全部计数（每个门店一次向量化统计）；返回计入的订单数。"""
+        by_store: dict[str, list[list[int]]] = {}
+        with self._lock:
+            for store_id, order in orders:
+                by_store.setdefault(store_id, []).append(self._codes(order))
+            size = len(self._ids)
+            stores: dict[str, _StoreCounts] = {}
+            for store_id, baskets in by_store.items():
+                rows, cols, pairs, items = pair_counts(baskets, size)
+                counts = stores[store_id] = _StoreCounts()
+                counts.orders = len(baskets)
+                nonzero = np.flatnonzero(items)
+                counts.items = dict(zip(nonzero.tolist(), items[nonzero].tolist()))
+                counts.pairs = dict(zip(zip(rows.tolist(), cols.tolist()), pairs.tolist()))
+            self._stores = stores
+            self._dirty = set(stores) | set(self._neighbours)
+        total = sum(len(b) for b in by_store.values())
+        metrics.incr("cooccurrence.orders", total)
+        return total
+
+    def ingest(self, orders: OrderStore) -> int:
+        """
+        计入订单日志中上次读取之后的新订单（已取消的跳过）并扣回计入之后被取消的订单，返回计入与扣回的订单数。
+        第一次调用读取全部历史并用 rebuild 一次统计，之后逐单增量累加。
+        """
+        with self._ingest_lock:
+            replay = self._feed.last_order_id == 0
+            changes = self._feed.poll(orders)
+            count = 0
+            if replay and changes:
+                # 回放读到的订单一次统计；读取过程中恰好被取消的订单随后逐单扣回
+                count = self.rebuild((record["store_id"], record["order"]) for record, sign in changes if sign > 0)
+                changes = [(record, sign) for record, sign in changes if sign < 0]
+            for record, sign in changes:
+                self.record(record["order"], record["store_id"], sign=sign)
+            return count + len(changes)
+
+    def _store_neighbours(self, counts: _StoreCounts) -> dict[str, Neighbours]:
+        if counts.pairs:
+            keys = np.fromiter(itertools.chain.from_iterable(counts.pairs), dtype=np.int64, count=2 * len(counts.pairs))
+            rows, cols = keys[0::2], keys[1::2]
+            pairs = np.fromiter(counts.pairs.values(), dtype=np.int64, count=len(counts.pairs))
+        else:
+            rows = cols = pairs = np.zeros(0, dtype=np.int64)
+        items = np.zeros(len(self._ids), dtype=np.int64)
+        if counts.items:
+            items[np.fromiter(counts.items, dtype=np.int64)] = np.fromiter(counts.items.values(), dtype=np.int64)
+        # 同分的邻居按食材 id 排序：编号取决于读到订单的先后，不能作为次序
+        ids = self._ids
+        by_id = np.argsort(np.argsort(np.array(ids, dtype=object)))
+        lists = neighbour_lists(rows, cols, pairs, items, counts.orders, self.top_n, self.min_pairs, by_id)
+        return {ids[a]: tuple((ids[b], s) for b, s in nbrs) for a, nbrs in lists.items()}
+
+    def refresh(self) -> CooccurrenceSnapshot:
+        """重算有新订单的门店的邻居表；邻居与当前快照不同时生成新快照并替换，返回当前快照。"""
+        with self._lock:
+            for store_id in self._dirty:
+                counts = self._stores.get(store_id)
+                neighbours = self._store_neighbours(counts) if counts is not None else {}
+                if neighbours:
+                    self._neighbours[store_id] = neighbours
+                else:
+                    self._neighbours.pop(store_id, None)
+            self._dirty.clear()
+            current = self.snapshot
+            if _ids_of(self._neighbours) == _ids_of(current.neighbours):
+                return current
+            self.snapshot = CooccurrenceSnapshot(
+                version=current.version + 1, created_at=self._clock(), neighbours=dict(self._neighbours)
+            )
+        metrics.incr("cooccurrence.snapshots")
+        return self.snapshot
+
+    def stats(self, store_id: str | None = None, item_id: str | None = None) -> dict:
+        """各门店的订单数、食材数与食材对数；指定 item_id 时附该食材当前的邻居与同单次数，供管理接口查看。"""
+        with self._lock:
+            out: dict[str, dict] = {}
+            for sid, counts in sorted(self._stores.items()):
+                if store_id is not None and sid != store_id:
+                    continue
+                entry = {"orders": counts.orders, "items": len(counts.items), "pairs": len(counts.pairs)}
+                if item_id is not None:
+                    a = self._index.get(item_id)
+                    entry["neighbours"] = [
+                        [b, score, counts.pairs.get((min(a, self._index[b]), max(a, self._index[b])), 0)]
+                        for b, score in self.snapshot.for_store(sid).get(item_id, ())
+                    ] if a is not None else []
+                out[sid] = entry
+            return {"version": self.snapshot.version, "top_n": self.top_n, "min_pairs": self.min_pairs, "stores": out}
+
+
+class SuggestionTable:
+    """
+    门店的「常一起点」表：食材 × 可识别过敏项的全部子集 → 已排除含该过敏原食材与菜单外食材的邻居（按 NPMI 从高到低）。
+    邻居快照变化或门店重载时整表重建；购物车路径只查一次表，跳过已在购物车中的食材。
+    """
+
+    def __init__(
+        self,
+        menu_index: MenuIndex,
+        neighbours: dict[str, Neighbours] | None = None,
+        cooccurrence_version: int = 0,
+    ):
+        self.version = menu_index.version
+        self.cooccurrence_version = cooccurrence_version
+        valid = menu_index.ingredient_ids
+        subsets = [c for n in range(len(KNOWN_ALLERGIES) + 1) for c in itertools.combinations(sorted(KNOWN_ALLERGIES), n)]
+        blocked = {
+            subset: {iid for iid in valid if any(ingredient_has_allergen(menu_index.item_by_id[iid], a) for a in subset)}
+            for subset in subsets
+        }
+        self._table: dict[tuple[str, tuple[str, ...]], tuple[str, ...]] = {}
+        for item_id, nbrs in (neighbours or {}).items():
+            if item_id not in valid:
+                continue
+            for subset in subsets:
+                ids = tuple(b for b, _ in nbrs if b in valid and b not in blocked[subset])
+                if ids:
+                    self._table[item_id, subset] = ids
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def suggest(
+        self, item_id: str, allergies: list[str], cart: Iterable[str] = (), k: int = DEFAULT_SUGGESTIONS
+    ) -> list[str]:
+        """刚加入 item_id 时建议再加的最多 k 种食材（已在购物车中的跳过）。"""
+        cart = cart if isinstance(cart, (set, frozenset, dict)) else set(cart)
+        out: list[str] = []
+        for b in self._table.get((item_id, canonical_allergies(allergies)), ()):
+            if b not in cart:
+                out.append(b)
+                if len(out) >= k:
+                    break
+        return out
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+预计算 FAQ 答案表：离线为每种食材/锅底 × 常见意图（特点、涮煮时间、适合人群、蘸料）生成答案，
+/api/chat 命中时直接返回，不再走检索 + Gemini。
+
+答案表按知识库内容指纹（kb_hash）做版本：知识文档变化后旧表自动失效，回退到实时 RAG。
+精确查表未命中时，可用请求已算好的 query 向量做语义查表（需先 index_vectors；只在问到的同一实体、同一意图的条目中查）。
+"""
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.query import normalize
+from core.rag import RAGAnswer
+
+FAQ_FORMAT_VERSION = 1
+# 语义查表的相似度下限；另要求菜单匹配到的实体与条目相同（避免「毛肚涮多久」命中「鸭肠涮多久」），
+# 且问题属于条目的意图（避免「毛肚配什么蘸料」命中「毛肚涮多久」）
+FAQ_SEMANTIC_THRESHOLD = 0.9
+
+# 意图 -> (食材问法, 锅底问法)。每组第一条为生成答案时实际提问的问题，其余为等价问法（命中同一答案）。
+# 食材「特点」、锅底「特点」的第一条与前端下拉（dropdowns.js）发出的问题保持一致。
+FAQ_INTENTS: dict[str, tuple[list[str], list[str]]] = {
+    "特点": (
+        ["{name}有什么特点和涮煮建议？", "{name}有什么特点？", "{name}是什么？", "介绍一下{name}"],
+        ["{name}有什么特点和适合什么人？", "{name}有什么特点？", "{name}是什么？", "介绍一下{name}"],
+    ),
+    "涮煮时间": (
+        ["{name}涮多久？", "{name}煮多久？", "{name}要涮几分钟？", "{name}涮煮时间"],
+        ["{name}涮菜要煮多久？", "{name}涮煮时间"],
+    ),
+    "适合人群": (
+        ["{name}适合什么人？", "{name}适合什么人吃？"],
+        ["{name}适合什么人？", "{name}适合什么人吃？"],
+    ),
+    "蘸料": (
+        ["{name}配什么蘸料？", "{name}蘸什么好吃？"],
+        ["{name}配什么蘸料？", "{name}蘸料怎么调？"],
+    ),
+}
+
+# 意图 -> 问题中的关键词（语义查表时判断问题属于哪些意图；一个问题可同时属于多个，如「特点和适合什么人」）
+FAQ_INTENT_KEYWORDS: dict[str, tuple[str, ...]] = {
+    "特点": ("特点", "是什么", "介绍", "口感"),
+    "涮煮时间": ("多久", "几分钟", "多长时间", "时间"),
+    "适合人群": ("适合什么人", "适合谁", "人群"),
+    "蘸料": ("蘸",),
+}
+
+_PUNCT_RE = re.compile(r"[\s？?！!。．.，,、；;：:~～\"'“”‘’（）()]+")
+
+
+def normalize_question(text: str) -> str:
+    """问题归一化：去空白与标点、英文转小写，用作答案表键。"""
+    return _PUNCT_RE.sub("", (text or "").strip().lower())
+
+
+def question_intents(text: str) -> set[str]:
+    """问题属于的 FAQ 意图（按关键词）；都不含时为空集。"""
+    t = (text or "").lower()
+    return {intent for intent, words in FAQ_INTENT_KEYWORDS.items() if any(w in t for w in words)}
+
+
+def iter_faq_questions(menu: dict):
+    """遍历菜单实体 × 意图，产出 (entity_type, entity_id, name, intent, 问题列表)。"""
+    entities = [("ingredient", it) for it in menu.get("ingredients", [])]
+    entities += [("broth", b) for b in menu.get("soup_bases", [])]
+    for entity_type, it in entities:
+        name_cn = (it.get("name_cn") or "").strip()
+        name_en = (it.get("name_en") or "").strip()
+        name = name_cn or name_en
+        if not name:
+            continue
+        for intent, (ing_tpls, broth_tpls) in FAQ_INTENTS.items():
+            tpls = ing_tpls if entity_type == "ingredient" else broth_tpls
+            questions = [t.format(name=name) for t in tpls]
+            if name_en and name_en != name:
+                questions += [t.format(name=name_en) for t in tpls]
+            yield entity_type, it.get("id", ""), name, intent, questions
+
+
+class FAQTable:
+    """只读答案表：归一化问题 -> 答案，查表 O(1)。"""
+
+    def __init__(self, kb_hash: str, entries: list[dict], generated_at: str = ""):
+        self.kb_hash = kb_hash
+        self.entries = entries
+        self.generated_at = generated_at
+        self._index: dict[str, str] = {}
+        self._vec_entries: list[dict] = []
+        self._vecs: np.ndarray | None = None
+        # (实体名, 意图) -> 语义查表候选条目的下标
+        self._vec_groups: dict[tuple[str, str], list[int]] = {}
+        for e in entries:
+            answer = e.get("answer") or ""
+            if not answer:
+                continue
+            for q in e.get("questions") or [e.get("question", "")]:
+                key = normalize_question(q)
+                if key:
+                    self._index.setdefault(key, answer)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, question: str, query_vec=None, entity: str | None = None) -> str | None:
+        """
+        先按归一化问题精确查表；未命中且提供 query_vec 与 entity（菜单匹配到的食材/锅底名，见 routing.match_entity）时做语义查表：
+        只在同一实体、且问题属于同一意图的条目中取最相似的一条，相似度不低于 FAQ_SEMANTIC_THRESHOLD 才算命中。
+        """
+        hit = self._index.get(normalize_question(question))
+        if hit is not None or query_vec is None or not entity or self._vecs is None or not len(self._vec_entries):
+            return hit
+        candidates = [i for intent in question_intents(question) for i in self._vec_groups.get((entity, intent), ())]
+        if not candidates:
+            return None
+        sims = self._vecs[candidates] @ normalize(query_vec)
+        best = int(np.argmax(sims))
+        if sims[best] < FAQ_SEMANTIC_THRESHOLD:
+            return None
+        return self._vec_entries[candidates[best]]["answer"]
+
+    def index_vectors(self, embeddings: Embeddings) -> None:
+        """为每个条目的主问题批量编码一次，供语义查表。"""
+        # 没有实体名的条目无法核对问到的是不是同一食材/锅底，不参与语义查表
+        entries = [e for e in self.entries if e.get("answer") and e.get("question") and e.get("name")]
+        if not entries:
+            return
+        vecs = embeddings.embed_documents([e["question"] for e in entries])
+        self._vecs = np.stack([normalize(v) for v in vecs])
+        self._vec_entries = entries
+        self._vec_groups = {}
+        for i, e in enumerate(entries):
+            self._vec_groups.setdefault((e["name"], e.get("intent")), []).append(i)
+
+    def to_dict(self) -> dict:
+        return {
+            "format_version": FAQ_FORMAT_VERSION,
+            "kb_hash": self.kb_hash,
+            "generated_at": self.generated_at,
+            "entries": self.entries,
+        }
+
+    def save(self, path: Path | str) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=1), encoding="utf-8")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path | str, kb_hash: str | None = None) -> "FAQTable | None":
+        """读取答案表；文件不存在、格式版本不符或知识库指纹不一致时返回 None。"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if data.get("format_version") != FAQ_FORMAT_VERSION:
+            return None
+        if kb_hash is not None and data.get("kb_hash") != kb_hash:
+            return None
+        return cls(data.get("kb_hash", ""), data.get("entries") or [], data.get("generated_at", ""))
+
+
+def build_faq_table(
+    answer_fn: Callable[[str], RAGAnswer | str],
+    menu: dict,
+    kb_hash: str,
+    concurrency: int = 4,
+    on_progress: Callable[[int, int, dict], None] | None = None,
+) -> FAQTable:
+    """
+    用 answer_fn（完整 RAG 流程，返回 RAGAnswer 或答案文本）为每个实体 × 意图生成答案，线程池限制并发。
+    answer_fn 抛异常、答案为「没有相关内容」或降级答案（抽取式 / 回退）的条目不写入答案表（运行时回退实时 RAG），
+    进度回调中的 job 分别带 error / skipped。
+    """
+    jobs = [
+        {"entity_type": et, "entity_id": eid, "name": name, "intent": intent,
+         "question": qs[0], "questions": qs}
+        for et, eid, name, intent, qs in iter_faq_questions(menu)
+    ]
+    entries: list[dict] = []
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(answer_fn, job["question"]): job for job in jobs}
+        for fut in as_completed(futures):
+            job = futures[fut]
+            done += 1
+            try:
+                result = fut.result()
+            except Exception as e:
+                job = {**job, "error": str(e)}
+                result = None
+            if isinstance(result, RAGAnswer):
+                if result.empty or result.degraded:
+                    job = {**job, "skipped": "empty" if result.empty else "degraded"}
+                    result = None
+                else:
+                    result = result.answer
+            answer = (result or "").strip()
+            if answer:
+                entries.append({**job, "answer": answer})
+            if on_progress:
+                on_progress(done, len(jobs), job)
+    entries.sort(key=lambda e: (e["entity_type"], e["entity_id"], e["intent"]))
+    return FAQTable(kb_hash, entries, generated_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
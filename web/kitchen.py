@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+厨房备料看板：所有未完成（open）订单的食材份数合计（ingredient_id → 份数）与锅底合计（broth_id → 锅数），按门店分开。
+
+合计随订单变化增量维护：每个 open 订单记下它贡献的份数，确认、修改或关闭订单时先减去旧贡献、再加上新贡献，
+代价与该订单的菜品数成正比，与未完成订单总数无关；同一条记录重复应用不改变合计（幂等），
+因此本 worker 的写入与从订单日志同步来的写入可以重叠。
+
+推送：GET /api/kitchen/board/stream（SSE）先发一帧完整快照，之后每有变化等 push_interval 秒再发一帧
+只含变化项的增量（份数为 0 表示该项已清零），一波集中下单只产生一帧；空闲时定期发注释行保活。
+
+多 worker：每个 worker 各有一份看板，启动时从订单日志加载 open 订单，之后每 sync_interval 秒
+按 (updated_at, order_id) 读取其它 worker 写入的变化（KitchenSync）。
+
+指标：kitchen.updates（改变了合计的订单变化数）、kitchen.pushes（发出的增量帧数）。
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import AsyncIterator, Callable
+
+from core import metrics
+
+from .orders import MAX_PAGE_SIZE, ORDER_OPEN, SYNC_OVERLAP_S, OrderStore
+
+logger = logging.getLogger(__name__)
+
+# 增量推送的合并窗口（秒）：第一处变化后再等这么久，期间的变化合成一帧
+DEFAULT_PUSH_INTERVAL_S = 0.25
+# 从订单日志同步其它 worker 写入的间隔（秒）
+DEFAULT_SYNC_INTERVAL_S = 1.0
+# SSE 空闲保活间隔（秒）
+HEARTBEAT_S = 15.0
+# 份数低于该值视为清零（浮点累加误差）
+_EPS = 1e-6
+
+
+def order_portions(order: dict) -> tuple[dict[str, float], dict[str, int]]:
+    """一个 HotpotOrder（model_dump 后的 dict）的食材份数与锅底锅数；旧版单锅底订单按 1 锅计。"""
+    items: dict[str, float] = {}
+    for it in order.get("items") or []:
+        iid = it.get("menu_item_id")
+        if iid:
+            items[iid] = items.get(iid, 0.0) + float(it.get("quantity") or 0)
+    broths: dict[str, int] = {}
+    for b in order.get("broths") or []:
+        if b.get("broth_id"):
+            broths[b["broth_id"]] = broths.get(b["broth_id"], 0) + int(b.get("quantity") or 1)
+    if not broths and order.get("broth_id"):
+        broths[order["broth_id"]] = 1
+    return items, broths
+
+
+def format_event(event: str, data: dict, event_id: int | None = None) -> str:
+    """一帧 SSE（text/event-stream）。"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class _StoreTotals:
+    """一家门店的合计，以及每一项最后一次变化时的看板版本（用于算增量）。"""
+
+    def __init__(self):
+        self.open_orders = 0
+        self.version = 0
+        self.ingredients: dict[str, float] = {}
+        self.broths: dict[str, int] = {}
+        self.changed: dict[tuple[str, str], int] = {}
+
+
+class KitchenBoard:
+    """各门店未完成订单的备料合计（线程安全）；变化时通知订阅者。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stores: dict[str, _StoreTotals] = {}
+        # order_id -> (store_id, 食材份数, 锅底锅数)，只保存 open 订单
+        self._orders: dict[int, tuple[str, dict[str, float], dict[str, int]]] = {}
+        self._listeners: set[Callable[[], None]] = set()
+        self.version = 0
+        self._synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def apply(self, record: dict) -> bool:
+        """应用一条订单记录（OrderStore 返回的格式）；合计有变化时返回 True 并通知订阅者。"""
+        order_id = record["order_id"]
+        new = None
+        if record.get("status") == ORDER_OPEN:
+            new = (record["store_id"], *order_portions(record.get("order") or {}))
+        with self._lock:
+            old = self._orders.get(order_id)
+            if old == new:
+                return False
+            self.version += 1
+            if old is not None:
+                del self._orders[order_id]
+                self._add(old, -1)
+            if new is not None:
+                self._orders[order_id] = new
+                self._add(new, 1)
+            listeners = list(self._listeners)
+        metrics.incr("kitchen.updates")
+        for notify in listeners:
+            notify()
+        return True
+
+    def _add(self, entry: tuple[str, dict[str, float], dict[str, int]], sign: int) -> None:
+        store_id, items, broths = entry
+        st = self._stores.setdefault(store_id, _StoreTotals())
+        st.open_orders += sign
+        st.version = self.version
+        for kind, totals, delta in (("ingredients", st.ingredients, items), ("broths", st.broths, broths)):
+            for key, qty in delta.items():
+                value = totals.get(key, 0) + sign * qty
+                if abs(value) < _EPS:
+                    totals.pop(key, None)
+                else:
+                    totals[key] = value
+                st.changed[(kind, key)] = self.version
+
+    def snapshot(self, store_id: str) -> dict:
+        """门店当前的完整合计。"""
+        with self._lock:
+            st = self._stores.get(store_id) or _StoreTotals()
+            return {
+                "store_id": store_id,
+                "version": self.version,
+                "open_orders": st.open_orders,
+                "ingredients": {k: round(v, 2) for k, v in sorted(st.ingredients.items())},
+                "broths": dict(sorted(st.broths.items())),
+            }
+
+    def changes(self, store_id: str, since_version: int) -> dict | None:
+        """自 since_version 之后该门店变化过的项（当前值，清零的为 0）；没有变化时返回 None。"""
+        with self._lock:
+            st = self._stores.get(store_id)
+            if st is None or st.version <= since_version:
+                return None
+            out = {"store_id": store_id, "version": self.version, "open_orders": st.open_orders,
+                   "ingredients": {}, "broths": {}}
+            for (kind, key), ver in st.changed.items():
+                if ver > since_version:
+                    totals = st.ingredients if kind == "ingredients" else st.broths
+                    out[kind][key] = round(totals.get(key, 0), 2) if kind == "ingredients" else totals.get(key, 0)
+            return out
+
+    def subscribe(self, notify: Callable[[], None]) -> None:
+        with self._lock:
+            self._listeners.add(notify)
+
+    def unsubscribe(self, notify: Callable[[], None]) -> None:
+        with self._lock:
+            self._listeners.discard(notify)
+
+    def subscribers(self) -> int:
+        with self._lock:
+            return len(self._listeners)
+
+    # ---------- 从订单日志加载 / 同步 ----------
+    def load(self, orders: OrderStore) -> int:
+        """从订单日志加载全部 open 订单（启动时）；返回加载的订单数。"""
+        self._synced_at = time.time()
+        count, cursor = 0, None
+        while True:
+            page = orders.list_orders(status=ORDER_OPEN, cursor=cursor, limit=MAX_PAGE_SIZE, oldest_first=True)
+            for record in page["orders"]:
+                self.apply(record)
+                count += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return count
+
+    def sync(self, orders: OrderStore) -> int:
+        """应用上次同步以来订单日志里的变化（含其它 worker 的写入）；返回改变了合计的订单数。"""
+        since, after_id, changed = max(0.0, self._synced_at - SYNC_OVERLAP_S), 0, 0
+        while True:
+            rows = orders.changes_since(since, after_id, limit=MAX_PAGE_SIZE)
+            for record in rows:
+                changed += self.apply(record)
+            if rows:
+                since, after_id = rows[-1]["updated_at"], rows[-1]["order_id"]
+                self._synced_at = max(self._synced_at, since)
+            if len(rows) < MAX_PAGE_SIZE:
+                return changed
+
+
+class KitchenSync:
+    """后台线程：定期把订单日志的变化同步进看板（多 worker 时看到其它 worker 的订单）。"""
+
+    def __init__(self, board: KitchenBoard, orders: OrderStore, interval_s: float = DEFAULT_SYNC_INTERVAL_S):
+        self.board = board
+        self.orders = orders
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "KitchenSync":
+        if self._thread is None and self.interval_s > 0:
+            self._thread = threading.Thread(target=self._loop, name="kitchen-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 1)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.board.sync(self.orders)
+            except Exception:
+                logger.exception("[Kitchen] 同步订单日志失败")
+
+
+async def board_events(
+    board: KitchenBoard,
+    store_id: str,
+    push_interval: float = DEFAULT_PUSH_INTERVAL_S,
+    heartbeat: float = HEARTBEAT_S,
+) -> AsyncIterator[str]:
+    """SSE 帧序列：snapshot 一帧，之后每个合并窗口最多一帧 update；空闲 heartbeat 秒发一行保活注释。"""
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def _notify() -> None:
+        loop.call_soon_threadsafe(wake.set)
+
+    board.subscribe(_notify)
+    try:
+        snap = board.snapshot(store_id)
+        version = snap["version"]
+        yield format_event("snapshot", snap, version)
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            await asyncio.sleep(push_interval)
+            wake.clear()
+            delta = board.changes(store_id, version)
+            if delta is not None:
+                version = delta["version"]
+                metrics.incr("kitchen.pushes")
+                yield format_event("update", delta, version)
+    finally:
+        board.unsubscribe(_notify)
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+订单日志：确认的订单（generate_order_struct 生成的 HotpotOrder）追加写入本地 SQLite，重启不丢，厨房可查询未完成订单。
+
+写入：所有写操作交给一个写线程做组提交——第一条写请求到达后最多再等 commit_delay 秒（或攒满 max_batch 条），
+     在同一个事务里写完、提交一次（synchronous=FULL 时一次 fsync）。调用方拿到的 Future 在提交之后才完成，
+     确认下单的响应发出时订单已经落盘。
+读取：WAL 模式，每个线程一条只读连接，读不阻塞写、写也不阻塞读。分页按 order_id 游标（keyset），
+     翻到第几页代价都一样；索引覆盖 时间、(session_id, order_id)、(status, order_id)、(store_id, order_id)，
+     以及供厨房看板跨 worker 同步的 (updated_at, order_id)。
+增量统计：OrderFeed 按 order_id 读新订单、按 (updated_at, order_id) 跟随之后的状态变化，热度与「常一起点」据此计入新订单、
+     撤销计入后被取消的订单。
+多 worker 进程共用同一个数据库文件，写入由 SQLite 文件锁串行化（busy_timeout 内等待）。
+
+指标：orders.appended / orders.updated（写入 / 改状态的订单数）、orders.commits（提交次数）、orders.errors。
+"""
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ORDER_DB = "data/orders.db"
+# 组提交：第一条写请求最多等待的秒数与一次提交的写请求上限
+DEFAULT_COMMIT_DELAY_S = 0.002
+DEFAULT_MAX_BATCH = 256
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# 另一进程持有写锁时的最长等待（秒）
+BUSY_TIMEOUT_S = 5.0
+# 按 updated_at 读取状态变化时回看的秒数（容忍各进程时钟的微小偏差；重复应用须是幂等的）
+SYNC_OVERLAP_S = 1.0
+
+ORDER_OPEN = "open"
+ORDER_CLOSED = "closed"
+ORDER_CANCELLED = "cancelled"
+ORDER_STATUSES = (ORDER_OPEN, ORDER_CLOSED, ORDER_CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL    NOT NULL,
+    updated_at REAL    NOT NULL,
+    store_id   TEXT    NOT NULL,
+    session_id TEXT    NOT NULL,
+    status     TEXT    NOT NULL,
+    num_guests INTEGER NOT NULL,
+    order_json TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_session ON orders (session_id, order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_store ON orders (store_id, order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_updated ON orders (updated_at, order_id);
+"""
+
+
+def _record(row: sqlite3.Row) -> dict:
+    return {
+        "order_id": row["order_id"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "store_id": row["store_id"],
+        "session_id": row["session_id"],
+        "status": row["status"],
+        "num_guests": row["num_guests"],
+        "order": json.loads(row["order_json"]),
+    }
+
+
+def _insert(conn: sqlite3.Connection, order: dict, session_id: str, store_id: str) -> dict:
+    now = time.time()
+    cur = conn.execute(
+        "INSERT INTO orders (created_at, updated_at, store_id, session_id, status, num_guests, order_json)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (now, now, store_id, session_id, ORDER_OPEN, int(order.get("num_guests") or 1),
+         json.dumps(order, ensure_ascii=False, separators=(",", ":"))),
+    )
+    return {
+        "order_id": cur.lastrowid, "created_at": now, "updated_at": now, "store_id": store_id,
+        "session_id": session_id, "status": ORDER_OPEN, "num_guests": int(order.get("num_guests") or 1), "order": order,
+    }
+
+
+def _update_status(conn: sqlite3.Connection, order_id: int, status: str) -> dict | None:
+    conn.execute("UPDATE orders SET status = ?, updated_at = ? WHERE order_id = ?", (status, time.time(), order_id))
+    row = conn.execute("SELECT * FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+    return _record(row) if row else None
+
+
+class OrderStore:
+    """SQLite（WAL）订单日志：写入经写线程组提交，查询走各线程自己的只读连接。"""
+
+    def __init__(
+        self,
+        path: Path | str = DEFAULT_ORDER_DB,
+        commit_delay: float = DEFAULT_COMMIT_DELAY_S,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        synchronous: str = "FULL",
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.commit_delay = max(0.0, commit_delay)
+        self.max_batch = max(1, max_batch)
+        self.synchronous = synchronous
+        # 写连接在这里打开并建表：数据库打不开时启动即报错，而不是写线程悄悄退出
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._queue: queue.Queue = queue.Queue()
+        self._local = threading.local()
+        # 保护 _closed 与入队：写线程异常退出时置位并清空队列，之后不会再有 Future 入队后无人处理
+        self._lock = threading.Lock()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="order-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            conn = sqlite3.connect(
+                self.path.resolve().as_uri() + "?mode=ro", uri=True, timeout=BUSY_TIMEOUT_S, check_same_thread=False
+            )
+        else:
+            conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT_S, isolation_level=None, check_same_thread=False)
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect(readonly=True)
+        return conn
+
+    # ---------- 写入（组提交） ----------
+    def _submit(self, fn, *args) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("订单库已关闭")
+            self._queue.put((fn, args, future))
+        return future
+
+    def append(self, order: dict, session_id: str, store_id: str) -> Future:
+        """追加一条已确认订单（状态 open）；Future 在提交后完成，结果为订单记录（含 order_id）。"""
+        return self._submit(_insert, order, session_id, store_id)
+
+    def update_status(self, order_id: int, status: str) -> Future:
+        """修改订单状态；Future 的结果为更新后的记录，订单不存在时为 None。"""
+        if status not in ORDER_STATUSES:
+            raise ValueError(f"未知订单状态: {status}")
+        return self._submit(_update_status, order_id, status)
+
+    def _run(self) -> None:
+        conn = self._conn
+        batch: list = []
+        try:
+            stop = False
+            while not stop:
+                first = self._queue.get()
+                if first is None:
+                    break
+                batch = [first]
+                deadline = time.monotonic() + self.commit_delay
+                while len(batch) < self.max_batch:
+                    try:
+                        op = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if op is None:
+                        stop = True
+                        break
+                    batch.append(op)
+                self._commit(conn, batch)
+                batch = []
+        except Exception as e:
+            # 写线程意外退出：不再接受写入，已排队的写入都以异常结束，调用方不会一直等待
+            logger.exception("[Orders] 写线程异常退出")
+            self._fail_pending(batch, e)
+        finally:
+            conn.close()
+
+    def _fail_pending(self, batch: list, error: Exception) -> None:
+        with self._lock:
+            self._closed = True
+        pending = list(batch)
+        while True:
+            try:
+                op = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if op is not None:
+                pending.append(op)
+        failed = 0
+        for _, _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError(f"订单库写线程已停止：{error}"))
+                failed += 1
+        if failed:
+            metrics.incr("orders.errors", failed)
+
+    def _commit(self, conn: sqlite3.Connection, batch: list) -> None:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            results = [fn(conn, *args) for fn, args, _ in batch]
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    # 磁盘错误时回滚也可能失败；SQLite 会自动回滚未提交的事务，这里只记录
+                    logger.exception("[Orders] 回滚失败")
+            metrics.incr("orders.errors", len(batch))
+            logger.exception("[Orders] 提交 %d 条写入失败", len(batch))
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        metrics.incr("orders.commits")
+        for (fn, _, future), result in zip(batch, results):
+            metrics.incr("orders.appended" if fn is _insert else "orders.updated")
+            future.set_result(result)
+
+    def close(self) -> None:
+        """处理完已排队的写入后停止写线程。"""
+        with self._lock:
+            if self._closed and not self._writer.is_alive():
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._writer.join()
+
+    # ---------- 查询（只读连接，不阻塞写入） ----------
+    def get(self, order_id: int) -> dict | None:
+        row = self._reader().execute("SELECT * FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+        return _record(row) if row else None
+
+    def list_orders(
+        self,
+        status: str | None = None,
+        store_id: str | None = None,
+        session_id: str | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        cursor: int | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        oldest_first: bool = False,
+    ) -> dict:
+        """
+        分页查询：默认新单在前；oldest_first 为真时先下的单在前（厨房按顺序出餐）。
+        cursor 为上一页返回的 next_cursor（order_id 游标），没有下一页时 next_cursor 为 None。
+        """
+        where, params = [], []
+        for column, value in (("status", status), ("store_id", store_id), ("session_id", session_id)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            params.append(until)
+        if cursor is not None:
+            where.append("order_id > ?" if oldest_first else "order_id < ?")
+            params.append(cursor)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        sql = (
+            "SELECT * FROM orders" + (" WHERE " + " AND ".join(where) if where else "")
+            + f" ORDER BY order_id {'ASC' if oldest_first else 'DESC'} LIMIT ?"
+        )
+        rows = self._reader().execute(sql, (*params, limit + 1)).fetchall()
+        page = rows[:limit]
+        return {
+            "orders": [_record(r) for r in page],
+            "next_cursor": page[-1]["order_id"] if len(rows) > limit else None,
+        }
+
+    def changes_since(self, updated_at: float, after_id: int = 0, limit: int = MAX_PAGE_SIZE) -> list[dict]:
+        """按 (updated_at, order_id) 顺序返回在该位置之后新增或改过状态的订单（厨房看板同步其它 worker 的写入）。"""
+        rows = self._reader().execute(
+            "SELECT * FROM orders WHERE updated_at > ? OR (updated_at = ? AND order_id > ?)"
+            " ORDER BY updated_at, order_id LIMIT ?",
+            (updated_at, updated_at, after_id, limit),
+        ).fetchall()
+        return [_record(r) for r in rows]
+
+    def count_by_status(self, store_id: str | None = None) -> dict[str, int]:
+        """各状态的订单数（报表用）。"""
+        sql = "SELECT status, COUNT(*) AS n FROM orders"
+        params: tuple = ()
+        if store_id is not None:
+            sql += " WHERE store_id = ?"
+            params = (store_id,)
+        rows = self._reader().execute(sql + " GROUP BY status", params).fetchall()
+        return {status: 0 for status in ORDER_STATUSES} | {r["status"]: r["n"] for r in rows}
+
+
+class OrderFeed:
+    """
+    订单日志的增量读取，供热度、「常一起点」等只增统计使用：新订单按 order_id 游标读取，读过的订单之后的状态变化
+    按 updated_at 读取（changes_since）。读到时已取消的订单不计入；计入之后被取消的返回一次撤销，取消后又恢复的
+    再补计一次，统计里始终只有当前未取消的订单。只记住未计入的订单号（取消是少数），重复读到的变化不会重复生效。
+    """
+
+    def __init__(self):
+        self.last_order_id = 0
+        self.since: float | None = None
+        self._synced_at: float | None = None
+        self._uncounted: set[int] = set()
+
+    def poll(self, orders: OrderStore, since: float | None = None) -> list[tuple[dict, int]]:
+        """
+        返回上次读取之后需要计入（+1）或撤销（-1）的 (订单记录, 符号)，按读取顺序。
+        since 只在第一次读取时生效：只回放该时间之后下的单，更早的订单从未计入，之后改状态也不处理。
+        """
+        # 先记下时间再读新订单：读新订单期间及之后发生的状态变化，下面或下一次按 updated_at 一定能读到
+        synced_at = time.time()
+        if self._synced_at is None:
+            self.since = since
+            self._synced_at = synced_at
+        out: list[tuple[dict, int]] = []
+        while True:
+            page = orders.list_orders(
+                since=self.since, cursor=self.last_order_id or None, limit=MAX_PAGE_SIZE, oldest_first=True
+            )
+            for record in page["orders"]:
+                self.last_order_id = record["order_id"]
+                if record["status"] == ORDER_CANCELLED:
+                    self._uncounted.add(record["order_id"])
+                else:
+                    out.append((record, 1))
+            if page["next_cursor"] is None:
+                break
+        changed_since, after_id = max(0.0, self._synced_at - SYNC_OVERLAP_S), 0
+        while True:
+            rows = orders.changes_since(changed_since, after_id, limit=MAX_PAGE_SIZE)
+            for record in rows:
+                order_id = record["order_id"]
+                # 还没按 order_id 读到的新订单留到下一次；回放范围之前的订单从未计入
+                if order_id > self.last_order_id or (self.since is not None and record["created_at"] < self.since):
+                    continue
+                cancelled = record["status"] == ORDER_CANCELLED
+                if cancelled and order_id not in self._uncounted:
+                    self._uncounted.add(order_id)
+                    out.append((record, -1))
+                elif not cancelled and order_id in self._uncounted:
+                    self._uncounted.discard(order_id)
+                    out.append((record, 1))
+            if len(rows) < MAX_PAGE_SIZE:
+                break
+            changed_since, after_id = rows[-1]["updated_at"], rows[-1]["order_id"]
+        self._synced_at = synced_at
+        return out
+
+
+class SnapshotRefresher:
+    """
+    后台线程：定期让基于订单日志的统计模型（热度、「常一起点」）读取新变化、刷新快照，
+    再对每个已驻留门店调用 apply(门店上下文, 快照) 重建派生表（如 StoreContext.apply_popularity）。
+    model 需提供 ingest(orders) 与 refresh() -> 快照。
+    """
+
+    def __init__(self, model, orders: OrderStore, registry, apply, interval_s: float = 0.0, name: str = "snapshot"):
+        self.model = model
+        self.orders = orders
+        self.registry = registry
+        self.apply = apply
+        self.interval_s = interval_s
+        self.name = name
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "SnapshotRefresher":
+        if self._thread is None and self.interval_s > 0:
+            self._thread = threading.Thread(target=self._loop, name=f"{self.name}-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 1)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.refresh_once()
+            except Exception:
+                logger.exception("[Refresh] 刷新 %s 失败", self.name)
+            if self._stop.wait(self.interval_s):
+                return
+
+    def refresh_once(self) -> int:
+        """读取新变化、刷新快照并应用到已驻留门店；返回重建了派生表的门店数。"""
+        self.model.ingest(self.orders)
+        snapshot = self.model.refresh()
+        rebuilt = 0
+        for store_id in self.registry.resident_ids():
+            ctx = self.registry.peek(store_id)
+            if ctx is not None:
+                rebuilt += self.apply(ctx, snapshot)
+        return rebuilt
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+汉字转拼音（食材搜索的拼音全拼 / 首字母索引用）。
+
+安装了 pypinyin 时用它（覆盖全部汉字）；否则用内置字表，覆盖菜单名称里出现的字，
+多音字取点餐语境下的读音（萝卜 luobo、人参 renshen）。字表之外的汉字无法转换，该名称不建拼音索引。
+"""
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # 未安装 pypinyin：只用内置字表
+    lazy_pinyin = None
+
+# 读音: 汉字（无声调）
+_TABLE = """
+an:鹌 bai:白百 bao:包鲍 bei:北 bo:卜 cai:菜 can:餐 chang:肠 chi:翅 chuan:川 chun:鹑 cong:葱
+da:大 dai:带 dan:蛋 di:地底 dong:东冬冻 dou:豆 du:肚 er:耳 fan:番饭 fei:肥 fen:粉 fu:腐
+ga:咖 gan:干 gao:糕 gong:功工 gu:菇 gua:瓜 guo:锅 hai:海 hei:黑 hong:红 hua:花 huo:火
+ji:鸡 jian:尖 jiang:姜 jie:结 jin:筋金锦 jiu:酒 jun:菌 ke:壳 kou:口 kuan:宽 la:辣 lan:兰
+li:利喱 liu:柳 long:龙 lun:轮 luo:萝 ma:麻 mi:米 mian:面 mo:墨蘑魔 mu:木 nan:南 nian:年
+niu:牛纽 nong:浓 pao:泡 pi:啤皮 pian:片 qie:茄 qing:清青 ren:人 rou:肉 shan:膳 shang:上
+shen:参 sheng:生 shi:什食 shou:手 shu:薯 si:丝 su:素速 suan:酸 sun:笋 tang:唐汤 tian:甜
+tiao:条 tou:头 tu:土 tun:吞 wan:丸 wei:味尾 wu:乌午 xi:西 xia:虾 xian:蚬鲜 xiang:香 xiao:小
+xie:蟹 xin:心新 xu:须 ya:芽鸭 yan:颜 yang:养羊 yao:药 ye:叶野 yin:阴 you:有油鱿 yu:玉芋鱼
+yun:云 zai:仔 zha:炸 zhen:针 zhu:猪竹 zi:子
+"""
+PINYIN: dict[str, str] = {
+    ch: syllable
+    for entry in _TABLE.split()
+    for syllable, chars in [entry.split(":")]
+    for ch in chars
+}
+
+
+def _is_han(ch: str) -> bool:
+    return "一" <= ch <= "鿿"
+
+
+def syllables(text: str) -> list[str] | None:
+    """逐字拼音（非汉字原样保留为小写）；有无法转换的汉字时返回 None。"""
+    if lazy_pinyin is not None:
+        out = lazy_pinyin(text, style=Style.NORMAL, errors=lambda s: list(s))
+        return [s.lower() for s in out if s.strip()]
+    out = []
+    for ch in text:
+        if _is_han(ch):
+            if ch not in PINYIN:
+                return None
+            out.append(PINYIN[ch])
+        elif ch.strip():
+            out.append(ch.lower())
+    return out
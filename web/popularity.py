@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+点单热度：从已确认订单流式统计食材、锅底的受欢迎程度（总体与按时段），驱动推荐顺序。
+
+  计数：每个订单里出现的食材 / 锅底各计 1 次（与份数无关，避免大桌压过小桌），按下单时间指数衰减
+       （半衰期 half_life）。衰减用前向衰减实现：计数按 2^((t - landmark) / half_life) 放大后累加，
+       读取时统一换算，单次更新 O(1)；放大倍数过大时整体缩放一次并前移 landmark。
+  草图：每个（门店, 时段, 食材 / 锅底）维度是一个容量为 capacity 的 Space-Saving 重尾计数器，
+       不同键少于容量时即为精确计数；超出时替换最小项（该项计数作为新键的误差上界，最小项由惰性最小堆给出，
+       均摊 O(log capacity)），内存有界。计入之后被取消的订单按原权重扣回（仍在草图中的键才扣得到）。
+  快照：后台刷新（orders.SnapshotRefresher）每 interval 秒从订单日志读取新订单与状态变化（OrderFeed，覆盖所有 worker 的写入），
+       重新算出各门店各时段的前 top_k 名，排名变化时生成新的 PopularitySnapshot 并整体替换；
+       已驻留门店的推荐表随之按新排名重建（StoreContext.apply_popularity），请求路径只查表。
+       证据不足（衰减后的订单数少于 min_orders）的时段沿用总体排名，总体也不足时沿用手工维护的人气顺序。
+"""
+import heapq
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+
+from core import metrics
+
+from .orders import OrderFeed, OrderStore
+
+DEFAULT_REFRESH_INTERVAL_S = 30.0
+DEFAULT_HALF_LIFE_S = 72 * 3600.0
+DEFAULT_MIN_ORDERS = 20.0
+DEFAULT_CAPACITY = 512
+DEFAULT_TOP_K = 50
+# 启动时回放订单日志的时间范围（半衰期的倍数；更早订单的权重不到 1/1000）
+REPLAY_HALF_LIVES = 10
+# 放大倍数超过 2^RESCALE_EXPONENT 时整体缩放
+RESCALE_EXPONENT = 64
+# 扣减后剩余计数不超过扣减量的该比例时视为清零（浮点累加误差）
+_EPS = 1e-9
+
+KIND_INGREDIENT = "ingredient"
+KIND_BROTH = "broth"
+
+# 时段（本地时间，[起, 止) 小时）；其余时间为 late
+DAYPARTS = (("lunch", 10, 14), ("afternoon", 14, 17), ("dinner", 17, 21))
+DAYPART_LATE = "late"
+DAYPART_NAMES = tuple(name for name, _, _ in DAYPARTS) + (DAYPART_LATE,)
+
+
+def daypart_of(ts: float | None = None) -> str:
+    """时间戳（缺省为现在）所在的时段。"""
+    hour = time.localtime(ts).tm_hour
+    for name, start, end in DAYPARTS:
+        if start <= hour < end:
+            return name
+    return DAYPART_LATE
+
+
+class HeavyHitters:
+    """
+    Space-Saving 计数草图：最多保存 capacity 个键；已跟踪的键 O(1) 累加。
+    权重是实数（衰减放大后的计数），用不了按整数计数分桶的 stream-summary，最小项用惰性最小堆维护：
+    每个键在堆中至少有一项不大于其计数，累加时不动堆；扣减（负权重，撤销取消的订单）时另压入一项当前计数。
+    替换最小项时堆顶若已过时：小于计数的按当前计数放回，大于计数的（扣减前的旧项）与已移除键的项直接丢弃。
+    每次放回对应至少一次累加、每次丢弃对应一次扣减或移除，替换的均摊代价为 O(log capacity)。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = max(1, capacity)
+        self.counts: dict[str, float] = {}
+        self.errors: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, key: str, weight: float) -> None:
+        count = self.counts.get(key)
+        if count is not None:
+            count += weight
+            if weight >= 0:
+                self.counts[key] = count
+            elif count > _EPS * -weight:
+                self.counts[key] = count
+                heapq.heappush(self._heap, (count, key))
+            else:
+                # 扣到零：移除该键（堆中它的项之后丢弃）
+                del self.counts[key]
+                self.errors.pop(key, None)
+            return
+        if weight <= 0:
+            # 未跟踪（或已被替换出去）的键无从扣减，误差在 Space-Saving 的误差上界之内
+            return
+        floor = 0.0
+        if len(self.counts) >= self.capacity:
+            # 只有键数超过容量（长尾）时才需要找最小项
+            while True:
+                stale, victim = self._heap[0]
+                current = self.counts.get(victim)
+                if stale == current:
+                    break
+                if current is None or stale > current:
+                    heapq.heappop(self._heap)
+                else:
+                    heapq.heapreplace(self._heap, (current, victim))
+            floor = self.counts.pop(victim)
+            self.errors.pop(victim, None)
+            heapq.heapreplace(self._heap, (floor + weight, key))
+        else:
+            heapq.heappush(self._heap, (weight, key))
+        self.counts[key] = floor + weight
+        if floor:
+            self.errors[key] = floor
+
+    def scale(self, factor: float) -> None:
+        for key in self.counts:
+            self.counts[key] *= factor
+        for key in self.errors:
+            self.errors[key] *= factor
+        # 按缩放后的计数重建堆，顺带清掉扣减、移除留下的旧项
+        self._heap = [(c, key) for key, c in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, k: int) -> list[tuple[str, float]]:
+        """计数最高的 k 个键（同分按键名）。"""
+        return sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
+
+
+@dataclass(frozen=True)
+class Ranking:
+    """一个（门店, 时段）的排名：食材与锅底 id 按热度降序，orders 为衰减后的订单数。"""
+    ingredients: tuple[str, ...]
+    broths: tuple[str, ...]
+    orders: float
+
+
+@dataclass(frozen=True)
+class PopularitySnapshot:
+    """某一时刻的排名（只读，整体替换）：rankings[store_id][daypart]，daypart 为 None 表示总体。"""
+    version: int = 0
+    created_at: float = 0.0
+    rankings: dict[str, dict[str | None, Ranking]] = field(default_factory=dict)
+
+    def for_store(self, store_id: str) -> dict[str | None, tuple[str, ...]]:
+        """门店各时段的食材排名（只含证据充足的时段）。"""
+        return {dp: r.ingredients for dp, r in self.rankings.get(store_id, {}).items()}
+
+
+def _order_of(rankings: dict[str, dict[str | None, Ranking]]) -> dict:
+    """排名本身（不含订单数），判断快照是否需要替换。"""
+    return {s: {d: (r.ingredients, r.broths) for d, r in by.items()} for s, by in rankings.items()}
+
+
+class PopularityEngine:
+    """衰减计数 + 重尾草图；record 由单个线程调用（后台刷新线程），snapshot 可在任意线程读取。"""
+
+    def __init__(
+        self,
+        half_life_s: float = DEFAULT_HALF_LIFE_S,
+        capacity: int = DEFAULT_CAPACITY,
+        top_k: int = DEFAULT_TOP_K,
+        min_orders: float = DEFAULT_MIN_ORDERS,
+        clock=time.time,
+    ):
+        self.half_life_s = half_life_s
+        self.capacity = capacity
+        self.top_k = top_k
+        self.min_orders = min_orders
+        self._clock = clock
+        self._landmark = clock()
+        self._sketches: dict[tuple[str, str | None, str], HeavyHitters] = {}
+        self._orders: dict[tuple[str, str | None], float] = {}
+        self._feed = OrderFeed()
+        self._lock = threading.Lock()
+        # 后台刷新与管理接口可能同时调用 ingest，同一批订单只能计入一次
+        self._ingest_lock = threading.Lock()
+        self.snapshot = PopularitySnapshot()
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self._sketches.values())
+
+    def _weight(self, ts: float) -> float:
+        exponent = (ts - self._landmark) / self.half_life_s
+        if exponent > RESCALE_EXPONENT:
+            # 前移 landmark，已有计数按同一比例缩小，相对大小不变
+            shift = math.floor(exponent)
+            factor = 2.0 ** -shift
+            for sketch in self._sketches.values():
+                sketch.scale(factor)
+            for key in self._orders:
+                self._orders[key] *= factor
+            self._landmark += shift * self.half_life_s
+            exponent -= shift
+        return 2.0 ** exponent
+
+    def _sketch(self, store_id: str, daypart: str | None, kind: str) -> HeavyHitters:
+        key = (store_id, daypart, kind)
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = HeavyHitters(self.capacity)
+        return sketch
+
+    def record(self, order: dict, store_id: str, ts: float | None = None, sign: int = 1) -> None:
+        """
+        计入一个已确认订单（HotpotOrder 的 dict）；代价与订单的食材种数成正比。
+        sign 为 -1 时按同一下单时间的权重扣回（计入之后被取消的订单）。
+        """
+        ts = self._clock() if ts is None else ts
+        with self._lock:
+            w = sign * self._weight(ts)
+            ingredients = {it.get("menu_item_id") for it in order.get("items") or []} - {None}
+            broths = {b.get("broth_id") for b in order.get("broths") or []} - {None}
+            if not broths and order.get("broth_id"):
+                broths = {order["broth_id"]}
+            for daypart in (None, daypart_of(ts)):
+                self._orders[store_id, daypart] = max(0.0, self._orders.get((store_id, daypart), 0.0) + w)
+                sketch = self._sketch(store_id, daypart, KIND_INGREDIENT)
+                for iid in ingredients:
+                    sketch.add(iid, w)
+                sketch = self._sketch(store_id, daypart, KIND_BROTH)
+                for bid in broths:
+                    sketch.add(bid, w)
+        metrics.incr("popularity.orders" if sign > 0 else "popularity.cancelled")
+
+    def ingest(self, orders: OrderStore) -> int:
+        """
+        计入订单日志中上次读取之后的新订单（已取消的跳过；第一次调用时回放最近 REPLAY_HALF_LIVES 个半衰期），
+        并扣回计入之后被取消的订单；返回计入与扣回的订单数。
+        """
+        with self._ingest_lock:
+            changes = self._feed.poll(orders, since=self._clock() - REPLAY_HALF_LIVES * self.half_life_s)
+            for record, sign in changes:
+                self.record(record["order"], record["store_id"], record["created_at"], sign=sign)
+            return len(changes)
+
+    def refresh(self) -> PopularitySnapshot:
+        """重新计算排名；与当前快照不同时生成新快照并替换，返回当前快照。"""
+        with self._lock:
+            rankings: dict[str, dict[str | None, Ranking]] = {}
+            scale = 2.0 ** ((self._landmark - self._clock()) / self.half_life_s)
+            for (store_id, daypart), weight in self._orders.items():
+                orders = weight * scale
+                if orders < self.min_orders:
+                    continue
+                rankings.setdefault(store_id, {})[daypart] = Ranking(
+                    ingredients=tuple(k for k, _ in self._sketch(store_id, daypart, KIND_INGREDIENT).top(self.top_k)),
+                    broths=tuple(k for k, _ in self._sketch(store_id, daypart, KIND_BROTH).top(self.top_k)),
+                    orders=round(orders, 1),
+                )
+            current = self.snapshot
+            if _order_of(rankings) == _order_of(current.rankings):
+                return current
+            self.snapshot = PopularitySnapshot(version=current.version + 1, created_at=self._clock(), rankings=rankings)
+        metrics.incr("popularity.snapshots")
+        return self.snapshot
+
+    def stats(self, store_id: str | None = None, top: int = 10) -> dict:
+        """各门店各时段的衰减订单数与前 top 名（含衰减计数），供管理接口查看。"""
+        with self._lock:
+            scale = 2.0 ** ((self._landmark - self._clock()) / self.half_life_s)
+            out: dict[str, dict] = {}
+            for (sid, daypart), weight in sorted(self._orders.items(), key=lambda kv: (kv[0][0], kv[0][1] or "")):
+                if store_id is not None and sid != store_id:
+                    continue
+                out.setdefault(sid, {})[daypart or "all"] = {
+                    "orders": round(weight * scale, 2),
+                    "ingredients": [[k, round(c * scale, 2)] for k, c in self._sketch(sid, daypart, KIND_INGREDIENT).top(top)],
+                    "broths": [[k, round(c * scale, 2)] for k, c in self._sketch(sid, daypart, KIND_BROTH).top(top)],
+                }
+            return {"version": self.snapshot.version, "half_life_s": self.half_life_s,
+                    "min_orders": self.min_orders, "stores": out}
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket 通道（/ws）：一条连接绑定一个 session 与门店，以带类型的 JSON 帧复用对话、购物车增量与推荐。
+
+客户端帧（id 可选，服务端的应答帧原样带回，用于对应请求）：
+  {"type": "chat", "id": "1", "message": "...", "num_guests": 2, "allergies": [], "broths": [...]}
+  {"type": "cart", "id": "2", "version": 3, "ops": [{"op": "set", "id": "beef", "quantity": 1}]}
+  {"type": "recommend", "id": "3", "num_guests": 2, "allergies": [], "cart": {"version": 3, "ops": [...]}}
+  {"type": "ping"}
+服务端帧：
+  {"type": "hello", "session_id": ..., "store_id": ...}      连接建立后第一帧
+  {"type": "chat.accepted", "id": ...}                        对话已开始处理（前端显示输入中）
+  {"type": "chat" | "cart" | "recommend", "id": ..., ...}     应答，字段与对应 REST 接口的响应相同
+  {"type": "event", "event": "cart_updated" | "order_confirmed", ...}   服务端主动推送
+  {"type": "error", "id": ..., "error": ...}                  帧无效、排队已满或处理出错
+  {"type": "pong"}
+
+同一连接的请求帧按到达顺序逐条处理（同一 session 的状态修改不并发），ping 在读循环中直接应答；
+未处理的帧超过 max_pending 时新帧直接返回 busy 错误。指标：ws.connected / ws.frames / ws.errors。
+"""
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from core import metrics
+
+from .stores import DEFAULT_STORE_ID
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WS_MAX_PENDING = 16
+# 帧大小上限（字节），与 REST 请求体量级一致
+MAX_FRAME_BYTES = 64 * 1024
+
+
+class Connection:
+    """一条 WebSocket 连接：绑定的 session / 门店，以及串行化的发送（读循环与处理任务都会发帧）。"""
+
+    def __init__(self, websocket: WebSocket, session_id: str, store_id: str | None):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.store_id = store_id
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, frame: dict) -> None:
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(frame, ensure_ascii=False, default=list))
+
+
+Handler = Callable[[Connection, dict], Awaitable[list[dict]]]
+
+
+def _error(frame_id, error: str, detail=None) -> dict:
+    out = {"type": "error", "id": frame_id, "error": error}
+    if detail is not None:
+        out["detail"] = detail
+    return out
+
+
+async def _process(conn: Connection, queue: asyncio.Queue, handlers: dict[str, Handler]) -> None:
+    while True:
+        frame = await queue.get()
+        frame_id = frame.get("id")
+        try:
+            replies = await handlers[frame["type"]](conn, frame)
+        except ValidationError as e:
+            metrics.incr("ws.errors")
+            detail = e.errors(include_url=False, include_context=False, include_input=False)
+            replies = [_error(frame_id, "invalid_frame", detail)]
+        except Exception as e:
+            metrics.incr("ws.errors")
+            logger.exception("[WS] 处理 %s 帧出错", frame["type"])
+            replies = [_error(frame_id, "internal_error", str(e))]
+        for reply in replies:
+            await conn.send(reply)
+
+
+async def serve(
+    conn: Connection,
+    handlers: dict[str, Handler],
+    max_pending: int = DEFAULT_WS_MAX_PENDING,
+) -> None:
+    """读循环：解析帧并交给处理任务，直到客户端断开。调用前连接须已 accept。"""
+    metrics.incr("ws.connected")
+    await conn.send({"type": "hello", "session_id": conn.session_id, "store_id": conn.store_id or DEFAULT_STORE_ID})
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_pending))
+    worker = asyncio.create_task(_process(conn, queue, handlers))
+    try:
+        while True:
+            text = await conn.websocket.receive_text()
+            metrics.incr("ws.frames")
+            if len(text) > MAX_FRAME_BYTES:
+                await conn.send(_error(None, "frame_too_large"))
+                continue
+            try:
+                frame = json.loads(text)
+            except json.JSONDecodeError:
+                await conn.send(_error(None, "invalid_json"))
+                continue
+            kind = frame.get("type") if isinstance(frame, dict) else None
+            if kind == "ping":
+                await conn.send({"type": "pong", "id": frame.get("id")})
+            elif kind not in handlers:
+                await conn.send(_error(frame.get("id") if isinstance(frame, dict) else None, "unknown_type"))
+            else:
+                try:
+                    queue.put_nowait(frame)
+                except asyncio.QueueFull:
+                    metrics.incr("ws.errors")
+                    await conn.send(_error(frame.get("id"), "busy"))
+            if worker.done():
+                # 处理任务只会因发送失败（连接已断）而退出
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        worker.cancel()
+        metrics.incr("ws.disconnected")
@@ -2,8 +2,16 @@
 """
 食材推荐与购物车解析逻辑。
 规定：1人8份、2人10份、3人12份、4人14份、5人16份、6人17份（总种类数）。
+
+推荐结果只取决于人数、过敏项与人气顺序，门店加载菜单时预先算好全部组合（RecommendationTable），
+/api/recommend 只需查表并合并 session 购物车。人气顺序缺省为手工维护的 DEFAULT_RECOMMEND_IDS；
+有足够的已确认订单后改用点单热度排名（web.popularity），排名刷新时整张表重建后替换。
 """
-from concierge.menu_loader import get_all_items_with_prices, load_menu
+from dataclasses import dataclass
+from itertools import combinations
+from typing import Sequence
+
+from concierge.menu_loader import MenuIndex, get_menu_index
 
 # ---------- 人数 → 总份数规定 ----------
 GUESTS_TO_PORTIONS = {1: 8, 2: 10, 3: 12, 4: 14, 5: 16, 6: 17}
@@ -35,11 +43,21 @@ GLUTEN_REPLACEMENTS = ["konjac_noodles", "yam_noodle"]
 ALLERGY_PEANUT = "花生"
 ALLERGY_SEAFOOD = "海鲜"
 ALLERGY_GLUTEN = "面筋"
+# ingredient_has_allergen 能识别的过敏项；其它过敏项不影响推荐结果
+KNOWN_ALLERGIES = (ALLERGY_SEAFOOD, ALLERGY_GLUTEN, ALLERGY_PEANUT)
 
 ADD_CART_KEYWORDS = ("添加", "加", "再来", "来一份", "加上", "要", "多要", "再来一份")
 REMOVE_CART_KEYWORDS = ("去掉", "不要", "删掉", "取消", "移除", "减去")
 
-_INGREDIENT_KEYWORDS: list[tuple[str, str]] = []
+# 食材俗称 → id（增减食材解析与食材搜索共用）
+INGREDIENT_SYNONYMS = {
+    "米饭": "steam_rice", "白米饭": "steam_rice",
+    "肥牛": "beef_sliced", "牛肉": "beef_sliced",
+    "羊肉": "lamb_sliced", "猪肉": "pork_sliced", "鸡肉": "chicken_sliced",
+    "豆皮": "bean_curd_wrapper", "宽粉": "mung_clear_sheets",
+}
+# 菜单版本 -> 关键词表（多门店各自缓存）
+_INGREDIENT_KEYWORDS: dict[str, list[tuple[str, str]]] = {}
 
 
 def ingredient_has_allergen(item: dict, allergen: str) -> bool:
@@ -66,21 +84,33 @@ def ingredient_has_allergen(item: dict, allergen: str) -> bool:
     return False
 
 
-def recommend_items(num_guests: int, allergies: list[str]) -> tuple[list[dict], int]:
-    """根据人数与过敏列表，按固定顺序返回人气菜品；按人数规定截取份数。"""
-    menu = load_menu()
-    items = get_all_items_with_prices(menu)
-    by_id = {it.get("id"): it for it in items}
-    has_seafood_allergy = any(a.strip() == ALLERGY_SEAFOOD for a in allergies if a)
-    has_gluten_allergy = any(a.strip() == ALLERGY_GLUTEN for a in allergies if a)
-
-    ordered_ids = list(DEFAULT_RECOMMEND_IDS)
-    if has_seafood_allergy:
+def _ordered_ids(allergies: list[str], popular: Sequence[str] = ()) -> list[str]:
+    """
+    人气菜品顺序：popular（点单热度排名）在前，DEFAULT_RECOMMEND_IDS 补足；
+    海鲜 / 面筋过敏时把对应菜品依次换成替代品。
+    """
+    ordered_ids = list(dict.fromkeys([*popular, *DEFAULT_RECOMMEND_IDS]))
+    if any(a.strip() == ALLERGY_SEAFOOD for a in allergies if a):
         repl_iter = iter(SEAFOOD_REPLACEMENTS)
-        ordered_ids = [next(repl_iter) if x in SEAFOOD_IDS else x for x in ordered_ids]
-    if has_gluten_allergy:
+        ordered_ids = [next(repl_iter, x) if x in SEAFOOD_IDS else x for x in ordered_ids]
+    if any(a.strip() == ALLERGY_GLUTEN for a in allergies if a):
         repl_iter = iter(GLUTEN_REPLACEMENTS)
-        ordered_ids = [next(repl_iter) if x in GLUTEN_IDS else x for x in ordered_ids]
+        ordered_ids = [next(repl_iter, x) if x in GLUTEN_IDS else x for x in ordered_ids]
+    return ordered_ids
+
+
+def recommend_items(
+    num_guests: int,
+    allergies: list[str],
+    menu_index: MenuIndex | None = None,
+    popular: Sequence[str] = (),
+) -> tuple[list[dict], int]:
+    """
+    根据人数与过敏列表，按人气顺序返回菜品；按人数规定截取份数。menu_index 为门店菜单（缺省默认菜单），
+    popular 为点单热度排名（缺省只用 DEFAULT_RECOMMEND_IDS）。
+    """
+    by_id = (menu_index or get_menu_index()).item_by_id
+    ordered_ids = _ordered_ids(allergies, popular)
 
     seen = set()
     result: list[dict] = []
@@ -105,18 +135,105 @@ def recommend_items(num_guests: int, allergies: list[str]) -> tuple[list[dict],
     return result, len(result)
 
 
-def _build_ingredient_keywords() -> list[tuple[str, str]]:
+def display_order(
+    allergies: list[str], menu_index: MenuIndex | None = None, popular: Sequence[str] = ()
+) -> list[dict]:
+    """全部食材的展示顺序：去掉含过敏原的食材，人气菜品（含替代品）在前，其余按菜单顺序。"""
+    ingredients = (menu_index or get_menu_index()).ingredients
+    allowed = [
+        it for it in ingredients
+        if it.get("id") and not any(a and ingredient_has_allergen(it, a.strip()) for a in allergies)
+    ]
+    by_id = {it["id"]: it for it in allowed}
+    ordered = [by_id[iid] for iid in dict.fromkeys(_ordered_ids(allergies, popular)) if iid in by_id]
+    head = {it["id"] for it in ordered}
+    return ordered + [it for it in allowed if it["id"] not in head]
+
+
+def canonical_allergies(allergies: list[str]) -> tuple[str, ...]:
+    """推荐表的键：只保留能识别的过敏项，去重排序（顺序、重复与无法识别的过敏项不影响推荐结果）。"""
+    return tuple(sorted({a.strip() for a in allergies if a and a.strip() in KNOWN_ALLERGIES}))
+
+
+@dataclass(frozen=True)
+class Recommendation:
+    """某一（人数, 过敏项）组合的推荐结果；条目为 /api/recommend 响应所需字段。"""
+    items: tuple[dict, ...]
+    item_ids: tuple[str, ...]
+    # 全部可选食材（展示顺序），响应时按购物车补上 checked
+    all_items: tuple[dict, ...]
+
+    @property
+    def total(self) -> int:
+        return len(self.items)
+
+
+def build_recommendation(
+    num_guests: int, allergies: list[str], menu_index: MenuIndex | None = None, popular: Sequence[str] = ()
+) -> Recommendation:
+    items, _ = recommend_items(num_guests, allergies, menu_index, popular)
+    return Recommendation(
+        items=tuple(
+            {"id": it.get("id"), "name_cn": it.get("name_cn"), "name_en": it.get("name_en"), "category": it.get("category")}
+            for it in items
+        ),
+        item_ids=tuple(it["id"] for it in items if it.get("id")),
+        all_items=tuple(
+            {"id": it["id"], "name_cn": it.get("name_cn"), "name_en": it.get("name_en")}
+            for it in display_order(allergies, menu_index, popular)
+        ),
+    )
+
+
+class RecommendationTable:
+    """
+    门店菜单加载时预先算好的推荐表：人数 1–6 × 可识别过敏项的全部子集（3 项共 8 种，合计 48 条）。
+    菜单变化时随门店快照一起重建；查表时过敏项先规范化为 canonical_allergies。
+
+    rankings 为点单热度排名（时段 -> 食材 id，None 为总体，见 PopularitySnapshot.for_store）：
+    总体排名用于默认表，各时段排名各建一张表；没有排名的时段查默认表。
+    popularity_version 记录所用的热度快照版本。
+    """
+
+    def __init__(
+        self,
+        menu_index: MenuIndex,
+        rankings: dict[str | None, Sequence[str]] | None = None,
+        popularity_version: int = 0,
+    ):
+        self.version = menu_index.version
+        self.popularity_version = popularity_version
+        rankings = rankings or {}
+        self._table = self._build(menu_index, rankings.get(None, ()))
+        self._dayparts = {
+            daypart: self._build(menu_index, ranking)
+            for daypart, ranking in rankings.items()
+            if daypart is not None and ranking
+        }
+
+    @staticmethod
+    def _build(menu_index: MenuIndex, popular: Sequence[str]) -> dict[tuple[int, tuple[str, ...]], Recommendation]:
+        subsets = [c for n in range(len(KNOWN_ALLERGIES) + 1) for c in combinations(sorted(KNOWN_ALLERGIES), n)]
+        return {
+            (num_guests, subset): build_recommendation(num_guests, list(subset), menu_index, popular)
+            for num_guests in GUESTS_TO_PORTIONS
+            for subset in subsets
+        }
+
+    def __len__(self) -> int:
+        return len(self._table) + sum(len(t) for t in self._dayparts.values())
+
+    def get(self, num_guests: int, allergies: list[str], daypart: str | None = None) -> Recommendation:
+        """人数超出 1–6 时按边界取；daypart 没有单独的排名时查默认表。"""
+        num_guests = max(min(GUESTS_TO_PORTIONS), min(max(GUESTS_TO_PORTIONS), num_guests))
+        return self._dayparts.get(daypart, self._table)[num_guests, canonical_allergies(allergies)]
+
+
+def _build_ingredient_keywords(index: MenuIndex) -> list[tuple[str, str]]:
     """构建 关键词->id 映射，用于解析「添加米饭」等。"""
-    menu = load_menu()
-    items = menu.get("ingredients", [])
+    items = index.ingredients
     pairs: list[tuple[str, str]] = []
-    synonyms = {
-        "米饭": "steam_rice", "白米饭": "steam_rice",
-        "肥牛": "beef_sliced", "牛肉": "beef_sliced",
-        "羊肉": "lamb_sliced", "猪肉": "pork_sliced", "鸡肉": "chicken_sliced",
-        "豆皮": "bean_curd_wrapper", "宽粉": "mung_clear_sheets",
-    }
-    for kw, iid in synonyms.items():
+    for kw, iid in INGREDIENT_SYNONYMS.items():
         pairs.append((kw, iid))
     for it in items:
         name_cn = (it.get("name_cn") or "").strip()
@@ -127,20 +244,21 @@ def _build_ingredient_keywords() -> list[tuple[str, str]]:
     return pairs
 
 
-def parse_add_remove_item(msg: str) -> tuple[str | None, bool]:
+def parse_add_remove_item(msg: str, menu_index: MenuIndex | None = None) -> tuple[str | None, bool]:
     """
     解析用户消息中的增减意图。返回 (item_id, is_add)。
-    若无法解析返回 (None, True)。
+    若无法解析返回 (None, True)。menu_index 为门店菜单（缺省默认菜单）。
     """
-    global _INGREDIENT_KEYWORDS
-    if not _INGREDIENT_KEYWORDS:
-        _INGREDIENT_KEYWORDS = _build_ingredient_keywords()
+    index = menu_index or get_menu_index()
+    keywords = _INGREDIENT_KEYWORDS.get(index.version)
+    if keywords is None:
+        keywords = _INGREDIENT_KEYWORDS[index.version] = _build_ingredient_keywords(index)
     t = msg.strip()
     is_add = any(k in t for k in ADD_CART_KEYWORDS)
     is_remove = any(k in t for k in REMOVE_CART_KEYWORDS)
     if not is_add and not is_remove:
         return None, True
-    for kw, iid in _INGREDIENT_KEYWORDS:
+    for kw, iid in keywords:
         if kw in t:
             return iid, not is_remove
     return None, True
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+检索评测：在黄金问题集上并排比较多组检索配置（分块大小 / 重叠、top_k、食材问题最大候选窗口、
+是否按食材打散、是否自适应检索），报告 recall@k、MRR 与检索延迟分位数。只做检索与上下文组装，不调用 LLM。
+
+黄金问题集：
+  - 自动生成：菜单中每种食材 / 锅底一条（与前端下拉发出的问题一致），相关块 = 含该名称的文本块；
+  - 手写：门店知识目录下的 retrieval_golden.json，每条 {"question": ..., "expect": [关键词, ...]}，
+    相关块 = 含任一关键词的文本块。
+不同分块配置切出的块不同，相关性只能按文本内容判断，不能按块 id。
+问题向量（含实体扩展）按 /api/chat 的方式每题只算一次，各配置共用；延迟只计检索 + 上下文组装。
+"""
+import json
+import statistics
+import time
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+
+from core.context import estimate_tokens
+from core.query import QueryContext
+from core.rag import BOOST_FETCH_K, DEFAULT_CHUNK_OVERLAP, DEFAULT_CHUNK_SIZE, RAG
+
+from .faq import FAQ_INTENTS
+from .stores import StoreContext
+
+GOLDEN_FILENAME = "retrieval_golden.json"
+DEFAULT_RECALL_KS = (1, 3, 5, 8)
+
+
+@dataclass(frozen=True)
+class GoldenQuestion:
+    """一条黄金问题：文本块含 expect 中任一关键词即视为相关。"""
+    question: str
+    expect: tuple[str, ...]
+    source: str = "handwritten"
+
+    def relevant(self, text: str) -> bool:
+        return any(k in text for k in self.expect)
+
+
+def menu_golden_questions(menu: dict) -> list[GoldenQuestion]:
+    """每种食材 / 锅底一条「特点」问题（FAQ_INTENTS 的第一种问法），期望命中含其中文名的块。"""
+    ing_tpl, broth_tpl = FAQ_INTENTS["特点"][0][0], FAQ_INTENTS["特点"][1][0]
+    questions = []
+    for tpl, items in ((ing_tpl, menu.get("ingredients", [])), (broth_tpl, menu.get("soup_bases", []))):
+        for it in items:
+            name = (it.get("name_cn") or "").strip()
+            if name:
+                questions.append(GoldenQuestion(tpl.format(name=name), (name,), source="menu"))
+    return questions
+
+
+def load_golden_file(path: Path | str) -> list[GoldenQuestion]:
+    """读取手写问题集；文件不存在时返回空列表。"""
+    path = Path(path)
+    if not path.exists():
+        return []
+    data = json.loads(path.read_text(encoding="utf-8"))
+    rows = data.get("questions", []) if isinstance(data, dict) else data
+    questions = []
+    for row in rows:
+        expect = tuple(k for k in row.get("expect") or [] if k)
+        if not row.get("question") or not expect:
+            raise ValueError(f"黄金问题缺少 question 或 expect: {row}")
+        questions.append(GoldenQuestion(row["question"], expect))
+    return questions
+
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    """一组检索配置；前三项决定分块（同样分块的配置共用一个临时集合）。"""
+    name: str
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP
+    ingredient_splitting: bool = True
+    top_k: int = 8
+    fetch_k: int = BOOST_FETCH_K
+    adaptive: bool = True
+
+    @property
+    def index_key(self) -> tuple:
+        return self.chunk_size, self.chunk_overlap, self.ingredient_splitting
+
+    @classmethod
+    def parse(cls, spec: str) -> "RetrievalConfig":
+        """
+        解析命令行配置：「名称:键=值,键=值」，未给出的键取线上默认值，如
+        small-chunks:chunk_size=300,chunk_overlap=30   或   no-split:ingredient_splitting=0
+        """
+        name, _, body = spec.partition(":")
+        types = {f.name: f.type for f in fields(cls)}
+        kwargs = {}
+        for item in filter(None, (s.strip() for s in body.split(","))):
+            key, sep, value = item.partition("=")
+            key = key.strip()
+            if not sep or key not in types or key == "name":
+                raise ValueError(f"无法解析配置项 {item!r}（可用：{', '.join(k for k in types if k != 'name')}）")
+            if types[key] in (bool, "bool"):
+                kwargs[key] = value.strip().lower() in ("1", "true", "yes", "on")
+            else:
+                kwargs[key] = int(value)
+        return cls(name=name.strip() or spec, **kwargs)
+
+
+# 线上配置 + 单项变动的对照组
+DEFAULT_EVAL_CONFIGS = [
+    RetrievalConfig("baseline"),
+    RetrievalConfig("fixed-window", adaptive=False),
+    RetrievalConfig("top_k=5", top_k=5),
+    RetrievalConfig("fetch_k=40", fetch_k=40),
+    RetrievalConfig("chunk=300", chunk_size=300, chunk_overlap=30),
+    RetrievalConfig("chunk=800", chunk_size=800, chunk_overlap=80),
+    RetrievalConfig("no-split", ingredient_splitting=False),
+]
+
+
+@dataclass
+class EvalResult:
+    config: RetrievalConfig
+    chunks: int
+    build_ms: float
+    questions: int
+    recall: dict[int, float]
+    mrr: float
+    latency_ms: dict[str, float]
+    below_floor: int
+    avg_scanned: float
+    avg_context_tokens: float
+    misses: list[str] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            "config": self.config.__dict__,
+            "chunks": self.chunks,
+            "build_ms": round(self.build_ms, 1),
+            "questions": self.questions,
+            "recall": {f"@{k}": round(v, 4) for k, v in self.recall.items()},
+            "mrr": round(self.mrr, 4),
+            "latency_ms": {k: round(v, 3) for k, v in self.latency_ms.items()},
+            "below_floor": self.below_floor,
+            "avg_scanned": round(self.avg_scanned, 1),
+            "avg_context_tokens": round(self.avg_context_tokens, 1),
+            "misses": self.misses,
+        }
+
+
+def _percentile(values: list[float], p: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, int(round(p / 100 * len(s))) - 1))] if s else 0.0
+
+
+def _build_index(store: StoreContext, config: RetrievalConfig, persist_directory: str) -> tuple[RAG, float]:
+    """按配置的分块参数把门店知识文档录入一个临时集合。"""
+    t0 = time.perf_counter()
+    size, overlap, split = config.index_key
+    rag = RAG(
+        collection_name=f"eval-{size}-{overlap}-{int(split)}",
+        persist_directory=persist_directory,
+        chunk_size=size,
+        chunk_overlap=overlap,
+        embeddings=store.embeddings,
+        ingredient_splitting=split,
+    )
+    if rag.count() == 0:
+        for f in store.config.knowledge_files():
+            rag.ingest_file(str(f))
+    return rag, (time.perf_counter() - t0) * 1000
+
+
+def evaluate(
+    store: StoreContext,
+    questions: list[GoldenQuestion],
+    configs: list[RetrievalConfig],
+    persist_directory: str,
+    recall_ks: tuple[int, ...] = DEFAULT_RECALL_KS,
+    repeat: int = 1,
+) -> list[EvalResult]:
+    """
+    逐个配置评测。每题的名次 = 交给 LLM 的上下文块中第一个相关块的位置（从 1 起）；
+    低于相关度下限（不会调用 LLM）或上下文中没有相关块记为未命中。
+    repeat > 1 时每题重复检索，延迟取各次的分位数（名次只看第一次）。
+    """
+    prepared = []
+    for q in questions:
+        entity, query_vec, boost_vec = store.retrieval_vectors(QueryContext(q.question, store.embeddings))
+        prepared.append((q, entity.name if entity else None, query_vec, boost_vec))
+
+    indexes: dict[tuple, tuple[RAG, float]] = {}
+    results = []
+    for config in configs:
+        if config.index_key not in indexes:
+            indexes[config.index_key] = _build_index(store, config, persist_directory)
+        rag, build_ms = indexes[config.index_key]
+        rag.adaptive, rag.boost_fetch_k = config.adaptive, config.fetch_k
+        ranks: list[int | None] = []
+        latencies: list[float] = []
+        scanned: list[int] = []
+        tokens: list[int] = []
+        below_floor = 0
+        misses = []
+        for q, boost, query_vec, boost_vec in prepared:
+            for i in range(max(1, repeat)):
+                t0 = time.perf_counter()
+                found = rag.search(q.question, config.top_k, boost, query_vec=query_vec, boost_vec=boost_vec)
+                relevant = rag.is_relevant(found, boost)
+                context = rag.assemble_context(q.question, found, config.top_k, priority=boost) if relevant else []
+                latencies.append((time.perf_counter() - t0) * 1000)
+                if i:
+                    continue
+                scanned.append(found.scanned)
+                tokens.append(sum(estimate_tokens(d.page_content) for d in context))
+                below_floor += not relevant
+                rank = next((r for r, d in enumerate(context, 1) if q.relevant(d.page_content)), None)
+                ranks.append(rank)
+                if rank is None:
+                    misses.append(q.question)
+        n = len(ranks) or 1
+        results.append(EvalResult(
+            config=config,
+            chunks=rag.count(),
+            build_ms=build_ms,
+            questions=len(ranks),
+            recall={k: sum(1 for r in ranks if r is not None and r <= k) / n for k in recall_ks},
+            mrr=sum(1.0 / r for r in ranks if r is not None) / n,
+            latency_ms={
+                "p50": _percentile(latencies, 50),
+                "p95": _percentile(latencies, 95),
+                "p99": _percentile(latencies, 99),
+            },
+            below_floor=below_floor,
+            avg_scanned=statistics.mean(scanned) if scanned else 0.0,
+            avg_context_tokens=statistics.mean(tokens) if tokens else 0.0,
+            misses=misses,
+        ))
+    return results
+
+
+def format_results(results: list[EvalResult]) -> str:
+    """并排对比表。"""
+    if not results:
+        return "（无结果）"
+    ks = list(results[0].recall)
+    head = (
+        f"  {'配置':<16} {'块数':>5} "
+        + " ".join(f"{'R@' + str(k):>6}" for k in ks)
+        + f" {'MRR':>6} {'p50ms':>7} {'p95ms':>7} {'p99ms':>7} {'扫描':>6} {'上下文tok':>9} {'拒答':>4}"
+    )
+    lines = [head]
+    for r in results:
+        lines.append(
+            f"  {r.config.name:<18} {r.chunks:>5} "
+            + " ".join(f"{r.recall[k]:>6.3f}" for k in ks)
+            + f" {r.mrr:>6.3f} {r.latency_ms['p50']:>7.2f} {r.latency_ms['p95']:>7.2f} {r.latency_ms['p99']:>7.2f}"
+            f" {r.avg_scanned:>7.1f} {r.avg_context_tokens:>11.0f} {r.below_floor:>5}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+前置路由用到的向量资源：
+  - IntentRouter：按各意图示例问句的质心向量，把 query 向量分到 知识问答 / 点餐 / 增减食材；
+  - 菜单实体扩展：食材/锅底名的前缀匹配，以及在门店加载时预计算的扩展词向量与名称向量，
+    检索时与 query 向量相加代替「拼接扩展词再编码」，不再为扩展或备用检索额外编码。
+"""
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from concierge.menu_loader import MenuIndex
+from core.query import normalize
+
+INTENT_KNOWLEDGE = "knowledge"
+INTENT_ORDER = "order"
+INTENT_CART_EDIT = "cart_edit"
+
+# 各意图的示例问句（中英混合），质心向量在首次路由时一次性批量编码
+INTENT_EXAMPLES: dict[str, list[str]] = {
+    INTENT_KNOWLEDGE: [
+        "毛肚涮多久比较好？", "番茄锅底有什么特点？", "虾滑要煮几分钟？", "牛油锅适合什么人？",
+        "吃火锅怎么蘸料比较健康？", "菌汤锅有什么营养？", "吃火锅有什么礼仪要注意？", "鸭血热量高吗？",
+        "鸳鸯锅和九宫格有什么区别？", "How long should I cook beef slices?", "What is special about the tomato broth?",
+    ],
+    INTENT_ORDER: [
+        "我们两个人，微辣", "三个人，不吃辣，有一个小孩", "帮我推荐一份菜单", "我想点餐",
+        "不吃香菜，喜欢牛肉和虾", "四个人，能吃辣，海鲜过敏", "请帮我配一桌火锅", "就按这个来，再帮我看看",
+        "We are two people and like medium spicy", "Please help me order a hotpot meal",
+    ],
+    INTENT_CART_EDIT: [
+        "加一份肥牛", "再来一份虾滑", "去掉豆芽", "不要土豆片了", "多要一份米饭", "把宽粉删掉",
+        "添加鸭血", "取消牛肉", "Add one more beef", "Remove the tofu",
+    ],
+}
+# 最高相似度低于下限、或与第二名差距不足时视为拿不准，由调用方回退关键词规则
+ROUTER_MIN_SIMILARITY = 0.35
+ROUTER_MIN_MARGIN = 0.03
+
+
+class IntentRouter:
+    """基于意图质心的 embedding 路由器；质心只计算一次，可跨请求、跨门店共用。"""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        examples: dict[str, list[str]] | None = None,
+        min_similarity: float = ROUTER_MIN_SIMILARITY,
+        min_margin: float = ROUTER_MIN_MARGIN,
+    ):
+        self._embeddings = embeddings
+        self.examples = examples or INTENT_EXAMPLES
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self._intents: list[str] = []
+        self._centroids: np.ndarray | None = None
+        self._lock = threading.Lock()
+
+    def warm(self) -> None:
+        """计算各意图质心（只执行一次）。"""
+        if self._centroids is not None:
+            return
+        with self._lock:
+            if self._centroids is not None:
+                return
+            intents = list(self.examples)
+            texts = [t for i in intents for t in self.examples[i]]
+            vecs = np.asarray(self._embeddings.embed_documents(texts), dtype=np.float32)
+            centroids, start = [], 0
+            for i in intents:
+                n = len(self.examples[i])
+                centroids.append(normalize(np.mean([normalize(v) for v in vecs[start:start + n]], axis=0)))
+                start += n
+            self._intents = intents
+            self._centroids = np.stack(centroids)
+
+    def memory_usage(self) -> dict:
+        """意图质心的条目数与字节数（embedding 模型与门店共用，不计入）。"""
+        return {"entries": len(self._intents), "bytes": 0 if self._centroids is None else int(self._centroids.nbytes)}
+
+    def scores(self, query_vec) -> dict[str, float]:
+        self.warm()
+        sims = self._centroids @ normalize(query_vec)
+        return {i: float(s) for i, s in zip(self._intents, sims)}
+
+    def route(self, query_vec) -> str | None:
+        """返回最匹配的意图；拿不准时返回 None。"""
+        ranked = sorted(self.scores(query_vec).items(), key=lambda kv: -kv[1])
+        best, best_sim = ranked[0]
+        second_sim = ranked[1][1] if len(ranked) > 1 else -1.0
+        if best_sim < self.min_similarity or best_sim - second_sim < self.min_margin:
+            return None
+        return best
+
+
+# ---------- 菜单实体扩展 ----------
+_INGREDIENT_EXPANSION = ["介绍", "涮煮", "时间", "特点", "丸子", "煮法", "分钟", "口感"]
+_BROTH_EXPANSION = ["介绍", "特点", "适合"]
+
+
+@dataclass(frozen=True)
+class MenuEntity:
+    """可被问到的菜单实体：name 用于检索后重排，prefixes 用于匹配问题开头，expansion 为扩展词。"""
+    name: str
+    prefixes: tuple[str, ...]
+    expansion: str
+
+
+def menu_entities(menu_index: MenuIndex) -> list[MenuEntity]:
+    """食材（按中文名长度降序，优先长名称，如「豆腐皮」先于「豆腐」）在前，锅底在后。"""
+    out: list[MenuEntity] = []
+    ingredients = sorted(
+        menu_index.ingredients,
+        key=lambda x: len((x.get("name_cn") or "").strip()),
+        reverse=True,
+    )
+    groups = [(ingredients, _INGREDIENT_EXPANSION), (menu_index.soup_bases, _BROTH_EXPANSION)]
+    for items, words in groups:
+        for it in items:
+            nc = (it.get("name_cn") or "").strip()
+            ne = (it.get("name_en") or "").strip()
+            if not (nc or ne):
+                continue
+            out.append(MenuEntity(
+                name=nc or ne,
+                prefixes=tuple(p for p in (nc, ne) if p),
+                expansion=" ".join(filter(None, [ne, nc, *words])),
+            ))
+    return out
+
+
+def match_entity(text: str, entities: list[MenuEntity]) -> MenuEntity | None:
+    """问题以某个食材/锅底名开头时返回该实体（「XX有什么特点/涮煮建议」类问题）。"""
+    t = (text or "").strip()
+    if not t:
+        return None
+    for e in entities:
+        if any(t.startswith(p) for p in e.prefixes):
+            return e
+    return None
+
+
+class EntityVectors:
+    """菜单实体的扩展词向量与名称向量（门店加载知识库时一次性批量编码）。"""
+
+    def __init__(self, entities: list[MenuEntity], embeddings: Embeddings):
+        texts = [e.expansion for e in entities] + [e.name for e in entities]
+        vecs = np.asarray(embeddings.embed_documents(texts), dtype=np.float32) if texts else np.zeros((0, 0))
+        n = len(entities)
+        self._expansion = {e.name: vecs[i] for i, e in enumerate(entities)}
+        self._name = {e.name: vecs[n + i] for i, e in enumerate(entities)}
+
+    def __len__(self) -> int:
+        return len(self._name)
+
+    def expansion(self, name: str) -> np.ndarray | None:
+        return self._expansion.get(name)
+
+    def name(self, name: str) -> np.ndarray | None:
+        return self._name.get(name)
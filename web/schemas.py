@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 """FastAPI 请求/响应模型（点餐顾问 Web API）。"""
-from typing import Optional
+from typing import Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class BrothSelectionBody(BaseModel):
@@ -13,6 +13,7 @@ class BrothSelectionBody(BaseModel):
 
 class ChatRequest(BaseModel):
     session_id: Optional[str] = None
+    store_id: Optional[str] = None
     message: str
     num_guests: Optional[int] = None
     allergies: Optional[list[str]] = None
@@ -24,12 +25,20 @@ class ChatResponse(BaseModel):
     reply: str
     source: str = "concierge"
     order_json: Optional[dict] = None
+    # 订单落盘后的单号（厨房查询 /api/kitchen/orders/{order_id}）
+    order_id: Optional[int] = None
+    # 对话加菜后的「常一起点」建议：[{"id", "name_cn", "name_en"}]
+    suggestions: Optional[list[dict]] = None
+    degraded: bool = False
+    # 本次请求的 trace 被采样导出时返回其 id（python main.py traces --trace-id 查看）
+    trace_id: Optional[str] = None
 
 
 class RecommendRequest(BaseModel):
     num_guests: int = 2
     allergies: list[str] = []
     session_id: Optional[str] = None
+    store_id: Optional[str] = None
 
 
 class RecommendResponse(BaseModel):
@@ -39,8 +48,64 @@ class RecommendResponse(BaseModel):
     num_guests: int
     message: str
     session_id: str
+    cart_version: int = 0
 
 
 class CartUpdateRequest(BaseModel):
     session_id: str
     cart: list[str]
+    store_id: Optional[str] = None
+
+
+class CartOp(BaseModel):
+    """购物车增量操作：add（数量累加）/ remove（移除）/ set（设为指定数量）。"""
+    op: Literal["add", "remove", "set"]
+    id: str
+    quantity: Optional[int] = None
+
+
+class CartPatchRequest(BaseModel):
+    session_id: str
+    version: int
+    ops: list[CartOp]
+    store_id: Optional[str] = None
+
+
+class OrderStatusRequest(BaseModel):
+    """厨房修改订单状态：open（待出餐）/ closed（已出餐）/ cancelled（已取消）。"""
+    status: Literal["open", "closed", "cancelled"]
+
+
+class ReloadRequest(BaseModel):
+    """热更新：store_id 为空时重新加载全部已驻留门店；force 为真时即使源文件未变也重建。"""
+    store_id: Optional[str] = None
+    force: bool = False
+
+
+class ReloadResponse(BaseModel):
+    results: list[dict]
+    duration_ms: float
+
+
+class ProfileToggleRequest(BaseModel):
+    """
+    管理开关：enabled 为真时在 duration_s 秒内按 sample_rate 比例剖析请求（1 为全部），到期自动恢复；
+    enabled 为假时立即关闭开关（PROFILE_SAMPLE_RATE 与请求头触发不受影响）。
+    """
+    enabled: bool = True
+    duration_s: float = Field(default=60.0, gt=0, le=3600)
+    sample_rate: float = Field(default=1.0, gt=0, le=1)
+
+
+class MemorySnapshotRequest(BaseModel):
+    """tracemalloc 快照：列出增长最多的 top 个位置；frames 为开启追踪时保留的调用栈层数；since_baseline 为真时与第一次快照比较。"""
+    top: int = Field(default=20, ge=1, le=200)
+    frames: int = Field(default=1, ge=1, le=25)
+    since_baseline: bool = False
+
+
+class BatchAskRequest(BaseModel):
+    """批量知识问答：questions 逐条回答（上限见 web.batch.MAX_BATCH_QUESTIONS），concurrency 为同时在途的 Gemini 调用数。"""
+    questions: list[str] = Field(min_length=1, max_length=1000)
+    store_id: Optional[str] = None
+    concurrency: int = Field(default=4, ge=1, le=16)
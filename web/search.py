@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+食材搜索（GET /api/ingredients/search）：索引在门店加载菜单时建好，查询只做二分查找与小范围排序。
+
+  前缀索引：中文名、英文名、俗称、拼音全拼与首字母，以及中文名的每个后缀、英文名从每个单词开始的后缀
+           （中缀匹配：「豆腐」→ 冻豆腐、"tofu" → Frozen Tofu）。前缀树按字典序摊平成一个有序数组，
+           一个前缀的全部匹配是数组里连续的一段，两次二分即可定位；匹配超过 SCAN_LIMIT 条的短前缀
+           （前缀树上层的大节点）在建索引时预先排好前 MAX_SEARCH_LIMIT 名，查询代价与菜单规模无关。
+  模糊索引：中文名、英文名、俗称与拼音全拼的字符二元组倒排表（首尾加边界符），前缀匹配不足 limit 条时
+           按 Dice 系数补充，容忍英文拼写错误与拼音错字（brocoli → 西兰花、feinui → 肥牛）。
+
+排序：先按匹配质量（完全匹配 > 名称前缀 > 拼音 > 中缀 > 模糊），同档按 popularity_rank（越小越热门）。
+     完全匹配只指名称（中文名、英文名、俗称）与查询相同；拼音全拼或首字母与查询相同仍算拼音匹配。
+"""
+import math
+import re
+from bisect import bisect_left
+
+import numpy as np
+
+from concierge.menu_loader import MenuIndex
+
+from .pinyin import syllables
+from .recommendation import INGREDIENT_SYNONYMS
+
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+# 前缀匹配条数不超过该值时查询时直接扫描排序，超过时使用建索引时预排好的结果
+SCAN_LIMIT = 256
+# 模糊匹配的 Dice 系数下限与最短查询长度（字符数，不含空格）
+FUZZY_MIN_SCORE = 0.5
+FUZZY_MIN_CHARS = 3
+
+MATCH_EXACT, MATCH_PREFIX, MATCH_PINYIN, MATCH_INFIX, MATCH_FUZZY = range(5)
+MATCH_NAMES = ("exact", "prefix", "pinyin", "infix", "fuzzy")
+
+_END = "\U0010ffff"
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """小写、去首尾空白、连续空白合并为一个空格。"""
+    return _SPACE_RE.sub(" ", text.strip().lower())
+
+
+def _grams(key: str) -> set[str]:
+    padded = f"^{key}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def _pinyin_keys(name: str) -> list[tuple[str, int]]:
+    """拼音全拼与首字母（前缀档），以及从第二个字起各后缀的全拼（中缀档）。"""
+    syl = syllables(name)
+    if not syl:
+        return []
+    out = [("".join(syl), MATCH_PINYIN)]
+    if len(syl) > 1:
+        out.append(("".join(s[0] for s in syl), MATCH_PINYIN))
+    out.extend(("".join(syl[i:]), MATCH_INFIX) for i in range(1, len(syl)))
+    return out
+
+
+class IngredientSearch:
+    """一家门店食材的搜索索引（只读，随菜单快照重建）。"""
+
+    def __init__(self, items: list[dict], synonyms: dict[str, str] | None = None):
+        self.items = [
+            {"id": it.get("id"), "name_cn": it.get("name_cn"), "name_en": it.get("name_en"), "category": it.get("category")}
+            for it in items
+        ]
+        by_id = {it.get("id"): i for i, it in enumerate(items)}
+        aliases: dict[int, list[str]] = {}
+        for alias, iid in (synonyms or {}).items():
+            if iid in by_id:
+                aliases.setdefault(by_id[iid], []).append(alias)
+        for i, it in enumerate(items):
+            aliases.setdefault(i, []).extend(it.get("synonyms") or [])
+
+        # 热门顺序：popularity_rank（缺省排最后）→ 名称长度 → 菜单顺序；_rank[i] 为第 i 个食材的名次
+        order = sorted(
+            range(len(items)),
+            key=lambda i: (items[i].get("popularity_rank") or float("inf"), len(items[i].get("name_cn") or ""), i),
+        )
+        self._rank = [0] * len(items)
+        for pos, i in enumerate(order):
+            self._rank[i] = pos
+
+        keys, kinds, owners = [], [], []
+        terms: dict[str, list[int]] = {}
+        for i, it in enumerate(items):
+            item_keys: dict[str, int] = {}
+
+            def _put(key: str, kind: int) -> None:
+                if key and kind < item_keys.get(key, MATCH_FUZZY):
+                    item_keys[key] = kind
+
+            name_en = normalize_query(it.get("name_en") or "")
+            fuzzy = set(w for w in name_en.split() if len(w) >= FUZZY_MIN_CHARS)
+            fuzzy.add(name_en.replace(" ", ""))
+            for name in [it.get("name_cn") or "", *aliases[i]]:
+                name = normalize_query(name)
+                if not name:
+                    continue
+                _put(name, MATCH_PREFIX)
+                for j in range(1, len(name)):
+                    _put(name[j:], MATCH_INFIX)
+                for key, kind in _pinyin_keys(name):
+                    _put(key, kind)
+                fuzzy.add(name)
+                fuzzy.add("".join(syllables(name) or []))
+            if name_en:
+                _put(name_en, MATCH_PREFIX)
+                for m in re.finditer(r" (?=\S)", name_en):
+                    _put(name_en[m.end():], MATCH_INFIX)
+            for key, kind in item_keys.items():
+                keys.append(key)
+                kinds.append(kind)
+                owners.append(i)
+            for term in fuzzy:
+                if term:
+                    terms.setdefault(term, []).append(i)
+
+        perm = sorted(range(len(keys)), key=keys.__getitem__)
+        self._keys = [keys[j] for j in perm]
+        self._kinds = [kinds[j] for j in perm]
+        self._owners = [owners[j] for j in perm]
+        self._hot: dict[str, list[tuple[int, int]]] = {}
+        self._n = max(1, len(items))
+        if perm:
+            rank = np.asarray(self._rank, dtype=np.int64)
+            self._order = np.asarray(self._kinds, dtype=np.int64) * self._n + rank[self._owners]
+            self._build_hot("", 0, len(perm))
+
+        # 模糊索引：整名、英文单词与拼音全拼作为词条，每个词条下的食材按热门名次排好
+        self._terms = list(terms)
+        self._term_items = [sorted(ids, key=self._rank.__getitem__)[:MAX_SEARCH_LIMIT] for ids in terms.values()]
+        postings: dict[str, list[int]] = {}
+        term_len = []
+        for t, term in enumerate(self._terms):
+            grams = _grams(term)
+            term_len.append(len(grams))
+            for g in grams:
+                postings.setdefault(g, []).append(t)
+        self._postings = {g: np.asarray(ids, dtype=np.int32) for g, ids in postings.items()}
+        self._term_len = np.asarray(term_len, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _build_hot(self, prefix: str, lo: int, hi: int) -> None:
+        """
+        前缀树的大节点：匹配超过 SCAN_LIMIT 条的前缀预先排好前 MAX_SEARCH_LIMIT 名（名称键与前缀完全相同的按完全匹配计），
+        并继续细分子节点。
+        """
+        keys = self._keys
+        exact = bisect_left(keys, prefix + "\0", lo, hi) - lo if prefix else 0
+        seg = self._order[lo:hi].copy()
+        if exact:
+            head = seg[:exact]
+            seg[:exact] = np.where(head // self._n == MATCH_PREFIX, head % self._n, head)
+        take = min(len(seg), MAX_SEARCH_LIMIT * 4)
+        picked = np.argpartition(seg, take - 1)[:take] if take < len(seg) else np.arange(len(seg))
+        top, seen = [], set()
+        for e in picked[np.argsort(seg[picked], kind="stable")]:
+            item = self._owners[lo + e]
+            if item not in seen:
+                seen.add(item)
+                top.append((item, int(seg[e] // self._n)))
+                if len(top) == MAX_SEARCH_LIMIT:
+                    break
+        self._hot[prefix] = top
+
+        depth = len(prefix)
+        i = lo + exact
+        while i < hi:
+            child = prefix + keys[i][depth]
+            j = bisect_left(keys, child + _END, i, hi)
+            if j - i > SCAN_LIMIT:
+                self._build_hot(child, i, j)
+            i = j
+
+    def _prefix(self, q: str, best: dict[int, int]) -> None:
+        hot = self._hot.get(q)
+        if hot is not None:
+            matches = hot
+        else:
+            keys = self._keys
+            lo = bisect_left(keys, q)
+            hi = bisect_left(keys, q + _END, lo)
+            matches = (
+                (item, MATCH_EXACT if kind == MATCH_PREFIX and key == q else kind)
+                for key, kind, item in zip(keys[lo:hi], self._kinds[lo:hi], self._owners[lo:hi])
+            )
+        for item, tier in matches:
+            if tier < best.get(item, MATCH_FUZZY):
+                best[item] = tier
+
+    def _fuzzy(self, q: str, exclude: dict[int, int], want: int) -> list[int]:
+        grams = _grams(q.replace(" ", ""))
+        lists = [self._postings[g] for g in grams if g in self._postings]
+        if not lists:
+            return []
+        common = np.bincount(np.concatenate(lists), minlength=len(self._terms))
+        # Dice ≥ FUZZY_MIN_SCORE 要求的最少公共二元组数（词条再短也至少要这么多）
+        need = max(1, math.ceil(FUZZY_MIN_SCORE * len(grams) / (2 - FUZZY_MIN_SCORE)))
+        cand = np.flatnonzero(common >= need)
+        score = 2.0 * common[cand] / (len(grams) + self._term_len[cand])
+        keep = score >= FUZZY_MIN_SCORE
+        cand, score = cand[keep], score[keep]
+        out: list[int] = []
+        for t in cand[np.argsort(-score, kind="stable")]:
+            for item in self._term_items[t]:
+                if item not in exclude and item not in out:
+                    out.append(item)
+                    if len(out) == want:
+                        return out
+        return out
+
+    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
+        """按匹配质量与热门程度排序的前 limit 个食材，每项附 match（exact / prefix / pinyin / infix / fuzzy）。"""
+        q = normalize_query(query)
+        if not q:
+            return []
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+        best: dict[int, int] = {}
+        self._prefix(q, best)
+        if " " in q:
+            self._prefix(q.replace(" ", ""), best)
+        ranked = sorted(best, key=lambda i: (best[i], self._rank[i]))[:limit]
+        if len(ranked) < limit and len(q.replace(" ", "")) >= FUZZY_MIN_CHARS:
+            for item in self._fuzzy(q, best, limit - len(ranked)):
+                best[item] = MATCH_FUZZY
+                ranked.append(item)
+        return [{**self.items[i], "match": MATCH_NAMES[best[i]]} for i in ranked]
+
+    @classmethod
+    def from_menu(cls, menu_index: MenuIndex) -> "IngredientSearch":
+        return cls(menu_index.ingredients, INGREDIENT_SYNONYMS)
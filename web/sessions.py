@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+进程内 session 存储：session_id -> 对话状态（画像、购物车、消息历史）。
+按最近访问排序（LRU），超过 max_sessions 时逐出最久未访问的，空闲超过 ttl_s 的在访问或写入时清理；
+接口与 dict 相同（MutableMapping），读取即刷新访问时间。
+指标：session.evicted / session.expired。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterator, MutableMapping
+
+from core import metrics
+
+DEFAULT_MAX_SESSIONS = 10000
+# 一餐的时长量级：空闲 3 小时的桌台视为已离店
+DEFAULT_SESSION_TTL_S = 3 * 3600.0
+
+
+class SessionStore(MutableMapping[str, dict]):
+    """LRU + 空闲过期的 session 表；线程安全。"""
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        ttl_s: float = DEFAULT_SESSION_TTL_S,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+
+    def _expired(self, touched: float, now: float) -> bool:
+        return self.ttl_s > 0 and now - touched > self.ttl_s
+
+    def _prune_locked(self, now: float) -> None:
+        while self._data:
+            sid, (touched, _) = next(iter(self._data.items()))
+            if self._expired(touched, now):
+                self.expired += 1
+                metrics.incr("session.expired")
+            elif len(self._data) > self.max_sessions:
+                self.evicted += 1
+                metrics.incr("session.evicted")
+            else:
+                break
+            del self._data[sid]
+
+    def __getitem__(self, session_id: str) -> dict:
+        now = self._clock()
+        with self._lock:
+            touched, state = self._data[session_id]
+            if self._expired(touched, now):
+                del self._data[session_id]
+                self.expired += 1
+                metrics.incr("session.expired")
+                raise KeyError(session_id)
+            self._data[session_id] = (now, state)
+            self._data.move_to_end(session_id)
+            return state
+
+    def __setitem__(self, session_id: str, state: dict) -> None:
+        now = self._clock()
+        with self._lock:
+            self._data[session_id] = (now, state)
+            self._data.move_to_end(session_id)
+            self._prune_locked(now)
+
+    def __delitem__(self, session_id: str) -> None:
+        with self._lock:
+            del self._data[session_id]
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def snapshot(self) -> list[tuple[str, dict]]:
+        """当前全部 (session_id, 状态)，不刷新访问时间（供内存核算在线程池中遍历）。"""
+        with self._lock:
+            return [(sid, state) for sid, (_, state) in self._data.items()]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "count": len(self._data),
+                "max_sessions": self.max_sessions,
+                "ttl_s": self.ttl_s,
+                "evicted": self.evicted,
+                "expired": self.expired,
+            }
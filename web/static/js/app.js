@@ -1,6 +1,6 @@
 /**
  * 智能火锅点餐顾问 - 主入口
- * 表单、快捷按钮、确认下单、食材推荐的按钮事件绑定
+ * 表单、快捷按钮、确认下单、食材推荐的按钮事件绑定，建立 WebSocket 通道
  */
 
 var form = document.getElementById('input-bar');
@@ -36,7 +36,10 @@ function updateConfirmOrderState() {
 if (btnConfirmOrder) {
   btnConfirmOrder.addEventListener('click', function() {
     if (btnConfirmOrder.disabled) return;
-    sendMessage(btnConfirmOrder.dataset.msg);
+    var latestCard = document.querySelector('.recommend-checklist:not(.recommend-checklist--archived)');
+    flushCartDeltas(latestCard).then(function() {
+      sendMessage(btnConfirmOrder.dataset.msg);
+    });
   });
 }
 
@@ -56,28 +59,33 @@ if (btnRecommend) {
 
     var body = { num_guests: numGuests, allergies: allergies };
     if (sessionId) body.session_id = sessionId;
+    if (STORE_ID) body.store_id = STORE_ID;
 
     var latestCard = document.querySelector('.recommend-checklist:not(.recommend-checklist--archived)');
-    var syncPromise = Promise.resolve();
-    if (latestCard && sessionId) {
-      var cart = [];
-      latestCard.querySelectorAll('input[type="checkbox"][data-id]').forEach(function(cb) {
-        if (cb.checked && cb.getAttribute('data-id')) cart.push(cb.getAttribute('data-id'));
-      });
-      syncPromise = fetch('/api/cart/update', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ session_id: sessionId, cart: cart })
-      }).then(function(r) { return r.json(); }).then(function() {});
+    var request;
+    if (Realtime.isReady() && (!latestCard || latestCard.getAttribute('data-session-id') === sessionId)) {
+      // 上一张卡片未提交的勾选增量随推荐帧一起发送，一次往返
+      if (latestCard && latestCard._cartSyncTimer) {
+        clearTimeout(latestCard._cartSyncTimer);
+        latestCard._cartSyncTimer = null;
+      }
+      var ops = latestCard ? cartDeltaOps(latestCard) : [];
+      if (ops.length) {
+        body.cart = { version: parseInt(latestCard.getAttribute('data-cart-version'), 10) || 0, ops: ops };
+      }
+      request = Realtime.request('recommend', body);
+    } else {
+      // 先把上一张卡片未提交的勾选增量刷到服务端，推荐时才能保留用户的改动
+      var syncPromise = sessionId ? flushCartDeltas(latestCard) : Promise.resolve();
+      request = syncPromise.then(function() {
+        return fetch('/api/recommend', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify(body)
+        });
+      }).then(function(res) { return res.json(); });
     }
-    syncPromise.then(function() {
-      return fetch('/api/recommend', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(body)
-      });
-    })
-      .then(function(res) { return res.json(); })
+    request
       .then(function(data) {
         removeTyping();
         sessionId = data.session_id;
@@ -96,3 +104,4 @@ if (btnRecommend) {
 }
 
 updateConfirmOrderState();
+Realtime.connect();
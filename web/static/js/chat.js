@@ -2,6 +2,7 @@
  * 智能火锅点餐顾问 - 聊天核心逻辑
  * 聊天：addMessage、addOrderCard、addRecommendCard、sendMessage、
  * showTyping、removeTyping、getChatContext 等
+ * WebSocket 通道（realtime.js）已连接时经 /ws 收发，否则回退到 REST 接口
  */
 
 var sessionId = null;
@@ -22,13 +23,13 @@ function addMessage(text, role, source) {
   scrollToBottom();
 }
 
-function addOrderCard(json) {
+function addOrderCard(json, orderId) {
   var chatArea = document.getElementById('chat-area');
   var card = document.createElement('details');
   card.className = 'order-card';
   card.open = true;
   var summary = document.createElement('summary');
-  summary.textContent = '📋 结构化订单（点击展开/收起）';
+  summary.textContent = '📋 结构化订单' + (orderId ? ' #' + orderId : '') + '（点击展开/收起）';
   var pre = document.createElement('pre');
   pre.textContent = JSON.stringify(json, null, 2);
   card.appendChild(summary);
@@ -102,6 +103,8 @@ function addRecommendCard(data) {
   });
   card.appendChild(list);
   card.setAttribute('data-session-id', data.session_id || sessionId || '');
+  card.setAttribute('data-cart-version', data.cart_version || 0);
+  card._cartSynced = checkedIds(card);
   chatArea.appendChild(card);
   updateRecommendCount(card);
   scrollToBottom();
@@ -116,31 +119,129 @@ function updateRecommendCount(cardEl) {
   countEl.textContent = '已选 ' + n + ' 样';
 }
 
+// 勾选变化先合并，停止操作 CART_SYNC_DELAY_MS 后一次性以增量（cart 帧 / PATCH /api/cart）提交
+var CART_SYNC_DELAY_MS = 300;
+
 function syncCartFromChecklist(cardEl) {
-  var sessionIdForCart = cardEl.getAttribute('data-session-id');
-  if (!sessionIdForCart) return;
-  var checkboxes = cardEl.querySelectorAll('input[type="checkbox"][data-id]');
-  var cart = [];
-  checkboxes.forEach(function(cb) {
-    if (cb.checked && cb.getAttribute('data-id')) {
-      cart.push(cb.getAttribute('data-id'));
-    }
-  });
   updateRecommendCount(cardEl);
-  fetch('/api/cart/update', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ session_id: sessionIdForCart, cart: cart })
-  })
-    .then(function(res) { return res.json(); })
+  scheduleCartSync(cardEl);
+}
+
+function scheduleCartSync(cardEl) {
+  if (cardEl._cartSyncTimer) clearTimeout(cardEl._cartSyncTimer);
+  cardEl._cartSyncTimer = setTimeout(function() {
+    cardEl._cartSyncTimer = null;
+    flushCartDeltas(cardEl);
+  }, CART_SYNC_DELAY_MS);
+}
+
+function checkedIds(cardEl) {
+  var ids = {};
+  cardEl.querySelectorAll('input[type="checkbox"][data-id]').forEach(function(cb) {
+    if (cb.checked) ids[cb.getAttribute('data-id')] = true;
+  });
+  return ids;
+}
+
+// 与上次同步的勾选状态比较，只提交本卡片上发生变化的食材
+function cartDeltaOps(cardEl) {
+  var synced = cardEl._cartSynced || {};
+  var current = checkedIds(cardEl);
+  var ops = [];
+  cardEl.querySelectorAll('input[type="checkbox"][data-id]').forEach(function(cb) {
+    var id = cb.getAttribute('data-id');
+    if (current[id] && !synced[id]) ops.push({ op: 'set', id: id, quantity: 1 });
+    if (!current[id] && synced[id]) ops.push({ op: 'remove', id: id });
+  });
+  return ops;
+}
+
+function flushCartDeltas(cardEl, retried) {
+  if (!cardEl) return Promise.resolve();
+  if (cardEl._cartSyncTimer) {
+    clearTimeout(cardEl._cartSyncTimer);
+    cardEl._cartSyncTimer = null;
+  }
+  var sessionIdForCart = cardEl.getAttribute('data-session-id');
+  if (!sessionIdForCart) return Promise.resolve();
+  var ops = cartDeltaOps(cardEl);
+  if (!ops.length) return Promise.resolve();
+  var version = parseInt(cardEl.getAttribute('data-cart-version'), 10) || 0;
+  var request = Realtime.isReady() && sessionIdForCart === sessionId
+    ? Realtime.request('cart', { version: version, ops: ops })
+    : fetch('/api/cart', {
+      method: 'PATCH',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ session_id: sessionIdForCart, version: version, ops: ops, store_id: STORE_ID })
+    }).then(function(res) { return res.json(); });
+  return request
     .then(function(data) {
-      if (data.ok && sessionIdForCart === sessionId) {
-        sessionId = sessionIdForCart;
+      if (applyCartResult(cardEl, data) === 'version_conflict' && !retried) {
+        // 服务端购物车已被其它途径修改（如对话增减食材）：以服务端为基准重算增量再提交一次
+        return flushCartDeltas(cardEl, true);
       }
     })
     .catch(function() {});
 }
 
+// 按服务端返回的购物车与版本号更新卡片的已同步状态；返回 ok / 错误码
+function applyCartResult(cardEl, data) {
+  if (!cardEl || !data) return null;
+  if (data.version !== undefined) cardEl.setAttribute('data-cart-version', data.version);
+  if (data.ok || data.error === 'version_conflict') {
+    var synced = {};
+    Object.keys(data.cart || {}).forEach(function(id) { synced[id] = true; });
+    cardEl._cartSynced = synced;
+  }
+  if (data.ok && data.suggestions) showCartSuggestions(cardEl, data.suggestions);
+  return data.ok ? 'ok' : data.error;
+}
+
+// 「常一起点」：新勾选食材后在卡片顶部提示互补食材，点击即勾选
+function showCartSuggestions(cardEl, suggestions) {
+  var box = cardEl.querySelector('.recommend-suggest');
+  var items = suggestions.filter(function(s) {
+    var cb = cardEl.querySelector('input[type="checkbox"][data-id="' + s.id + '"]');
+    return cb && !cb.checked;
+  });
+  if (!items.length) {
+    if (box) box.remove();
+    return;
+  }
+  if (!box) {
+    box = document.createElement('div');
+    box.className = 'recommend-suggest';
+    box.style.fontSize = '0.85rem';
+    box.style.color = 'var(--text-light)';
+    box.style.marginBottom = '8px';
+    var countEl = cardEl.querySelector('.recommend-count');
+    cardEl.insertBefore(box, countEl ? countEl.nextSibling : cardEl.firstChild);
+  }
+  box.textContent = '常一起点：';
+  items.forEach(function(s) {
+    var btn = document.createElement('button');
+    btn.type = 'button';
+    btn.textContent = '+ ' + (s.name_cn || s.name_en || s.id);
+    btn.style.marginRight = '6px';
+    btn.style.cursor = 'pointer';
+    btn.addEventListener('click', function() {
+      var cb = cardEl.querySelector('input[type="checkbox"][data-id="' + s.id + '"]');
+      if (cb && !cb.checked) {
+        cb.checked = true;
+        syncCartFromChecklist(cardEl);
+      }
+      btn.remove();
+    });
+    box.appendChild(btn);
+  });
+}
+
+// 服务端推送：对话中增减了食材，更新当前卡片的版本号，后续增量不再冲突
+Realtime.on('cart_updated', function(frame) {
+  var card = document.querySelector('.recommend-checklist:not(.recommend-checklist--archived)');
+  applyCartResult(card, { ok: true, cart: frame.cart, version: frame.version });
+});
+
 function showTyping() {
   var chatArea = document.getElementById('chat-area');
   var div = document.createElement('div');
@@ -188,6 +289,7 @@ async function sendMessage(text, context) {
   try {
     var body = { message: text };
     if (sessionId) body.session_id = sessionId;
+    if (STORE_ID) body.store_id = STORE_ID;
     var ctx = context || getChatContext();
     body.num_guests = ctx.num_guests;
     body.allergies = ctx.allergies || [];
@@ -195,22 +297,25 @@ async function sendMessage(text, context) {
       return typeof b === 'object' ? { name_cn: b.name_cn, quantity: b.quantity || 1 } : { name_cn: b, quantity: 1 };
     });
 
-    var res = await fetch('/api/chat', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(body),
-    });
-
-    if (!res.ok) throw new Error('HTTP ' + res.status);
-
-    var data = await res.json();
+    var data;
+    if (Realtime.isReady()) {
+      data = await Realtime.request('chat', body);
+    } else {
+      var res = await fetch('/api/chat', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body),
+      });
+      if (!res.ok) throw new Error('HTTP ' + res.status);
+      data = await res.json();
+    }
     sessionId = data.session_id;
 
     removeTyping();
     addMessage(data.reply, 'ai', data.source);
 
     if (data.order_json) {
-      addOrderCard(data.order_json);
+      addOrderCard(data.order_json, data.order_id);
     }
   } catch (err) {
     removeTyping();
@@ -57,32 +57,82 @@ function closeIngredientDropdown() {
   ingredientTrigger.setAttribute('aria-expanded', 'false');
 }
 
+var INGREDIENT_SEARCH_DELAY_MS = 150;
+
+function storeQuery(prefix) {
+  return STORE_ID ? prefix + 'store_id=' + encodeURIComponent(STORE_ID) : '';
+}
+
+function renderIngredientOptions(container, list) {
+  container.innerHTML = '';
+  if (!list.length) {
+    var empty = document.createElement('div');
+    empty.className = 'ingredient-empty';
+    empty.textContent = '没有找到相关食材';
+    container.appendChild(empty);
+    return;
+  }
+  list.forEach(function(it) {
+    var nameCn = it.name_cn || '';
+    var nameEn = it.name_en || '';
+    var btn = document.createElement('button');
+    btn.type = 'button';
+    btn.className = 'ingredient-option';
+    btn.setAttribute('role', 'option');
+    btn.textContent = nameCn + (nameEn ? ' / ' + nameEn : '');
+    btn.addEventListener('click', function() {
+      sendMessage(nameCn + '有什么特点和涮煮建议？');
+      closeIngredientDropdown();
+    });
+    container.appendChild(btn);
+  });
+}
+
 if (ingredientTrigger && ingredientDropdown) {
-  fetch('/api/ingredients')
+  // 输入框为空时列出全部食材；有输入时由服务端搜索（中文 / 拼音 / 英文，容忍拼写错误）
+  var ingredientSearch = document.createElement('input');
+  ingredientSearch.type = 'search';
+  ingredientSearch.className = 'ingredient-search';
+  ingredientSearch.placeholder = '搜索：中文 / 拼音 / English';
+  var ingredientList = document.createElement('div');
+  ingredientDropdown.appendChild(ingredientSearch);
+  ingredientDropdown.appendChild(ingredientList);
+  var allIngredients = [];
+  var searchTimer = null;
+  var searchSeq = 0;
+
+  fetch('/api/ingredients' + storeQuery('?'))
     .then(function(res) { return res.json(); })
     .then(function(data) {
-      var list = data.ingredients || [];
-      list.forEach(function(it) {
-        var nameCn = it.name_cn || '';
-        var nameEn = it.name_en || '';
-        var label = nameCn + (nameEn ? ' / ' + nameEn : '');
-        var btn = document.createElement('button');
-        btn.type = 'button';
-        btn.className = 'ingredient-option';
-        btn.setAttribute('role', 'option');
-        btn.textContent = label;
-        btn.addEventListener('click', function() {
-          sendMessage(nameCn + '有什么特点和涮煮建议？');
-          closeIngredientDropdown();
-        });
-        ingredientDropdown.appendChild(btn);
-      });
+      allIngredients = data.ingredients || [];
+      if (!ingredientSearch.value.trim()) renderIngredientOptions(ingredientList, allIngredients);
     })
     .catch(function() {});
 
+  ingredientSearch.addEventListener('input', function() {
+    clearTimeout(searchTimer);
+    var q = ingredientSearch.value.trim();
+    var seq = ++searchSeq;
+    if (!q) {
+      renderIngredientOptions(ingredientList, allIngredients);
+      return;
+    }
+    searchTimer = setTimeout(function() {
+      fetch('/api/ingredients/search?q=' + encodeURIComponent(q) + storeQuery('&'))
+        .then(function(res) { return res.json(); })
+        .then(function(data) {
+          // 只显示最后一次输入的结果
+          if (seq === searchSeq) renderIngredientOptions(ingredientList, data.results || []);
+        })
+        .catch(function() {});
+    }, INGREDIENT_SEARCH_DELAY_MS);
+  });
+  ingredientSearch.addEventListener('click', function(e) { e.stopPropagation(); });
+
   ingredientTrigger.addEventListener('click', function(e) {
     e.stopPropagation();
     toggleIngredientDropdown();
+    if (ingredientDropdown.classList.contains('open')) ingredientSearch.focus();
   });
 }
 
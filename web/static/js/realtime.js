@@ -0,0 +1,105 @@
+/**
+ * 智能火锅点餐顾问 - WebSocket 通道（/ws）
+ * 一条连接绑定当前 session，对话、购物车增量、推荐都以帧收发；未连上时各调用方回退到 REST 接口。
+ * Realtime.request(type, payload) 返回该请求应答帧的 Promise；Realtime.on(event, fn) 订阅服务端推送。
+ */
+
+var Realtime = (function() {
+  var RECONNECT_MIN_MS = 1000;
+  var RECONNECT_MAX_MS = 15000;
+  var REQUEST_TIMEOUT_MS = 60000;
+
+  var ws = null;
+  var ready = false;
+  var seq = 0;
+  var pending = {};
+  var listeners = {};
+  var retryMs = RECONNECT_MIN_MS;
+
+  function url() {
+    var params = [];
+    if (sessionId) params.push('session_id=' + encodeURIComponent(sessionId));
+    if (STORE_ID) params.push('store_id=' + encodeURIComponent(STORE_ID));
+    var proto = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    return proto + '//' + window.location.host + '/ws' + (params.length ? '?' + params.join('&') : '');
+  }
+
+  function emit(event, frame) {
+    (listeners[event] || []).forEach(function(fn) { fn(frame); });
+  }
+
+  function failPending(message) {
+    Object.keys(pending).forEach(function(id) {
+      clearTimeout(pending[id].timer);
+      pending[id].reject(new Error(message));
+    });
+    pending = {};
+  }
+
+  function onFrame(frame) {
+    if (frame.type === 'hello') {
+      // 连接前已经通过 REST 建立了 session：改用该 session 重连，保证两条路径共用同一购物车
+      if (sessionId && frame.session_id !== sessionId) {
+        ws.close();
+        return;
+      }
+      sessionId = frame.session_id;
+      ready = true;
+      retryMs = RECONNECT_MIN_MS;
+      return;
+    }
+    if (frame.type === 'event') {
+      emit(frame.event, frame);
+      return;
+    }
+    var req = frame.id != null ? pending[frame.id] : null;
+    if (!req) return;
+    if (frame.type === 'chat.accepted') {
+      emit('accepted', frame);
+      return;
+    }
+    clearTimeout(req.timer);
+    delete pending[frame.id];
+    if (frame.type === 'error') req.reject(new Error(frame.error));
+    else req.resolve(frame);
+  }
+
+  function connect() {
+    if (!window.WebSocket) return;
+    ws = new WebSocket(url());
+    ws.onmessage = function(e) {
+      try { onFrame(JSON.parse(e.data)); } catch (err) {}
+    };
+    ws.onclose = function() {
+      ready = false;
+      failPending('连接已断开');
+      setTimeout(connect, retryMs);
+      retryMs = Math.min(retryMs * 2, RECONNECT_MAX_MS);
+    };
+  }
+
+  function request(type, payload) {
+    if (!ready) return Promise.reject(new Error('WebSocket 未连接'));
+    var id = String(++seq);
+    var frame = Object.assign({}, payload || {}, { type: type, id: id });
+    return new Promise(function(resolve, reject) {
+      var timer = setTimeout(function() {
+        delete pending[id];
+        reject(new Error('请求超时'));
+      }, REQUEST_TIMEOUT_MS);
+      pending[id] = { resolve: resolve, reject: reject, timer: timer };
+      ws.send(JSON.stringify(frame));
+    });
+  }
+
+  function on(event, fn) {
+    (listeners[event] = listeners[event] || []).push(fn);
+  }
+
+  return {
+    connect: connect,
+    request: request,
+    on: on,
+    isReady: function() { return ready; }
+  };
+})();
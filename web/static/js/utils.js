@@ -1,8 +1,11 @@
 /**
  * 智能火锅点餐顾问 - 工具函数与常量
- * 工具函数 scrollToBottom、positionDropdownInViewport，常量 BROTH_LIST
+ * 工具函数 scrollToBottom、positionDropdownInViewport，常量 BROTH_LIST、STORE_ID
  */
 
+/** 门店 id：页面地址 ?store=xxx 指定，缺省为默认门店（不传） */
+var STORE_ID = new URLSearchParams(window.location.search).get('store') || null;
+
 /** 锅底知识目录（20 种，与菜单一致） */
 var BROTH_LIST = [
   '姜葱浓汤底', '清新小肥羊汤底', '麻辣小肥羊汤底', '素食汤底', '川味香辣汤底',
@@ -0,0 +1,619 @@
+# -*- coding: utf-8 -*-
+"""
+多门店：每家门店有自己的菜单、知识文档与蘸料规则。
+
+  默认门店（store_id="default"）：data/hotpot_menu.json、data/*.txt、data/sauce_pairing_rules.json
+  其它门店：data/stores/<store_id>/ 下的同名文件；缺少菜单或蘸料规则时沿用默认门店的
+  预构建索引包（python main.py build-index）：门店数据目录下的 index/；与知识库一致时直接只读打开，不再录入
+
+门店在首次访问时才加载：菜单快照（含预计算的推荐表）随 StoreContext 创建，RAG 集合、FAQ 答案表与菜单实体向量在第一次知识问答时才打开/计算。
+StoreRegistry 按估算的驻留内存做 LRU：超过上限时逐出最久未用的门店，下次访问再加载。
+所有门店共用同一个 embedding 模型与同一个 Chroma 目录（每店一个集合，集合名带知识库指纹）。
+
+热更新：StoreContext 创建后只读，请求开始时取得的门店即本次请求的快照。StoreRegistry.reload 在后台构建新快照
+（菜单、蘸料规则、知识集合），完成后在锁内一次性替换；进行中的请求继续使用旧快照，
+旧快照的向量集合在宽限期后删除。
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows：不做跨进程录入互斥
+    fcntl = None
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core import RAG, knowledge_hash, metrics, shared_embeddings
+from core.memory import deep_sizeof, model_bytes, sized
+from core.index_bundle import MANIFEST_FILENAME
+from core.query import QueryContext
+from core.rag import DEFAULT_COLLECTION_NAME, DEFAULT_PERSIST_DIR, delete_collection, list_collections
+from concierge.menu_loader import DEFAULT_MENU_PATH, MenuIndex
+from concierge.sauce_pairing import RULES_PATH, load_rules
+
+from .assets import CachedBody
+from .cooccurrence import CooccurrenceSnapshot, SuggestionTable
+from .faq import FAQTable
+from .popularity import PopularitySnapshot
+from .recommendation import RecommendationTable
+from .routing import EntityVectors, MenuEntity, match_entity, menu_entities
+from .search import IngredientSearch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_ID = "default"
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+MENU_FILENAME = "hotpot_menu.json"
+RULES_FILENAME = "sauce_pairing_rules.json"
+FAQ_FILENAME = "faq_answers.json"
+INDEX_DIRNAME = "index"
+DEFAULT_STORE_MEMORY_CAP_MB = 512
+# 热更新后旧快照的保留时长（秒）：进行中的请求在此期间用完旧快照，之后删除旧向量集合
+DEFAULT_RELOAD_GRACE_S = 60.0
+
+# 驻留内存估算：每个文本块（向量 + 原文 + 索引）的字节数，以及 JSON 文件解析成 Python 对象后的放大倍数
+CHUNK_RESIDENT_BYTES = 4096
+JSON_OBJECT_OVERHEAD = 8
+
+# 门店 id 同时用于目录名与 Chroma 集合名：小写字母数字，可含 _ -，首尾须为字母数字
+_STORE_ID_RE = re.compile(r"^[a-z0-9](?:[a-z0-9_-]{0,30}[a-z0-9])?$")
+# 门店向量集合名：基础名 + "-" + 知识库指纹前 8 位（StoreContext.collection_name）
+_HASHED_COLLECTION_RE = re.compile(r"^(?P<base>.+)-[0-9a-f]{8}$")
+
+
+class UnknownStoreError(KeyError):
+    """门店不存在：既不是默认门店，也没有 data/stores/<store_id>/ 目录。"""
+
+
+@dataclass(frozen=True)
+class StoreConfig:
+    """一家门店的数据文件位置。"""
+    store_id: str
+    menu_path: Path
+    knowledge_dir: Path
+    rules_path: Path
+    faq_path: Path
+    collection_name: str
+    index_dir: Path
+
+    def knowledge_files(self) -> list[Path]:
+        if not self.knowledge_dir.exists():
+            return []
+        return sorted(self.knowledge_dir.glob("*.txt"))
+
+    def knowledge_hash(self) -> str:
+        """门店知识库内容指纹，FAQ 答案表以此为版本。"""
+        return knowledge_hash(self.knowledge_files())
+
+    def source_files(self) -> list[Path]:
+        """门店快照依赖的全部源文件（热更新据此判断是否变化）。"""
+        return [self.menu_path, self.rules_path, self.faq_path, self.index_dir / MANIFEST_FILENAME, *self.knowledge_files()]
+
+    def source_signature(self) -> tuple:
+        """源文件的 (路径, 修改时间, 大小)；文件增删或内容更新都会改变签名。"""
+        sig = []
+        for p in self.source_files():
+            try:
+                st = p.stat()
+                sig.append((str(p), st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append((str(p), None, None))
+        return tuple(sig)
+
+
+@contextmanager
+def _ingest_lock(persist_directory: str, collection_name: str):
+    """跨进程互斥录入同一集合（多 worker 同时热更新时避免重复录入）。"""
+    if fcntl is None:
+        yield
+        return
+    lock_path = Path(persist_directory) / f".{collection_name}.lock"
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class StoreContext:
+    """已加载的门店（只读快照）：菜单与蘸料规则常驻；RAG 集合与 FAQ 答案表在第一次知识问答时懒加载。"""
+
+    def __init__(
+        self,
+        config: StoreConfig,
+        embeddings_factory,
+        persist_directory: str = DEFAULT_PERSIST_DIR,
+    ):
+        t0 = time.perf_counter()
+        self.config = config
+        # 先取签名再读文件：读取期间文件又被改动时，下次检查仍会发现变化
+        self.signature = config.source_signature()
+        self.kb_hash = config.knowledge_hash()
+        self.menu_index = MenuIndex.from_file(config.menu_path)
+        self.rules = load_rules(config.rules_path)
+        self.entities: list[MenuEntity] = menu_entities(self.menu_index)
+        # 人数 × 过敏项的推荐结果随快照一起预先算好；点单热度排名变化时由 apply_popularity 整表替换
+        self.recommendations = RecommendationTable(self.menu_index)
+        # 购物车加菜时的「常一起点」表；订单同现邻居变化时由 apply_cooccurrence 整表替换
+        self.suggestions = SuggestionTable(self.menu_index)
+        # /api/ingredients 的响应体：预先序列化与压缩，ETag 绑定菜单版本
+        self.ingredients_body = CachedBody.json(
+            {"ingredients": [
+                {"id": it.get("id"), "name_cn": it.get("name_cn"), "name_en": it.get("name_en")}
+                for it in self.menu_index.ingredients
+            ]},
+            etag=f"ingredients-{self.menu_index.version}",
+        )
+        # /api/ingredients/search 的前缀 / 拼音 / 模糊索引
+        self.ingredient_search = IngredientSearch.from_menu(self.menu_index)
+        self._menu_bytes = config.menu_path.stat().st_size
+        self._embeddings_factory = embeddings_factory
+        self._persist_directory = persist_directory
+        self._rag: RAG | None = None
+        self._faq_table: FAQTable | None = None
+        self._entity_vectors: EntityVectors | None = None
+        self._rag_chunks = 0
+        self._faq_bytes = 0
+        self._lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.load_ms = (time.perf_counter() - t0) * 1000
+
+    @property
+    def store_id(self) -> str:
+        return self.config.store_id
+
+    @property
+    def menu_path(self) -> Path:
+        return self.config.menu_path
+
+    @property
+    def rules_path(self) -> Path:
+        return self.config.rules_path
+
+    @property
+    def collection_name(self) -> str:
+        """向量集合名 = 门店基础名 + 知识库指纹前缀：知识变化后热更新录入新集合，不影响正在使用的旧集合。"""
+        return f"{self.config.collection_name}-{self.kb_hash[:8]}"
+
+    @property
+    def rag(self) -> RAG:
+        if self._rag is None:
+            self.load_knowledge()
+        return self._rag
+
+    @property
+    def faq_table(self) -> FAQTable | None:
+        if self._rag is None:
+            self.load_knowledge()
+        return self._faq_table
+
+    @property
+    def entity_vectors(self) -> EntityVectors:
+        if self._rag is None:
+            self.load_knowledge()
+        return self._entity_vectors
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings_factory()
+
+    @property
+    def knowledge_loaded(self) -> bool:
+        return self._rag is not None
+
+    def retrieval_vectors(self, query: QueryContext) -> tuple[MenuEntity | None, np.ndarray, np.ndarray | None]:
+        """
+        知识问答的检索向量，返回 (实体, query 向量, 名称向量)。
+        问题以食材/锅底名开头时，把预计算的实体扩展向量叠加到 query 向量上，并给出实体名称向量供备用检索。
+        """
+        entity = match_entity(query.text, self.entities)
+        if entity is None:
+            return None, query.vector, None
+        return (
+            entity,
+            query.blended(self.entity_vectors.expansion(entity.name)),
+            self.entity_vectors.name(entity.name),
+        )
+
+    def faq_answer(self, query: QueryContext) -> str | None:
+        """查预计算 FAQ 答案表（没有答案表时为 None）；语义查表只看问题开头匹配到的同一食材/锅底的条目。"""
+        faq_table = self.faq_table
+        if faq_table is None:
+            return None
+        entity = match_entity(query.text, self.entities)
+        return faq_table.lookup(query.text, query_vec=query.vector, entity=entity.name if entity else None)
+
+    def load_knowledge(self) -> None:
+        """
+        优先只读打开与知识库一致的预构建索引包，否则打开门店的向量集合（为空时录入门店知识文档）；
+        加载与当前知识库一致的 FAQ 答案表，
+        并批量编码菜单实体的扩展词/名称向量与 FAQ 问题向量（之后每个请求只需编码用户问题一次）。
+        """
+        with self._lock:
+            if self._rag is not None:
+                return
+            t0 = time.perf_counter()
+            cfg = self.config
+            embeddings = self._embeddings_factory()
+            kb_hash = self.kb_hash
+            rag = RAG.open_prebuilt(
+                cfg.index_dir,
+                kb_hash,
+                embeddings=embeddings,
+                collection_name=self.collection_name,
+                persist_directory=self._persist_directory,
+            )
+            if rag is not None:
+                print(f"[RAG] 门店 {cfg.store_id}：已打开预构建索引 {rag.count()} 个文本块（只读）。")
+            else:
+                rag = RAG(
+                    collection_name=self.collection_name,
+                    persist_directory=self._persist_directory,
+                    embeddings=embeddings,
+                )
+                with _ingest_lock(self._persist_directory, self.collection_name):
+                    if rag.count() == 0:
+                        total = sum(rag.ingest_file(str(f)) for f in cfg.knowledge_files())
+                        if total > 0:
+                            print(f"[RAG] 门店 {cfg.store_id}：已自动录入 {total} 个文本块到知识库。")
+            faq_table = FAQTable.load(cfg.faq_path, kb_hash=kb_hash)
+            if faq_table is not None:
+                faq_table.index_vectors(embeddings)
+                self._faq_bytes = cfg.faq_path.stat().st_size
+                print(f"[FAQ] 门店 {cfg.store_id}：已加载预计算答案 {len(faq_table)} 条。")
+            elif cfg.faq_path.exists():
+                print(
+                    f"[FAQ] 门店 {cfg.store_id}：答案表与当前知识库不一致，已忽略"
+                    f"（请重新运行 python main.py precompute-faq --store {cfg.store_id}）。"
+                )
+            self._rag_chunks = rag.count()
+            self._entity_vectors = EntityVectors(self.entities, embeddings)
+            self._faq_table = faq_table
+            self._rag = rag
+            self.load_ms += (time.perf_counter() - t0) * 1000
+
+    def apply_popularity(self, snapshot: PopularitySnapshot) -> bool:
+        """按点单热度快照重建推荐表并原子替换（快照版本未变时跳过）；返回是否重建。"""
+        if self.recommendations.popularity_version == snapshot.version:
+            return False
+        self.recommendations = RecommendationTable(
+            self.menu_index, snapshot.for_store(self.store_id), popularity_version=snapshot.version
+        )
+        return True
+
+    def apply_cooccurrence(self, snapshot: CooccurrenceSnapshot) -> bool:
+        """按订单同现邻居快照重建「常一起点」表并原子替换（快照版本未变时跳过）；返回是否重建。"""
+        if self.suggestions.cooccurrence_version == snapshot.version:
+            return False
+        self.suggestions = SuggestionTable(
+            self.menu_index, snapshot.for_store(self.store_id), cooccurrence_version=snapshot.version
+        )
+        return True
+
+    def approx_bytes(self) -> int:
+        """估算的驻留内存（菜单与 FAQ 对象 + 已打开集合的文本块）。"""
+        return (
+            (self._menu_bytes + self._faq_bytes) * JSON_OBJECT_OVERHEAD
+            + self._rag_chunks * CHUNK_RESIDENT_BYTES
+        )
+
+    def memory_usage(self) -> dict[str, dict]:
+        """各组成部分的条目数与实测深度大小；向量集合由 Chroma 管理，按文本块数估算。"""
+        out = {
+            "menu_index": {"entries": len(self.menu_index.ingredients), "bytes": deep_sizeof(self.menu_index)},
+            "sauce_rules": {"entries": len(self.rules.get("rules") or []), "bytes": deep_sizeof(self.rules)},
+            "entities": sized(self.entities),
+            "recommendations": sized(self.recommendations),
+            "suggestions": sized(self.suggestions),
+            "ingredients_body": sized(self.ingredients_body),
+            "ingredient_search": sized(self.ingredient_search),
+        }
+        if self._rag is not None:
+            out["knowledge_chunks"] = {"entries": self._rag_chunks, "bytes": self._rag_chunks * CHUNK_RESIDENT_BYTES}
+            out["entity_vectors"] = sized(self._entity_vectors)
+            if self._faq_table is not None:
+                out["faq_table"] = sized(self._faq_table)
+        return out
+
+
+class StoreRegistry:
+    """门店注册表：按需加载门店，按估算内存上限做 LRU 驻留。"""
+
+    def __init__(
+        self,
+        data_dir: Path | str = DATA_DIR,
+        persist_directory: str = DEFAULT_PERSIST_DIR,
+        memory_cap_bytes: int = DEFAULT_STORE_MEMORY_CAP_MB * 1024 * 1024,
+        embeddings: Embeddings | None = None,
+        reload_grace_s: float = DEFAULT_RELOAD_GRACE_S,
+        drop_retired: bool = True,
+    ):
+        """
+        drop_retired=False 用于多 worker 共用同一持久化目录：某个 worker 热更新时，其它 worker 可能仍在使用旧集合，
+        因此不删除旧集合，留给下次启动时的 prune_collections 清理。
+        """
+        self.data_dir = Path(data_dir)
+        self.stores_dir = self.data_dir / "stores"
+        self.persist_directory = persist_directory
+        self.memory_cap_bytes = memory_cap_bytes
+        self.reload_grace_s = reload_grace_s
+        self.drop_retired = drop_retired
+        self._embeddings = embeddings
+        self._resident: OrderedDict[str, StoreContext] = OrderedDict()
+        self._loading: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def get_embeddings(self) -> Embeddings:
+        return self._embeddings or shared_embeddings()
+
+    def config(self, store_id: str) -> StoreConfig:
+        """门店数据文件位置；门店不存在时抛 UnknownStoreError。"""
+        if store_id == DEFAULT_STORE_ID:
+            return StoreConfig(
+                store_id=store_id,
+                menu_path=self._default_menu_path(),
+                knowledge_dir=self.data_dir,
+                rules_path=self._default_rules_path(),
+                faq_path=self.data_dir / FAQ_FILENAME,
+                collection_name=DEFAULT_COLLECTION_NAME,
+                index_dir=self.data_dir / INDEX_DIRNAME,
+            )
+        store_dir = self.stores_dir / store_id
+        if not _STORE_ID_RE.match(store_id or "") or not store_dir.is_dir():
+            raise UnknownStoreError(store_id)
+        menu_path = store_dir / MENU_FILENAME
+        rules_path = store_dir / RULES_FILENAME
+        return StoreConfig(
+            store_id=store_id,
+            menu_path=menu_path if menu_path.exists() else self._default_menu_path(),
+            knowledge_dir=store_dir,
+            rules_path=rules_path if rules_path.exists() else self._default_rules_path(),
+            faq_path=store_dir / FAQ_FILENAME,
+            collection_name=f"store_{store_id}",
+            index_dir=store_dir / INDEX_DIRNAME,
+        )
+
+    def _default_menu_path(self) -> Path:
+        path = self.data_dir / MENU_FILENAME
+        return path if path.exists() else DEFAULT_MENU_PATH
+
+    def _default_rules_path(self) -> Path:
+        path = self.data_dir / RULES_FILENAME
+        return path if path.exists() else RULES_PATH
+
+    def store_ids(self) -> list[str]:
+        """已配置的全部门店（默认门店 + data/stores 下的子目录）。"""
+        ids = [DEFAULT_STORE_ID]
+        if self.stores_dir.is_dir():
+            ids += sorted(
+                p.name for p in self.stores_dir.iterdir() if p.is_dir() and _STORE_ID_RE.match(p.name)
+            )
+        return ids
+
+    def get(self, store_id: str | None = None) -> StoreContext:
+        """返回门店上下文；未驻留时加载（同一门店并发首访只加载一次）。"""
+        store_id = store_id or DEFAULT_STORE_ID
+        with self._lock:
+            ctx = self._touch_locked(store_id)
+            if ctx is not None:
+                return ctx
+        # 先校验门店存在再建加载锁：未知门店直接抛 UnknownStoreError，不在 _loading 中留下条目
+        config = self.config(store_id)
+        with self._lock:
+            load_lock = self._loading.setdefault(store_id, threading.Lock())
+        try:
+            with load_lock:
+                with self._lock:
+                    ctx = self._touch_locked(store_id)
+                    if ctx is not None:
+                        return ctx
+                ctx = StoreContext(config, self.get_embeddings, self.persist_directory)
+                with self._lock:
+                    self._resident[store_id] = ctx
+                    self.loads += 1
+                    self._evict_locked()
+        finally:
+            # 加载成功或失败都移除加载锁；仍在等待的请求持有同一把锁，醒来后按驻留表重新判断
+            with self._lock:
+                if self._loading.get(store_id) is load_lock:
+                    del self._loading[store_id]
+        metrics.incr("store.load")
+        logger.info("[Store] 已加载门店 %s（%.1f ms）", store_id, ctx.load_ms)
+        return ctx
+
+    def _touch_locked(self, store_id: str) -> StoreContext | None:
+        ctx = self._resident.get(store_id)
+        if ctx is None:
+            return None
+        self._resident.move_to_end(store_id)
+        ctx.last_used = time.monotonic()
+        # 知识库懒加载后门店占用会变大，命中时也检查一次上限
+        self._evict_locked()
+        return ctx
+
+    def _evict_locked(self) -> None:
+        """超过内存上限时从最久未用的门店开始逐出；最近使用的门店始终保留。"""
+        while len(self._resident) > 1 and self._resident_bytes_locked() > self.memory_cap_bytes:
+            store_id, _ = self._resident.popitem(last=False)
+            self.evictions += 1
+            metrics.incr("store.evict")
+            logger.info("[Store] 内存超过上限，逐出门店 %s", store_id)
+
+    def _resident_bytes_locked(self) -> int:
+        return sum(ctx.approx_bytes() for ctx in self._resident.values())
+
+    def resident_ids(self) -> list[str]:
+        with self._lock:
+            return list(self._resident)
+
+    def peek(self, store_id: str) -> StoreContext | None:
+        """返回已驻留的门店（不更新 LRU 顺序、不触发加载）。"""
+        with self._lock:
+            return self._resident.get(store_id)
+
+    # ---------- 热更新 ----------
+    def reload(self, store_id: str, force: bool = False) -> dict:
+        """
+        重新加载一家已驻留的门店：源文件未变化（且非 force）时跳过；
+        否则在当前线程构建新快照（原来已打开知识库的，新快照也先打开/录入好），再原子替换。
+        构建失败时保留旧快照。返回 {store_id, swapped, reason, changed, duration_ms}。
+        """
+        t0 = time.perf_counter()
+
+        def result(swapped: bool, reason: str, changed: list[str] | None = None) -> dict:
+            return {
+                "store_id": store_id,
+                "swapped": swapped,
+                "reason": reason,
+                "changed": changed or [],
+                "duration_ms": round((time.perf_counter() - t0) * 1000, 1),
+            }
+
+        with self._reload_lock:
+            old = self.peek(store_id)
+            if old is None:
+                return result(False, "not_loaded")
+            try:
+                cfg = self.config(store_id)
+            except UnknownStoreError:
+                self.evict(store_id)
+                return result(False, "removed")
+            if not force and cfg.source_signature() == old.signature:
+                return result(False, "unchanged")
+            try:
+                new = StoreContext(cfg, self.get_embeddings, self.persist_directory)
+                if old.knowledge_loaded:
+                    new.load_knowledge()
+            except Exception as e:
+                metrics.incr("store.reload_failed")
+                logger.exception("[Store] 门店 %s 热更新失败，继续使用旧快照", store_id)
+                return result(False, f"error: {e}")
+            changed = [
+                name for name, differs in (
+                    ("menu", new.menu_index.version != old.menu_index.version),
+                    ("rules", new.rules != old.rules),
+                    ("knowledge", new.kb_hash != old.kb_hash),
+                ) if differs
+            ]
+            with self._lock:
+                if store_id not in self._resident:
+                    return result(False, "evicted", changed)
+                # 原位替换，保持 LRU 顺序
+                self._resident[store_id] = new
+                self.reloads += 1
+                self._evict_locked()
+            self._retire(old)
+        metrics.incr("store.reload")
+        out = result(True, "reloaded", changed)
+        logger.info("[Store] 门店 %s 已热更新（%s，%.1f ms）", store_id, ",".join(changed) or "force", out["duration_ms"])
+        return out
+
+    def reload_all(self, force: bool = False) -> list[dict]:
+        return [self.reload(store_id, force=force) for store_id in self.resident_ids()]
+
+    def _retire(self, old: StoreContext) -> None:
+        """
+        宽限期后删除旧快照的向量集合（仍被某个驻留门店使用、或为只读索引包时不删）。
+        「仍在使用」只看得到本进程，多 worker（drop_retired=False）时不删，由启动时的 prune_collections 清理。
+        """
+        if not self.drop_retired or not old.knowledge_loaded or old.rag.read_only:
+            return
+
+        def drop() -> None:
+            with self._lock:
+                in_use = any(
+                    ctx.knowledge_loaded and ctx.collection_name == old.collection_name
+                    for ctx in self._resident.values()
+                )
+            if not in_use:
+                old.rag.drop()
+                logger.info("[Store] 已删除旧向量集合 %s", old.collection_name)
+
+        if self.reload_grace_s <= 0:
+            drop()
+            return
+        timer = threading.Timer(self.reload_grace_s, drop)
+        timer.daemon = True
+        timer.start()
+
+    def prune_collections(self) -> list[str]:
+        """
+        删除持久化目录中不再对应当前知识库的门店向量集合（热更新留下的旧集合、已删除门店的集合），返回删除的集合名。
+        只在没有其它进程使用这些集合时调用：单进程服务启动时，或多 worker 启动前由主进程调用。
+        """
+        current, bases = set(), set()
+        for store_id in self.store_ids():
+            cfg = self.config(store_id)
+            bases.add(cfg.collection_name)
+            current.add(f"{cfg.collection_name}-{cfg.knowledge_hash()[:8]}")
+        removed = []
+        for name in list_collections(self.persist_directory):
+            m = _HASHED_COLLECTION_RE.match(name)
+            if m is None or name in current:
+                continue
+            base = m.group("base")
+            if base in bases or (base.startswith("store_") and _STORE_ID_RE.match(base[len("store_"):])):
+                delete_collection(self.persist_directory, name)
+                removed.append(name)
+        if removed:
+            logger.info("[Store] 已清理不再使用的向量集合 %s", ", ".join(removed))
+        return removed
+
+    def evict(self, store_id: str) -> bool:
+        with self._lock:
+            return self._resident.pop(store_id, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._resident.clear()
+
+    def memory_usage(self) -> dict[str, dict]:
+        """已驻留门店各组成部分的内存核算，键为「stores.<门店>.<部分>」。"""
+        with self._lock:
+            resident = list(self._resident.items())
+        out = {
+            f"stores.{sid}.{name}": usage
+            for sid, ctx in resident
+            for name, usage in ctx.memory_usage().items()
+        }
+        # 只在模型已被使用时统计，避免为了核算去加载模型
+        if self._embeddings is not None or any(ctx.knowledge_loaded for _, ctx in resident):
+            out["embedding_model"] = {"entries": 1, "bytes": model_bytes(self.get_embeddings())}
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            resident = [
+                {
+                    "store_id": sid,
+                    "approx_bytes": ctx.approx_bytes(),
+                    "knowledge_loaded": ctx.knowledge_loaded,
+                    "idle_s": round(now - ctx.last_used, 1),
+                    "load_ms": round(ctx.load_ms, 1),
+                }
+                for sid, ctx in self._resident.items()
+            ]
+            return {
+                "configured": len(self.store_ids()),
+                "resident": resident,
+                "resident_bytes": self._resident_bytes_locked(),
+                "memory_cap_bytes": self.memory_cap_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+            }
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+数据文件监视：定期检查已驻留门店的源文件（菜单、蘸料规则、知识文档、FAQ 答案表、索引包清单），
+签名变化且在连续两次检查间保持不变（避免读到写了一半的文件）后触发 StoreRegistry.reload。
+
+用轮询（os.stat）而不是 inotify：不引入依赖，门店源文件只有几个，开销可忽略；
+多 worker 部署时每个 worker 各自监视、各自替换快照。
+"""
+import logging
+import threading
+
+from .stores import StoreRegistry, UnknownStoreError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCH_INTERVAL_S = 5.0
+
+
+class SourceWatcher:
+    """后台轮询线程；poll_once 可单独调用（测试 / 手动触发）。"""
+
+    def __init__(self, registry: StoreRegistry, interval_s: float = DEFAULT_WATCH_INTERVAL_S):
+        self.registry = registry
+        self.interval_s = interval_s
+        self._pending: dict[str, tuple] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "SourceWatcher":
+        if self._thread is None and self.interval_s > 0:
+            self._thread = threading.Thread(target=self._loop, name="store-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 1)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.poll_once()
+            except Exception:
+                logger.exception("[Watch] 检查门店数据文件失败")
+
+    def poll_once(self) -> list[dict]:
+        """检查一轮；返回本轮触发的热更新结果。"""
+        results = []
+        for store_id in self.registry.resident_ids():
+            ctx = self.registry.peek(store_id)
+            if ctx is None:
+                continue
+            try:
+                sig = self.registry.config(store_id).source_signature()
+            except UnknownStoreError:
+                sig = None
+            if sig == ctx.signature:
+                self._pending.pop(store_id, None)
+                continue
+            if self._pending.get(store_id) != sig:
+                # 第一次发现变化：等下一轮确认文件已写完
+                self._pending[store_id] = sig
+                continue
+            self._pending.pop(store_id, None)
+            result = self.registry.reload(store_id)
+            logger.info("[Watch] 门店 %s 数据文件已变化：%s", store_id, result)
+            results.append(result)
+        return results